@@ -981,7 +981,10 @@ class AlertUIDManager:
 
 class AlertCache:
     @staticmethod
-    def save_alert_to_cache(alerts: List[Alert]):
+    def save_alert_to_cache(alerts: List[Alert], pipeline=None):
+        """
+        :param pipeline: 外部传入的 pipeline，传入时只写入命令，由调用方统一执行
+        """
         alerts_to_saved = {}
         for alert in alerts:
             current_alert = alerts_to_saved.get(alert.dedupe_md5)
@@ -994,7 +997,9 @@ class AlertCache:
         update_count = 0
         finished_count = 0
         # 通过 pipeline 批量更新告警，由于这些告警维度都各不相同，更新的先后顺序就都无所谓了
-        pipeline = ALERT_DEDUPE_CONTENT_KEY.client.pipeline(transaction=False)
+        should_execute = pipeline is None
+        if should_execute:
+            pipeline = ALERT_DEDUPE_CONTENT_KEY.client.pipeline(transaction=False)
         for alert in alerts_to_saved.values():
             key = ALERT_DEDUPE_CONTENT_KEY.get_key(strategy_id=alert.strategy_id or 0, dedupe_md5=alert.dedupe_md5)
             if not alert.is_abnormal():
@@ -1004,15 +1009,21 @@ class AlertCache:
                 # 如果告警未结束就更新
                 update_count += 1
             pipeline.set(key, json.dumps(alert.to_dict()), ALERT_DEDUPE_CONTENT_KEY.ttl)
-        pipeline.execute()
+        if should_execute:
+            pipeline.execute()
         return update_count, finished_count
 
     @staticmethod
-    def save_alert_snapshot(alerts: List[Alert]):
+    def save_alert_snapshot(alerts: List[Alert], pipeline=None):
+        """
+        :param pipeline: 外部传入的 pipeline，传入时只写入命令，由调用方统一执行
+        """
         if not alerts:
             return 0
 
-        pipeline = ALERT_SNAPSHOT_KEY.client.pipeline(transaction=False)
+        should_execute = pipeline is None
+        if should_execute:
+            pipeline = ALERT_SNAPSHOT_KEY.client.pipeline(transaction=False)
         snapshot_count = 0
         for alert in alerts:
             # 已经结束的告警保存快照备用
@@ -1020,5 +1031,6 @@ class AlertCache:
             pipeline.set(key, json.dumps(alert.to_dict()), ALERT_SNAPSHOT_KEY.ttl)
             snapshot_count += 1
 
-        pipeline.execute()
+        if should_execute:
+            pipeline.execute()
         return snapshot_count
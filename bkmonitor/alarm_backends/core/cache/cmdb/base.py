@@ -11,17 +11,83 @@ specific language governing permissions and limitations under the License.
 
 
 import abc
+import hashlib
 import json
+import threading
 import time
+from collections import OrderedDict
 
 import six.moves.cPickle as pickle
+from django.conf import settings
 
 from alarm_backends.constants import CONST_ONE_DAY
 from alarm_backends.core.cache.base import CacheManager
+from bkmonitor.utils.thread_backend import ThreadPool
 from core.drf_resource import api
 from core.prometheus import metrics
 
 
+class LocalCache(object):
+    """
+    进程内 LRU 缓存，缓存反序列化后的 CMDB 对象
+    数据在过期或刷新版本变化时失效，对象在进程内共享，使用方不能修改
+    """
+
+    def __init__(self, cache_type, maxsize, ttl):
+        self.cache_type = cache_type
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.version = None
+        self.version_checked_at = 0
+        self.lock = threading.Lock()
+
+    def report(self, status, count=1):
+        if count:
+            metrics.ALARM_CACHE_LOCAL_COUNT.labels(self.cache_type, status).inc(count)
+
+    def get(self, key):
+        """
+        :return: 缓存对象，未命中返回 None
+        """
+        with self.lock:
+            value = self.data.get(key)
+            if value is None:
+                return None
+            expire_at, obj = value
+            if expire_at < time.time():
+                del self.data[key]
+                self.report("evict")
+                return None
+            self.data.move_to_end(key)
+            return obj
+
+    def set(self, key, obj):
+        with self.lock:
+            self.data[key] = (time.time() + self.ttl, obj)
+            self.data.move_to_end(key)
+            evicted = 0
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                evicted += 1
+        self.report("evict", evicted)
+
+    def clear(self):
+        with self.lock:
+            evicted = len(self.data)
+            self.data.clear()
+        self.report("evict", evicted)
+
+    def check_version(self, version):
+        """
+        刷新版本变化时清空缓存
+        """
+        self.version_checked_at = time.time()
+        if version != self.version:
+            self.version = version
+            self.clear()
+
+
 class CMDBCacheManager(CacheManager):
     """
     CMDB 缓存管理基类
@@ -60,6 +126,78 @@ class CMDBCacheManager(CacheManager):
         """
         return origin_key
 
+    @classmethod
+    def get_version_cache_key(cls):
+        return "{}.version".format(cls.CACHE_KEY)
+
+    @classmethod
+    def get_local_cache(cls):
+        """
+        获取进程内缓存，每个缓存管理类独立一份，并定期检查刷新版本
+        :rtype: LocalCache | None
+        """
+        if not getattr(settings, "CMDB_LOCAL_CACHE_ENABLED", False):
+            return None
+
+        # 只查找当前类，避免子类共用父类的缓存
+        local_cache = cls.__dict__.get("_local_cache")
+        if local_cache is None:
+            local_cache = LocalCache(
+                cls.type,
+                getattr(settings, "CMDB_LOCAL_CACHE_MAXSIZE", 50000),
+                getattr(settings, "CMDB_LOCAL_CACHE_TTL", 600),
+            )
+            cls._local_cache = local_cache
+
+        interval = getattr(settings, "CMDB_LOCAL_CACHE_VERSION_CHECK_INTERVAL", 10)
+        if time.time() - local_cache.version_checked_at >= interval:
+            local_cache.check_version(cls.cache.get(cls.get_version_cache_key()))
+        return local_cache
+
+    @classmethod
+    def set_refresh_version(cls, version):
+        """
+        设置刷新版本，版本变化后各进程的本地缓存失效
+        :param version: 刷新数据的摘要，数据未变化时版本不变
+        """
+        cls.cache.set(cls.get_version_cache_key(), version, ex=cls.CACHE_TIMEOUT)
+        local_cache = cls.__dict__.get("_local_cache")
+        if local_cache is not None:
+            local_cache.check_version(version)
+
+    @classmethod
+    def clear_local_cache(cls):
+        local_cache = cls.__dict__.get("_local_cache")
+        if local_cache is not None:
+            local_cache.clear()
+
+    @classmethod
+    def get_objs(cls, keys):
+        """
+        获取多个对象，优先从进程内缓存获取
+        :param list keys: 内部存储key
+        :return: list
+        """
+        local_cache = cls.get_local_cache()
+        if local_cache is None:
+            return [cls.deserialize(obj) if obj else None for obj in cls.cache.hmget(cls.CACHE_KEY, keys)]
+
+        result = [local_cache.get(key) for key in keys]
+        missed_indexes = [index for index, obj in enumerate(result) if obj is None]
+        local_cache.report("hit", len(keys) - len(missed_indexes))
+        local_cache.report("miss", len(missed_indexes))
+        if not missed_indexes:
+            return result
+
+        missed_keys = [keys[index] for index in missed_indexes]
+        for index, key, obj in zip(missed_indexes, missed_keys, cls.cache.hmget(cls.CACHE_KEY, missed_keys)):
+            if not obj:
+                continue
+            obj = cls.deserialize(obj)
+            local_cache.set(key, obj)
+            result[index] = obj
+        return result
+
     @classmethod
     def multi_get(cls, keys):
         """
@@ -69,16 +207,7 @@ class CMDBCacheManager(CacheManager):
         """
         if not keys:
             return []
-        keys = list(keys)
-
-        objs = cls.cache.hmget(cls.CACHE_KEY, keys)
-        result = []
-        for obj in objs:
-            if obj:
-                result.append(cls.deserialize(obj))
-            else:
-                result.append(None)
-        return result
+        return cls.get_objs(list(keys))
 
     @classmethod
     def get(cls, *args, **kwargs):
@@ -87,13 +216,13 @@ class CMDBCacheManager(CacheManager):
         """
         key = cls.key_to_internal_value(*args, **kwargs)
 
-        obj = cls.cache.hget(cls.CACHE_KEY, key)
+        obj = cls.get_objs([key])[0]
 
-        if not obj:
+        if obj is None:
             cls.logger.warning("unknown {}: {}".format(cls.__name__.replace("Manager", ""), key))
             return None
 
-        return cls.deserialize(obj)
+        return obj
 
     @classmethod
     def multi_get_with_dict(cls, keys):
@@ -144,7 +273,12 @@ class CMDBCacheManager(CacheManager):
         """
         清理缓存
         """
-        cls.cache.delete(cls.CACHE_KEY)
+        cls.cache.delete(cls.CACHE_KEY, cls.get_version_cache_key())
+        cls.clear_local_cache()
+
+
+# i18n 为全局单例，切换业务时需要加锁，保证各线程激活的语言和时区与业务一致
+i18n_lock = threading.Lock()
 
 
 class RefreshByBizMixin(object):
@@ -152,6 +286,13 @@ class RefreshByBizMixin(object):
     def get_biz_cache_key(cls):
         return "{}.biz".format(cls.CACHE_KEY)
 
+    @classmethod
+    def get_hash_cache_key(cls):
+        """
+        对象序列化摘要，用于增量刷新时跳过未变化的对象
+        """
+        return "{}.hash".format(cls.CACHE_KEY)
+
     @classmethod
     @abc.abstractmethod
     def refresh_by_biz(cls, bk_biz_id):
@@ -163,12 +304,34 @@ class RefreshByBizMixin(object):
         raise NotImplementedError
 
     @classmethod
-    def refresh(cls):
+    def fetch_by_biz(cls, bk_biz_id):
         """
-        刷新缓存
+        拉取单个业务的对象信息，在线程池中执行
+        :return: (bk_biz_id, objs, exc, cost)
         """
         from alarm_backends.core.i18n import i18n
 
+        start_time = time.time()
+        objs = None
+        exc = None
+        try:
+            with i18n_lock:
+                i18n.set_biz(bk_biz_id)
+            objs = cls.refresh_by_biz(bk_biz_id)
+        except Exception as e:
+            # 如果接口调用异常，则不更新
+            cls.logger.exception("get data by biz fail, bk_biz_id: {}, {}".format(bk_biz_id, e))
+            exc = e
+        return bk_biz_id, objs, exc, time.time() - start_time
+
+    @classmethod
+    def refresh(cls):
+        """
+        刷新缓存
+        1. 按业务并发拉取对象
+        2. 对比对象序列化摘要，只写入发生变化的对象
+        3. 根据业务下的key列表计算需要删除的对象
+        """
         cls.logger.info("refresh CMDB data started.")
 
         start_time = time.time()
@@ -179,68 +342,104 @@ class RefreshByBizMixin(object):
 
         biz_ids = [business.bk_biz_id for business in business_list]
 
-        new_keys = []
-
         biz_cache_key = cls.get_biz_cache_key()
+        hash_cache_key = cls.get_hash_cache_key()
 
+        # 按业务存储的key列表，用于差量更新
+        # {
+        #   '2': ['10.0.0.1|0', '10.0.0.2|0'],
+        #   '3': ['10.0.0.3|0'],
+        # }
+        old_biz_keys = {
+            bk_biz_id: json.loads(keys) for bk_biz_id, keys in (cls.cache.hgetall(biz_cache_key) or {}).items()
+        }
+
+        # 摘要缺失时(首次刷新、缓存被清理或关闭增量刷新)，全量写入，并通过 hkeys 清理已删除的对象
+        incremental = (
+            getattr(settings, "CMDB_INCREMENTAL_REFRESH_ENABLED", True)
+            and cls.cache.exists(cls.CACHE_KEY)
+            and cls.cache.exists(hash_cache_key)
+        )
+        old_hashes = (cls.cache.hgetall(hash_cache_key) or {}) if incremental else {}
+
+        new_biz_keys = {}
+        written_count = 0
+        skipped_count = 0
+        # 刷新数据摘要，作为进程内缓存的刷新版本
+        digest = hashlib.md5()
+
+        pool = ThreadPool(processes=min(getattr(settings, "CMDB_REFRESH_CONCURRENCY", 8), len(biz_ids)))
+        try:
+            for bk_biz_id, objs, exc, cost in pool.imap(cls.fetch_by_biz, biz_ids):
+                if exc is None:
+                    pipeline = cls.cache.pipeline()
+                    for key, obj in list(objs.items()):
+                        value = cls.serialize(obj)
+                        value_hash = hashlib.md5(str(value).encode("utf-8")).hexdigest()
+                        digest.update("{}\n{}\n".format(key, value_hash).encode("utf-8"))
+                        if old_hashes.get(key) == value_hash:
+                            skipped_count += 1
+                            continue
+                        old_hashes[key] = value_hash
+                        pipeline.hset(cls.CACHE_KEY, key, value)
+                        pipeline.hset(hash_cache_key, key, value_hash)
+                        written_count += 1
+
+                    new_biz_keys[str(bk_biz_id)] = list(objs.keys())
+                    pipeline.hset(biz_cache_key, str(bk_biz_id), json.dumps(new_biz_keys[str(bk_biz_id)]))
+
+                    pipeline.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
+                    pipeline.expire(hash_cache_key, cls.CACHE_TIMEOUT)
+                    pipeline.execute()
+                metrics.ALARM_CACHE_TASK_TIME.labels(str(bk_biz_id), cls.type, str(exc)).observe(cost)
+        finally:
+            pool.close()
+            pool.join()
+
+        # 拉取失败的业务保留原有的key列表
         for bk_biz_id in biz_ids:
-            biz_start_time = time.time()
-            exc = None
-            try:
-                i18n.set_biz(bk_biz_id)
-                objs = cls.refresh_by_biz(bk_biz_id)
-            except Exception as e:
-                # 如果接口调用异常，则不更新
-                cls.logger.exception("get data by biz fail, bk_biz_id: {}, {}".format(bk_biz_id, e))
-                exc = e
-            else:
-                # 更新对象缓存
-                pipeline = cls.cache.pipeline()
-                for key, obj in list(objs.items()):
-                    pipeline.hset(cls.CACHE_KEY, key, cls.serialize(obj))
-                    new_keys.append(key)
-
-                # 按业务设置key列表，用于差量更新
-                pipeline.hset(biz_cache_key, str(bk_biz_id), json.dumps(list(objs.keys())))
-
-                pipeline.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
-                pipeline.execute()
-            metrics.ALARM_CACHE_TASK_TIME.labels(str(bk_biz_id), cls.type, str(exc)).observe(
-                time.time() - biz_start_time
-            )
+            bk_biz_id = str(bk_biz_id)
+            if bk_biz_id not in new_biz_keys and bk_biz_id in old_biz_keys:
+                new_biz_keys[bk_biz_id] = old_biz_keys[bk_biz_id]
 
         # 清理已被删除的业务数据
-        old_biz_ids = set(cls.cache.hkeys(biz_cache_key))
-        new_biz_ids = {str(biz_id) for biz_id in biz_ids}
-        deleted_biz_ids = old_biz_ids - new_biz_ids
+        deleted_biz_ids = set(old_biz_keys) - {str(biz_id) for biz_id in biz_ids}
         if deleted_biz_ids:
             cls.cache.hdel(biz_cache_key, *deleted_biz_ids)
         cls.cache.expire(biz_cache_key, cls.CACHE_TIMEOUT)
 
-        biz_cache_keys = cls.cache.hgetall(biz_cache_key) or {}
-
-        # biz_cache_key 存储的就是最新的Keys列表，在后面与old keys做差量比对
-        # 存储结构
-        # {
-        #   '2': ['10.0.0.1|0', '10.0.0.2|0'],
-        #   '3': ['10.0.0.3|0'],
-        # }
-        new_keys = []
-        for keys in list(biz_cache_keys.values()):
-            new_keys.extend(json.loads(keys))
+        new_keys = set()
+        for keys in new_biz_keys.values():
+            new_keys.update(keys)
 
         # 清理业务下已被删除的对象数据
-        old_keys = cls.cache.hkeys(cls.CACHE_KEY)
-        deleted_keys = set(old_keys) - set(new_keys)
+        if incremental:
+            old_keys = set()
+            for keys in old_biz_keys.values():
+                old_keys.update(keys)
+        else:
+            old_keys = set(cls.cache.hkeys(cls.CACHE_KEY))
+        deleted_keys = old_keys - new_keys
         if deleted_keys:
             cls.cache.hdel(cls.CACHE_KEY, *deleted_keys)
+            cls.cache.hdel(hash_cache_key, *deleted_keys)
         cls.cache.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
 
+        cls.set_refresh_version(digest.hexdigest())
+
         metrics.ALARM_CACHE_TASK_TIME.labels("0", cls.type, "None").observe(time.time() - start_time)
 
         cls.logger.info(
-            "cache_key({}) refresh CMDB data finished, amount: updated: {}, removed: {}, "
-            "removed_biz: {}".format(cls.CACHE_KEY, len(new_keys), len(deleted_keys), len(deleted_biz_ids))
+            "cache_key({}) refresh CMDB data finished, incremental: {}, amount: {}, written: {}, skipped: {}, "
+            "removed: {}, removed_biz: {}".format(
+                cls.CACHE_KEY,
+                incremental,
+                len(new_keys),
+                written_count,
+                skipped_count,
+                len(deleted_keys),
+                len(deleted_biz_ids),
+            )
         )
 
     @classmethod
@@ -248,4 +447,7 @@ class RefreshByBizMixin(object):
         """
         清理缓存
         """
-        cls.cache.delete(cls.CACHE_KEY, cls.get_biz_cache_key())
+        cls.cache.delete(
+            cls.CACHE_KEY, cls.get_biz_cache_key(), cls.get_hash_cache_key(), cls.get_version_cache_key()
+        )
+        cls.clear_local_cache()
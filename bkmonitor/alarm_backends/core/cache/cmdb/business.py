@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import hashlib
 
 from alarm_backends.core.cache.cmdb.base import CMDBCacheManager
 from api.cmdb.define import Business
@@ -50,9 +51,13 @@ class BusinessManager(CMDBCacheManager):
         cls.logger.info("refresh CMDB Business data started.")
 
         business_list = api.cmdb.get_business(all=True)  # type: list[Business]
+        digest = hashlib.md5()
         pipeline = cls.cache.pipeline()
         for business in business_list:
-            pipeline.hset(cls.CACHE_KEY, cls.key_to_internal_value(business.bk_biz_id), cls.serialize(business))
+            key = cls.key_to_internal_value(business.bk_biz_id)
+            value = cls.serialize(business)
+            pipeline.hset(cls.CACHE_KEY, key, value)
+            digest.update("{}\n{}\n".format(key, value).encode("utf-8"))
 
         pipeline.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
         pipeline.execute()
@@ -68,6 +73,8 @@ class BusinessManager(CMDBCacheManager):
         pipeline.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
         pipeline.execute()
 
+        cls.set_refresh_version(digest.hexdigest())
+
         cls.logger.info(
             "refresh CMDB Business data finished, amount: updated: {}, removed: {}".format(
                 len(new_keys), len(deleted_keys)
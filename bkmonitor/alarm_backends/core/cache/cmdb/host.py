@@ -9,6 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import hashlib
 import json
 from typing import List
 
@@ -148,10 +149,12 @@ class HostIPManager(CMDBCacheManager):
         if deleted_keys:
             cls.cache.hdel(cls.CACHE_KEY, *deleted_keys)
 
+        digest = hashlib.md5()
         if ip_mapping:
             ip_result = {}
             for index, ip in enumerate(ip_mapping):
-                ip_result[ip] = json.dumps(list(ip_mapping[ip]))
+                ip_result[ip] = json.dumps(sorted(ip_mapping[ip]))
+                digest.update("{}\n{}\n".format(ip, ip_result[ip]).encode("utf-8"))
                 if index % 1000 == 0:
                     cls.cache.hmset(cls.CACHE_KEY, ip_result)
                     ip_result = {}
@@ -160,6 +163,7 @@ class HostIPManager(CMDBCacheManager):
                 cls.cache.hmset(cls.CACHE_KEY, ip_result)
 
         cls.cache.expire(cls.CACHE_KEY, cls.CACHE_TIMEOUT)
+        cls.set_refresh_version(digest.hexdigest())
 
         cls.logger.info(
             "cache_key({}) refresh CMDB data finished, amount: updated: {}, removed: {}".format(
@@ -216,7 +220,7 @@ class HostManager(RefreshByBizMixin, CMDBCacheManager):
             if host:
                 return host
         # 尝试使用bk_host_id获取主机信息
-        host = cls.cache.hget(cls.CACHE_KEY, bk_host_id)
+        host = cls.get_objs([bk_host_id])[0]
         if not host:
             # 如果没有获取到主机信息，则尝试使用ip获取主机信息
             host_key = HostIDManager.get(bk_host_id)
@@ -227,8 +231,6 @@ class HostManager(RefreshByBizMixin, CMDBCacheManager):
 
             if not host:
                 return
-        else:
-            host = cls.deserialize(host)
 
         # 本地缓存主机信息
         if using_mem:
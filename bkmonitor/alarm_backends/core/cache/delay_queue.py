@@ -10,61 +10,170 @@ specific language governing permissions and limitations under the License.
 """
 
 
+import hashlib
 import json
 import logging
 import time
+import zlib
 
-from six.moves import zip
+from django.conf import settings
+from redis.exceptions import NoScriptError
 
 from alarm_backends.constants import CONST_MINUTES
 from alarm_backends.core.cache.key import KEY_PREFIX
 from alarm_backends.core.storage.redis import CACHE_BACKEND_CONF_MAP, Cache
+from core.prometheus import metrics
 
 logger = logging.getLogger("cache.delay_queue")
 
+# 原子领取到期任务: 按批次从延时队列中取出到期任务，同时删除任务存储，返回任务内容、最早的待调度时间及剩余任务数
+# KEYS[1]: 延时队列(zset) KEYS[2]: 任务存储(hash)
+# ARGV[1]: 当前时间 ARGV[2]: 单批次最大任务数
+CLAIM_DUE_TASKS_SCRIPT = """
+local unpack = unpack or table.unpack
+local task_ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local messages = {}
+if #task_ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(task_ids))
+    messages = redis.call('HMGET', KEYS[2], unpack(task_ids))
+    redis.call('HDEL', KEYS[2], unpack(task_ids))
+end
+local next_task = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {messages, next_task[2] or false, redis.call('ZCARD', KEYS[1])}
+"""
+CLAIM_DUE_TASKS_SCRIPT_SHA = hashlib.sha1(CLAIM_DUE_TASKS_SCRIPT.encode("utf-8")).hexdigest()
+
 
 class DelayQueueManager(object):
     TASK_STORAGE_QUEUE = KEY_PREFIX + "task_storage"
     TASK_DELAY_QUEUE = KEY_PREFIX + "task_delay_queue"
+    # 使用过的最大分片数量，分片数量调小后，仍然调度被移除分片中的任务
+    TASK_SHARD_COUNT = KEY_PREFIX + "task_delay_queue.shards"
+
+    # 轮询间隔下限，避免到期时间过近时空转
+    MIN_POLL_INTERVAL = 0.01
 
     @classmethod
-    def refresh_single_db(cls, backend):
-        redis_client = Cache(backend)
+    def get_shard_count(cls):
+        return max(int(getattr(settings, "DELAY_QUEUE_SHARDS", 1)), 1)
+
+    @classmethod
+    def get_shard_keys(cls, shard):
+        """
+        第0个分片沿用原来的key，调整分片数量时，已有的任务仍然可以被调度
+        """
+        if not shard:
+            return cls.TASK_DELAY_QUEUE, cls.TASK_STORAGE_QUEUE
+        return "{}.{}".format(cls.TASK_DELAY_QUEUE, shard), "{}.{}".format(cls.TASK_STORAGE_QUEUE, shard)
+
+    @classmethod
+    def get_used_shard_count(cls, redis_client):
+        """
+        获取需要调度的分片数量，取当前配置与使用过的最大分片数量中的较大值
+        """
+        shard_count = cls.get_shard_count()
+        used_shard_count = int(redis_client.get(cls.TASK_SHARD_COUNT) or 1)
+        if shard_count > used_shard_count:
+            redis_client.set(cls.TASK_SHARD_COUNT, shard_count)
+        return max(shard_count, used_shard_count)
+
+    @classmethod
+    def get_task_keys(cls, task_id):
+        shard = zlib.crc32(str(task_id).encode("utf-8")) % cls.get_shard_count()
+        return cls.get_shard_keys(shard)
+
+    @classmethod
+    def claim_due_tasks(cls, redis_client, delay_queue, storage_queue, now, batch_size):
+        """
+        领取到期任务
+        :return: (任务内容列表, 最早的待调度时间, 剩余任务数)
+        """
+        if getattr(settings, "DELAY_QUEUE_SCRIPT_ENABLED", False):
+            # 通过 redis_client 执行，连接异常时可以重建连接并重试
+            args = [2, delay_queue, storage_queue, repr(now), batch_size]
+            try:
+                messages, next_score, backlog = redis_client.evalsha(CLAIM_DUE_TASKS_SCRIPT_SHA, *args)
+            except NoScriptError:
+                messages, next_score, backlog = redis_client.eval(CLAIM_DUE_TASKS_SCRIPT, *args)
+            return messages, next_score, backlog
 
-        now = int(time.time())
-        task_ids = redis_client.zrangebyscore(cls.TASK_DELAY_QUEUE, 0, now)
+        task_ids = redis_client.zrangebyscore(delay_queue, 0, now, start=0, num=batch_size)
 
         # use the atomicity of zrem to prevent concurrency
         pipe = redis_client.pipeline()
         for task_id in task_ids:
-            pipe.zrem(cls.TASK_DELAY_QUEUE, task_id)
+            pipe.zrem(delay_queue, task_id)
         result = pipe.execute()
         data_keys = [data_key for data_key, flag in zip(task_ids, result) if flag]
-        if not data_keys:
-            return
 
-        # load data
-        task_list = redis_client.hmget(cls.TASK_STORAGE_QUEUE, data_keys)
-        task_list = [json.loads(task) for task in task_list]
+        pipe = redis_client.pipeline()
+        if data_keys:
+            pipe.hmget(storage_queue, data_keys)
+            pipe.hdel(storage_queue, *data_keys)
+        pipe.zrange(delay_queue, 0, 0, withscores=True)
+        pipe.zcard(delay_queue)
+        result = pipe.execute()
 
-        # delete string key
-        redis_client.hdel(cls.TASK_STORAGE_QUEUE, *data_keys)
+        messages = result[0] if data_keys else []
+        next_task, backlog = result[-2:]
+        return messages, next_task[0][1] if next_task else None, backlog
 
-        # redo push
+    @classmethod
+    def dispatch(cls, backend, redis_client, messages, now):
+        """
+        将到期任务推入目标队列
+        """
         pipe = redis_client.pipeline()
-        for task in task_list:
-            task_id, cmd, queue, values, scheduled = task
+        dispatched = 0
+        for message in messages:
+            if not message:
+                continue
+            task_id, cmd, queue, values, scheduled = json.loads(message)
             getattr(pipe, cmd)(queue, *values)
-        pipe.execute()
+            metrics.DELAY_QUEUE_DISPATCH_LAG.labels(backend=backend).observe(max(now - scheduled, 0))
+            dispatched += 1
+        if dispatched:
+            pipe.execute()
+        return dispatched
+
+    @classmethod
+    def refresh_single_db(cls, backend):
+        """
+        按批次调度所有分片中的到期任务
+        :return: 最早的待调度时间，没有待调度任务时返回 None
+        """
+        redis_client = Cache(backend)
+        batch_size = int(getattr(settings, "DELAY_QUEUE_BATCH_SIZE", 1000))
+
+        next_scores = []
+        for shard in range(cls.get_used_shard_count(redis_client)):
+            delay_queue, storage_queue = cls.get_shard_keys(shard)
+            while True:
+                now = time.time()
+                messages, next_score, backlog = cls.claim_due_tasks(
+                    redis_client, delay_queue, storage_queue, now, batch_size
+                )
+                cls.dispatch(backend, redis_client, messages, now)
+                # 不足一个批次，或者剩余的任务均未到期，则处理下一个分片
+                if len(messages) < batch_size or next_score is None or float(next_score) > now:
+                    break
+
+            metrics.DELAY_QUEUE_BACKLOG.labels(backend=backend, shard=shard).set(backlog)
+            if next_score is not None:
+                next_scores.append(float(next_score))
+        return min(next_scores) if next_scores else None
 
     @classmethod
     def refresh(cls):
         """
         由定时任务调度，一分钟运行一次，一次运行一分钟
+        根据最早的待调度时间决定下次唤醒时间，最长不超过 DELAY_QUEUE_POLL_INTERVAL
         """
-        now = int(time.time())
-        while int(time.time()) - now < CONST_MINUTES:
+        start = time.time()
+        poll_interval = float(getattr(settings, "DELAY_QUEUE_POLL_INTERVAL", 1))
+        while time.time() - start < CONST_MINUTES:
             duplicate_db = set()
+            next_scores = []
             for backend, redis_conf in list(CACHE_BACKEND_CONF_MAP.items()):
                 db = redis_conf.get("db", 0)
                 if db in duplicate_db:
@@ -72,10 +181,17 @@ class DelayQueueManager(object):
                 duplicate_db.add(db)
 
                 try:
-                    cls.refresh_single_db(backend)
+                    next_score = cls.refresh_single_db(backend)
                 except Exception as e:
                     logger.exception("redo push(backend:{}), error({})" "".format(backend, e))
-            time.sleep(1)
+                    continue
+                if next_score is not None:
+                    next_scores.append(next_score)
+
+            interval = poll_interval
+            if next_scores:
+                interval = min(poll_interval, max(min(next_scores) - time.time(), cls.MIN_POLL_INTERVAL))
+            time.sleep(interval)
 
 
 def main():
@@ -206,6 +206,17 @@ NO_DATA_LIST_KEY = register_key_with_config(
     }
 )
 
+DATA_SCHEMA_KEY = register_key_with_config(
+    {
+        "label": "[access]待检测数据字段schema(紧凑编码)",
+        "key_type": "hash",
+        "key_tpl": "access.data.schema.{strategy_id}.{item_id}",
+        "field_tpl": "{schema_id}",
+        "ttl": 30 * CONST_MINUTES,
+        "backend": "queue",
+    }
+)
+
 HISTORY_DATA_KEY = register_key_with_config(
     {
         "label": "[detect]待检测数据对应历史数据",
@@ -292,6 +303,16 @@ ACCESS_DUPLICATE_KEY = register_key_with_config(
     }
 )
 
+ACCESS_DUPLICATE_FINGERPRINT_KEY = register_key_with_config(
+    {
+        "label": "[access]数据拉取去重(指纹)",
+        "key_type": "string",
+        "key_tpl": "access.data.duplicate_fp.strategy_group_{strategy_group_key}.{dt_event_time}",
+        "ttl": 10 * CONST_MINUTES,
+        "backend": "service",
+    }
+)
+
 ACCESS_PRIORITY_KEY = register_key_with_config(
     {
         "label": "[access]数据拉取优先级",
@@ -922,6 +943,16 @@ APM_TOPO_DISCOVER_LOCK = register_key_with_config(
     }
 )
 
+APM_TOPO_DISCOVER_WATERMARK = register_key_with_config(
+    {
+        "label": "[apm]TOPO增量发现水位",
+        "key_type": "string",
+        "key_tpl": "apm.tasks.topo.discover.watermark.{app_id}",
+        "ttl": CONST_ONE_DAY,
+        "backend": "service",
+    }
+)
+
 APM_EBPF_DISCOVER_LOCK = register_key_with_config(
     {
         "label": "[apm_ebpf]自动发现周期锁",
@@ -73,7 +73,20 @@ class ShieldCacheManager(CacheManager):
             }
         ]
         """
-        data = cls.cache.get(cls.CACHE_KEY_TEMPLATE.format(bk_biz_id))
+        return cls.load_shields(cls.get_raw_shields(bk_biz_id))
+
+    @classmethod
+    def get_raw_shields(cls, bk_biz_id):
+        """
+        按业务ID获取未解析的屏蔽配置，内容不变时可复用解析结果
+        """
+        return cls.cache.get(cls.CACHE_KEY_TEMPLATE.format(bk_biz_id))
+
+    @classmethod
+    def load_shields(cls, data):
+        """
+        解析屏蔽配置
+        """
         if data:
             data = extended_json.loads(data)
             for shield in data:
@@ -8,6 +8,7 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import copy
 from typing import Dict, List
 
 from django.utils.functional import cached_property
@@ -23,6 +24,17 @@ from alarm_backends.core.context import BaseContextObject
 from api.cmdb.define import Business
 
 
+def copy_cache_obj(obj):
+    """
+    复制缓存对象，缓存对象在进程内共享，补充展示字段前需要复制
+    """
+    new_obj = copy.copy(obj)
+    extra_attr = obj.__dict__.get("_extra_attr")
+    if isinstance(extra_attr, dict):
+        new_obj.__dict__["_extra_attr"] = dict(extra_attr)
+    return new_obj
+
+
 class MultiInstanceDisplay:
     def __init__(self, instances):
         self.instances = instances
@@ -68,6 +80,7 @@ class Target(BaseContextObject):
 
         if not result:
             return
+        result = copy_cache_obj(result)
         result.operator_string = ",".join(result.operator)
         result.bk_bak_operator_string = ",".join(result.bk_bak_operator)
         module_names = set()
@@ -95,6 +108,7 @@ class Target(BaseContextObject):
                 continue
 
             if host:
+                host = copy_cache_obj(host)
                 host.operator_string = host.operator
                 host.bk_bak_operator_string = host.bk_bak_operator
                 module_names = set()
@@ -186,7 +200,9 @@ class Target(BaseContextObject):
         bk_biz_id = self.parent.alert.event.bk_biz_id or self.parent.action.bk_biz_id
 
         biz = BusinessManager.get(bk_biz_id)
-        if not biz:
+        if biz:
+            biz = copy_cache_obj(biz)
+        else:
             biz = Business(bk_biz_id=bk_biz_id)
 
         biz.bk_biz_developer_string = ",".join(biz.bk_biz_developer)
@@ -14,6 +14,7 @@ import logging
 from itertools import chain
 
 import arrow
+from django.conf import settings
 from django.utils.module_loading import import_string
 from django.utils.translation import ugettext_lazy as _
 
@@ -25,10 +26,13 @@ from alarm_backends.constants import (
 )
 from alarm_backends.core.cache import key
 from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
-from bkmonitor.utils.common_utils import count_md5
+from bkmonitor.utils.common_utils import chunks, count_md5
 
 logger = logging.getLogger("core.control")
 
+# 批量模式下单条 hmget/hdel/hmset 命令包含的最大字段数
+BULK_FIELDS_CHUNK_SIZE = 5000
+
 
 class CheckMixin(object):
     @property
@@ -36,6 +40,10 @@ class CheckMixin(object):
         no_data_config = getattr(self, "no_data_config", {})
         return int(no_data_config.get("level", NO_DATA_LEVEL))
 
+    @property
+    def bulk_check_enabled(self):
+        return getattr(settings, "NODATA_BULK_CHECK_ENABLED", False)
+
     def check(self, data_points, check_timestamp):
         scenario_cls = import_string("alarm_backends.service.nodata.scenarios.base.SCENARIO_CLS")
         scenario = self.strategy.scenario
@@ -87,19 +95,13 @@ class CheckMixin(object):
 
             # 5. 生成异常记录，生成规则：1）当前监测点无数据 or 2）当前监测点有数据，但是数据上报时间晚于 last_check_point
             anomaly_data = []
-            target_dimensions_md5 = []
-            last_check_cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=self.strategy.id, item_id=self.id)
-            for target_inst_dms in target_instance_dimensions:
-                target_dms_md5 = count_md5(target_inst_dms)
-                target_dimensions_md5.append(target_dms_md5)
-                # 之前检测的数据最后上报点
-                last_checkpoint_cache_field = key.LAST_CHECKPOINTS_CACHE_KEY.get_field(
-                    dimensions_md5=target_dms_md5,
-                    level=self.no_data_level,
-                )
-                last_point = key.LAST_CHECKPOINTS_CACHE_KEY.client.hget(
-                    last_check_cache_key, last_checkpoint_cache_field
-                )
+            recovered_dimensions_md5 = []
+            target_dimensions_md5 = [count_md5(target_inst_dms) for target_inst_dms in target_instance_dimensions]
+            # 之前检测的数据最后上报点
+            last_points = self._get_last_checkpoints(target_dimensions_md5)
+            for target_inst_dms, target_dms_md5, last_point in zip(
+                target_instance_dimensions, target_dimensions_md5, last_points
+            ):
                 if target_dms_md5 not in dimensions_md5_timestamp or (
                     last_point and dimensions_md5_timestamp[target_dms_md5] < int(last_point)
                 ):
@@ -120,7 +122,8 @@ class CheckMixin(object):
                     )
                 else:
                     # recovery 历史告警事件
-                    self.recover(target_dms_md5)
+                    recovered_dimensions_md5.append(target_dms_md5)
+            self.recover_many(recovered_dimensions_md5)
 
             # 6. 如果有不存在的目标实例，生成异常记录
             for missing_target_inst in missing_target_instances:
@@ -299,6 +302,7 @@ class CheckMixin(object):
         """
         redis_pipeline = None
         processed = set()
+        data_dimensions_md5_set = set(data_dimensions_md5)
         all_dimensions_md5 = target_dimensions_md5 + data_dimensions_md5
         loop = 0
         for _dms in chain(target_instance_dimensions, data_dimensions):
@@ -317,7 +321,7 @@ class CheckMixin(object):
             )
             if redis_pipeline is None:
                 redis_pipeline = check_result.CHECK_RESULT
-            if dimensions_md5 not in data_dimensions_md5:
+            if dimensions_md5 not in data_dimensions_md5_set:
                 name = "{}|{}".format(check_timestamp, ANOMALY_LABEL)
             else:
                 name = "{}|{}".format(check_timestamp, str(NO_DATA_VALUE))
@@ -340,6 +344,10 @@ class CheckMixin(object):
             redis_pipeline.execute()
 
         # 更新last_checkpoint，计算无数据
+        if self.bulk_check_enabled:
+            self._bulk_update_last_checkpoints(check_timestamp, dimensions_md5_timestamp)
+            return
+
         for _dimensions_md5, point_timestamp in list(dimensions_md5_timestamp.items()):
             try:
                 CheckResult.update_last_checkpoint_by_d_md5(
@@ -358,6 +366,70 @@ class CheckMixin(object):
         )
         CheckResult.expire_last_checkpoint_cache(strategy_id=self.strategy.id, item_id=self.id)
 
+    def _get_last_checkpoints(self, dimensions_md5_list):
+        """
+        获取各维度之前检测的数据最后上报点，批量模式下通过一次 pipeline 分段 hmget 获取
+        """
+        client = key.LAST_CHECKPOINTS_CACHE_KEY.client
+        last_check_cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=self.strategy.id, item_id=self.id)
+        fields = [
+            key.LAST_CHECKPOINTS_CACHE_KEY.get_field(dimensions_md5=dimensions_md5, level=self.no_data_level)
+            for dimensions_md5 in dimensions_md5_list
+        ]
+        if not self.bulk_check_enabled:
+            return [client.hget(last_check_cache_key, field) for field in fields]
+
+        if not fields:
+            return []
+        pipeline = client.pipeline(transaction=False)
+        for chunk in chunks(fields, BULK_FIELDS_CHUNK_SIZE):
+            pipeline.hmget(last_check_cache_key, chunk)
+        return list(chain.from_iterable(pipeline.execute()))
+
+    def _bulk_update_last_checkpoints(self, check_timestamp, dimensions_md5_timestamp):
+        """
+        批量模式下，所有维度的最后上报点及最后无数据检测时间通过一个 pipeline 写入
+        """
+        client = key.LAST_CHECKPOINTS_CACHE_KEY.client
+        last_check_cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=self.strategy.id, item_id=self.id)
+        mapping = {
+            key.LAST_CHECKPOINTS_CACHE_KEY.get_field(dimensions_md5=dimensions_md5, level=self.no_data_level): point
+            for dimensions_md5, point in dimensions_md5_timestamp.items()
+        }
+        # 记录每个策略监控项的最后无数据检测时间
+        mapping[
+            key.LAST_CHECKPOINTS_CACHE_KEY.get_field(dimensions_md5=LATEST_NO_DATA_CHECK_POINT, level=self.no_data_level)
+        ] = check_timestamp
+
+        fields = list(mapping)
+        pipeline = client.pipeline(transaction=False)
+        for chunk in chunks(fields, BULK_FIELDS_CHUNK_SIZE):
+            pipeline.hmset(last_check_cache_key, {field: mapping[field] for field in chunk})
+        pipeline.expire(last_check_cache_key, key.LAST_CHECKPOINTS_CACHE_KEY.ttl)
+        pipeline.execute()
+
+    def recover_many(self, dimensions_md5_list):
+        """
+        批量恢复，批量模式下通过一次 pipeline 分段 hdel
+        """
+        if not self.bulk_check_enabled:
+            for dimensions_md5 in dimensions_md5_list:
+                self.recover(dimensions_md5)
+            return
+
+        if not dimensions_md5_list:
+            return
+        fields = [
+            key.NO_DATA_LAST_ANOMALY_CHECKPOINTS_CACHE_KEY.get_field(
+                strategy_id=self.strategy.id, item_id=self.id, dimensions_md5=dimensions_md5
+            )
+            for dimensions_md5 in dimensions_md5_list
+        ]
+        pipeline = key.NO_DATA_LAST_ANOMALY_CHECKPOINTS_CACHE_KEY.client.pipeline(transaction=False)
+        for chunk in chunks(fields, BULK_FIELDS_CHUNK_SIZE):
+            pipeline.hdel(key.NO_DATA_LAST_ANOMALY_CHECKPOINTS_CACHE_KEY.get_key(), *chunk)
+        pipeline.execute()
+
     def recover(self, dimensions_md5):
         key.NO_DATA_LAST_ANOMALY_CHECKPOINTS_CACHE_KEY.client.hdel(
             key.NO_DATA_LAST_ANOMALY_CHECKPOINTS_CACHE_KEY.get_key(),
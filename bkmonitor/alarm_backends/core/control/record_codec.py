@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+"""
+待检测数据队列(access -> detect/nodata)编解码
+
+版本1: 完整的json字典
+    {"record_id": "...", "value": 1.38, "values": {...}, "dimensions": {...}, "time": 1569246480}
+
+版本2: 紧凑格式，字段名按 strategy item 维度抽取为 schema，队列中只保存字段值
+    2|{schema_id}|[[顶层字段值], [values字段值], [dimensions字段值]]
+    schema 保存在 DATA_SCHEMA_KEY 中: {schema_id: [[顶层字段名], [values字段名], [dimensions字段名]]}
+
+解码时两种版本均可识别，滚动升级时先升级所有消费端，再通过 ACCESS_DATA_CODEC_VERSION 切换生产端版本。
+"""
+import hashlib
+import json
+
+from django.conf import settings
+
+from alarm_backends.core.cache.key import DATA_SCHEMA_KEY
+
+CODEC_VERSION_JSON = 1
+CODEC_VERSION_COMPACT = 2
+
+COMPACT_PREFIX = "{}|".format(CODEC_VERSION_COMPACT)
+
+# 按 schema 抽取字段名的嵌套字段
+NESTED_FIELDS = ("values", "dimensions")
+
+
+class DataRecordCodec(object):
+    """
+    单个 strategy item 的待检测数据编解码器
+    """
+
+    # 进程内缓存的 schema 数量上限，schema 内容不可变，超过上限直接清空
+    MAX_CACHED_SCHEMAS = 10000
+    _schema_cache = {}
+
+    def __init__(self, strategy_id, item_id, version=None):
+        self.version = int(version or getattr(settings, "ACCESS_DATA_CODEC_VERSION", CODEC_VERSION_JSON))
+        self.schema_key = DATA_SCHEMA_KEY.get_key(strategy_id=strategy_id, item_id=item_id)
+        # 字段名 -> (schema_id, 嵌套字段位置)，避免每条记录都计算一次 schema
+        self._schema_ids = {}
+        # 本次编码新产生的 schema，需要随数据一起写入 redis
+        self._pending_schemas = {}
+        self._schema_loaded = False
+
+    @classmethod
+    def cache_schema(cls, schema_id, schema):
+        if len(cls._schema_cache) >= cls.MAX_CACHED_SCHEMAS:
+            cls._schema_cache.clear()
+        cls._schema_cache[schema_id] = schema
+
+    def encode(self, data):
+        if self.version != CODEC_VERSION_COMPACT:
+            return json.dumps(data)
+
+        nested = [data.get(field) for field in NESTED_FIELDS]
+        nested = [value if isinstance(value, dict) else None for value in nested]
+        fields = (tuple(data), *(tuple(value) if value is not None else None for value in nested))
+        schema_info = self._schema_ids.get(fields)
+        if schema_info is None:
+            schema = [list(field) if field is not None else None for field in fields]
+            schema_content = json.dumps(schema, separators=(",", ":"))
+            schema_id = hashlib.md5(schema_content.encode("utf-8")).hexdigest()[:16]
+            # 嵌套字段在顶层字段中的位置，编码时置空
+            schema_info = schema_id, [
+                fields[0].index(field) for field, value in zip(NESTED_FIELDS, nested) if value is not None
+            ]
+            self._schema_ids[fields] = schema_info
+            self._pending_schemas[schema_id] = schema_content
+            self.cache_schema(schema_id, schema)
+
+        schema_id, indexes = schema_info
+        top_values = list(data.values())
+        for index in indexes:
+            top_values[index] = None
+        row = [top_values, *(list(value.values()) if value is not None else None for value in nested)]
+        return "{}{}|{}".format(COMPACT_PREFIX, schema_id, json.dumps(row, separators=(",", ":")))
+
+    def flush_schemas(self, pipeline):
+        """
+        将新产生的 schema 写入 pipeline，需要在推送数据之前调用
+        """
+        if not self._pending_schemas:
+            return
+        pipeline.hmset(self.schema_key, self._pending_schemas)
+        pipeline.expire(self.schema_key, DATA_SCHEMA_KEY.ttl)
+        self._pending_schemas = {}
+
+    def load_schemas(self, client):
+        """
+        从 redis 加载当前 item 的全部 schema，每个解码器只加载一次
+        """
+        self._schema_loaded = True
+        for schema_id, schema_content in client.hgetall(self.schema_key).items():
+            self.cache_schema(schema_id, json.loads(schema_content))
+
+    def decode(self, raw, client):
+        """
+        解码待检测数据，兼容新旧两种格式
+        :raise ValueError: 无法识别的数据
+        """
+        if not raw.startswith(COMPACT_PREFIX):
+            return json.loads(raw)
+
+        try:
+            _, schema_id, payload = raw.split("|", 2)
+        except ValueError:
+            raise ValueError("invalid compact record: {}".format(raw))
+
+        schema = self._schema_cache.get(schema_id)
+        if schema is None and not self._schema_loaded:
+            self.load_schemas(client)
+            schema = self._schema_cache.get(schema_id)
+        if schema is None:
+            raise ValueError("record schema({}) not found in {}".format(schema_id, self.schema_key))
+
+        row = json.loads(payload)
+        data = dict(zip(schema[0], row[0]))
+        for field, keys, values in zip(NESTED_FIELDS, schema[1:], row[1:]):
+            if keys is not None:
+                data[field] = dict(zip(keys, values))
+        return data
@@ -141,8 +141,11 @@ class BaseRedisCache(object):
 
         from alarm_backends.core.cache.delay_queue import DelayQueueManager
 
-        self.hset(DelayQueueManager.TASK_STORAGE_QUEUE, task_id, message)
-        self.zadd(DelayQueueManager.TASK_DELAY_QUEUE, {task_id: score})
+        delay_queue, storage_queue = DelayQueueManager.get_task_keys(task_id)
+        pipeline = self.pipeline(transaction=False)
+        pipeline.hset(storage_queue, task_id, message)
+        pipeline.zadd(delay_queue, {task_id: score})
+        pipeline.execute()
 
 
 class RedisCache(BaseRedisCache):
@@ -11,11 +11,14 @@ specific language governing permissions and limitations under the License.
 
 
 from alarm_backends.management.base.protocol import AbstractDispatchMixin
-from alarm_backends.management.hashring import HashRing
+from alarm_backends.management.hashring import get_hash_ring
 
 
 class DefaultDispatchMixin(AbstractDispatchMixin):
-    def dispatch_all_hosts(self, hosts):
+    # 分配算法: ring/jump/rendezvous，为空时读取 DISPATCH_HASH_ALGORITHM 配置
+    dispatch_algorithm = None
+
+    def dispatch_all_hosts(self, hosts, algorithm=None):
         if isinstance(hosts, (list, tuple)):
             hosts = {host: 1 for host in hosts}
 
@@ -23,7 +26,7 @@ class DefaultDispatchMixin(AbstractDispatchMixin):
 
         host_targets_dict = {host: list() for host in hosts}
         if targets:
-            host_ring = HashRing(hosts)
+            host_ring = get_hash_ring(hosts, algorithm or self.dispatch_algorithm)
             for target in targets:
                 host = host_ring.get_node(target)
                 host_targets_dict[host].append(target)
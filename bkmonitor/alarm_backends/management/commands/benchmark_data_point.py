@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import gc
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.service.access.data.records import InhibitedDict, RetainedDict
+from alarm_backends.service.detect import DataPoint
+
+
+class LegacyDataPoint(object):
+    """
+    原 DataPoint 实现：逐个字段 setattr 到实例字典
+    """
+
+    def __init__(self, accessed_data, item):
+        self.item = item
+        self._raw_input = accessed_data
+        for k, v in accessed_data.items():
+            setattr(self, k, v)
+
+
+class LegacyRecordState(object):
+    def __init__(self):
+        self.is_retains = defaultdict(lambda: True)
+        self.inhibitions = defaultdict(lambda: False)
+
+
+class RecordState(object):
+    def __init__(self):
+        self.is_retains = RetainedDict()
+        self.inhibitions = InhibitedDict()
+
+
+def gen_records(count):
+    return [
+        {
+            "bk_target_ip": "127.0.0.{}".format(i % 255),
+            "bk_target_cloud_id": "0",
+            "_time_": 1569246480,
+            "_result_": i * 0.01,
+            "record_id": "{:032x}.1569246480".format(i),
+            "value": i * 0.01,
+            "values": {"time": 1569246480, "usage": i * 0.01},
+            "dimensions": {"bk_target_ip": "127.0.0.{}".format(i % 255), "bk_target_cloud_id": "0"},
+            "time": 1569246480,
+            "dimension_fields": ["bk_target_ip", "bk_target_cloud_id"],
+            "access_time": 1569246490,
+        }
+        for i in range(count)
+    ]
+
+
+def measure(factory, records):
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    objects = [factory(record) for record in records]
+    cost = time.time() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size, cost
+
+
+class Command(BaseCommand):
+    help = "DataPoint/DataRecord 内存及构造吞吐压测"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500000, help="数据点数量")
+
+    def handle(self, *args, **options):
+        records = gen_records(options["count"])
+        cases = [
+            ("LegacyDataPoint", lambda r: LegacyDataPoint(r, None)),
+            ("DataPoint", lambda r: DataPoint(r, None)),
+            ("defaultdict record state", lambda r: LegacyRecordState()),
+            ("RetainedDict record state", lambda r: RecordState()),
+        ]
+        print("points: {}".format(len(records)))
+        for name, factory in cases:
+            size, cost = measure(factory, records)
+            print(
+                "{:<28} {:>8.1f} bytes/point {:>12.0f} points/s".format(name, size / len(records), len(records) / cost)
+            )
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.service.access.data.duplicate import (
+    Duplicate,
+    FingerprintDuplicate,
+)
+
+TIMESTAMP = 1569246480
+
+
+class Record(object):
+    def __init__(self, record_id, timestamp):
+        self.record_id = record_id
+        self.time = timestamp
+
+
+class MemoryClient(object):
+    """
+    仅用于压测的去重数据存储，避免依赖 redis
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=False):
+        return MemoryPipeline(self)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    def sadd(self, key, *values):
+        self.data.setdefault(key, set()).update(values)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def append(self, key, value):
+        self.data[key] = self.data.get(key, "") + value
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class MemoryPipeline(object):
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.commands.append((name, args))
+
+        return command
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+def payload_size(value):
+    if isinstance(value, set):
+        return sum(len(member) for member in value)
+    return len(value)
+
+
+def memory_size(value):
+    if isinstance(value, set):
+        return sys.getsizeof(value) + sum(sys.getsizeof(member) for member in value)
+    return sys.getsizeof(value)
+
+
+class Command(BaseCommand):
+    help = "数据拉取去重压测：对比集合与指纹两种实现的传输量、内存占用及读写耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="每分钟已接入的数据点数量")
+        parser.add_argument("--redis", action="store_true", help="使用实际的redis，默认使用内存存储")
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        records = [Record("{:032x}.{}".format(i, TIMESTAMP), TIMESTAMP) for i in range(count)]
+        new_records = [Record("{:032x}.{}".format(i, TIMESTAMP), TIMESTAMP) for i in range(count, count * 2)]
+        print("points: {}".format(count))
+
+        for duplicate_cls in [Duplicate, FingerprintDuplicate]:
+            client = duplicate_cls.dup_key_template.client if options["redis"] else MemoryClient()
+
+            start = time.time()
+            dup = duplicate_cls("benchmark")
+            dup.client = client
+            dup.load(records)
+            for record in records:
+                if not dup.is_duplicate(record):
+                    dup.add_record(record)
+            dup.refresh_cache()
+            write_cost = time.time() - start
+
+            dup = duplicate_cls("benchmark")
+            dup.client = client
+            start = time.time()
+            dup.load(records + new_records)
+            load_cost = time.time() - start
+            cached = dup.get_record_ids(TIMESTAMP)
+
+            start = time.time()
+            duplicate_count = sum(1 for record in records if dup.is_duplicate(record))
+            false_positive_count = sum(1 for record in new_records if dup.is_duplicate(record))
+            check_cost = time.time() - start
+
+            dup_key = dup.get_dup_key(TIMESTAMP)
+            raw = dup.fetch(client, dup_key)
+            client.delete(dup_key)
+            print(
+                "{}: payload {:.1f} bytes/point, memory {:.1f} bytes/point, write {:.1f}ms, load {:.1f}ms, "
+                "check {:.2f}us/point, duplicate {}, false positive {}".format(
+                    duplicate_cls.__name__,
+                    payload_size(raw) / count,
+                    memory_size(cached) / count,
+                    write_cost * 1000,
+                    load_cost * 1000,
+                    check_cost * 1000000 / (count * 2),
+                    duplicate_count,
+                    false_positive_count,
+                )
+            )
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.management.hashring import HASH_RING_CLASSES, plan_rebalance
+
+
+class Command(BaseCommand):
+    help = "各一致性哈希算法的构造、查询耗时及节点变更迁移量压测"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hosts", type=int, default=10, help="主机数量")
+        parser.add_argument("--keys", type=int, default=10000, help="任务数量")
+        parser.add_argument("--rounds", type=int, default=3, help="查询轮数，第一轮之后命中分配表缓存")
+
+    def handle(self, *args, **options):
+        hosts = {"10.0.0.{}".format(i): 1 for i in range(options["hosts"])}
+        keys = list(range(options["keys"]))
+        # 下线中间的一台主机
+        removed_hosts = dict(hosts)
+        removed_hosts.pop("10.0.0.{}".format(options["hosts"] // 2))
+
+        print("hosts: {}, keys: {}".format(len(hosts), len(keys)))
+        for algorithm, ring_class in HASH_RING_CLASSES.items():
+            start = time.time()
+            ring = ring_class(hosts)
+            build_cost = time.time() - start
+
+            lookup_costs = []
+            for _ in range(options["rounds"]):
+                start = time.time()
+                for key in keys:
+                    ring.get_node(key)
+                lookup_costs.append(time.time() - start)
+
+            plan = plan_rebalance(keys, hosts, removed_hosts, algorithm)
+            print(
+                "{:<12} build: {:>8.2f}ms  first lookup: {:>8.0f}keys/s  cached lookup: {:>10.0f}keys/s  "
+                "moved: {:>6} skew: {:.3f}".format(
+                    algorithm,
+                    build_cost * 1000,
+                    len(keys) / lookup_costs[0],
+                    len(keys) / min(lookup_costs[1:] or lookup_costs),
+                    len(plan["moved"]),
+                    plan["after_skew"],
+                )
+            )
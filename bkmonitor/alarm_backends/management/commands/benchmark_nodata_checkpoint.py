@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from alarm_backends.constants import NO_DATA_LEVEL, NO_DATA_TAG_DIMENSION
+from alarm_backends.core.cache import key
+from alarm_backends.core.control.mixins.nodata import CheckMixin
+from alarm_backends.core.detect_result import CheckResult
+from bkmonitor.utils.common_utils import count_md5
+
+
+class BenchmarkStrategy(object):
+    # 使用不存在的策略ID，避免影响线上数据
+    id = 0
+
+
+class BenchmarkItem(CheckMixin):
+    id = 0
+    strategy = BenchmarkStrategy()
+    no_data_config = {"level": NO_DATA_LEVEL}
+
+
+def gen_dimensions(count):
+    return [
+        {"bk_target_ip": "10.{}.{}.{}".format(i // 65025, i // 255 % 255, i % 255), NO_DATA_TAG_DIMENSION: True}
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "无数据检测维度检测点逐个读写与批量读写耗时压测"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000], help="维度数量")
+
+    def run(self, item, dimensions):
+        dimensions_md5_list = [count_md5(dimension) for dimension in dimensions]
+        dimensions_md5_timestamp = dict.fromkeys(dimensions_md5_list, 10000)
+
+        start = time.time()
+        item._get_last_checkpoints(dimensions_md5_list)
+        get_cost = time.time() - start
+
+        start = time.time()
+        item.recover_many(dimensions_md5_list)
+        recover_cost = time.time() - start
+
+        start = time.time()
+        if item.bulk_check_enabled:
+            item._bulk_update_last_checkpoints(10000, dimensions_md5_timestamp)
+        else:
+            for dimensions_md5, point in dimensions_md5_timestamp.items():
+                CheckResult.update_last_checkpoint_by_d_md5(
+                    item.strategy.id, item.id, dimensions_md5, point, item.no_data_level
+                )
+        update_cost = time.time() - start
+        return get_cost, recover_cost, update_cost
+
+    def handle(self, *args, **options):
+        item = BenchmarkItem()
+        cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=item.strategy.id, item_id=item.id)
+        for count in options["counts"]:
+            dimensions = gen_dimensions(count)
+            for bulk_check_enabled in [False, True]:
+                with override_settings(NODATA_BULK_CHECK_ENABLED=bulk_check_enabled):
+                    get_cost, recover_cost, update_cost = self.run(item, dimensions)
+                print(
+                    "dimensions: {:>7} bulk: {:<5} get: {:>8.3f}s recover: {:>8.3f}s update: {:>8.3f}s".format(
+                        count, str(bulk_check_enabled), get_cost, recover_cost, update_cost
+                    )
+                )
+            key.LAST_CHECKPOINTS_CACHE_KEY.client.delete(cache_key)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import queue
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from alarm_backends.service.access import AccessRealTimeDataProcess
+
+ConsumerRecord = namedtuple("ConsumerRecord", ["topic", "value"])
+
+BOOTSTRAP_SERVERS = "kafka.service.consul:9092"
+
+
+def gen_strategy(strategy_id, bk_biz_id):
+    strategy = SimpleNamespace(strategy_id=strategy_id, bk_biz_id=bk_biz_id, scenario="os")
+    strategy.items = [SimpleNamespace(strategy=strategy, data_sources=[SimpleNamespace()], query_configs=[{}])]
+    return strategy
+
+
+def gen_records(count, biz_ids, start_time=1646654276):
+    return [
+        ConsumerRecord(
+            "topic1",
+            json.dumps(
+                {
+                    "time": start_time + i,
+                    "dimensions": {
+                        "bk_biz_id": biz_ids[i % len(biz_ids)],
+                        "bk_target_ip": "127.0.{}.{}".format(i // 255 % 255, i % 255),
+                        "bk_target_cloud_id": "0",
+                    },
+                    "metrics": {"usage": i * 0.01, "idle": 1 - i * 0.0001},
+                }
+            ).encode()
+            + b"\n",
+        )
+        for i in range(count)
+    ]
+
+
+def run_handler(process, records, poll_size, handler):
+    """
+    按拉取批次放入队列后执行处理，返回耗时
+    """
+    process.queue = queue.Queue()
+    for offset in range(0, len(records), poll_size):
+        process.queue.put((BOOTSTRAP_SERVERS, records[offset : offset + poll_size]))
+
+    start = time.time()
+    while not process.queue.empty():
+        handler(once=True)
+    return time.time() - start
+
+
+class Command(BaseCommand):
+    help = (
+        "实时监控吞吐压测(kafka 消息使用本地构造数据代替)\n"
+        "默认对比逐条扁平化与批量扁平化；指定 --strategy-ids 时使用真实策略压测端到端处理"
+        "(扁平化、维度补充、过滤、去重及推送)，数据会写入策略的检测队列，仅在测试环境使用"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="消息数量")
+        parser.add_argument("--strategies", type=int, default=20, help="topic 关联的策略数量")
+        parser.add_argument("--biz", type=int, default=10, help="业务数量")
+        parser.add_argument("--strategy-ids", type=str, default="", help="端到端压测使用的实时监控策略ID，逗号分隔")
+        parser.add_argument(
+            "--dimensions", type=str, default="bk_target_ip,bk_target_cloud_id", help="端到端压测的 topic 维度"
+        )
+
+    def handle(self, *args, **options):
+        if options["strategy_ids"]:
+            self.handle_end_to_end(options)
+            return
+
+        process = AccessRealTimeDataProcess(None)
+        strategies = {i: gen_strategy(i, i % options["biz"]) for i in range(options["strategies"])}
+        process.get_strategy = strategies.__getitem__
+        process.topics = {
+            "{}|topic1".format(BOOTSTRAP_SERVERS): {
+                "strategy_ids": list(strategies),
+                "dimensions": ["bk_target_ip", "bk_target_cloud_id"],
+            }
+        }
+        records = gen_records(options["count"], list(range(options["biz"])))
+
+        start = time.time()
+        legacy_result = []
+        for record in records:
+            legacy_result.extend(process.flat(BOOTSTRAP_SERVERS, record))
+        legacy_cost = time.time() - start
+
+        start = time.time()
+        batch_result = process.flat_batch(BOOTSTRAP_SERVERS, records)
+        batch_cost = time.time() - start
+
+        print("messages: {}, records: {}/{}".format(len(records), len(legacy_result), len(batch_result)))
+        print("{:<8} {:>12.0f} messages/s".format("flat", len(records) / legacy_cost))
+        print("{:<8} {:>12.0f} messages/s".format("batch", len(records) / batch_cost))
+
+    def handle_end_to_end(self, options):
+        """
+        端到端压测，两种模式使用相同的处理流程，分别按各自的拉取批次大小入队
+        """
+        strategy_ids = [int(strategy_id) for strategy_id in options["strategy_ids"].split(",") if strategy_id]
+        process = AccessRealTimeDataProcess(None)
+        process.topics = {
+            "{}|topic1".format(BOOTSTRAP_SERVERS): {
+                "strategy_ids": strategy_ids,
+                "dimensions": [dimension for dimension in options["dimensions"].split(",") if dimension],
+            }
+        }
+        biz_ids = sorted({int(process.get_strategy(strategy_id).bk_biz_id) for strategy_id in strategy_ids})
+        count = options["count"]
+        # 两轮使用不同的时间，避免第二轮数据被去重
+        now = int(time.time())
+        legacy_records = gen_records(count, biz_ids, now - 2 * count)
+        batch_records = gen_records(count, biz_ids, now - count)
+
+        legacy_cost = run_handler(process, legacy_records, 5000, process.run_handler)
+        batch_poll_size = getattr(settings, "REAL_TIME_ACCESS_POLL_MAX_RECORDS", 20000)
+        batch_cost = run_handler(process, batch_records, batch_poll_size, process.run_batch_handler)
+
+        print("messages: {}, strategies: {}".format(count, len(strategy_ids)))
+        print("{:<8} {:>12.0f} messages/s".format("legacy", count / legacy_cost))
+        print("{:<8} {:>12.0f} messages/s".format("batch", count / batch_cost))
+        print("speedup: {:.2f}x".format(legacy_cost / batch_cost))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from alarm_backends.core.control.record_codec import (
+    CODEC_VERSION_COMPACT,
+    CODEC_VERSION_JSON,
+    DataRecordCodec,
+)
+
+
+def gen_records(count, dimension_count):
+    records = []
+    for i in range(count):
+        dimensions = {"dimension_{}".format(d): "value_{}_{}".format(d, i) for d in range(dimension_count)}
+        record = dict(dimensions)
+        record.update(
+            {
+                "_time_": 1569246480,
+                "_result_": i * 0.01,
+                "record_id": "{:032x}.1569246480".format(i),
+                "value": i * 0.01,
+                "values": {"time": 1569246480, "usage": i * 0.01},
+                "dimensions": dimensions,
+                "time": 1569246480,
+                "dimension_fields": list(dimensions),
+                "access_time": 1569246490,
+            }
+        )
+        records.append(record)
+    return records
+
+
+class SchemaClient(object):
+    """
+    仅用于压测的 schema 存储，避免依赖 redis
+    """
+
+    def __init__(self):
+        self.schemas = {}
+
+    def hmset(self, key, mapping):
+        self.schemas.update(mapping)
+
+    def expire(self, key, ttl):
+        pass
+
+    def hgetall(self, key):
+        return self.schemas
+
+
+class Command(BaseCommand):
+    help = "待检测数据队列编码压测：输出每个点的字节数及编解码吞吐"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000, help="数据点数量")
+        parser.add_argument("--dimensions", type=int, default=5, help="每个数据点的维度数量")
+
+    def handle(self, *args, **options):
+        records = gen_records(options["count"], options["dimensions"])
+        print("points: {count}, dimensions: {dimensions}".format(**options))
+        for version in [CODEC_VERSION_JSON, CODEC_VERSION_COMPACT]:
+            client = SchemaClient()
+            producer = DataRecordCodec(1, 1, version=version)
+
+            start = time.time()
+            encoded = [producer.encode(record) for record in records]
+            producer.flush_schemas(client)
+            encode_cost = time.time() - start
+
+            DataRecordCodec._schema_cache.clear()
+            consumer = DataRecordCodec(1, 1)
+            start = time.time()
+            for raw in encoded:
+                consumer.decode(raw, client)
+            decode_cost = time.time() - start
+
+            total_bytes = sum(len(raw.encode("utf-8")) for raw in encoded)
+            print(
+                "version {}: {:.1f} bytes/point, encode {:.0f} points/s, decode {:.0f} points/s".format(
+                    version,
+                    total_bytes / len(records),
+                    len(records) / encode_cost,
+                    len(records) / decode_cost,
+                )
+            )
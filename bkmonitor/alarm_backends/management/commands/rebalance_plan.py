@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from django.core.management.base import BaseCommand
+
+from alarm_backends.management.commands.hash_ring import HashRing
+from alarm_backends.management.hashring import HASH_RING_CLASSES, plan_rebalance
+
+
+class Command(BaseCommand):
+    help = "评估主机增减对任务分配的影响，输出需要迁移的任务及各主机负载倾斜度"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--type", default="run_access-data", help="consul 注册的服务名，如 run_access-data")
+        parser.add_argument("--algorithm", choices=list(HASH_RING_CLASSES), help="分配算法，默认使用当前配置")
+        parser.add_argument("--add", action="append", default=[], help="新增的主机，可多次指定")
+        parser.add_argument("--remove", action="append", default=[], help="下线的主机，可多次指定")
+        parser.add_argument("--verbose", action="store_true", help="输出每个迁移的任务")
+
+    def handle(self, *args, **options):
+        command = HashRing(options["type"])
+        old_hosts = {host: 1 for host in command.query_for_hosts()}
+        new_hosts = {host: 1 for host in old_hosts if host not in options["remove"]}
+        new_hosts.update({host: 1 for host in options["add"]})
+        if not old_hosts or not new_hosts:
+            print("no hosts to dispatch, old({}), new({})".format(len(old_hosts), len(new_hosts)))
+            return
+
+        targets = command.query_host_targets()
+        plan = plan_rebalance(targets, old_hosts, new_hosts, options["algorithm"] or command.dispatch_algorithm)
+
+        print("targets: {}, moved: {}".format(len(targets), len(plan["moved"])))
+        print("skew: before({:.3f}) after({:.3f})".format(plan["before_skew"], plan["after_skew"]))
+        for host in sorted(set(plan["before"]) | set(plan["after"])):
+            print(
+                "host: {:<20} before: {:>6} after: {:>6}".format(
+                    host, len(plan["before"].get(host, [])), len(plan["after"].get(host, []))
+                )
+            )
+        if options["verbose"]:
+            for target, old_host, new_host in plan["moved"]:
+                print("- {}: {} -> {}".format(target, old_host, new_host))
@@ -10,12 +10,18 @@ specific language governing permissions and limitations under the License.
 """
 
 
+import math
 from bisect import bisect_left
-from hashlib import md5
+from collections import OrderedDict
+from hashlib import blake2b, md5
+from threading import Lock
 
 import six
+from django.conf import settings
 from six.moves import range
 
+MASK_64 = 2 ** 64 - 1
+
 
 class HashRing(object):
     def __init__(self, nodes, num_vnodes=2 ** 16):
@@ -44,3 +50,173 @@ class HashRing(object):
         h = self._hash(key)
         n = bisect_left(self.ring, h) % self.vnodes
         return self.hash2node[self.ring[n]]
+
+
+def hash64(key):
+    return int.from_bytes(blake2b(str(key).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def mix64(x):
+    """
+    splitmix64 混淆，用于将 key 与节点种子组合成均匀分布的64位整数
+    """
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return x ^ (x >> 31)
+
+
+def jump_hash(key, num_buckets):
+    """
+    Jump Consistent Hash: https://arxiv.org/abs/1406.2294
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & MASK_64
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+class CachedHashRing(object):
+    """
+    带分配表缓存的哈希环，相同 key 只计算一次
+    """
+
+    # 分配表缓存上限，超过后直接清空
+    MAX_CACHED_ASSIGNMENTS = 100000
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self._assignments = {}
+
+    def _get_node(self, key):
+        raise NotImplementedError
+
+    def get_node(self, key):
+        try:
+            return self._assignments[key]
+        except KeyError:
+            pass
+        node = self._get_node(key)
+        if len(self._assignments) >= self.MAX_CACHED_ASSIGNMENTS:
+            self._assignments.clear()
+        self._assignments[key] = node
+        return node
+
+
+class JumpHashRing(CachedHashRing):
+    """
+    基于 jump hash 的一致性哈希
+    节点按名称排序后，按权重展开为 bucket，节点在列表末尾增减时迁移量最小，中间节点变化时迁移量较大
+    """
+
+    def __init__(self, nodes):
+        super(JumpHashRing, self).__init__(nodes)
+        self.buckets = []
+        for node in sorted(nodes, key=str):
+            self.buckets.extend([node] * nodes[node])
+
+    def _get_node(self, key):
+        return self.buckets[jump_hash(hash64(key), len(self.buckets))]
+
+
+class RendezvousHashRing(CachedHashRing):
+    """
+    基于 rendezvous(HRW) 的一致性哈希，任意节点增减时只迁移该节点相关的 key
+    带权重的打分方式: score = -weight / ln(h / 2^64)
+    """
+
+    def __init__(self, nodes):
+        super(RendezvousHashRing, self).__init__(nodes)
+        self.node_seeds = [(node, hash64(node), weight) for node, weight in six.iteritems(nodes) if weight > 0]
+
+    def _get_node(self, key):
+        h = hash64(key)
+        best_node, best_score = None, None
+        for node, seed, weight in self.node_seeds:
+            score = -weight / math.log((mix64(h ^ seed) + 0.5) / 2 ** 64)
+            if best_score is None or score > best_score:
+                best_node, best_score = node, score
+        return best_node
+
+
+HASH_RING_CLASSES = {
+    "ring": HashRing,
+    "jump": JumpHashRing,
+    "rendezvous": RendezvousHashRing,
+}
+
+_ring_cache = OrderedDict()
+_ring_cache_lock = Lock()
+# 进程内缓存的哈希环数量
+MAX_CACHED_RINGS = 16
+
+
+def get_hash_ring(nodes, algorithm=None):
+    """
+    按算法获取哈希环，相同节点及算法的哈希环在进程内复用，避免重复构造及重复计算分配
+    :param nodes: {node: weight}
+    :param algorithm: ring/jump/rendezvous，默认读取 DISPATCH_HASH_ALGORITHM 配置
+    """
+    algorithm = algorithm or getattr(settings, "DISPATCH_HASH_ALGORITHM", "ring")
+    if algorithm not in HASH_RING_CLASSES:
+        raise ValueError("unknown hash ring algorithm: {}".format(algorithm))
+
+    cache_key = (algorithm, tuple(sorted((repr(node), weight) for node, weight in six.iteritems(nodes))))
+    with _ring_cache_lock:
+        ring = _ring_cache.get(cache_key)
+        if ring is not None:
+            _ring_cache.move_to_end(cache_key)
+            return ring
+
+    ring = HASH_RING_CLASSES[algorithm](dict(nodes))
+    with _ring_cache_lock:
+        _ring_cache[cache_key] = ring
+        while len(_ring_cache) > MAX_CACHED_RINGS:
+            _ring_cache.popitem(last=False)
+    return ring
+
+
+def load_skew(host_targets):
+    """
+    负载倾斜度: 最大分配数 / 平均分配数
+    """
+    if not host_targets:
+        return 0
+    counts = [len(targets) for targets in host_targets.values()]
+    mean = sum(counts) / len(counts)
+    return max(counts) / mean if mean else 0
+
+
+def plan_rebalance(targets, old_nodes, new_nodes, algorithm=None):
+    """
+    计算节点变更前后的分配差异
+    :return: {
+        "moved": [(target, old_node, new_node)],
+        "before": {node: [target]},
+        "after": {node: [target]},
+        "before_skew": 1.2,
+        "after_skew": 1.1,
+    }
+    """
+    old_ring = get_hash_ring(old_nodes, algorithm)
+    new_ring = get_hash_ring(new_nodes, algorithm)
+
+    before = {node: [] for node in old_nodes}
+    after = {node: [] for node in new_nodes}
+    moved = []
+    for target in targets:
+        old_node = old_ring.get_node(target)
+        new_node = new_ring.get_node(target)
+        before[old_node].append(target)
+        after[new_node].append(target)
+        if old_node != new_node:
+            moved.append((target, old_node, new_node))
+
+    return {
+        "moved": moved,
+        "before": before,
+        "after": after,
+        "before_skew": load_skew(before),
+        "after_skew": load_skew(after),
+    }
@@ -8,25 +8,69 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import sys
+from array import array
+from collections import defaultdict
+from hashlib import blake2b
+
+from django.conf import settings
+
 from alarm_backends.core.cache import key
 
 
 class Duplicate:
+    dup_key_template = key.ACCESS_DUPLICATE_KEY
+
     def __init__(self, strategy_group_key, strategy_id=None):
         self.strategy_group_key = strategy_group_key
         self.record_ids_cache = {}
         self.pending_to_add = {}
         self.strategy_id = strategy_id
+        self.dup_keys = {}
+
+        self.client = self.dup_key_template.client
+
+    def get_dup_key(self, time):
+        dup_key = self.dup_keys.get(time)
+        if dup_key is None:
+            dup_key = self.dup_key_template.get_key(strategy_group_key=self.strategy_group_key, dt_event_time=time)
+            if self.strategy_id is not None:
+                dup_key.strategy_id = self.strategy_id
+            self.dup_keys[time] = dup_key
+        return dup_key
+
+    def fetch(self, client, dup_key):
+        return client.smembers(dup_key)
+
+    def parse(self, result):
+        return result
 
-        self.client = key.ACCESS_DUPLICATE_KEY.client
+    def write(self, pipeline, dup_key, values):
+        pipeline.sadd(dup_key, *values)
+
+    def load(self, records):
+        """
+        批量加载本批数据涉及的所有时间点的去重数据，合并为一次redis请求
+        :return: 按去重key分组的数据
+        """
+        records_by_key = defaultdict(list)
+        for record in records:
+            records_by_key[self.get_dup_key(record.time)].append(record)
+
+        dup_keys = [dup_key for dup_key in records_by_key if dup_key not in self.record_ids_cache]
+        if dup_keys:
+            pipeline = self.client.pipeline(transaction=False)
+            for dup_key in dup_keys:
+                self.fetch(pipeline, dup_key)
+            for dup_key, result in zip(dup_keys, pipeline.execute()):
+                self.record_ids_cache[dup_key] = self.parse(result)
+        return records_by_key
 
     def get_record_ids(self, time):
         # 保证每个时间点仅调用一次redis， 即使无数据也缓存下来。
-        dup_key = key.ACCESS_DUPLICATE_KEY.get_key(strategy_group_key=self.strategy_group_key, dt_event_time=time)
+        dup_key = self.get_dup_key(time)
         if dup_key not in self.record_ids_cache:
-            if self.strategy_id is not None:
-                dup_key.strategy_id = self.strategy_id
-            self.record_ids_cache[dup_key] = self.client.smembers(dup_key)
+            self.record_ids_cache[dup_key] = self.parse(self.fetch(self.client, dup_key))
 
         return self.record_ids_cache[dup_key]
 
@@ -42,17 +86,97 @@ class Duplicate:
         # 原方案，将需要新增的点和已经存在的点放一起。然后再批量刷进redis。
         # 优化：仅把新增的点，单独列出（后续推到redis）。
         # 同步更新新的record到内存record_ids_cache中（但不再将缓存的所有点全推给redis）
-        dup_key = key.ACCESS_DUPLICATE_KEY.get_key(
-            strategy_group_key=self.strategy_group_key, dt_event_time=record.time
-        )
+        dup_key = self.get_dup_key(record.time)
         self.record_ids_cache.setdefault(dup_key, set()).add(record.record_id)
         self.pending_to_add.setdefault(dup_key, set()).add(record.record_id)
 
     def refresh_cache(self):
         pipeline = self.client.pipeline(transaction=False)
-        for dup_key, record_ids in self.pending_to_add.items():
+        for dup_key, values in self.pending_to_add.items():
             if self.strategy_id is not None:
                 dup_key.strategy_id = self.strategy_id
-            pipeline.sadd(dup_key, *record_ids)
-            pipeline.expire(dup_key, key.ACCESS_DUPLICATE_KEY.ttl)
+            self.write(pipeline, dup_key, values)
+            pipeline.expire(dup_key, self.dup_key_template.ttl)
         pipeline.execute()
+
+
+class FingerprintDuplicate(Duplicate):
+    """
+    基于64位指纹的去重
+    每分钟已接入的数据以定长十六进制指纹追加写入redis字符串，读取后在内存中保存为整数数组，
+    每个数据点在redis中占16字节，内存中占8字节，远小于集合方案中完整的record_id。
+    批量判断时，本批数据的指纹集合与整数数组求交集，仅需一次遍历。
+    同一分钟内已有n个数据点时，单次判断将新数据误判为重复的概率约为 n / 2^64
+    """
+
+    dup_key_template = key.ACCESS_DUPLICATE_FINGERPRINT_KEY
+
+    def __init__(self, strategy_group_key, strategy_id=None):
+        super(FingerprintDuplicate, self).__init__(strategy_group_key, strategy_id=strategy_id)
+        # 已批量判断过的数据点及其是否已存在
+        self.checked_record_ids = {}
+
+    @staticmethod
+    def fingerprint(record_id) -> int:
+        record_id = str(record_id)
+        # record_id格式为"{维度md5}.{时间戳}"，时间戳已包含在去重key中，直接取维度md5的后64位
+        if record_id.find(".") == 32:
+            try:
+                return int(record_id[16:32], 16)
+            except ValueError:
+                pass
+        return int.from_bytes(blake2b(record_id.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def fetch(self, client, dup_key):
+        return client.get(dup_key)
+
+    def parse(self, result):
+        fingerprints = array("Q")
+        if result:
+            fingerprints.frombytes(bytes.fromhex(result))
+            if sys.byteorder == "little":
+                fingerprints.byteswap()
+        return fingerprints
+
+    def write(self, pipeline, dup_key, values):
+        pipeline.append(dup_key, "".join(f"{value:016x}" for value in values))
+
+    def load(self, records):
+        records_by_key = super(FingerprintDuplicate, self).load(records)
+        for dup_key, key_records in records_by_key.items():
+            values = {record.record_id: self.fingerprint(record.record_id) for record in key_records}
+            existed = set(values.values()).intersection(self.record_ids_cache[dup_key])
+            checked = self.checked_record_ids.setdefault(dup_key, {})
+            for record_id, value in values.items():
+                checked[record_id] = value in existed
+        return records_by_key
+
+    def is_duplicate(self, record):
+        dup_key = self.get_dup_key(record.time)
+        checked = self.checked_record_ids.get(dup_key)
+        if checked is not None and record.record_id in checked:
+            return checked[record.record_id]
+
+        # 未经批量加载的数据点，逐个扫描
+        value = self.fingerprint(record.record_id)
+        return value in self.pending_to_add.get(dup_key, ()) or value in self.get_record_ids(record.time)
+
+    def add_record(self, record):
+        dup_key = self.get_dup_key(record.time)
+        self.pending_to_add.setdefault(dup_key, set()).add(self.fingerprint(record.record_id))
+        if dup_key in self.checked_record_ids:
+            self.checked_record_ids[dup_key][record.record_id] = True
+
+
+DUPLICATE_BACKENDS = {
+    "set": Duplicate,
+    "fingerprint": FingerprintDuplicate,
+}
+
+
+def get_duplicate(strategy_group_key, strategy_id=None) -> Duplicate:
+    """
+    按配置选择去重实现
+    """
+    duplicate_cls = DUPLICATE_BACKENDS.get(getattr(settings, "ACCESS_DUPLICATE_BACKEND", "set"), Duplicate)
+    return duplicate_cls(strategy_group_key, strategy_id=strategy_id)
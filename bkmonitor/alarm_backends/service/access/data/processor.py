@@ -36,11 +36,12 @@ from alarm_backends.core.cache.strategy import StrategyCacheManager
 from alarm_backends.core.cluster import get_cluster
 from alarm_backends.core.control.checkpoint import Checkpoint
 from alarm_backends.core.control.item import Item
+from alarm_backends.core.control.record_codec import DataRecordCodec
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.storage.redis import Cache
 from alarm_backends.management.hashring import HashRing
 from alarm_backends.service.access import base
-from alarm_backends.service.access.data.duplicate import Duplicate
+from alarm_backends.service.access.data.duplicate import get_duplicate
 from alarm_backends.service.access.data.filters import (
     ExpireFilter,
     HostStatusFilter,
@@ -78,7 +79,10 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
     def pull(self):
         pass
 
-    def _push_noise_data(self, item, record_list):
+    def _push_noise_data(self, item, record_list, pipeline=None):
+        """
+        :param pipeline: 外部传入的 pipeline，传入时只写入命令，由调用方统一执行
+        """
         noise_reduce_config = item.strategy.notice.get("options", {}).get("noise_reduce_config")
         if not (noise_reduce_config and noise_reduce_config.get("is_enabled")):
             logger.debug(
@@ -99,6 +103,7 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
             logger.debug("strategy(%s) noise reduce dimension_value(%s)", item.strategy.strategy_id, dimension_value)
             dimension_value_hash = count_md5(dimension_value)
             noise_data[dimension_value_hash] = record.data["time"]
+        client = pipeline if pipeline is not None else client
         client.zadd(record_key, noise_data)
         client.expire(record_key, key.NOISE_REDUCE_TOTAL_KEY.ttl)
 
@@ -114,18 +119,21 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
             )
         )
 
-    def _push(self, item, record_list, output_client=None, data_list_key=None):
+    def _push(self, item, record_list, output_client=None, data_list_key=None, pipeline=None, queue_length=None):
         """
         :summary: 推送单个item的数据到检测队列或无数据待检测队列
         :param item
         :param record_list
         :param output_client
         :param data_list_key：数据队列，默认为 key.DATA_LIST_KEY
+        :param pipeline: 外部传入的 pipeline，传入时只写入命令，由调用方统一执行
+        :param queue_length: 已经查询到的队列长度，不传则实时查询
         """
         data_list_key = data_list_key or key.DATA_LIST_KEY
         client = output_client or data_list_key.client
         output_key = data_list_key.get_key(strategy_id=item.strategy.strategy_id, item_id=item.id)
-        queue_length = client.llen(output_key)
+        if queue_length is None:
+            queue_length = client.llen(output_key)
         # 超过最大检测长度10倍(50w)说明detect模块处理能力不足,数据将被丢弃。
         if queue_length > settings.SQL_MAX_LIMIT * 10:
             msg = (
@@ -136,16 +144,23 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
             )
             raise Exception(msg)
 
-        pipeline = client.pipeline(transaction=False)
+        codec = DataRecordCodec(item.strategy.strategy_id, item.id)
+        encoded_records = [codec.encode(record.data) for record in record_list]
+
+        should_execute = pipeline is None
+        if should_execute:
+            pipeline = client.pipeline(transaction=False)
+        # schema 需要先于数据写入，保证消费端读到数据时 schema 已存在
+        codec.flush_schemas(pipeline)
         _offset = 0
-        while _offset < len(record_list):
-            chunk_records = record_list[_offset : _offset + 10000]
-            pipeline.lpush(output_key, *[json.dumps(record.data) for record in chunk_records])
+        while _offset < len(encoded_records):
+            pipeline.lpush(output_key, *encoded_records[_offset : _offset + 10000])
             _offset += 10000
         # 避免监控周期大于默认key过期时间，引起数据丢失
         agg_interval = min(query_config["agg_interval"] for query_config in item.query_configs)
         pipeline.expire(output_key, max([data_list_key.ttl, agg_interval * 5]))
-        pipeline.execute()
+        if should_execute:
+            pipeline.execute()
         metrics.ACCESS_PROCESS_PUSH_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG, type="data").inc(len(record_list))
 
         logger.info(
@@ -159,9 +174,52 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
             )
         )
 
-    def push(self, records: List = None, output_client=None):
+    def _push_batch(self, pending_to_push, item_id_to_item, records, output_client=None):
+        """
+        批量推送，所有item的队列长度查询、数据推送、降噪数据推送分别合并为一次 pipeline 请求
+        :return: 推送了数据的策略ID
+        """
+        push_tasks = []
+        for item_id, record_list in pending_to_push.items():
+            item = item_id_to_item[item_id]
+            if record_list:
+                push_tasks.append((item, record_list, key.DATA_LIST_KEY))
+            if item.no_data_config["is_enabled"]:
+                push_tasks.append((item, records, key.NO_DATA_LIST_KEY))
+        if not push_tasks:
+            return set()
+
+        pipeline = (output_client or key.DATA_LIST_KEY.client).pipeline(transaction=False)
+        for item, _, data_list_key in push_tasks:
+            pipeline.llen(data_list_key.get_key(strategy_id=item.strategy.strategy_id, item_id=item.id))
+        queue_lengths = pipeline.execute()
+
+        noise_pipeline = key.NOISE_REDUCE_TOTAL_KEY.client.pipeline(transaction=False)
+        strategy_ids = set()
+        for (item, record_list, data_list_key), queue_length in zip(push_tasks, queue_lengths):
+            try:
+                self._push(item, record_list, output_client, data_list_key, pipeline, queue_length)
+            except Exception as e:
+                # 单个队列积压不影响同批次其他策略的数据推送
+                logger.exception("push data of strategy(%s) error, %s", item.strategy.strategy_id, e)
+                continue
+
+            if data_list_key is not key.DATA_LIST_KEY:
+                continue
+            strategy_ids.add(item.strategy.strategy_id)
+            try:
+                self._push_noise_data(item, record_list, noise_pipeline)
+            except BaseException as e:
+                logger.exception("push noise data of strategy(%s) error, %s", item.strategy.strategy_id, str(e))
+
+        pipeline.execute()
+        noise_pipeline.execute()
+        return strategy_ids
+
+    def push(self, records: List = None, output_client=None, batch=False):
         """
         推送格式化后的数据到 detect 和 nodata 中(按单个策略，单个item项，写入不同的队列)
+        :param batch: 是否将所有item的推送合并为一次 pipeline 请求
         """
         if records is None:
             records = self.record_list
@@ -184,6 +242,23 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
                 if record.is_retains[item_id] and not record.inhibitions[item_id]:
                     pending_to_push[item_id].append(record)
 
+        if batch:
+            strategy_ids = self._push_batch(pending_to_push, item_id_to_item, records, output_client)
+        else:
+            strategy_ids = self._push_items(pending_to_push, item_id_to_item, records, output_client)
+
+        # 推送数据处理信号
+        if records:
+            client = output_client or key.DATA_SIGNAL_KEY.client
+            if strategy_ids:
+                client.lpush(key.DATA_SIGNAL_KEY.get_key(), *list(strategy_ids))
+            client.expire(key.DATA_SIGNAL_KEY.get_key(), key.DATA_SIGNAL_KEY.ttl)
+
+    def _push_items(self, pending_to_push, item_id_to_item, records, output_client=None):
+        """
+        逐个item推送
+        :return: 推送了数据的策略ID
+        """
         strategy_ids = set()
         for item_id, record_list in list(pending_to_push.items()):
             item = item_id_to_item[item_id]
@@ -202,13 +277,7 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
             # 推送无数据处理
             if item.no_data_config["is_enabled"]:
                 self._push(item, records, output_client, key.NO_DATA_LIST_KEY)
-
-        # 推送数据处理信号
-        if records:
-            client = output_client or key.DATA_SIGNAL_KEY.client
-            if strategy_ids:
-                client.lpush(key.DATA_SIGNAL_KEY.get_key(), *list(strategy_ids))
-            client.expire(key.DATA_SIGNAL_KEY.get_key(), key.DATA_SIGNAL_KEY.ttl)
+        return strategy_ids
 
 
 class AccessDataProcess(BaseAccessDataProcess):
@@ -342,7 +411,7 @@ class AccessDataProcess(BaseAccessDataProcess):
                 return
 
         records = []
-        dup_obj = Duplicate(self.strategy_group_key, strategy_id=first_item.strategy.id)
+        dup_obj = get_duplicate(self.strategy_group_key, strategy_id=first_item.strategy.id)
         duplicate_counts = none_point_counts = 0
 
         # 是否有优先级
@@ -352,8 +421,10 @@ class AccessDataProcess(BaseAccessDataProcess):
                 have_priority = True
                 break
 
-        for record in reversed(item_records):
-            point = DataRecord(self.items, record)
+        points = [DataRecord(self.items, record) for record in reversed(item_records)]
+        # 一次性加载本批数据涉及的所有时间点的去重数据
+        dup_obj.load(point for point in points if point.value is not None)
+        for point in points:
             if point.value is not None:
                 # 去除重复数据
                 if dup_obj.is_duplicate(point):
@@ -459,7 +530,13 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
 
         self.consumers: Dict[str, KafkaConsumer] = {}
         self.consumers_lock = threading.Lock()
-        self.queue = queue.Queue(maxsize=100)
+        # 批量模式: 大批量拉取，批量解码，按批次合并推送
+        self.batch_enabled = getattr(settings, "REAL_TIME_ACCESS_BATCH_ENABLED", False)
+        if self.batch_enabled:
+            # 有界队列，处理能力不足时阻塞拉取，形成反压
+            self.queue = queue.Queue(maxsize=getattr(settings, "REAL_TIME_ACCESS_QUEUE_SIZE", 20))
+        else:
+            self.queue = queue.Queue(maxsize=100)
         self._stop_signal = False
         self.strategy_cache = {}
 
@@ -651,6 +728,72 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
             new_record_list.append(DataRecord(item, standard_raw_data))
         return new_record_list
 
+    @staticmethod
+    def decode_batch(values: List) -> List[Dict]:
+        """
+        批量解码，整批数据拼接后只调用一次 json.loads，解码失败时再逐条解码并丢弃异常数据
+        """
+        values = [value.encode("utf-8") if isinstance(value, str) else value for value in values]
+        values = [value.rstrip(b"\x00\n") for value in values]
+        try:
+            return json.loads(b"[" + b",".join(values) + b"]")
+        except ValueError:
+            pass
+
+        result = []
+        for value in values:
+            try:
+                result.append(json.loads(value))
+            except ValueError as e:
+                logger.warning("loads real time data(%s) failed, %s", value, e)
+        return result
+
+    def flat_batch(self, bootstrap_servers: str, records: List[ConsumerRecord]) -> List[DataRecord]:
+        """
+        批量扁平化，结果与逐条调用 flat 一致
+        1. 按 topic 分组批量解码
+        2. 每个 topic 的策略及维度信息只获取一次，并按业务分组
+        """
+        topic_values = defaultdict(list)
+        for record in records:
+            topic_values[record.topic].append(record.value)
+
+        new_record_list = []
+        for topic, values in topic_values.items():
+            topic_key = f"{bootstrap_servers}|{topic}"
+            if topic_key not in self.topics:
+                logger.warning("abandon %s records of topic(%s), topic not belong to current host", len(values), topic)
+                continue
+            dimensions = self.topics[topic_key]["dimensions"]
+
+            biz_items = defaultdict(list)
+            for strategy_id in self.topics[topic_key]["strategy_ids"]:
+                try:
+                    strategy = self.get_strategy(strategy_id)
+                    item = strategy.items[0]
+                except Exception as e:
+                    logger.exception("get real time strategy(%s) failed, %s", strategy_id, e)
+                    continue
+                item.data_sources[0].group_by = dimensions
+                item.query_configs[0]["agg_dimension"] = dimensions
+                biz_items[int(strategy.bk_biz_id)].append(item)
+
+            for raw_data in self.decode_batch(values):
+                try:
+                    items = biz_items.get(int(raw_data["dimensions"].get("bk_biz_id", 0)))
+                    if not items:
+                        logger.debug("abandon data(%s), not belong targets", raw_data)
+                        continue
+
+                    for item in items:
+                        standard_raw_data = {"time": raw_data["time"]}
+                        standard_raw_data.update(raw_data["metrics"])
+                        standard_raw_data.update(raw_data["dimensions"])
+                        new_record_list.append(DataRecord(item, standard_raw_data))
+                except Exception as e:
+                    logger.warning("%s loads alarm(%s) failed, %s", topic, raw_data, e)
+        return new_record_list
+
     def get_strategy(self, strategy_id: int) -> Strategy:
         """
         获取策略配置
@@ -660,20 +803,62 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
 
         return self.strategy_cache[strategy_id]["strategy"]
 
+    def report_consumer_lag(self, consumer: KafkaConsumer):
+        """
+        上报各 topic 的消费延迟，highwater 来自最近一次拉取的响应，不产生额外请求
+        """
+        bootstrap_servers = consumer.config["bootstrap_servers"]
+        topic_lags = defaultdict(int)
+        try:
+            for partition in consumer.assignment():
+                highwater = consumer.highwater(partition)
+                if highwater is None:
+                    continue
+                topic_lags[partition.topic] += max(highwater - consumer.position(partition), 0)
+        except Exception as e:
+            logger.warning("get real time consumer(%s) lag failed, %s", bootstrap_servers, e)
+            return
+
+        for topic, lag in topic_lags.items():
+            metrics.ACCESS_REAL_TIME_CONSUMER_LAG.labels(topic=f"{bootstrap_servers}|{topic}").set(lag)
+
+    def put_batch(self, bootstrap_servers: str, records: List[ConsumerRecord]):
+        """
+        放入有界队列，队列满时阻塞等待，收到停止信号后不再等待
+        """
+        while True:
+            try:
+                self.queue.put((bootstrap_servers, records), timeout=1)
+                return
+            except queue.Full:
+                if self._stop_signal:
+                    logger.warning("real_time poller drop %s records because of stop signal", len(records))
+                    return
+
     def run_poller(self, once=False):
+        max_records = getattr(settings, "REAL_TIME_ACCESS_POLL_MAX_RECORDS", 20000) if self.batch_enabled else 5000
         while True:
             self.consumers_lock.acquire()
             has_record = False
             for consumer in self.consumers.values():
-                data = consumer.poll(0.1, max_records=5000)
+                data = consumer.poll(0.1, max_records=max_records)
                 if not data:
                     continue
 
                 has_record = True
+                if self.batch_enabled:
+                    # 批量模式下，同一个 kafka 集群一次拉取到的数据作为一个批次
+                    records = [record for partition_records in data.values() for record in partition_records]
+                    logger.info(f"real_time poller poll {consumer.config['bootstrap_servers']}: {len(records)}")
+                    self.put_batch(consumer.config["bootstrap_servers"], records)
+                    self.report_consumer_lag(consumer)
+                    continue
+
                 for records in data.values():
                     logger.info(f"real_time poller poll {consumer.config['bootstrap_servers']}: {len(records)}")
                     self.queue.put((consumer.config["bootstrap_servers"], records))
             self.consumers_lock.release()
+            metrics.ACCESS_REAL_TIME_QUEUE_SIZE.set(self.queue.qsize())
 
             if once or self._stop_signal:
                 logger.info("real_time poller get stop signal")
@@ -774,32 +959,85 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
                     except Exception as e:
                         logger.warning("%s loads alarm(%s) failed", record.topic, record.value, e)
 
-                record_list = []
-                for r in records:
-                    # 补充维度：比如：业务、集群、模块等信息
-                    self.full(r)
+                self.push(self.handle_records(records))
+            except Exception as e:
+                logger.exception(e)
+                logger.error(f"real_time handler exception: {e}")
 
-                    new_r_list = r.full()
-                    if not new_r_list:
-                        continue
+            if once:
+                break
 
-                    record_list.extend(new_r_list)
+    def handle_records(self, records: List[DataRecord]) -> List[DataRecord]:
+        """
+        维度补充、过滤及格式化
+        """
+        record_list = []
+        for r in records:
+            # 补充维度：比如：业务、集群、模块等信息
+            self.full(r)
 
-                output = []
-                for r in record_list:
-                    # 过滤数据
-                    if self.filter(r) or r.filter(r):
-                        continue
+            new_r_list = r.full()
+            if not new_r_list:
+                continue
 
-                    # 格式化数据
-                    r.clean()
+            record_list.extend(new_r_list)
 
-                    output.append(r)
+        output = []
+        for r in record_list:
+            # 过滤数据
+            if self.filter(r) or r.filter(r):
+                continue
 
-                self.push(output)
-            except Exception as e:
-                logger.exception(e)
-                logger.error(f"real_time handler exception: {e}")
+            # 格式化数据
+            r.clean()
+
+            output.append(r)
+        return output
+
+    def run_batch_handler(self, once=False):
+        """
+        批量处理，合并队列中已有的批次后统一解码、处理并通过一次 pipeline 推送
+        """
+        batch_size = getattr(settings, "REAL_TIME_ACCESS_HANDLE_BATCH_SIZE", 50000)
+        while True:
+            if self._stop_signal and self.queue.empty():
+                logger.info("real_time handler get stop signal")
+                break
+
+            batches = []
+            try:
+                batches.append(self.queue.get(block=True, timeout=5))
+            except queue.Empty:
+                pass
+
+            count = sum(len(records) for _, records in batches)
+            while batches and count < batch_size:
+                try:
+                    bootstrap_servers, records = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches.append((bootstrap_servers, records))
+                count += len(records)
+            metrics.ACCESS_REAL_TIME_QUEUE_SIZE.set(self.queue.qsize())
+
+            if batches:
+                start_time = time.time()
+                try:
+                    records = []
+                    for bootstrap_servers, data in batches:
+                        records.extend(self.flat_batch(bootstrap_servers, data))
+
+                    output = self.handle_records(records)
+                    self.push(output, batch=True)
+                    logger.info(
+                        "real_time handler process messages(%s), push records(%s), elapsed(%.3f)",
+                        count,
+                        len(output),
+                        time.time() - start_time,
+                    )
+                except Exception as e:
+                    logger.exception(e)
+                    logger.error(f"real_time handler exception: {e}")
 
             if once:
                 break
@@ -812,14 +1050,17 @@ class AccessRealTimeDataProcess(BaseAccessDataProcess):
             self.run_leader(once=True)
             self.run_consumer_manager(once=True)
             self.run_poller(once=True)
-            self.run_handler(once=True)
+            if self.batch_enabled:
+                self.run_batch_handler(once=True)
+            else:
+                self.run_handler(once=True)
         else:
             signal.signal(signal.SIGTERM, self._stop)
             signal.signal(signal.SIGINT, self._stop)
             leader = InheritParentThread(target=self.run_leader)
             consumer_manager = InheritParentThread(target=self.run_consumer_manager)
             poller = InheritParentThread(target=self.run_poller)
-            handler = InheritParentThread(target=self.run_handler)
+            handler = InheritParentThread(target=self.run_batch_handler if self.batch_enabled else self.run_handler)
             leader.start()
             consumer_manager.start()
             poller.start()
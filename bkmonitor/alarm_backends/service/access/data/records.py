@@ -10,7 +10,6 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 import time
-from collections import defaultdict
 from typing import TYPE_CHECKING, List
 
 import six
@@ -31,6 +30,25 @@ if TYPE_CHECKING:
 logger = logging.getLogger("access.data")
 
 
+class RetainedDict(dict):
+    """
+    记录在各个item下是否保留，未经过滤的item默认保留
+    与 defaultdict(lambda: True) 相比，不需要为每条记录创建默认值函数，且读取时不写入默认值
+    """
+
+    def __missing__(self, key):
+        return True
+
+
+class InhibitedDict(dict):
+    """
+    记录在各个item下是否被抑制，默认不抑制
+    """
+
+    def __missing__(self, key):
+        return False
+
+
 class DataRecord(base.BaseRecord):
     """
     raw_data:
@@ -76,9 +94,9 @@ class DataRecord(base.BaseRecord):
             self._item = self.items[0]
         self.scenario = self._item.strategy.scenario  # 监控对象，相同查询条件的items，监控场景一定是相同的，由rt的label决定
 
-        self.is_retains = defaultdict(lambda: True)  # 保留记录，记录当前record经过filter之后是否仍然保留下来
+        self.is_retains = RetainedDict()  # 保留记录，记录当前record经过filter之后是否仍然保留下来
         self.is_duplicate = False  # 是否重复记录，记录当前record是否是重复记录
-        self.inhibitions = defaultdict(lambda: False)  # 抑制记录，记录当前record是否被抑制
+        self.inhibitions = InhibitedDict()  # 抑制记录，记录当前record是否被抑制
 
     @cached_property
     def time(self):
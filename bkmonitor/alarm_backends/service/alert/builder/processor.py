@@ -10,15 +10,17 @@ specific language governing permissions and limitations under the License.
 """
 import logging
 import time
-from typing import List
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List
 
+from django.conf import settings
 from django.utils.translation import ugettext as _
 from elasticsearch.helpers import BulkIndexError
 
 from alarm_backends.constants import CONST_MINUTES
 from alarm_backends.core.alert import Alert, Event
-from alarm_backends.core.alert.alert import AlertUIDManager
-from alarm_backends.core.cache.key import ALERT_UPDATE_LOCK
+from alarm_backends.core.alert.alert import AlertCache, AlertUIDManager
+from alarm_backends.core.cache.key import ALERT_DEDUPE_CONTENT_KEY, ALERT_UPDATE_LOCK
 from alarm_backends.core.lock.service_lock import multi_service_lock
 from alarm_backends.service.alert.enricher import AlertEnrichFactory, EventEnrichFactory
 from alarm_backends.service.alert.manager.tasks import send_check_task
@@ -35,11 +37,13 @@ class AlertBuilder(BaseAlertProcessor):
         super(AlertBuilder, self).__init__()
         self.logger = logging.getLogger("alert.builder")
 
-    def get_unexpired_events(self, events: List[Event]):
+    def get_unexpired_events(self, events: List[Event], current_alerts: Dict[str, Alert] = None):
         """
         先判断关联事件是否已经过期
+        :param current_alerts: 已经获取到的告警缓存内容，不传则从缓存中读取
         """
-        current_alerts = self.get_current_alerts(events)
+        if current_alerts is None:
+            current_alerts = self.get_current_alerts(events)
         unexpired_events = []
         expired_events = []
         for event in events:
@@ -60,22 +64,27 @@ class AlertBuilder(BaseAlertProcessor):
             )
         return unexpired_events
 
-    def get_current_alerts(self, events: List[Event]):
+    def get_current_alerts(self, events: List[Event], pipelined: bool = False):
         """
         获取关联事件对应的告警缓存内容
+        :param pipelined: 是否通过一个 pipeline 一次性读取新旧缓存
         """
         events_dedupe_md5_list = set({event.dedupe_md5 for event in events})
         if not events_dedupe_md5_list:
             return {}
 
-        cached_alerts = self.list_alerts_content_from_cache(events)
+        if pipelined:
+            cached_alerts = self.fetch_alerts_content_from_cache(events)
+        else:
+            cached_alerts = self.list_alerts_content_from_cache(events)
         return {alert.dedupe_md5: alert for alert in cached_alerts}
 
     def dedupe_events_to_alerts(self, events: List[Event]):
         """
         将事件进行去重，生成告警并保存
         """
-        from alarm_backends.service.alert.builder.tasks import dedupe_events_to_alerts
+        if getattr(settings, "ALERT_BUILDER_FUSED_ENABLED", False):
+            return self.fused_dedupe_events_to_alerts(events)
 
         events = self.get_unexpired_events(events)
         if not events:
@@ -83,32 +92,8 @@ class AlertBuilder(BaseAlertProcessor):
         lock_keys = [ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5) for event in events]
 
         with multi_service_lock(ALERT_UPDATE_LOCK, lock_keys) as lock:
-            success_locked_events = []
-            fail_locked_events = []
-            # 区分出哪些告警加锁成功，哪些失败
-            for event in events:
-                if lock.is_locked(ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5)):
-                    success_locked_events.append(event)
-                else:
-                    fail_locked_events.append(event)
-
-            for event in success_locked_events:
-                latency = event.get_process_latency()
-                if not latency:
-                    # 没有延迟数据，直接下一个
-                    continue
-                if latency.get("trigger_latency"):
-                    metrics.ALERT_PROCESS_LATENCY.labels(
-                        bk_data_id=event.data_id,
-                        topic=event.topic,
-                        strategy_id=metrics.TOTAL_TAG,
-                    ).observe(latency["trigger_latency"])
-                if latency.get("access_latency"):
-                    metrics.ACCESS_TO_ALERT_PROCESS_LATENCY.labels(
-                        bk_data_id=event.data_id,
-                        topic=event.topic,
-                        strategy_id=metrics.TOTAL_TAG,
-                    ).observe(latency["access_latency"])
+            success_locked_events, fail_locked_events = self.split_locked_events(lock, events)
+            self.report_process_latency(success_locked_events)
 
             # 对加锁成功的告警才能进行操作
             alerts = self.build_alerts(success_locked_events)
@@ -116,24 +101,139 @@ class AlertBuilder(BaseAlertProcessor):
             self.update_alert_cache(alerts)
             self.update_alert_snapshot(alerts)
 
-            if fail_locked_events:
-                # 对加锁失败的告警，丢到队列中，延后5s操作
-                dedupe_events_to_alerts.apply_async(
-                    kwargs={
-                        "events": fail_locked_events,
-                    },
-                    countdown=5,
-                )
-                self.logger.info(
-                    "%s alerts is locked, will try later: %s",
-                    len(fail_locked_events),
-                    ",".join([event.dedupe_md5 for event in fail_locked_events]),
-                )
+            self.delay_locked_events(fail_locked_events)
 
             alerts = self.save_alerts(alerts, action=BulkActionType.UPSERT, force_save=True)
 
         # TODO: 这里需要清理保存失败的告警的 Redis 缓存，否则会导致DB和 Redis 不一致
         self.save_alert_logs(alerts)
+        self.finish_alerts(alerts)
+        return alerts
+
+    @contextmanager
+    def stage_timer(self, stage: str):
+        """
+        记录合并处理模式下各阶段的耗时
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            metrics.ALERT_BUILD_STAGE_TIME.labels(stage=stage).observe(time.time() - start_time)
+
+    def fused_dedupe_events_to_alerts(self, events: List[Event]):
+        """
+        合并处理模式的事件去重
+        1. 加锁之后一次性读取新旧告警缓存，过期判断及告警生成共用读取结果
+        2. 告警缓存及快照通过同一个 pipeline 写入
+        3. 告警及流水日志合并为一次 ES bulk 请求
+        """
+        if not events:
+            return []
+        lock_keys = [ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5) for event in events]
+
+        with ExitStack() as stack:
+            with self.stage_timer("lock"):
+                lock = stack.enter_context(multi_service_lock(ALERT_UPDATE_LOCK, lock_keys))
+            success_locked_events, fail_locked_events = self.split_locked_events(lock, events)
+
+            with self.stage_timer("fetch"):
+                current_alerts = self.get_current_alerts(success_locked_events, pipelined=True)
+
+            success_locked_events = self.get_unexpired_events(success_locked_events, current_alerts)
+            if not success_locked_events:
+                self.delay_locked_events(fail_locked_events)
+                return []
+            self.report_process_latency(success_locked_events)
+
+            with self.stage_timer("build"):
+                alerts = self.build_alerts(success_locked_events, current_alerts)
+            with self.stage_timer("enrich"):
+                alerts = self.enrich_alerts(alerts)
+
+            with self.stage_timer("cache"):
+                self.update_alert_cache_and_snapshot(alerts)
+
+            # 加锁失败的事件在重试时会重新进行过期判断
+            self.delay_locked_events(fail_locked_events)
+
+            with self.stage_timer("save"):
+                alerts = self.save_alerts_and_logs(alerts, action=BulkActionType.UPSERT, force_save=True)
+
+        self.finish_alerts(alerts)
+        return alerts
+
+    def update_alert_cache_and_snapshot(self, alerts: List[Alert]):
+        """
+        告警缓存及快照通过同一个 pipeline 写入
+        """
+        if not alerts:
+            return
+        pipeline = ALERT_DEDUPE_CONTENT_KEY.client.pipeline(transaction=False)
+        update_count, finished_count = AlertCache.save_alert_to_cache(alerts, pipeline=pipeline)
+        snapshot_count = AlertCache.save_alert_snapshot(alerts, pipeline=pipeline)
+        pipeline.execute()
+        self.logger.info(
+            "update alert cache: updated(%s), finished(%s), snapshot(%s)", update_count, finished_count, snapshot_count
+        )
+
+    @staticmethod
+    def split_locked_events(lock, events: List[Event]):
+        """
+        区分出哪些告警加锁成功，哪些失败
+        """
+        success_locked_events = []
+        fail_locked_events = []
+        for event in events:
+            if lock.is_locked(ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5)):
+                success_locked_events.append(event)
+            else:
+                fail_locked_events.append(event)
+        return success_locked_events, fail_locked_events
+
+    def report_process_latency(self, events: List[Event]):
+        for event in events:
+            latency = event.get_process_latency()
+            if not latency:
+                # 没有延迟数据，直接下一个
+                continue
+            if latency.get("trigger_latency"):
+                metrics.ALERT_PROCESS_LATENCY.labels(
+                    bk_data_id=event.data_id,
+                    topic=event.topic,
+                    strategy_id=metrics.TOTAL_TAG,
+                ).observe(latency["trigger_latency"])
+            if latency.get("access_latency"):
+                metrics.ACCESS_TO_ALERT_PROCESS_LATENCY.labels(
+                    bk_data_id=event.data_id,
+                    topic=event.topic,
+                    strategy_id=metrics.TOTAL_TAG,
+                ).observe(latency["access_latency"])
+
+    def delay_locked_events(self, events: List[Event]):
+        """
+        对加锁失败的告警，丢到队列中，延后5s操作
+        """
+        from alarm_backends.service.alert.builder.tasks import dedupe_events_to_alerts
+
+        if not events:
+            return
+        dedupe_events_to_alerts.apply_async(
+            kwargs={
+                "events": events,
+            },
+            countdown=5,
+        )
+        self.logger.info(
+            "%s alerts is locked, will try later: %s",
+            len(events),
+            ",".join([event.dedupe_md5 for event in events]),
+        )
+
+    def finish_alerts(self, alerts: List[Alert]):
+        """
+        告警保存之后的后续处理：触发状态检查，发送告警信号，上报指标
+        """
         self.send_periodic_check_task(alerts)
 
         alerts_to_send_signal = [alert for alert in alerts if alert.should_send_signal()]
@@ -147,8 +247,6 @@ class AlertBuilder(BaseAlertProcessor):
                 is_saved="1" if alert.should_refresh_db() else "0",
             ).inc()
 
-        return alerts
-
     def handle(self, events: List[Event]):
         """
         事件处理逻辑
@@ -284,14 +382,16 @@ class AlertBuilder(BaseAlertProcessor):
             )
             return alert
 
-    def build_alerts(self, events: List[Event]) -> List[Alert]:
+    def build_alerts(self, events: List[Event], current_alerts: Dict[str, Alert] = None) -> List[Alert]:
         """
         根据事件生成告警
+        :param current_alerts: 已经获取到的告警缓存内容，不传则从缓存中读取
         """
         if not events:
             return []
 
-        current_alerts = self.get_current_alerts(events)
+        if current_alerts is None:
+            current_alerts = self.get_current_alerts(events)
         new_alerts = {}
         # 对事件进行遍历，逐个更新告警内容
         for event in events:
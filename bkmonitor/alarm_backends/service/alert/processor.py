@@ -105,6 +105,56 @@ class BaseAlertProcessor:
             alerts.extend(self.list_alerts_from_cache(not_existed_dedupe_md5_list))
         return alerts
 
+    def fetch_alerts_content_from_cache(self, events: List[Event]) -> List[Alert]:
+        """
+        与 list_alerts_content_from_cache 的结果一致，但新旧两种缓存 key 通过一个 pipeline 一次性读取
+        :param events: 告警关联事件信息
+        :return:
+        """
+        if not events:
+            return []
+
+        strategy_dedupe_md5_dict = defaultdict(list)
+        for event in events:
+            strategy_dedupe_md5_dict[event.strategy_id or 0].append(event.dedupe_md5)
+        cache_keys = []
+        dedupe_md5_list = []
+        for strategy_id, md5_list in strategy_dedupe_md5_dict.items():
+            cache_keys.extend(
+                [ALERT_DEDUPE_CONTENT_KEY.get_key(strategy_id=strategy_id, dedupe_md5=md5) for md5 in md5_list]
+            )
+            dedupe_md5_list.extend(md5_list)
+
+        pipeline = ALERT_DEDUPE_CONTENT_KEY.client.pipeline(transaction=False)
+        for cache_key in cache_keys:
+            pipeline.get(cache_key)
+        # 切换过程中，旧的数据保存在原来的redis key里，一并读取，避免再发起一次请求
+        for dedupe_md5 in dedupe_md5_list:
+            pipeline.get(ALERT_CONTENT_KEY.get_key(dedupe_md5=dedupe_md5))
+        results = pipeline.execute()
+        alert_data = results[: len(cache_keys)]
+        legacy_alert_data = results[len(cache_keys) :]
+
+        alerts = []
+        legacy_alerts = []
+        for index, alert in enumerate(alert_data):
+            dedupe_md5 = dedupe_md5_list[index]
+            if not alert:
+                # 不存在的才使用旧 key 的数据
+                alert = legacy_alert_data[index]
+                if not alert:
+                    continue
+                alert_list = legacy_alerts
+            else:
+                alert_list = alerts
+            try:
+                alert = json.loads(alert)
+                alert_list.append(Alert(alert))
+            except Exception as e:
+                self.logger.warning("dedupe_md5(%s) loads alert failed: %s, origin data: %s", dedupe_md5, e, alert)
+        alerts.extend(legacy_alerts)
+        return alerts
+
     def update_alert_cache(self, alerts: List[Alert]):
         """
         更新告警信息到 redis 缓存
@@ -158,6 +208,44 @@ class BaseAlertProcessor:
 
         return [alert for alert in alerts]
 
+    def save_alerts_and_logs(self, alerts: List[Alert], action=BulkActionType.INDEX, force_save=False) -> List[Alert]:
+        """
+        将告警信息及流水日志合并为一次 bulk 请求保存到 ES
+        """
+        operations = [
+            (alert.to_document(include_all_fields=False), action)
+            for alert in alerts
+            if force_save or alert.should_refresh_db()
+        ]
+        alert_count = len(operations)
+        for alert in alerts:
+            operations.extend((log, BulkActionType.CREATE) for log in alert.list_log_documents())
+
+        if not operations:
+            self.logger.info(
+                "save alert and log document with action(%s): ignored(%d), saved(0), failed(0)", action, len(alerts)
+            )
+            return alerts
+
+        start_time = time.time()
+        errors = []
+        try:
+            AlertDocument.bulk_write(operations)
+        except BulkIndexError as e:
+            self.logger.error("save alert and log document error: %s", e.errors)
+            errors = e.errors
+
+        self.logger.info(
+            "save alert and log document with action(%s): ignored(%d), alert(%d), log(%d), failed(%d), elapsed(%.3f)",
+            action,
+            len(alerts) - alert_count,
+            alert_count,
+            len(operations) - alert_count,
+            len(errors),
+            time.time() - start_time,
+        )
+        return alerts
+
     def save_alert_logs(self, alerts: List[Alert]):
         """
         保存流水日志
@@ -11,12 +11,16 @@ specific language governing permissions and limitations under the License.
 
 import copy
 import logging
+from collections import defaultdict
 
 import arrow
 from django.utils.translation import ugettext as _
 from six import string_types
 
+from alarm_backends.constants import CONST_ONE_HOUR
+from alarm_backends.core.cache.cmdb.base import LocalCache
 from alarm_backends.core.cache.key import NOTICE_SHIELD_KEY_LOCK
+from alarm_backends.core.cache.shield import ShieldCacheManager
 from alarm_backends.core.context.utils import get_business_roles
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.service.converge.shield.display_manager import DisplayManager
@@ -28,6 +32,7 @@ from bkmonitor.utils.range import (
     load_field_instance,
 )
 from bkmonitor.utils.range.conditions import AndCondition, EqualCondition, OrCondition
+from bkmonitor.utils.range.fields import BkTargetIpDimensionField, IpDimensionField
 from bkmonitor.utils.range.period import TimeMatch, TimeMatchBySingle
 from bkmonitor.utils.send import Sender
 from constants.shield import ScopeType, ShieldCategory
@@ -368,7 +373,8 @@ class ShieldObj(object):
 
 
 class AlertShieldObj(ShieldObj):
-    def get_dimension(self, alert: AlertDocument):
+    @staticmethod
+    def get_dimension(alert: AlertDocument):
         try:
             dimension = copy.deepcopy(alert.origin_alarm["data"]["dimensions"])
         except BaseException as error:
@@ -426,5 +432,140 @@ class AlertShieldObj(ShieldObj):
         return new_dimensions
 
     def is_match(self, alert: AlertDocument):
+        return self.is_match_dimension(self.get_dimension(alert))
+
+    def is_match_dimension(self, dimension, source_time=None):
+        """
+        判断时间和告警维度是否都匹配，dimension 由 get_dimension 生成
+        """
+        source_time = source_time or arrow.now()
+        return self.time_check.is_match(source_time) and self.dimension_check.is_match(dimension)
+
+
+class AlertShieldIndex(object):
+    """
+    业务下屏蔽配置的匹配索引
+
+    屏蔽配置的维度条件是多个条件的与，其中顶层的等值条件是必须满足的。
+    按其中一个必要条件的取值对屏蔽配置分桶，告警只需要对命中的桶及无法索引的屏蔽配置进行完整匹配，
+    匹配结果与逐条匹配一致。
+    """
+
+    # 选择索引条件的维度优先级，未列出的维度排在最后
+    INDEX_FIELDS = ("strategy_id", "bk_host_id", "ip", "bk_target_ip", "service_instance_id", "bk_topo_node")
+
+    # IP 类维度字段按配置值中是否带云区域决定取值方式
+    CLOUD_ID_KEYS = {IpDimensionField: "bk_cloud_id", BkTargetIpDimensionField: "bk_target_cloud_id"}
+
+    # 按业务缓存的索引 {bk_biz_id: (屏蔽配置原始数据, 索引)}，屏蔽配置缓存刷新后重建
+    _biz_indexes = LocalCache("shield_index", maxsize=1000, ttl=CONST_ONE_HOUR)
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.shield_objs = []
+        # 索引探针，同一个探针下的条件从告警维度中取值的方式相同 {probe_key: condition}
+        self.probes = {}
+        # {probe_key: {value: [屏蔽配置位置]}}
+        self.buckets = defaultdict(lambda: defaultdict(list))
+        # 无法索引的屏蔽配置位置，每次都需要匹配
+        self.unindexed = []
+
+        for position, config in enumerate(configs):
+            shield_obj = AlertShieldObj(config)
+            self.shield_objs.append(shield_obj)
+
+            condition = self.select_condition(shield_obj)
+            if condition is None:
+                self.unindexed.append(position)
+                continue
+
+            probe_key = self.get_probe_key(condition)
+            self.probes.setdefault(probe_key, condition)
+            for value in set(condition.cond_field.to_str_list()):
+                self.buckets[probe_key][value].append(position)
+
+    @classmethod
+    def get_by_biz(cls, bk_biz_id):
+        """
+        获取业务的屏蔽配置索引，屏蔽配置未变化时复用
+        :rtype: AlertShieldIndex
+        """
+        raw_configs = ShieldCacheManager.get_raw_shields(bk_biz_id)
+        cached = cls._biz_indexes.get(bk_biz_id)
+        if cached and cached[0] == raw_configs:
+            return cached[1]
+
+        index = cls(ShieldCacheManager.load_shields(raw_configs))
+        cls._biz_indexes.set(bk_biz_id, (raw_configs, index))
+        return index
+
+    @classmethod
+    def select_condition(cls, shield_obj):
+        """
+        选择屏蔽配置的索引条件，只有不存在维度时不匹配的顶层等值条件才可以用于索引
+        """
+        conditions = [
+            condition
+            for condition in shield_obj.dimension_check.conditions
+            if type(condition) is EqualCondition and not condition.default_value_if_not_exists
+        ]
+        if not conditions:
+            return None
+
+        def priority(condition):
+            name = condition.cond_field.name
+            return cls.INDEX_FIELDS.index(name) if name in cls.INDEX_FIELDS else len(cls.INDEX_FIELDS)
+
+        return min(conditions, key=priority)
+
+    @classmethod
+    def get_probe_key(cls, condition):
+        """
+        IP 类维度的取值方式与配置值的格式有关，因此需要按字段类型、字段名、配置值格式及是否带云区域区分
+        """
+        field = condition.cond_field
+        first_value = field.value
+        if field.value and isinstance(field.value, (list, tuple)):
+            first_value = field.value[0]
+        is_dict = isinstance(first_value, dict)
+        cloud_id_key = cls.CLOUD_ID_KEYS.get(field.__class__)
+        has_cloud_id = bool(is_dict and cloud_id_key and cloud_id_key in first_value)
+        return field.__class__, field.name, is_dict, has_cloud_id
+
+    def get_candidates(self, dimension):
+        """
+        获取可能匹配的屏蔽配置位置
+        """
+        candidates = set(self.unindexed)
+        for probe_key, condition in self.probes.items():
+            bucket = self.buckets[probe_key]
+            try:
+                existed, data_field = condition.get_field(dimension)
+                if not existed:
+                    continue
+                values = data_field.to_str_list()
+            except Exception as error:
+                # 维度格式异常时无法判断，退化为匹配该探针下的所有屏蔽配置
+                logger.info("get shield index value of dimension(%s) error, %s", dimension, str(error))
+                for positions in bucket.values():
+                    candidates.update(positions)
+                continue
+
+            for value in values:
+                candidates.update(bucket.get(value, []))
+        return sorted(candidates)
+
+    def match(self, alert: AlertDocument):
+        """
+        获取告警匹配的屏蔽配置，顺序与屏蔽配置顺序一致
+        """
+        if not self.shield_objs:
+            return []
+
+        dimension = AlertShieldObj.get_dimension(alert)
         source_time = arrow.now()
-        return self.time_check.is_match(source_time) and self.dimension_check.is_match(self.get_dimension(alert))
+        return [
+            self.shield_objs[position]
+            for position in self.get_candidates(dimension)
+            if self.shield_objs[position].is_match_dimension(dimension, source_time)
+        ]
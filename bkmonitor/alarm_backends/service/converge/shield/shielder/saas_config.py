@@ -16,10 +16,9 @@ from django.conf import settings
 from django.utils.translation import ugettext as _
 
 from alarm_backends.core.cache.cmdb import HostManager
-from alarm_backends.core.cache.shield import ShieldCacheManager
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.i18n import i18n
-from alarm_backends.service.converge.shield.shield_obj import AlertShieldObj
+from alarm_backends.service.converge.shield.shield_obj import AlertShieldIndex
 from bkmonitor.documents.alert import AlertDocument
 from bkmonitor.models import ActionInstance, time_tools
 from bkmonitor.utils import extended_json
@@ -40,7 +39,8 @@ class AlertShieldConfigShielder(BaseShielder):
     def __init__(self, alert: AlertDocument):
         self.alert = alert
         try:
-            self.configs = ShieldCacheManager.get_shields_by_biz_id(self.alert.event.bk_biz_id)
+            self.shield_index = AlertShieldIndex.get_by_biz(self.alert.event.bk_biz_id)
+            self.configs = self.shield_index.configs
             config_ids = ",".join([str(config["id"]) for config in self.configs])
             logger.info(
                 "Get biz(%s) shield configs(%s) of alert(%s), ",
@@ -49,14 +49,12 @@ class AlertShieldConfigShielder(BaseShielder):
                 self.alert.id,
             )
         except BaseException as error:
+            self.shield_index = AlertShieldIndex([])
             self.configs = []
             logger.exception("failed to get shield configs: %s", str(error))
 
-        self.shield_objs = []
-        for config in self.configs:
-            shield_obj = AlertShieldObj(config)
-            if shield_obj.is_match(alert):
-                self.shield_objs.append(shield_obj)
+        # 通过索引只匹配可能命中的屏蔽配置
+        self.shield_objs = self.shield_index.match(alert)
         shield_config_ids = ",".join([str(shield_obj.id) for shield_obj in self.shield_objs])
         self.is_global_shielder = None
         self.is_host_shielder = None
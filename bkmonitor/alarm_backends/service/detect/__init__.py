@@ -11,7 +11,6 @@ specific language governing permissions and limitations under the License.
 
 
 import arrow
-import six
 
 
 class DataPoint(object):
@@ -21,12 +20,26 @@ class DataPoint(object):
 
     # 定义DataPoint必须拥有的属性
     context_field = ["value", "timestamp", "unit", "item"]
+    # 检测过程中高频访问的标准字段，直接存放在 slots 中，其余字段按需从原始数据中读取
+    data_fields = ("record_id", "value", "values", "dimensions", "time")
+
+    __slots__ = ("item", "_raw_input") + data_fields
 
     def __init__(self, accessed_data, item):
         self.item = item
         self._raw_input = accessed_data
-        for k, v in six.iteritems(accessed_data):
-            setattr(self, k, v)
+        for k in self.data_fields:
+            # 原始数据中不存在的字段不赋值，保持 hasattr 判断的语义
+            if k in accessed_data:
+                setattr(self, k, accessed_data[k])
+
+    def __getattr__(self, item):
+        if item == "_raw_input":
+            raise AttributeError(item)
+        try:
+            return self._raw_input[item]
+        except KeyError:
+            raise AttributeError(item)
 
     def as_dict(self):
         return self._raw_input
@@ -9,13 +9,13 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
-import json
 import logging
 import time
 
 from django.conf import settings
 
 from alarm_backends.core.cache import key
+from alarm_backends.core.control.record_codec import DataRecordCodec
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.i18n import i18n
 from alarm_backends.core.lock.service_lock import service_lock
@@ -59,6 +59,7 @@ class DetectProcess(BaseAbnormalPushProcessor):
         # pull data
         data_channel = key.DATA_LIST_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
         client = key.DATA_LIST_KEY.client
+        codec = DataRecordCodec(self.strategy_id, item.id)
 
         total_points = client.llen(data_channel)
         assert settings.SQL_MAX_LIMIT > 0, "SQL_MAX_LIMIT should bigger than zero"
@@ -85,7 +86,7 @@ class DetectProcess(BaseAbnormalPushProcessor):
             # 队列左进右出，lrange 取出时需要做一次倒序才能保证先进先出
             for record in reversed(records):
                 try:
-                    data_point = DataPoint(json.loads(record), item)
+                    data_point = DataPoint(codec.decode(record, client), item)
                     # fill data point into inputs list
                     self.inputs[item.id].append(data_point)
                 except ValueError:
@@ -14,6 +14,8 @@ import functools
 import inspect
 import json
 import logging
+import operator
+from collections import defaultdict
 
 from django.conf import settings
 from django.template import Context, Template
@@ -45,6 +47,8 @@ class Algorithms(object):
     """
 
     desc_tpl = ""
+    # 是否支持批量检测
+    support_batch_detect = False
 
     def __init__(self):
         self.expr = self.gen_expr()
@@ -107,13 +111,22 @@ class Algorithms(object):
         返回异常数据点对象
         """
         if self._detect(data_point):
-            anomaly_point = AnomalyDataPoint(data_point=data_point, detector=self)
+            return [self.gen_detected_point(data_point)]
+
+    def gen_detected_point(self, data_point, anomaly_message=None):
+        """
+        生成表达式命中的异常数据点对象
+        :param anomaly_message: 异常描述，为 None 时基于 data_point 渲染
+        """
+        anomaly_point = AnomalyDataPoint(data_point=data_point, detector=self)
+        if anomaly_message is None:
             try:
-                anomaly_point.anomaly_message = self._format_message(data_point)
+                anomaly_message = self._format_message(data_point)
             except Exception as e:
                 logger.error("format anomaly message error: {}".format(e))
-                anomaly_point.anomaly_message = ""
-            return [anomaly_point]
+                anomaly_message = ""
+        anomaly_point.anomaly_message = anomaly_message
+        return anomaly_point
 
     def _format_message(self, data_point):
         """
@@ -124,18 +137,49 @@ class Algorithms(object):
         context = Context(self.get_context(data_point))
         return Template(self.desc_tpl).render(context)
 
-    def detect_records(self, data_points, level):
+    def scalar_detect(self, data_points):
         """
-        detect service entry
+        逐点检测
+        :return: 异常数据点及其检测结果 -> [(data_point, check_result), ...]
         """
-        if isinstance(data_points, DataPoint):
-            data_points = [data_points]
-        anomaly_points = []
+        detect_results = []
         for data_point in data_points:
             try:
                 check_result = self.detect(data_point)
             except Exception:
                 continue
+            if check_result:
+                detect_results.append((data_point, check_result))
+        return detect_results
+
+    def batch_detect(self, data_points):
+        """
+        批量检测，支持批量检测的算法(support_batch_detect)需要重写该方法，
+        返回结果需要和逐点检测保持一致
+        :return: 异常数据点及其检测结果 -> [(data_point, check_result), ...]
+        """
+        return self.scalar_detect(data_points)
+
+    def is_batch_detect_enabled(self, data_points):
+        if not self.support_batch_detect or not getattr(settings, "DETECT_BATCH_ENABLED", True):
+            return False
+        # debug 模式需要逐点输出检测上下文
+        return not any(hasattr(data_point, "__debug__") for data_point in data_points)
+
+    def detect_records(self, data_points, level):
+        """
+        detect service entry
+        """
+        if isinstance(data_points, DataPoint):
+            data_points = [data_points]
+
+        if self.is_batch_detect_enabled(data_points):
+            detect_results = self.batch_detect(data_points)
+        else:
+            detect_results = self.scalar_detect(data_points)
+
+        anomaly_points = []
+        for data_point, check_result in detect_results:
             if check_result:
                 ap = self.gen_anomaly_point(data_point, check_result, level)
                 logger.info(
@@ -282,6 +326,48 @@ class BasicAlgorithmsCollection(Algorithms):
 
         return anomaly
 
+    def split_batch_points(self, data_points):
+        """
+        将待检测点按单位拆分为列，值已做单位转换(与表达式中的 unit_convert_min 一致)，可直接批量比较。
+        字段缺失、非数值等无法批量处理的点交由逐点检测，保证与逐点检测结果一致
+        :return: ({unit: ([index, ...], [value, ...])}, [scalar_index, ...])
+        """
+        units = {}
+        batch_columns = {}
+        scalar_indexes = []
+        for index, data_point in enumerate(data_points):
+            try:
+                for attr in DataPoint.context_field:
+                    getattr(data_point, attr)
+                unit = data_point.unit
+                if unit not in units:
+                    units[unit] = load_unit(unit)
+                value = units[unit].convert_to_max(data_point.value, decimal=settings.POINT_PRECISION)[0]
+            except Exception:
+                scalar_indexes.append(index)
+                continue
+
+            if not isinstance(value, (int, float)):
+                scalar_indexes.append(index)
+                continue
+
+            indexes, values = batch_columns.setdefault(unit, ([], []))
+            indexes.append(index)
+            values.append(value)
+        return batch_columns, scalar_indexes
+
+    def merge_batch_results(self, data_points, batch_results, scalar_indexes):
+        """
+        合并批量检测和逐点检测的结果，按待检测点的原始顺序返回
+        :param batch_results: 批量检测结果 {index: check_result}
+        :param scalar_indexes: 需要逐点检测的数据点下标
+        """
+        detect_results = dict(batch_results)
+        for index in scalar_indexes:
+            for data_point, check_result in self.scalar_detect([data_points[index]]):
+                detect_results[index] = check_result
+        return [(data_points[index], detect_results[index]) for index in sorted(detect_results)]
+
     def get_context(self, data_point):
         context = super(BasicAlgorithmsCollection, self).get_context(data_point)
         context.update(
@@ -293,9 +379,13 @@ class BasicAlgorithmsCollection(Algorithms):
 class HistoryPointFetcher(object):
     def query_history_points(self, data_points):
         item = data_points[0].item
+        agg_interval = item.query_configs[0]["agg_interval"]
         # 按时间从小到大排序
         sorted_data_points = sorted(data_points, key=lambda x: x.timestamp)
         offsets = self.get_history_offsets(item)
+
+        # 计算各offset需要的历史时刻区间
+        history_windows = []
         for offset in offsets:
             # offsets 支持区间（相邻offset之间差值等于interval的整数倍）批量查询
             if isinstance(offset, tuple):
@@ -304,43 +394,66 @@ class HistoryPointFetcher(object):
                 start = end = offset
 
             if end == 0:
-                self._publish_history_points(item, data_points)
+                history_windows.append(None)
                 continue
 
-            records = []
-            from_timestamp, until_timestamp = (
-                sorted_data_points[0].timestamp - end,
-                sorted_data_points[-1].timestamp - start + item.query_configs[0]["agg_interval"],
+            history_windows.append(
+                (
+                    sorted_data_points[0].timestamp - end,
+                    sorted_data_points[-1].timestamp - start + agg_interval,
+                )
             )
 
-            accessed = None
-            for history_timestamp in range(from_timestamp, until_timestamp, item.query_configs[0]["agg_interval"]):
-                if accessed is None:
-                    accessed = True
-                accessed = accessed and self._check_history_points(item, history_timestamp)
+        # 一次性检查所有历史时刻的数据是否已经拉取过
+        accessed_timestamps = self._check_history_timestamps(
+            item,
+            {
+                history_timestamp
+                for window in history_windows
+                if window
+                for history_timestamp in range(window[0], window[1], agg_interval)
+            },
+        )
 
-            if accessed:
+        for window in history_windows:
+            if window is None:
+                self._publish_history_points(item, data_points)
+                accessed_timestamps.update(point.timestamp for point in data_points)
+                continue
+
+            from_timestamp, until_timestamp = window
+            history_timestamps = range(from_timestamp, until_timestamp, agg_interval)
+            if history_timestamps and all(timestamp in accessed_timestamps for timestamp in history_timestamps):
                 # 历史时刻的数据都已经查过
                 continue
 
+            records = []
             item_records = item.query_record(from_timestamp, until_timestamp)
             for record in item_records:
                 point = DataRecord(item, record)
                 if point.value:
                     records.append(adapter_data_access_2_detect(point, item))
 
-            self._local_history_storage = {}
             self._publish_history_points(item, records)
+            accessed_timestamps.update(point.timestamp for point in records)
 
-    def _check_history_points(self, item, history_timestamp):
+        self.prefetch_history_points(item, data_points)
+
+    def _check_history_timestamps(self, item, history_timestamps):
         """
-        检查历史时刻的数据是否已经拉取过，如果存在，则更新过期时间。
+        批量检查历史时刻的数据是否已经拉取过
+        :return: 已拉取过的历史时刻
         """
-        client = key.HISTORY_DATA_KEY.client
-        history_key = key.HISTORY_DATA_KEY.get_key(
-            strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
-        )
-        return client.exists(history_key)
+        if not history_timestamps:
+            return set()
+
+        history_timestamps = sorted(history_timestamps)
+        pipeline = key.HISTORY_DATA_KEY.client.pipeline(transaction=False)
+        for history_timestamp in history_timestamps:
+            pipeline.exists(
+                key.HISTORY_DATA_KEY.get_key(strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp)
+            )
+        return {timestamp for timestamp, exists in zip(history_timestamps, pipeline.execute()) if exists}
 
     def _publish_history_points(self, item, history_points):
         """
@@ -364,21 +477,65 @@ class HistoryPointFetcher(object):
             pipeline.expire(history_key, key.HISTORY_DATA_KEY.ttl)
         pipeline.execute()
 
+    def get_history_timestamps(self, item, timestamp):
+        """
+        获取数据点在各offset下可能用到的历史时刻
+        """
+        agg_interval = item.query_configs[0]["agg_interval"]
+        history_timestamps = []
+        for offset in self.get_history_offsets(item):
+            if isinstance(offset, tuple):
+                start, end = offset
+                history_timestamps.extend(range(timestamp - end, timestamp - start + 1, agg_interval))
+            else:
+                history_timestamps.append(timestamp - offset)
+        return history_timestamps
+
+    def prefetch_history_points(self, item, data_points):
+        """
+        预取当前批次数据点需要的历史数据
+        汇总所有(offset, 时刻)后通过一次管道批量读取，且只读取批次内出现的维度
+        """
+        history_fields = defaultdict(set)
+        for point in data_points:
+            field = point.record_id.split(".")[0]
+            for history_timestamp in self.get_history_timestamps(item, point.timestamp):
+                history_fields[history_timestamp].add(field)
+
+        self._local_history_storage = {}
+        if not history_fields:
+            return
+
+        pipeline = key.HISTORY_DATA_KEY.client.pipeline(transaction=False)
+        history_keys = []
+        for history_timestamp, fields in history_fields.items():
+            history_key = key.HISTORY_DATA_KEY.get_key(
+                strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
+            )
+            fields = list(fields)
+            pipeline.hmget(history_key, fields)
+            history_keys.append((history_key, fields))
+
+        for (history_key, fields), values in zip(history_keys, pipeline.execute()):
+            self._local_history_storage[history_key] = dict(zip(fields, values))
+
     def fetch_history_point(self, item, point, history_timestamp):
         """
         获取当前数据点对应的历史数据点
         """
-        client = key.HISTORY_DATA_KEY.client
         history_key = key.HISTORY_DATA_KEY.get_key(
             strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
         )
-        if not getattr(self, "_local_history_storage", None):
+        if getattr(self, "_local_history_storage", None) is None:
             self._local_history_storage = {}
 
-        if history_key not in self._local_history_storage:
-            self._local_history_storage[history_key] = client.hgetall(history_key)
+        field = point.record_id.split(".")[0]
+        history_fields = self._local_history_storage.setdefault(history_key, {})
+        if field not in history_fields:
+            # 未预取的维度(如未经过 query_history_points 的数据点)单独读取
+            history_fields[field] = key.HISTORY_DATA_KEY.client.hget(history_key, field)
 
-        raw_data = self._local_history_storage[history_key].get(point.record_id.split(".")[0])
+        raw_data = history_fields[field]
         if not raw_data:
             return
 
@@ -429,6 +586,53 @@ class RangeRatioAlgorithmsCollection(BasicAlgorithmsCollection, HistoryPointFetc
                 self.ceil_desc_tpl,
             )
 
+    def batch_detect(self, data_points):
+        """
+        批量检测，当前值和历史值按列做单位转换后，依次计算下降/上升规则，仅为命中的点渲染异常描述
+        """
+        ratio_rules = []
+        if self.validated_config["floor"]:
+            ratio_rules.append((operator.le, 100 - self.validated_config["floor"]))
+        if self.validated_config["ceil"]:
+            ratio_rules.append((operator.ge, 100 + self.validated_config["ceil"]))
+        # 表达式与规则不对应(子类重写了 gen_expr)时，退化为逐点检测
+        if len(ratio_rules) != len(self.detectors):
+            return self.scalar_detect(data_points)
+
+        batch_columns, scalar_indexes = self.split_batch_points(data_points)
+        batch_results = {}
+        for unit, (indexes, values) in batch_columns.items():
+            history_unit = load_unit(unit)
+            pending = []
+            for index, value in zip(indexes, values):
+                try:
+                    history_data_point = self.history_point_fetcher(data_points[index])
+                    if history_data_point is None:
+                        # 历史数据不存在，逐点检测同样会跳过该点
+                        continue
+                    history_value = history_unit.convert_to_max(
+                        history_data_point.value, decimal=settings.POINT_PRECISION
+                    )[0]
+                except Exception:
+                    continue
+                if not isinstance(history_value, (int, float)):
+                    scalar_indexes.append(index)
+                    continue
+                pending.append((index, value, history_value))
+
+            # 表达式间为 or 关系，命中前一个规则的点不再参与后续规则计算
+            for (compare, ratio), detector in zip(ratio_rules, self.detectors):
+                next_pending = []
+                for index, value, history_value in pending:
+                    limit = history_value * ratio * 0.01
+                    if (value or limit) and compare(value, limit):
+                        batch_results[index] = [detector.gen_detected_point(data_points[index])]
+                    else:
+                        next_pending.append((index, value, history_value))
+                pending = next_pending
+
+        return self.merge_batch_results(data_points, batch_results, scalar_indexes)
+
     def extra_context(self, context):
         env = dict()
         history_data_point = self.history_point_fetcher(context.data_point)
@@ -27,6 +27,7 @@ logger = logging.getLogger("detect")
 class SimpleYearRound(RangeRatioAlgorithmsCollection):
     config_serializer = SimpleYearRoundSerializer
     expr_op = "or"
+    support_batch_detect = True
 
     floor_desc_tpl = _("{% load unit %}较上周同一时刻({{history_data_point.value|auto_unit:unit}})下降超过{{floor}}%")
     ceil_desc_tpl = _("{% load unit %}较上周同一时刻({{history_data_point.value|auto_unit:unit}})上升超过{{ceil}}%")
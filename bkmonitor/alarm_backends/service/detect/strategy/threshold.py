@@ -15,16 +15,28 @@ specific language governing permissions and limitations under the License.
 
 import ast
 import logging
+import operator
 
 from django.utils.safestring import mark_safe
 from six.moves import zip
 
 from alarm_backends.service.detect.strategy import BasicAlgorithmsCollection, ExprDetectAlgorithms
+from alarm_backends.templatetags.unit import unit_convert_min
 from bkmonitor.strategy.serializers import ThresholdSerializer, allowed_threshold_method
 from core.errors.alarm_backends.detect import InvalidThresholdConfig
 
 logger = logging.getLogger("detect")
 
+# 批量检测时使用的比较函数，与 allowed_threshold_method 一一对应
+threshold_operators = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+    "neq": operator.ne,
+}
+
 
 class AlgorithmsAST(ast.NodeTransformer):
     """
@@ -37,9 +49,14 @@ class AlgorithmsAST(ast.NodeTransformer):
 class AndThreshold(BasicAlgorithmsCollection):
     config_serializer = ThresholdSerializer.AndSerializer
     expr_op = "and"
+    support_batch_detect = True
 
     desc_tpl = "{{% load unit %}} {method_desc} {threshold}{{{{unit|unit_suffix:algorithm_unit}}}}"
 
+    def __init__(self, config, unit=""):
+        super(AndThreshold, self).__init__(config, unit)
+        self._batch_conditions = {}
+
     def gen_expr(self):
         expr_list = []
         tpl_list = []
@@ -61,6 +78,55 @@ class AndThreshold(BasicAlgorithmsCollection):
         for args in zip(expr_list, tpl_list):
             yield ExprDetectAlgorithms(*args)
 
+    def get_batch_conditions(self, unit):
+        """
+        批量检测条件，阈值按数据单位只转换一次
+        :return: [(比较函数, 阈值, 表达式算法), ...]
+        """
+        if unit not in self._batch_conditions:
+            self._batch_conditions[unit] = [
+                (threshold_operators[t_config["method"]], unit_convert_min(t_config["threshold"], unit, self.unit), d)
+                for t_config, d in zip(self.validated_config, self.detectors)
+            ]
+        return self._batch_conditions[unit]
+
+    def batch_check(self, unit, values):
+        """
+        按列比较，条件间为 and 关系
+        :return: 与 values 一一对应，命中时为命中的表达式算法列表，否则为 None
+        """
+        matched = [[] for _ in values]
+        for compare, threshold, detector in self.get_batch_conditions(unit):
+            for i, value in enumerate(values):
+                if matched[i] is None:
+                    continue
+                if compare(value, threshold):
+                    matched[i].append(detector)
+                else:
+                    matched[i] = None
+        return matched
+
+    def batch_detect(self, data_points):
+        """
+        批量检测，同一单位的值一次性完成比较，仅为命中的点生成异常点。
+        阈值类异常描述只和单位有关，同一表达式只渲染一次
+        """
+        batch_columns, scalar_indexes = self.split_batch_points(data_points)
+        batch_results = {}
+        messages = {}
+        for unit, (indexes, values) in batch_columns.items():
+            for index, detectors in zip(indexes, self.batch_check(unit, values)):
+                if not detectors:
+                    continue
+                check_result = []
+                for detector in detectors:
+                    anomaly_point = detector.gen_detected_point(data_points[index], messages.get((detector, unit)))
+                    messages[(detector, unit)] = anomaly_point.anomaly_message
+                    check_result.append(anomaly_point)
+                batch_results[index] = check_result
+
+        return self.merge_batch_results(data_points, batch_results, scalar_indexes)
+
 
 class Threshold(AndThreshold):
     config_serializer = ThresholdSerializer
@@ -69,3 +135,21 @@ class Threshold(AndThreshold):
     def gen_expr(self):
         for t_config in self.validated_config:
             yield AndThreshold(t_config, self.unit)
+
+    def batch_check(self, unit, values):
+        """
+        按列比较，阈值组间为 or 关系，命中前一组的值不再参与后续比较
+        """
+        matched = [None] * len(values)
+        pending = list(range(len(values)))
+        for detector in self.detectors:
+            if not pending:
+                break
+            next_pending = []
+            for i, result in zip(pending, detector.batch_check(unit, [values[i] for i in pending])):
+                if result:
+                    matched[i] = result
+                else:
+                    next_pending.append(i)
+            pending = next_pending
+        return matched
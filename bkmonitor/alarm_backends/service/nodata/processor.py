@@ -10,13 +10,13 @@ specific language governing permissions and limitations under the License.
 """
 
 
-import json
 import logging
 
 import arrow
 
 from alarm_backends.constants import LATEST_NO_DATA_CHECK_POINT
 from alarm_backends.core.cache import key
+from alarm_backends.core.control.record_codec import DataRecordCodec
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.i18n import i18n
 from alarm_backends.core.lock.service_lock import service_lock
@@ -61,6 +61,7 @@ class CheckProcessor(BaseAbnormalPushProcessor):
         # pull data
         data_channel = key.NO_DATA_LIST_KEY.get_key(strategy_id=self.strategy_id, item_id=item.id)
         client = key.NO_DATA_LIST_KEY.client
+        codec = DataRecordCodec(self.strategy_id, item.id)
 
         total_points = client.llen(data_channel)
         if total_points == 0:
@@ -86,7 +87,7 @@ class CheckProcessor(BaseAbnormalPushProcessor):
             future_records = []
             for record in records:
                 try:
-                    data_point = DataPoint(json.loads(record), item)
+                    data_point = DataPoint(codec.decode(record, client), item)
                     if data_point.timestamp <= check_timestamp:
                         self.inputs[item.id].append(data_point)
                     else:
@@ -98,12 +99,12 @@ class CheckProcessor(BaseAbnormalPushProcessor):
             # 如果当前监测点之前无数据，但是未来有数据，那么取未来一个周期的数据
             if not self.inputs[item.id] and future_records:
                 record = future_records[0]
-                data_point = DataPoint(json.loads(record), item)
+                data_point = DataPoint(codec.decode(record, client), item)
                 earliest_future_timestamp = data_point.timestamp
                 earliest_future_points = [data_point]
                 earliest_future_records_idx = [0]
                 for index, record in enumerate(future_records[1:]):
-                    data_point = DataPoint(json.loads(record), item)
+                    data_point = DataPoint(codec.decode(record, client), item)
                     # 遇到更早时间数据，重置 earliest_future_points 和 earliest_future_records_idx
                     if data_point.timestamp < earliest_future_timestamp:
                         earliest_future_timestamp = data_point.timestamp
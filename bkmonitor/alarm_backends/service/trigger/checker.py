@@ -20,6 +20,7 @@ from alarm_backends.core.control.record_parser import RecordParser
 from alarm_backends.core.control.strategy import Strategy
 from alarm_backends.core.detect_result import ANOMALY_LABEL
 from bkmonitor.models import AnomalyRecord
+from bkmonitor.utils.common_utils import chunks
 
 logger = logging.getLogger("trigger")
 
@@ -31,6 +32,8 @@ class AnomalyChecker(object):
 
     # 检测窗口单位(默认1min)
     DEFAULT_CHECK_WINDOW_UNIT = 60
+    # 批量拉取检测结果时，单个 pipeline 的最大命令数
+    PREFETCH_CHUNK_SIZE = 5000
 
     def __init__(self, point, strategy, item_id):
         self.item = Strategy.get_item_in_strategy(strategy, item_id)
@@ -54,6 +57,8 @@ class AnomalyChecker(object):
         # shortcut
         self.dimensions_md5 = self.record_parser.dimensions_md5
         self.source_time = self.record_parser.source_time
+        # 批量拉取的检测结果 {(check_cache_key, min_score, max_score): check_results}
+        self.check_results_cache = None
 
     @staticmethod
     def is_no_data_point(point):
@@ -163,39 +168,83 @@ class AnomalyChecker(object):
                 anomaly_level = level
         return anomaly_level, anomaly_timestamps
 
-    def _check_anomaly_by_level(self, level):
+    @classmethod
+    def prefetch_check_results(cls, checkers):
         """
-        检测某个级别的异常点是否满足触发条件
-        :param str level: 告警级别
-        :return: 二元组：是否被触发，异常次数
+        批量拉取检测结果缓存
+        按 (dimensions_md5, level) 汇总所有异常点需要的检测窗口，通过 pipeline 一次取回，
+        检测时直接读取内存中的结果，避免每个异常点每个级别都请求一次 redis
+        :param checkers: 待检测的 AnomalyChecker 列表
+        """
+        check_windows = set()
+        for checker in checkers:
+            for level in checker.point["anomaly"]:
+                trigger_config = checker.get_trigger_config(str(level))
+                if trigger_config:
+                    check_windows.add(checker.get_check_window(str(level), trigger_config))
+
+        check_results_cache = {}
+        for chunked_windows in chunks(list(check_windows), cls.PREFETCH_CHUNK_SIZE):
+            pipeline = CHECK_RESULT_CACHE_KEY.client.pipeline(transaction=False)
+            for check_cache_key, min_score, max_score in chunked_windows:
+                pipeline.zrangebyscore(name=check_cache_key, min=min_score, max=max_score, withscores=True)
+            check_results_cache.update(zip(chunked_windows, pipeline.execute()))
+
+        for checker in checkers:
+            checker.check_results_cache = check_results_cache
+
+    def get_trigger_config(self, level):
+        """
+        获取级别对应的触发配置，未配置时返回 None
         """
         try:
-            trigger_config = self.trigger_configs[level]
+            return self.trigger_configs[level]
         except KeyError:
             trigger_configs = self.trigger_configs.values()
             if not trigger_configs:
-                # 如果该等级没有在策略中配置，则不检测
-                logger.error(
-                    "strategy({}), item({}) level({}) trigger config not exists".format(
-                        self.strategy_id, self.item_id, level
-                    )
-                )
-                return False, []
-
+                return None
             # 默认兜底，trigger 配置当前所有告警级别默认一致
-            trigger_config = list(trigger_configs)[0]
+            return list(trigger_configs)[0]
 
+    def get_check_window(self, level, trigger_config):
+        """
+        检测窗口：(检测结果缓存key, 起始时间, 结束时间)
+        时间范围为source_time前后的一个窗口偏移量
+        """
         check_cache_key = CHECK_RESULT_CACHE_KEY.get_key(
             strategy_id=self.strategy_id,
             item_id=self.item_id,
             dimensions_md5=self.dimensions_md5,
             level=level,
         )
-        # 在对应的打点队列中取出打点信息。时间范围为source_time前后的一个窗口偏移量
         check_window_offset = trigger_config["check_window_size"] * self.check_window_unit - 1
-        check_results = CHECK_RESULT_CACHE_KEY.client.zrangebyscore(
-            name=check_cache_key, min=self.source_time - check_window_offset, max=self.source_time, withscores=True
-        )
+        return check_cache_key, self.source_time - check_window_offset, self.source_time
+
+    def _check_anomaly_by_level(self, level):
+        """
+        检测某个级别的异常点是否满足触发条件
+        :param str level: 告警级别
+        :return: 二元组：是否被触发，异常次数
+        """
+        trigger_config = self.get_trigger_config(level)
+        if trigger_config is None:
+            # 如果该等级没有在策略中配置，则不检测
+            logger.error(
+                "strategy({}), item({}) level({}) trigger config not exists".format(
+                    self.strategy_id, self.item_id, level
+                )
+            )
+            return False, []
+
+        # 在对应的打点队列中取出打点信息，已经批量拉取过的窗口直接使用缓存结果
+        check_window = self.get_check_window(level, trigger_config)
+        if self.check_results_cache is not None and check_window in self.check_results_cache:
+            check_results = self.check_results_cache[check_window]
+        else:
+            check_cache_key, min_score, max_score = check_window
+            check_results = CHECK_RESULT_CACHE_KEY.client.zrangebyscore(
+                name=check_cache_key, min=min_score, max=max_score, withscores=True
+            )
         # 统计包含异常标记的key的数量，并与trigger_count进行比较
         anomaly_timestamps = []
         for label, score in check_results:
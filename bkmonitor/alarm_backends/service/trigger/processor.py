@@ -14,6 +14,7 @@ import logging
 import time
 
 import six.moves.cPickle
+from django.conf import settings
 
 from alarm_backends.core.alert.adapter import MonitorEventAdapter
 from alarm_backends.core.cache.key import (
@@ -127,22 +128,55 @@ class TriggerProcessor(object):
         in_alarm_time, message = self.strategy.in_alarm_time()
         if not in_alarm_time:
             logger.info("[trigger] strategy(%s) not in alarm time: %s, skipped", self.strategy_id, message)
+        elif getattr(settings, "TRIGGER_BATCH_ENABLED", True):
+            self.process_points(self.anomaly_points)
         else:
             for point in self.anomaly_points:
                 try:
                     self.process_point(point)
                 except Exception as e:
-                    error_message = "[process error] strategy({}), item({}) reason: {} \norigin data: {}".format(
-                        self.strategy_id, self.item_id, e, point
-                    )
-                    logger.exception(error_message)
+                    self.log_process_error(point, e)
 
         self.push()
 
-    def process_point(self, point):
+    def log_process_error(self, point, e):
+        error_message = "[process error] strategy({}), item({}) reason: {} \norigin data: {}".format(
+            self.strategy_id, self.item_id, e, point
+        )
+        logger.exception(error_message)
+
+    def process_points(self, points):
+        """
+        批量处理异常点：先为所有异常点创建检测器，批量拉取检测窗口后再逐个判断是否触发
+        """
+        checkers = []
+        for point in points:
+            try:
+                checkers.append((point, self.gen_checker(point)))
+            except Exception as e:
+                self.log_process_error(point, e)
+
+        try:
+            AnomalyChecker.prefetch_check_results([checker for _, checker in checkers])
+        except Exception as e:
+            # 批量拉取失败时，退化为逐点读取检测结果
+            logger.exception("[trigger] strategy(%s) prefetch check results error: %s", self.strategy_id, e)
+
+        for point, checker in checkers:
+            try:
+                self.check_point(checker)
+            except Exception as e:
+                self.log_process_error(point, e)
+
+    def gen_checker(self, point):
         point = json.loads(point)
         strategy = self.get_strategy_snapshot(point["strategy_snapshot_key"])
-        checker = AnomalyChecker(point, strategy, self.item_id)
+        return AnomalyChecker(point, strategy, self.item_id)
+
+    def process_point(self, point):
+        self.check_point(self.gen_checker(point))
+
+    def check_point(self, checker):
         anomaly_records, event_record = checker.check()
 
         # 暂存结果，最后批量保存
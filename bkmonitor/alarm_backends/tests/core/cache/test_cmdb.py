@@ -13,7 +13,7 @@ specific language governing permissions and limitations under the License.
 import json
 
 import mock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from alarm_backends.core.cache.cmdb import (
     BusinessManager,
@@ -23,6 +23,7 @@ from alarm_backends.core.cache.cmdb import (
     ServiceInstanceManager,
     TopoManager,
 )
+from alarm_backends.core.context.target import copy_cache_obj
 from api.cmdb.define import Business, Host, Module, ServiceInstance, TopoNode, TopoTree
 
 BIZ_IDS = [2, 3, 4, 5, 6, 10, 20, 21]
@@ -234,7 +235,6 @@ class TestHostManager(TestCase):
         self.assertSetEqual(set(ALL_HOSTS), set(hosts))
 
     def test_clear(self):
-
         HostManager.refresh()
         keys = HostManager.cache.hkeys(HostManager.CACHE_KEY)
         biz_keys = HostManager.cache.hkeys(HostManager.get_biz_cache_key())
@@ -312,6 +312,86 @@ class TestHostManager(TestCase):
         HostManager.refresh()
         self.assertEqual(8, len(HostManager.all()))
 
+    @mock.patch("alarm_backends.core.cache.cmdb.host.api.cmdb.get_host_by_topo_node")
+    def test_incremental_refresh(self, get_host_by_topo_node):
+        hosts = [
+            Host(bk_host_innerip="10.0.0.1", bk_cloud_id=1, bk_host_id=1, bk_biz_id=2),
+            Host(bk_host_innerip="10.0.0.2", bk_cloud_id=2, bk_host_id=2, bk_biz_id=2),
+        ]
+        get_host_by_topo_node.side_effect = lambda bk_biz_id, **kwargs: [
+            host for host in hosts if host.bk_biz_id == bk_biz_id
+        ]
+        HostManager.refresh()
+        self.assertEqual(len(HostManager.cache.hkeys(HostManager.get_hash_cache_key())), 4)
+
+        # 未变化的对象不会重新写入
+        HostManager.cache.hset(HostManager.CACHE_KEY, "2", HostManager.serialize(hosts[0]))
+        hosts[0] = Host(bk_host_innerip="10.0.0.1", bk_cloud_id=1, bk_host_id=1, bk_biz_id=2, bk_host_name="new")
+        HostManager.refresh()
+        self.assertEqual(HostManager.get_by_id(1).bk_host_name, "new")
+        self.assertEqual(HostManager.get_by_id(2).bk_host_id, 1)
+
+        # 删除及业务迁移
+        hosts[:] = [Host(bk_host_innerip="10.0.0.2", bk_cloud_id=2, bk_host_id=2, bk_biz_id=3)]
+        HostManager.refresh()
+        self.assertSetEqual(set(HostManager.keys()), {"10.0.0.2|2", "2"})
+        self.assertSetEqual(set(HostManager.cache.hkeys(HostManager.get_hash_cache_key())), {"10.0.0.2|2", "2"})
+        self.assertEqual(HostManager.get_by_id(2).bk_biz_id, 3)
+
+
+@override_settings(CMDB_LOCAL_CACHE_ENABLED=True, CMDB_LOCAL_CACHE_VERSION_CHECK_INTERVAL=0)
+class TestHostLocalCache(TestCase):
+    def setUp(self):
+        HostManager.clear()
+
+    def tearDown(self):
+        HostManager.clear()
+
+    @mock.patch("alarm_backends.core.cache.cmdb.host.api.cmdb.get_host_by_topo_node")
+    def test_get(self, get_host_by_topo_node):
+        get_host_by_topo_node.side_effect = lambda bk_biz_id, **kwargs: [
+            host for host in ALL_HOSTS if host.bk_biz_id == bk_biz_id
+        ]
+        HostManager.refresh()
+        version = HostManager.cache.get(HostManager.get_version_cache_key())
+
+        host = HostManager.get("10.0.0.1", 1)
+        host_by_id = HostManager.get_by_id(1)
+        with mock.patch.object(HostManager.cache, "hmget") as hmget:
+            self.assertIs(host, HostManager.get("10.0.0.1", 1))
+            self.assertIs(host_by_id, HostManager.get_by_id(1))
+            self.assertEqual(hmget.call_count, 0)
+
+        # 数据未变化，刷新版本不变，本地缓存保留
+        HostManager.refresh()
+        self.assertEqual(version, HostManager.cache.get(HostManager.get_version_cache_key()))
+        self.assertIs(host, HostManager.get("10.0.0.1", 1))
+
+        # 数据变化，本地缓存失效
+        get_host_by_topo_node.side_effect = (
+            lambda bk_biz_id, **kwargs: [Host(bk_host_innerip="10.0.0.1", bk_cloud_id=1, bk_host_id=1, bk_biz_id=3)]
+            if bk_biz_id == 3
+            else []
+        )
+        HostManager.refresh()
+        self.assertNotEqual(version, HostManager.cache.get(HostManager.get_version_cache_key()))
+        self.assertEqual(HostManager.get("10.0.0.1", 1).bk_biz_id, 3)
+        self.assertIsNone(HostManager.get("10.0.0.2", 2))
+
+    @mock.patch("alarm_backends.core.cache.cmdb.host.api.cmdb.get_host_by_topo_node")
+    def test_copy_cache_obj(self, get_host_by_topo_node):
+        get_host_by_topo_node.side_effect = lambda bk_biz_id, **kwargs: [
+            host for host in ALL_HOSTS if host.bk_biz_id == bk_biz_id
+        ]
+        HostManager.refresh()
+
+        # 修改复制的对象，不影响进程内共享的缓存对象
+        host = copy_cache_obj(HostManager.get_by_id(1))
+        host.operator_string = "admin"
+        host.bk_host_innerip = "10.0.0.100"
+        self.assertFalse(hasattr(HostManager.get_by_id(1), "operator_string"))
+        self.assertEqual(HostManager.get_by_id(1).bk_host_innerip, "10.0.0.1")
+
 
 class TestHostIDManager(TestCase):
     def setUp(self):
@@ -398,7 +478,6 @@ class TestModuleManager(TestCase):
         self.assertSetEqual(set(ALL_MODULES), set(modules))
 
     def test_clear(self):
-
         ModuleManager.refresh()
         keys = ModuleManager.cache.hkeys(ModuleManager.CACHE_KEY)
         biz_keys = ModuleManager.cache.hkeys(ModuleManager.get_biz_cache_key())
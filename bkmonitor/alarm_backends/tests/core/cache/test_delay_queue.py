@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+import pytest
+
+from alarm_backends.core.cache.delay_queue import DelayQueueManager
+from alarm_backends.core.storage.redis import Cache
+
+pytestmark = pytest.mark.django_db
+
+
+class TestDelayQueueManager(object):
+    def setup_method(self, method):
+        Cache("service").flushall()
+
+    @pytest.fixture(autouse=True, params=[False, True], ids=["pipeline", "script"])
+    def script_enabled(self, request, settings):
+        # 分别测试 lua 脚本及非脚本的领取方式，fakeredis 需要安装 lupa 才支持 lua 脚本
+        if request.param:
+            pytest.importorskip("lupa")
+        settings.DELAY_QUEUE_SCRIPT_ENABLED = request.param
+        settings.DELAY_QUEUE_SHARDS = 1
+
+    def test_refresh_single_db(self):
+        client = Cache("service")
+        client.delay("rpush", "test.delay.queue", "a", "b", delay=0)
+        client.delay("rpush", "test.delay.queue", "c", delay=60)
+
+        next_score = DelayQueueManager.refresh_single_db("service")
+
+        assert client.lrange("test.delay.queue", 0, -1) == ["a", "b"]
+        assert next_score > time.time()
+        assert client.zcard(DelayQueueManager.TASK_DELAY_QUEUE) == 1
+        assert client.hlen(DelayQueueManager.TASK_STORAGE_QUEUE) == 1
+
+    def test_refresh_single_db__batch(self, settings):
+        settings.DELAY_QUEUE_BATCH_SIZE = 2
+        client = Cache("service")
+        for i in range(5):
+            client.delay("lpush", "test.delay.queue", i, delay=0)
+
+        assert DelayQueueManager.refresh_single_db("service") is None
+        assert client.llen("test.delay.queue") == 5
+        assert client.zcard(DelayQueueManager.TASK_DELAY_QUEUE) == 0
+        assert client.hlen(DelayQueueManager.TASK_STORAGE_QUEUE) == 0
+
+    def test_refresh_single_db__shards(self, settings):
+        settings.DELAY_QUEUE_SHARDS = 4
+        client = Cache("service")
+        for i in range(20):
+            client.delay("rpush", "test.delay.queue", i, delay=0)
+
+        shard_sizes = [client.zcard(DelayQueueManager.get_shard_keys(shard)[0]) for shard in range(4)]
+        assert sum(shard_sizes) == 20
+        assert len([size for size in shard_sizes if size]) > 1
+
+        DelayQueueManager.refresh_single_db("service")
+        assert sorted(int(value) for value in client.lrange("test.delay.queue", 0, -1)) == list(range(20))
+        assert all(not client.zcard(DelayQueueManager.get_shard_keys(shard)[0]) for shard in range(4))
+
+    def test_refresh_single_db__shards_reduced(self, settings):
+        settings.DELAY_QUEUE_SHARDS = 4
+        client = Cache("service")
+        DelayQueueManager.refresh_single_db("service")
+        for i in range(20):
+            client.delay("rpush", "test.delay.queue", i, delay=0)
+
+        # 分片数量调小后，被移除分片中的任务仍然被调度
+        settings.DELAY_QUEUE_SHARDS = 1
+        DelayQueueManager.refresh_single_db("service")
+        assert sorted(int(value) for value in client.lrange("test.delay.queue", 0, -1)) == list(range(20))
+        assert all(not client.zcard(DelayQueueManager.get_shard_keys(shard)[0]) for shard in range(4))
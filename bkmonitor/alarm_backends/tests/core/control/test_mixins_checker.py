@@ -9,7 +9,7 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from mock import MagicMock, patch
 
 from alarm_backends.constants import NO_DATA_LEVEL, NO_DATA_TAG_DIMENSION
@@ -348,3 +348,24 @@ class TestChecker(TestCase):
         mock_last_check_key(self, 9940)
         data_points = [DataPoint(record, self.item) for record in RECORDS]
         self.assertEqual(self.item.check(data_points, check_timestamp), ANOMALY_INFO[:2])
+
+    @patch(
+        "alarm_backends.service.nodata.scenarios.base.BaseScenario.get_target_instances_dimensions",
+        MagicMock(return_value=(TARGET_INSTANCE_DIMENSIONS, [])),
+    )
+    @patch("alarm_backends.core.control.mixins.nodata.CheckMixin._produce_anomaly_info", mock_anomaly_info)
+    def test_check__bulk(self):
+        check_timestamp = 10000
+        cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=self.item.strategy.id, item_id=self.item.id)
+        results = []
+        for bulk_check_enabled in [False, True]:
+            key.LAST_CHECKPOINTS_CACHE_KEY.client.delete(cache_key)
+            mock_last_check_key(self, 9940)
+            data_points = [DataPoint(record, self.item) for record in RECORDS]
+            with override_settings(NODATA_BULK_CHECK_ENABLED=bulk_check_enabled):
+                anomaly_data = self.item.check(data_points, check_timestamp)
+            results.append((anomaly_data, key.LAST_CHECKPOINTS_CACHE_KEY.client.hgetall(cache_key)))
+
+        # 批量模式与逐个维度检测的结果及回写的检测点一致
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([ANOMALY_INFO[0]], results[1][0])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+
+import pytest
+
+from alarm_backends.core.cache.key import DATA_LIST_KEY, DATA_SCHEMA_KEY
+from alarm_backends.core.control.record_codec import (
+    CODEC_VERSION_COMPACT,
+    CODEC_VERSION_JSON,
+    DataRecordCodec,
+)
+
+RECORD = {
+    "bk_target_ip": "127.0.0.1",
+    "load5": 1.38,
+    "bk_target_cloud_id": "0",
+    "_time_": 1569246480,
+    "_result_": 1.38,
+    "record_id": "f7659f5811a0e187c71d119c7d625f23.1569246480",
+    "value": 1.38,
+    "values": {"time": 1569246480, "load5": 1.38},
+    "dimensions": {"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": "0"},
+    "time": 1569246480,
+    "dimension_fields": ["bk_target_ip", "bk_target_cloud_id"],
+    "access_time": 1569246490,
+}
+
+
+class TestDataRecordCodec(object):
+    def setup(self):
+        DataRecordCodec._schema_cache.clear()
+        DATA_SCHEMA_KEY.client.delete(DATA_SCHEMA_KEY.get_key(strategy_id=1, item_id=1))
+
+    def push(self, codec, records):
+        pipeline = DATA_LIST_KEY.client.pipeline(transaction=False)
+        encoded = [codec.encode(record) for record in records]
+        codec.flush_schemas(pipeline)
+        pipeline.execute()
+        return encoded
+
+    def test_json(self):
+        codec = DataRecordCodec(1, 1, version=CODEC_VERSION_JSON)
+        encoded = self.push(codec, [RECORD])
+        assert json.loads(encoded[0]) == RECORD
+        assert codec.decode(encoded[0], DATA_LIST_KEY.client) == RECORD
+
+    def test_compact(self):
+        producer = DataRecordCodec(1, 1, version=CODEC_VERSION_COMPACT)
+        encoded = self.push(producer, [RECORD, dict(RECORD, value=2)])
+        assert len(encoded[0]) < len(json.dumps(RECORD))
+
+        # 消费端进程内没有 schema 缓存，需要从 redis 加载
+        DataRecordCodec._schema_cache.clear()
+        consumer = DataRecordCodec(1, 1, version=CODEC_VERSION_JSON)
+        decoded = consumer.decode(encoded[0], DATA_LIST_KEY.client)
+        assert decoded == RECORD
+        assert list(decoded) == list(RECORD)
+        assert consumer.decode(encoded[1], DATA_LIST_KEY.client)["value"] == 2
+
+        # 新旧格式混合读取
+        assert consumer.decode(json.dumps(RECORD), DATA_LIST_KEY.client) == RECORD
+
+    def test_schema_not_found(self):
+        producer = DataRecordCodec(1, 1, version=CODEC_VERSION_COMPACT)
+        encoded = producer.encode(RECORD)
+        DataRecordCodec._schema_cache.clear()
+        with pytest.raises(ValueError):
+            DataRecordCodec(1, 1).decode(encoded, DATA_LIST_KEY.client)
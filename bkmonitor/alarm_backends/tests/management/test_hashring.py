@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+
+import pytest
+
+from alarm_backends.management.hashring import (
+    HashRing,
+    get_hash_ring,
+    jump_hash,
+    plan_rebalance,
+)
+
+HOSTS = {"10.0.0.{}".format(i): 1 for i in range(10)}
+KEYS = list(range(2000))
+
+
+class TestHashRing(object):
+    def test_jump_hash(self):
+        # 桶数量增加时，key 只会迁移到新增的桶
+        for key in range(1000):
+            old_bucket = jump_hash(key, 10)
+            new_bucket = jump_hash(key, 11)
+            assert new_bucket in (old_bucket, 10)
+
+    @pytest.mark.parametrize("algorithm", ["ring", "jump", "rendezvous"])
+    def test_get_node(self, algorithm):
+        ring = get_hash_ring(HOSTS, algorithm)
+        assert get_hash_ring(dict(HOSTS), algorithm) is ring
+        assignments = [ring.get_node(key) for key in KEYS]
+        assert set(assignments) == set(HOSTS)
+        # 分配结果稳定，与缓存无关
+        assert assignments == [get_hash_ring(HOSTS, algorithm).get_node(key) for key in KEYS]
+
+    def test_ring_compatible(self):
+        ring = HashRing(HOSTS)
+        assert [ring.get_node(key) for key in KEYS] == [get_hash_ring(HOSTS, "ring").get_node(key) for key in KEYS]
+
+    def test_unknown_algorithm(self):
+        with pytest.raises(ValueError):
+            get_hash_ring(HOSTS, "unknown")
+
+    def test_rendezvous_rebalance(self):
+        new_hosts = dict(HOSTS)
+        new_hosts.pop("10.0.0.5")
+        plan = plan_rebalance(KEYS, HOSTS, new_hosts, "rendezvous")
+
+        # 只有下线主机上的任务发生迁移
+        assert {old_host for _, old_host, _ in plan["moved"]} == {"10.0.0.5"}
+        assert len(plan["moved"]) == len(plan["before"]["10.0.0.5"])
+        assert sum(len(targets) for targets in plan["after"].values()) == len(KEYS)
+        assert plan["after_skew"] >= 1
@@ -15,13 +15,20 @@ import copy
 import fakeredis
 import pytest
 
-from alarm_backends.service.access.data.duplicate import Duplicate
+from alarm_backends.core.cache import key
+from alarm_backends.service.access.data.duplicate import (
+    Duplicate,
+    FingerprintDuplicate,
+    get_duplicate,
+)
 
 from .config import STANDARD_DATA
 
 
 pytestmark = pytest.mark.django_db
 
+DUPLICATE_CLASSES = [Duplicate, FingerprintDuplicate]
+
 
 class MockRecord(object):
     def __init__(self, attrs):
@@ -33,9 +40,10 @@ class TestDuplicate(object):
         redis = fakeredis.FakeRedis(decode_responses=True)
         redis.flushall()
 
-    def test_duplicate(self):
+    @pytest.mark.parametrize("duplicate_cls", DUPLICATE_CLASSES)
+    def test_duplicate(self, duplicate_cls):
         strategy_group_key = "123456789"
-        dup = Duplicate(strategy_group_key)
+        dup = duplicate_cls(strategy_group_key)
 
         raw_data_1 = copy.deepcopy(STANDARD_DATA)
         record_1 = MockRecord(raw_data_1)
@@ -44,9 +52,10 @@ class TestDuplicate(object):
         dup.add_record(record_1)
         assert dup.is_duplicate(record_1) is True
 
-    def test_refresh_cache(self):
+    @pytest.mark.parametrize("duplicate_cls", DUPLICATE_CLASSES)
+    def test_refresh_cache(self, duplicate_cls):
         strategy_group_key = "123456789"
-        dup = Duplicate(strategy_group_key)
+        dup = duplicate_cls(strategy_group_key)
         record = MockRecord(STANDARD_DATA)
 
         raw_data_1 = copy.deepcopy(STANDARD_DATA)
@@ -61,7 +70,58 @@ class TestDuplicate(object):
 
         dup.refresh_cache()
 
-        dup = Duplicate(strategy_group_key)
+        dup = duplicate_cls(strategy_group_key)
         assert dup.is_duplicate(record_1) is True
         assert dup.is_duplicate(record_2) is True
         assert dup.is_duplicate(record) is False
+
+    @pytest.mark.parametrize("duplicate_cls", DUPLICATE_CLASSES)
+    def test_load(self, duplicate_cls):
+        strategy_group_key = "987654321"
+        dup = duplicate_cls(strategy_group_key)
+        records = []
+        for i in range(3):
+            record = MockRecord(copy.deepcopy(STANDARD_DATA))
+            record.time += i * 60
+            record.record_id = "ac6847eefd664275c7b3693829f68bab.{}".format(record.time)
+            dup.add_record(record)
+            records.append(record)
+        dup.refresh_cache()
+
+        dup = duplicate_cls(strategy_group_key)
+        new_record = MockRecord(copy.deepcopy(STANDARD_DATA))
+        new_record.record_id = "bc6847eefd664275c7b3693829f68bab.1569246480"
+        dup.load(records + [new_record])
+        assert len(dup.record_ids_cache) == 3
+
+        # 已加载的时间点不再请求redis
+        dup.client = None
+        assert all(dup.is_duplicate(record) for record in records)
+        assert dup.is_duplicate(new_record) is False
+        dup.add_record(new_record)
+        assert dup.is_duplicate(new_record) is True
+
+    def test_fingerprint_append(self):
+        strategy_group_key = "1122334455"
+        record_ids = ["{:032x}.1569246480".format(i) for i in range(100)]
+        for start in (0, 50):
+            dup = FingerprintDuplicate(strategy_group_key)
+            for record_id in record_ids[start : start + 50]:
+                dup.add_record(MockRecord({"record_id": record_id, "time": 1569246480}))
+            dup.refresh_cache()
+
+        dup_key = key.ACCESS_DUPLICATE_FINGERPRINT_KEY.get_key(
+            strategy_group_key=strategy_group_key, dt_event_time=1569246480
+        )
+        assert len(key.ACCESS_DUPLICATE_FINGERPRINT_KEY.client.get(dup_key)) == 16 * 100
+
+        dup = FingerprintDuplicate(strategy_group_key)
+        fingerprints = dup.get_record_ids(1569246480)
+        assert sorted(fingerprints) == sorted(dup.fingerprint(record_id) for record_id in record_ids)
+        assert all(dup.is_duplicate(MockRecord({"record_id": r, "time": 1569246480})) for r in record_ids)
+
+    def test_get_duplicate(self, settings):
+        settings.ACCESS_DUPLICATE_BACKEND = "fingerprint"
+        assert isinstance(get_duplicate("123456789", strategy_id=1), FingerprintDuplicate)
+        settings.ACCESS_DUPLICATE_BACKEND = "set"
+        assert type(get_duplicate("123456789", strategy_id=1)) is Duplicate
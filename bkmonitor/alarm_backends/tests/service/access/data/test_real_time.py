@@ -195,3 +195,74 @@ class TestAccessDataProcess(object):
             )
         )
         p.run_handler(once=True)
+
+    def test_poller__batch(self, mock_kafka_consumer, settings):
+        settings.REAL_TIME_ACCESS_BATCH_ENABLED = True
+        service = mock.MagicMock()
+        p = AccessRealTimeDataProcess(service)
+        p.ip = "127.0.0.1"
+        assert p.batch_enabled
+
+        p.cache.hset(
+            p.topic_cache_key,
+            p.ip,
+            json.dumps({"kafka1.service.consul:9092|topic1": "", "kafka2.service.consul:9092|topic2": ""}),
+        )
+        p.run_consumer_manager(once=True)
+        for consumer in p.consumers.values():
+            consumer.poll = lambda *args, **kwargs: {"partition1": [b"{}"], "partition2": [b"{}", b"{}"]}
+        p.run_poller(once=True)
+
+        # 同一个 kafka 集群一次拉取到的数据合并为一个批次
+        assert p.queue.qsize() == 2
+        assert [len(records) for _, records in [p.queue.get(), p.queue.get()]] == [3, 3]
+
+    def test_decode_batch(self):
+        values = [b'{"time": 1}\x00', '{"time": 2}\n', b'{"time": 3}']
+        assert AccessRealTimeDataProcess.decode_batch(values) == [{"time": 1}, {"time": 2}, {"time": 3}]
+
+        # 存在异常数据时，只丢弃异常的数据
+        values.insert(1, b'{"time": ')
+        assert AccessRealTimeDataProcess.decode_batch(values) == [{"time": 1}, {"time": 2}, {"time": 3}]
+
+    def test_flat_batch(self):
+        ConsumerRecord = namedtuple("ConsumerRecord", ["topic", "value"])
+        service = mock.MagicMock()
+        p = AccessRealTimeDataProcess(service)
+        p.topics = {
+            "kafka1.service.consul:9092|topic1": {"strategy_ids": [1, 2, 3], "dimensions": ["bk_target_ip"]},
+        }
+
+        def get_strategy(strategy_id):
+            item = mock.MagicMock()
+            item.query_configs = [{}]
+            strategy = mock.MagicMock(bk_biz_id=3 if strategy_id == 3 else 2, items=[item])
+            item.strategy = strategy
+            return strategy
+
+        strategies = {strategy_id: get_strategy(strategy_id) for strategy_id in [1, 2, 3]}
+        p.get_strategy = lambda strategy_id: strategies[strategy_id]
+
+        records = [
+            ConsumerRecord(
+                "topic1",
+                json.dumps(
+                    {
+                        "time": 1646654276 + index,
+                        "dimensions": {"bk_biz_id": 2 + index % 3, "bk_target_ip": f"127.0.0.{index}"},
+                        "metrics": {"usage": index},
+                    }
+                ).encode(),
+            )
+            for index in range(10)
+        ]
+
+        expected = []
+        for record in records:
+            expected.extend(p.flat("kafka1.service.consul:9092", record))
+        result = p.flat_batch("kafka1.service.consul:9092", records)
+
+        assert len(result) == len(expected)
+        assert sorted((r.raw_data["time"], id(r.items[0])) for r in result) == sorted(
+            (r.raw_data["time"], id(r.items[0])) for r in expected
+        )
@@ -13,7 +13,7 @@ import time
 
 import mock
 from django.conf import settings
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from elasticsearch.helpers import BulkIndexError
 
 from alarm_backends.core.alert import Alert, Event
@@ -247,6 +247,54 @@ class TestProcessor(TestCase):
         result = processor.dedupe_events_to_alerts([event])
         self.assertEqual(0, len(result))
 
+    @override_settings(ALERT_BUILDER_FUSED_ENABLED=True)
+    @mock.patch("alarm_backends.service.alert.builder.processor.send_check_task.delay")
+    @mock.patch("bkmonitor.documents.base.BaseDocument.bulk_create")
+    @mock.patch("bkmonitor.documents.base.BaseDocument.bulk_write")
+    def test_dedupe_events_to_alerts__fused(self, bulk_write, bulk_create, send_check_task):
+        event_time = int(time.time())
+        events = [
+            Event(
+                {
+                    "event_id": str(index),
+                    "plugin_id": "fta-test",
+                    "strategy_id": 123,
+                    "alert_name": "test fused",
+                    "time": event_time,
+                    "tags": [{"key": "device", "value": "cpu{}".format(index)}],
+                    "ip": "10.0.0.1",
+                    "severity": 2,
+                    "dedupe_keys": ["alert_name", "tags.device", "ip"],
+                }
+            )
+            for index in range(2)
+        ]
+        processor = AlertBuilder()
+        alerts = processor.dedupe_events_to_alerts(events)
+        self.assertEqual(2, len(alerts))
+
+        # 告警及流水日志通过一次 bulk 请求写入
+        bulk_create.assert_not_called()
+        self.assertEqual(1, bulk_write.call_count)
+        operations = bulk_write.call_args[0][0]
+        self.assertEqual(["upsert", "upsert", "create", "create"], [action for _, action in operations])
+
+        # 告警缓存及快照均已写入
+        for alert in alerts:
+            cache_key = ALERT_DEDUPE_CONTENT_KEY.get_key(strategy_id=123, dedupe_md5=alert.dedupe_md5)
+            self.assertEqual(alert.id, json.loads(ALERT_DEDUPE_CONTENT_KEY.client.get(cache_key))["id"])
+            snapshot_key = ALERT_SNAPSHOT_KEY.get_key(strategy_id=123, alert_id=alert.id)
+            self.assertIsNotNone(ALERT_SNAPSHOT_KEY.client.get(snapshot_key))
+
+        # 再次处理时，读取到的缓存与非合并模式一致
+        self.assertEqual(
+            {alert.id for alert in processor.list_alerts_content_from_cache(events)},
+            {alert.id for alert in processor.fetch_alerts_content_from_cache(events)},
+        )
+        alerts = processor.dedupe_events_to_alerts(events)
+        self.assertEqual(2, len(alerts))
+        self.assertFalse(any(alert.is_new() for alert in alerts))
+
     @mock.patch("bkmonitor.documents.base.BaseDocument.bulk_create")
     def test_build_alerts__event_drop(self, bulk_create):
         documents = []
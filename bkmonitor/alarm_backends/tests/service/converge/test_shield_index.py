@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase
+
+from alarm_backends.core.alert import Alert, Event
+from alarm_backends.core.cache.shield import ShieldCacheManager
+from alarm_backends.service.converge.shield.shield_obj import (
+    AlertShieldIndex,
+    AlertShieldObj,
+)
+from bkmonitor.utils import extended_json
+
+
+def make_shield(shield_id, category, scope_type, dimension_config, cycle_config=None, begin_hours=0):
+    return {
+        "id": shield_id,
+        "is_enabled": True,
+        "is_deleted": False,
+        "bk_biz_id": 2,
+        "category": category,
+        "scope_type": scope_type,
+        "content": "",
+        "description": "",
+        "begin_time": datetime.now(tz=timezone.utc) + timedelta(hours=begin_hours),
+        "end_time": datetime.now(tz=timezone.utc) + timedelta(hours=begin_hours + 1),
+        "dimension_config": dimension_config,
+        "cycle_config": cycle_config
+        or {"type": 1, "week_list": [], "day_list": [], "begin_time": "", "end_time": ""},
+    }
+
+
+SHIELDS = [
+    make_shield(1, "scope", "biz", {}),
+    make_shield(2, "scope", "ip", {"bk_target_ip": [{"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0}]}),
+    make_shield(3, "scope", "ip", {"bk_target_ip": [{"bk_target_ip": "127.0.0.2", "bk_target_cloud_id": 0}]}),
+    make_shield(4, "scope", "node", {"bk_topo_node": [{"bk_obj_id": "module", "bk_inst_id": 8}]}),
+    make_shield(5, "scope", "node", {"bk_topo_node": [{"bk_obj_id": "set", "bk_inst_id": 3}]}),
+    make_shield(6, "scope", "ip", {"ip": ["127.0.0.3", "127.0.0.1"]}),
+    make_shield(7, "strategy", "biz", {"strategy_id": [10], "level": [1, 2]}),
+    make_shield(8, "scope", "ip", {"bk_target_ip": [{"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 1}]}),
+    make_shield(9, "alert", "", {"alert_id": "not_exists"}),
+    make_shield(10, "scope", "biz", {}, begin_hours=2),
+    make_shield(
+        11,
+        "scope",
+        "ip",
+        {"bk_target_ip": [{"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0}]},
+        begin_hours=2,
+    ),
+    make_shield(
+        12,
+        "dimension",
+        "",
+        {
+            "dimension_conditions": [
+                {"key": "device", "value": ["cpu0"], "method": "eq", "condition": "and"},
+                {"key": "bk_target_ip", "value": ["127.0.0.9"], "method": "neq", "condition": "and"},
+            ]
+        },
+    ),
+    make_shield(
+        13,
+        "dimension",
+        "",
+        {"dimension_conditions": [{"key": "device", "value": ["cpu1"], "method": "eq", "condition": "and"}]},
+    ),
+]
+
+
+# 同一维度下混合带云区域及不带云区域的配置
+MIXED_IP_SHIELDS = [
+    make_shield(1, "scope", "ip", {"ip": [{"ip": "127.0.0.1"}]}),
+    make_shield(2, "scope", "ip", {"ip": [{"ip": "127.0.0.1", "bk_cloud_id": 0}]}),
+    make_shield(3, "scope", "ip", {"ip": [{"ip": "127.0.0.2", "bk_cloud_id": 1}]}),
+    make_shield(4, "scope", "ip", {"bk_target_ip": [{"bk_target_ip": "127.0.0.1"}]}),
+    make_shield(5, "scope", "ip", {"bk_target_ip": [{"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": 0}]}),
+    make_shield(6, "scope", "ip", {"bk_target_ip": [{"bk_target_ip": "127.0.0.2", "bk_target_cloud_id": 1}]}),
+    make_shield(7, "scope", "ip", {"ip": ["127.0.0.2"]}),
+]
+
+
+def make_alert(ip=None, bk_cloud_id=None, bk_topo_node=None, device="cpu0"):
+    alert = Alert.from_event(
+        Event(
+            {
+                "event_id": "1",
+                "bk_biz_id": 2,
+                "plugin_id": "fta-test",
+                "alert_name": "CPU usage high",
+                "time": int(time.time()),
+                "tags": [{"key": "device", "value": device}],
+                "severity": 1,
+                "target_type": "",
+                "target": "",
+                "dedupe_keys": ["alert_name", "tags.device", "target_type", "target"],
+                "extra_info": {},
+            }
+        )
+    )
+    if ip is not None:
+        alert.add_dimension("ip", ip)
+    if bk_cloud_id is not None:
+        alert.add_dimension("bk_cloud_id", bk_cloud_id)
+    if bk_topo_node is not None:
+        alert.add_dimension("bk_topo_node", bk_topo_node)
+    return alert.to_document()
+
+
+ALERTS = [
+    make_alert(),
+    make_alert(ip="127.0.0.1", bk_cloud_id=0),
+    make_alert(ip="127.0.0.1", bk_cloud_id=1, device="cpu1"),
+    make_alert(ip="127.0.0.2", bk_cloud_id=0, bk_topo_node=["module|8", "set|1"]),
+    make_alert(ip="127.0.0.3", bk_cloud_id=0, bk_topo_node=["set|3"]),
+    make_alert(bk_topo_node=["module|9"], device="cpu2"),
+]
+
+
+class TestAlertShieldIndex(TestCase):
+    def tearDown(self):
+        ShieldCacheManager.cache.delete(ShieldCacheManager.CACHE_KEY_TEMPLATE.format(2))
+
+    def test_match_parity(self):
+        index = AlertShieldIndex(SHIELDS)
+        # 业务全局屏蔽及按维度屏蔽的配置无法索引
+        self.assertEqual([index.shield_objs[position].id for position in index.unindexed], [1, 10, 12, 13])
+
+        for alert in ALERTS:
+            expected = [config["id"] for config in SHIELDS if AlertShieldObj(config).is_match(alert)]
+            actual = [shield_obj.id for shield_obj in index.match(alert)]
+            self.assertEqual(actual, expected)
+            # 只对可能命中的屏蔽配置进行匹配
+            self.assertLess(len(index.get_candidates(AlertShieldObj.get_dimension(alert))), len(SHIELDS))
+
+    def test_match_parity_mixed_cloud_id(self):
+        index = AlertShieldIndex(MIXED_IP_SHIELDS)
+        for alert in ALERTS:
+            expected = [config["id"] for config in MIXED_IP_SHIELDS if AlertShieldObj(config).is_match(alert)]
+            actual = [shield_obj.id for shield_obj in index.match(alert)]
+            self.assertEqual(actual, expected)
+
+    def test_get_by_biz(self):
+        ShieldCacheManager.cache.set(ShieldCacheManager.CACHE_KEY_TEMPLATE.format(2), extended_json.dumps(SHIELDS))
+        index = AlertShieldIndex.get_by_biz(2)
+        self.assertEqual(len(index.shield_objs), len(SHIELDS))
+        self.assertIs(index, AlertShieldIndex.get_by_biz(2))
+
+        ShieldCacheManager.cache.set(
+            ShieldCacheManager.CACHE_KEY_TEMPLATE.format(2), extended_json.dumps(SHIELDS[:2])
+        )
+        new_index = AlertShieldIndex.get_by_biz(2)
+        self.assertIsNot(index, new_index)
+        self.assertEqual([shield_obj.id for shield_obj in new_index.shield_objs], [1, 2])
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+
+from alarm_backends.service.detect import DataPoint
+
+RECORD = {
+    "record_id": "342a08e0f85f169a7e099c18db3708ed.1569246480",
+    "value": 99,
+    "values": {"timestamp": 1569246480, "load5": 99},
+    "dimensions": {"ip": "127.0.0.1"},
+    "time": 1569246480,
+    "access_time": 1569246490,
+}
+
+
+class TestDataPoint(object):
+    def test_fields(self):
+        data_point = DataPoint(dict(RECORD), "item")
+        assert not hasattr(data_point, "__dict__")
+        assert data_point.value == 99
+        assert data_point.timestamp == 1569246480
+        assert data_point.dimensions == {"ip": "127.0.0.1"}
+        # 非标准字段从原始数据中读取
+        assert data_point.access_time == 1569246490
+        assert not hasattr(data_point, "__debug__")
+        assert hasattr(DataPoint(dict(RECORD, **{"__debug__": True}), "item"), "__debug__")
+        assert data_point.as_dict() == RECORD
+
+    def test_missing_fields(self):
+        data_point = DataPoint({"record_id": "xxx.1569246480", "time": 1569246480}, "item")
+        assert not hasattr(data_point, "value")
+        with pytest.raises(AttributeError):
+            data_point.values
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import random
+
+import mock
+import pytest
+
+from alarm_backends.core.cache import key
+from alarm_backends.service.detect import DataPoint
+from alarm_backends.service.detect.strategy import HistoryPointFetcher
+from alarm_backends.service.detect.strategy.advanced_ring_ratio import AdvancedRingRatio
+from alarm_backends.service.detect.strategy.advanced_year_round import AdvancedYearRound
+from alarm_backends.service.detect.strategy.os_restart import OsRestart
+from alarm_backends.service.detect.strategy.ring_ratio_amplitude import (
+    RingRatioAmplitude,
+)
+from alarm_backends.service.detect.strategy.simple_ring_ratio import SimpleRingRatio
+from alarm_backends.service.detect.strategy.simple_year_round import SimpleYearRound
+from alarm_backends.service.detect.strategy.year_round_amplitude import (
+    YearRoundAmplitude,
+)
+from alarm_backends.service.detect.strategy.year_round_range import YearRoundRange
+from alarm_backends.tests.service.detect.test_threshold import (
+    Item,
+    Strategy,
+    item_config,
+    mocked_data_source,
+)
+from bkmonitor.models import CacheNode, CacheRouter
+from bkmonitor.utils.common_utils import count_md5
+
+pytestmark = pytest.mark.django_db
+
+NOW = 1569246480
+
+ALGORITHM_CASES = [
+    (SimpleRingRatio, {"floor": 20, "ceil": 20}),
+    (SimpleYearRound, {"floor": 20, "ceil": 20}),
+    (AdvancedRingRatio, {"floor": 20, "ceil": 20, "floor_interval": 3, "ceil_interval": 5}),
+    (AdvancedRingRatio, {"floor": 20, "ceil": 20, "floor_interval": 2, "ceil_interval": 2, "fetch_type": "last"}),
+    (AdvancedYearRound, {"floor": 20, "ceil": 20, "floor_interval": 2, "ceil_interval": 3}),
+    (RingRatioAmplitude, {"ratio": 0.5, "shock": 10, "threshold": 5}),
+    (YearRoundAmplitude, {"ratio": 0.5, "shock": 10, "days": 2, "method": "gte"}),
+    (YearRoundRange, {"ratio": 1, "shock": 5, "days": 3, "method": "gte"}),
+    (OsRestart, None),
+]
+
+
+def make_item(item_id):
+    item = Item(
+        item_id, Strategy(item_id, "os"), "%", [mocked_data_source], ["system.cpu_summary"], item_config["query_configs"]
+    )
+    # 历史数据均已写入缓存，不需要再查询
+    item.query_record = mock.MagicMock(return_value=[])
+    return item
+
+
+def make_point(item, index, timestamp, value):
+    dimensions = {"ip": f"127.0.0.{index}"}
+    return DataPoint(
+        {
+            "record_id": f"{count_md5(dimensions)}.{timestamp}",
+            "value": value,
+            "values": {"timestamp": timestamp, "load5": value},
+            "dimensions": dimensions,
+            "time": timestamp,
+        },
+        item,
+    )
+
+
+def legacy_fetch_history_point(item, point, history_timestamp):
+    """
+    逐个历史时刻读取整个 hash 的原有实现，作为一致性对比的基准
+    """
+    history_key = key.HISTORY_DATA_KEY.get_key(
+        strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
+    )
+    raw_data = key.HISTORY_DATA_KEY.client.hgetall(history_key).get(point.record_id.split(".")[0])
+    if not raw_data:
+        return
+    return DataPoint(json.loads(raw_data), item)
+
+
+def anomaly_messages(detector, data_points):
+    return sorted(
+        (anomaly_point.data_point.record_id, anomaly_point.anomaly_message)
+        for anomaly_point in detector.detect_records(data_points, 1)
+    )
+
+
+class TestHistoryPointFetcher(object):
+    def setup_method(self):
+        CacheRouter.get_node_by_strategy_id(0)
+        CacheNode.refresh_from_settings()
+
+    @pytest.mark.parametrize("case_index", list(range(len(ALGORITHM_CASES))))
+    def test_prefetch_parity(self, case_index):
+        algorithm_cls, config = ALGORITHM_CASES[case_index]
+        item = make_item(1000 + case_index)
+        rng = random.Random(case_index)
+
+        data_points = [
+            make_point(item, index, NOW - cycle * 60, rng.randint(1, 800)) for index in range(5) for cycle in range(2)
+        ]
+        # 不在批次内的数据点，走单独读取
+        outside_point = make_point(item, 9, NOW, rng.randint(1, 800))
+
+        detector = algorithm_cls(config=config)
+        history_points = []
+        for point in data_points + [outside_point]:
+            for history_timestamp in set(detector.get_history_timestamps(item, point.timestamp)):
+                # 部分历史数据缺失
+                if history_timestamp != point.timestamp and rng.random() > 0.2:
+                    history_points.append(
+                        make_point(item, point.dimensions["ip"].split(".")[-1], history_timestamp, rng.randint(0, 800))
+                    )
+        HistoryPointFetcher()._publish_history_points(item, history_points)
+
+        detector.query_history_points(data_points)
+        with mock.patch.object(key.HISTORY_DATA_KEY.client, "hgetall") as hgetall:
+            result = anomaly_messages(detector, data_points + [outside_point])
+            assert not hgetall.called
+
+        legacy_detector = algorithm_cls(config=config)
+        legacy_detector.fetch_history_point = legacy_fetch_history_point
+        assert result == anomaly_messages(legacy_detector, data_points + [outside_point])
+
+    def test_prefetch_batch_fields_only(self):
+        item = make_item(2000)
+        data_points = [make_point(item, index, NOW, 100) for index in range(3)]
+        other_point = make_point(item, 8, NOW - 60, 100)
+        HistoryPointFetcher()._publish_history_points(
+            item, [make_point(item, index, NOW - 60, 100) for index in range(3)] + [other_point]
+        )
+
+        detector = SimpleRingRatio(config={"floor": 20, "ceil": 20})
+        detector.query_history_points(data_points)
+
+        history_key = key.HISTORY_DATA_KEY.get_key(strategy_id=item.strategy.id, item_id=item.id, timestamp=NOW - 60)
+        assert set(detector._local_history_storage) == {history_key}
+        assert set(detector._local_history_storage[history_key]) == {
+            point.record_id.split(".")[0] for point in data_points
+        }
+        assert not item.query_record.called
+
+        # 缺失的历史时刻仍会触发查询
+        detector.query_history_points([make_point(item, 0, NOW + 120, 100)])
+        item.query_record.assert_called_once_with(NOW + 60, NOW + 120)
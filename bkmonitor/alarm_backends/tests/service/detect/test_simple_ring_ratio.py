@@ -118,3 +118,21 @@ class TestSimpleRingRatio(object):
         with pytest.raises(InvalidSimpleRingRatioConfig):
             detect_engine = SimpleRingRatio(config=algorithms_config)
             detect_engine.detect((99, 100000000))
+
+    def test_batch_detect(self):
+        with mock.patch(
+            "alarm_backends.service.detect.strategy." "simple_ring_ratio.SimpleRingRatio.history_point_fetcher",
+            return_value=datapoint99,
+        ):
+            from .test_threshold import mock_datapoint_with_value
+
+            algorithms_config = {"floor": 50, "ceil": 100}
+            detect_engine = SimpleRingRatio(config=algorithms_config)
+            data_points = [mock_datapoint_with_value(value) for value in [200, 100, 0, 99, 198, 49.5, None]]
+
+            batch_results = detect_engine.batch_detect(data_points)
+            scalar_results = detect_engine.scalar_detect(data_points)
+            assert [dp.value for dp, _ in batch_results] == [200, 0, 198, 49.5]
+            assert [(dp, [ap.anomaly_message for ap in result]) for dp, result in batch_results] == [
+                (dp, [ap.anomaly_message for ap in result]) for dp, result in scalar_results
+            ]
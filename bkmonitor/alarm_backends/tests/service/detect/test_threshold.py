@@ -259,3 +259,25 @@ class TestThreshold(object):
 
         anomaly_records = detect_engine.detect_records([datapoint], 1)
         assert anomaly_records[0].anomaly_message == "avg(测试指标) >= 1.0KiB, 当前值1.000977KiB"
+
+    def test_batch_detect(self):
+        algorithms_config = [
+            [{"threshold": 6, "method": "gt"}, {"threshold": 99, "method": "lte"}, {"threshold": 50, "method": "neq"}],
+            [{"threshold": 6, "method": "eq"}],
+        ]
+        detect_engine = Threshold(config=algorithms_config)
+        data_points = [mock_datapoint_with_value(value) for value in [99, 50, 6, 0, 100, 7.5, None]]
+
+        batch_results = detect_engine.batch_detect(data_points)
+        scalar_results = detect_engine.scalar_detect(data_points)
+        assert [(dp.value, len(result)) for dp, result in batch_results] == [(99, 3), (6, 1), (7.5, 3)]
+        assert [(dp, [ap.anomaly_message for ap in result]) for dp, result in batch_results] == [
+            (dp, [ap.anomaly_message for ap in result]) for dp, result in scalar_results
+        ]
+
+        anomaly_result = detect_engine.detect_records(data_points, 1)
+        assert [ap.anomaly_message for ap in anomaly_result] == [
+            "avg(测试指标) > 6.0%且 <= 99.0%且 != 50.0%, 当前值99%",
+            "avg(测试指标) = 6.0%, 当前值6%",
+            "avg(测试指标) > 6.0%且 <= 99.0%且 != 50.0%, 当前值7.5%",
+        ]
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import copy
 
 import arrow
+import mock
 from django.test import TestCase
 
 from alarm_backends.core.cache.key import CHECK_RESULT_CACHE_KEY
@@ -433,3 +434,18 @@ class TestChecker(TestCase):
         anomaly_records, event_record = checker.check()
         self.assertEqual(len(anomaly_records), 3)
         self.assertEqual(event_record["trigger"]["level"], "2")
+
+    def test_prefetch_check_results(self):
+        for anomaly_count in [0, 1, 2, 3]:
+            self.clear_check_result()
+            self.insert_check_result(anomaly_count)
+            checker = AnomalyChecker(POINT, STRATEGY, 1)
+            batch_checker = AnomalyChecker(POINT, STRATEGY, 1)
+            AnomalyChecker.prefetch_check_results([batch_checker])
+            self.assertEqual(len(batch_checker.check_results_cache), 3)
+            expected = checker.check_anomaly()
+
+            # 拉取后不再访问 redis，结果与逐点检测一致
+            with mock.patch.object(CHECK_RESULT_CACHE_KEY.client, "zrangebyscore") as zrangebyscore:
+                self.assertEqual(batch_checker.check_anomaly(), expected)
+                zrangebyscore.assert_not_called()
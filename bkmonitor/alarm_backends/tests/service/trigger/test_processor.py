@@ -175,3 +175,12 @@ class TestProcessor(TestCase):
         processor = TriggerProcessor(1, 1)
         processor.process_point(json.dumps(POINT))
         self.assertEqual(len(processor.event_records), 1)
+
+    def test_process_points_prefetch_error(self):
+        processor = TriggerProcessor(1, 1)
+        with mock.patch(
+            "alarm_backends.service.trigger.processor.AnomalyChecker.prefetch_check_results",
+            side_effect=Exception("redis error"),
+        ):
+            processor.process_points([json.dumps(POINT)])
+        self.assertEqual(len(processor.event_records), 1)
@@ -12,10 +12,12 @@ specific language governing permissions and limitations under the License.
 import abc
 import datetime
 import itertools
+import json
 import logging
+import time
 import traceback
 from abc import ABC
-from typing import List, NamedTuple, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from apm import constants
 from apm.core.discover.precalculation.processor import PrecalculateProcessor
@@ -23,9 +25,11 @@ from apm.core.discover.precalculation.storage import PrecalculateStorage
 from apm.models import ApmApplication, ApmTopoDiscoverRule, TraceDataSource
 from apm.utils.base import divide_biscuit
 from constants.apm import OtlpKey, SpanKind
+from django.conf import settings
 from opentelemetry.semconv.resource import ResourceAttributes
 
 from bkmonitor.utils.thread_backend import ThreadPool
+from core.prometheus import metrics
 
 logger = logging.getLogger("apm")
 
@@ -165,6 +169,50 @@ class DiscoverBase(ABC):
         pass
 
 
+class TraceBuffer:
+    """增量发现时按 trace 缓存 span"""
+
+    def __init__(self):
+        # {traceId: {"spans": {spanId: span}, "first": 首个 span 时间, "last": 最后一个 span 时间, "deferred": 是否为延后处理的 trace}}
+        self.traces = {}
+        self.span_count = 0
+
+    def add(self, span, span_time: int, deferred: bool = False):
+        trace = self.traces.get(span[OtlpKey.TRACE_ID])
+        if trace is None:
+            trace = self.traces[span[OtlpKey.TRACE_ID]] = {
+                "spans": {},
+                "first": span_time,
+                "last": span_time,
+                "deferred": deferred,
+            }
+        # 延后处理的 trace 补齐时可能与窗口内的 span 重复
+        if span[OtlpKey.SPAN_ID] in trace["spans"]:
+            return
+        trace["spans"][span[OtlpKey.SPAN_ID]] = span
+        trace["first"] = min(trace["first"], span_time)
+        trace["last"] = max(trace["last"], span_time)
+        self.span_count += 1
+
+    def closed_trace_ids(self, before: int) -> List[str]:
+        """最后一个 span 早于 before 的 trace，认为已经结束"""
+        return [trace_id for trace_id, trace in self.traces.items() if trace["last"] < before]
+
+    def open_trace_ids(self, before: int) -> List[str]:
+        """按最后一个 span 时间排序的仍可能有后续 span 的 trace"""
+        trace_ids = [trace_id for trace_id, trace in self.traces.items() if trace["last"] >= before]
+        return sorted(trace_ids, key=lambda trace_id: self.traces[trace_id]["last"])
+
+    def pop(self, trace_ids: List[str]) -> Dict[str, dict]:
+        traces = {}
+        for trace_id in trace_ids:
+            trace = self.traces.pop(trace_id, None)
+            if trace is not None:
+                traces[trace_id] = trace
+                self.span_count -= len(trace["spans"])
+        return traces
+
+
 class TopoHandler:
 
     TRACE_ID_CHUNK_MAX_DURATION = 10 * 60
@@ -182,6 +230,15 @@ class TopoHandler:
 
     _ES_MAX_RESULT_WINDOWS = 10000
 
+    # 增量发现单次扫描的最大时间范围(毫秒)，水位落后过多时仅扫描最近的数据
+    INCREMENTAL_MAX_WINDOW = 60 * 60 * 1000
+    # 增量发现时，trace 在扫描位置前该时间(毫秒)内仍有 span 时，认为 trace 可能还有后续 span
+    INCREMENTAL_TRACE_OPEN_GRACE = 60 * 1000
+    # 增量发现时，窗口边界最多延后到下一次处理的 trace 数量
+    INCREMENTAL_MAX_DEFERRED_TRACES = 1000
+    # 增量发现时，最多缓存的 span 数量，超出时不再等待未结束的 trace
+    INCREMENTAL_MAX_BUFFERED_SPANS = 10 * constants.DISCOVER_BATCH_SIZE
+
     def __init__(self, bk_biz_id, app_name):
         self.bk_biz_id = bk_biz_id
         self.app_name = app_name
@@ -325,6 +382,8 @@ class TopoHandler:
 
     def discover(self):
         """application spans discover"""
+        if getattr(settings, "APM_TOPO_DISCOVER_INCREMENTAL_ENABLED", True):
+            return self.incremental_discover()
 
         start = datetime.datetime.now()
         pre_calculate_storage = PrecalculateStorage(self.bk_biz_id, self.app_name)
@@ -335,38 +394,234 @@ class TopoHandler:
         for trace_ids in self.list_trace_ids():
             trace_id_count += len(trace_ids)
 
-            pool = ThreadPool()
-            get_spans_params = [(i, max_result_count) for i in divide_biscuit(trace_ids, per_trace_size)]
-            results = pool.map_ignore_exception(self.list_span_by_trace_ids, get_spans_params)
-            all_spans = list(itertools.chain(*[i for i in results if i]))
+            all_spans = self._list_trace_spans(trace_ids, max_result_count, per_trace_size)
             span_count += len(all_spans)
 
-            topo_spans = [i for i in all_spans if i[OtlpKey.KIND] in self.FILTER_KIND]
+            self._discover_spans(all_spans, pre_calculate_storage)
 
-            # 拓扑发现任务
-            topo_params = [(c, topo_spans, "topo") for c in DiscoverBase.DISCOVER_CLS]
+        metrics.APM_TOPO_DISCOVER_SPAN_COUNT.labels(bk_biz_id=self.bk_biz_id, app_name=self.app_name, mode="full").inc(
+            span_count
+        )
+        logger.info(
+            f"[TopoHandler] discover finished {self.bk_biz_id} {self.app_name} "
+            f"trace count: {trace_id_count} span count: {span_count} "
+            f"elapsed: {(datetime.datetime.now() - start).seconds}s"
+        )
 
-            # 预计算任务
-            if pre_calculate_storage.is_valid:
-                # 灰度应用不参与定时任务中的预计算功能
-                from apm.core.discover.precalculation.daemon import (
-                    PrecalculateGrayRelease,
-                )
+    def _list_trace_spans(self, trace_ids, max_result_count, per_trace_size):
+        """并发拉取 trace 的完整 span"""
+        pool = ThreadPool()
+        get_spans_params = [(i, max_result_count) for i in divide_biscuit(trace_ids, per_trace_size)]
+        results = pool.map_ignore_exception(self.list_span_by_trace_ids, get_spans_params)
+        return list(itertools.chain(*[i for i in results if i]))
+
+    def _discover_spans(self, all_spans, pre_calculate_storage):
+        """将一批 span 交给拓扑发现及预计算处理"""
+        pool = ThreadPool()
+        topo_spans = [i for i in all_spans if i[OtlpKey.KIND] in self.FILTER_KIND]
+
+        # 拓扑发现任务
+        topo_params = [(c, topo_spans, "topo") for c in DiscoverBase.DISCOVER_CLS]
+
+        # 预计算任务
+        if pre_calculate_storage.is_valid:
+            # 灰度应用不参与定时任务中的预计算功能
+            from apm.core.discover.precalculation.daemon import (
+                PrecalculateGrayRelease,
+            )
 
-                if not PrecalculateGrayRelease.exist(self.application.id):
-                    pre_calculate_params = [
-                        (
-                            PrecalculateProcessor(pre_calculate_storage, self.bk_biz_id, self.app_name),
-                            all_spans,
-                            "pre_calculate",
-                        )
-                    ]
-                    topo_params += pre_calculate_params
+            if not PrecalculateGrayRelease.exist(self.application.id):
+                pre_calculate_params = [
+                    (
+                        PrecalculateProcessor(pre_calculate_storage, self.bk_biz_id, self.app_name),
+                        all_spans,
+                        "pre_calculate",
+                    )
+                ]
+                topo_params += pre_calculate_params
+
+        pool.map_ignore_exception(self._discover_handle, topo_params)
+
+    def get_watermark(self) -> dict:
+        """
+        获取增量发现水位
+        {"cursor": 最后处理的 span 的排序值 [time, trace_id, span_id], "deferred": {延后处理的 traceId: 首个 span 时间}}
+        """
+        from alarm_backends.core.cache import key
+
+        watermark_key = key.APM_TOPO_DISCOVER_WATERMARK.get_key(app_id=self.application.id)
+        try:
+            return json.loads(key.APM_TOPO_DISCOVER_WATERMARK.client.get(watermark_key) or "{}")
+        except Exception as e:  # noqa
+            logger.warning(f"[TopoHandler] {self} get discover watermark failed, error: {e}")
+            return {}
 
-            pool.map_ignore_exception(self._discover_handle, topo_params)
+    def set_watermark(self, cursor: list, deferred: Dict[str, int]):
+        from alarm_backends.core.cache import key
 
+        watermark_key = key.APM_TOPO_DISCOVER_WATERMARK.get_key(app_id=self.application.id)
+        key.APM_TOPO_DISCOVER_WATERMARK.client.set(
+            watermark_key,
+            json.dumps({"cursor": cursor, "deferred": deferred}),
+            key.APM_TOPO_DISCOVER_WATERMARK.ttl,
+        )
+
+    def get_discover_window(self) -> Tuple[int, int, Optional[list], Dict[str, int]]:
+        """根据水位计算本次扫描的时间窗口，从上次的游标处继续"""
+        watermark = self.get_watermark()
+        cursor = watermark.get("cursor")
+        end_time = int((time.time() - getattr(settings, "APM_TOPO_DISCOVER_DELAY", 60)) * 1000)
+
+        if not cursor:
+            # 首次发现时，与全量发现的时间范围保持一致
+            return end_time - self.TRACE_ID_CHUNK_MAX_DURATION * 1000, end_time, None, {}
+        if cursor[0] < end_time - self.INCREMENTAL_MAX_WINDOW:
+            # 水位落后过多时仅扫描最近的数据，延后的 trace 不再处理
+            logger.warning(f"[TopoHandler] {self} discover watermark({cursor[0]}) is too old, skip to latest")
+            return end_time - self.INCREMENTAL_MAX_WINDOW, end_time, None, {}
+        return cursor[0], end_time, cursor, watermark.get("deferred") or {}
+
+    def _search_span_pages(self, filters: list, size: int, after: Optional[list] = None):
+        """按 (time, trace_id, span_id) 排序，使用 search_after 分页拉取 span，每页返回 (span, 排序值) 列表"""
+        query = {
+            "query": {"bool": {"filter": filters}},
+            "sort": [{"time": "asc"}, {OtlpKey.TRACE_ID: "asc"}, {OtlpKey.SPAN_ID: "asc"}],
+            "size": size,
+        }
+        while True:
+            if after:
+                query["search_after"] = after
+            response = self.datasource.es_client.search(
+                index=self.datasource.index_name, body=query, request_timeout=60
+            )
+            hits = response["hits"]["hits"]
+            if hits:
+                yield [(i["_source"], i["sort"]) for i in hits]
+                after = hits[-1]["sort"]
+            if len(hits) < size:
+                break
+
+    def list_span_by_window(self, start_time: int, end_time: int, after: Optional[list] = None, size: int = None):
+        """按时间顺序拉取窗口内的 span，从游标处继续"""
+        filters = [{"range": {"time": {"gte": start_time, "lt": end_time, "format": "epoch_millis"}}}]
+        return self._search_span_pages(filters, size or constants.DISCOVER_BATCH_SIZE, after)
+
+    def list_span_by_deferred(self, trace_ids: List[str], start_time: int, end_time: int, size: int = None):
+        """拉取延后处理的 trace 在窗口开始前的 span"""
+        filters = [
+            {"terms": {OtlpKey.TRACE_ID: trace_ids}},
+            {"range": {"time": {"gte": start_time, "lte": end_time, "format": "epoch_millis"}}},
+        ]
+        return self._search_span_pages(filters, size or constants.DISCOVER_BATCH_SIZE)
+
+    def count_duplicate_spans(self, start_time: int, trace_ids: List[str]) -> int:
+        """统计 trace 中早于窗口开始的 span 数量，即按 traceId 拉取完整 trace 时会被重复处理的 span"""
+        query = {
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"terms": {OtlpKey.TRACE_ID: trace_ids}},
+                        {"range": {"time": {"lt": start_time, "format": "epoch_millis"}}},
+                    ]
+                }
+            }
+        }
+        try:
+            return self.datasource.es_client.count(index=self.datasource.index_name, body=query)["count"]
+        except Exception as e:  # noqa
+            logger.warning(f"[TopoHandler] {self} count duplicate spans failed, error: {e}")
+            return 0
+
+    def _flush_traces(self, buffer: TraceBuffer, trace_ids: List[str], pre_calculate_storage, start_time=None):
+        """
+        处理缓存中的 trace，返回处理的 span 数量
+        start_time 不为空时，统计 trace 在窗口开始前已处理过的 span，即增量发现避免重复处理的 span
+        """
+        traces = buffer.pop(trace_ids)
+        spans = [span for trace in traces.values() for span in trace["spans"].values()]
+        if not spans:
+            return 0
+
+        self._discover_spans(spans, pre_calculate_storage)
+        # 延后处理的 trace 在窗口开始前的 span 尚未处理过，不计入
+        trace_ids = [trace_id for trace_id, trace in traces.items() if not trace["deferred"]]
+        if start_time is not None and trace_ids:
+            metrics.APM_TOPO_DISCOVER_DUPLICATE_SPAN_AVOIDED_COUNT.labels(
+                bk_biz_id=self.bk_biz_id, app_name=self.app_name
+            ).inc(self.count_duplicate_spans(start_time, trace_ids))
+        return len(spans)
+
+    def incremental_discover(self):
+        """
+        按水位增量发现，按时间顺序流式扫描上次游标之后写入的 span
+        - span 按 trace 缓存，trace 在扫描位置前 INCREMENTAL_TRACE_OPEN_GRACE 内没有新的 span 时才交给拓扑发现及预计算处理
+        - 扫描结束时(窗口边界)仍可能有后续 span 的 trace 延后到下一次处理，下一次补齐其窗口开始前的 span 后一起处理
+        - 游标为最后扫描的 span 的 (time, trace_id, span_id)，超时中断时从游标处继续
+        """
+        start = datetime.datetime.now()
+        pre_calculate_storage = PrecalculateStorage(self.bk_biz_id, self.app_name)
+        start_time, end_time, cursor, deferred = self.get_discover_window()
+        if start_time >= end_time:
+            return
+
+        max_result_count, _ = self._get_trace_task_splits()
+        size = min(max_result_count, constants.DISCOVER_BATCH_SIZE)
+        # 首次发现时，窗口开始前的 span 未处理过
+        duplicate_start_time = start_time if cursor else None
+        buffer = TraceBuffer()
+        span_count = 0
+        trace_count = 0
+
+        # 上次窗口边界延后处理的 trace，补齐窗口开始前的 span
+        for trace_ids in divide_biscuit(list(deferred), self.PER_ROUND_TRACE_ID_MAX_SIZE):
+            first_time = min(deferred[trace_id] for trace_id in trace_ids)
+            for page in self.list_span_by_deferred(trace_ids, first_time, start_time, size):
+                for span, sort in page:
+                    buffer.add(span, sort[0], deferred=True)
+
+        position = start_time
+        for page in self.list_span_by_window(start_time, end_time, cursor, size):
+            for span, sort in page:
+                buffer.add(span, sort[0])
+            cursor = page[-1][1]
+            position = cursor[0]
+
+            if buffer.span_count >= size:
+                trace_ids = buffer.closed_trace_ids(position - self.INCREMENTAL_TRACE_OPEN_GRACE)
+                if buffer.span_count >= self.INCREMENTAL_MAX_BUFFERED_SPANS:
+                    # 缓存过多时不再等待未结束的 trace
+                    trace_ids = list(buffer.traces)
+                trace_count += len(trace_ids)
+                span_count += self._flush_traces(buffer, trace_ids, pre_calculate_storage, duplicate_start_time)
+
+            if (datetime.datetime.now() - start).seconds >= self.TRACE_ID_CHUNK_MAX_DURATION:
+                logger.warning(
+                    f"[TopoHandler] {self.bk_biz_id} {self.app_name} "
+                    f"incremental discover over {constants.DISCOVER_TIME_RANGE}, break"
+                )
+                break
+        else:
+            # 窗口扫描完成，下次从窗口结束处继续
+            position = end_time
+            cursor = [end_time, "", ""]
+
+        # 窗口边界: 首次出现且仍可能有后续 span 的 trace 延后到下一次处理，其余 trace 在本次处理
+        open_trace_ids = [
+            trace_id
+            for trace_id in buffer.open_trace_ids(position - self.INCREMENTAL_TRACE_OPEN_GRACE)
+            if not buffer.traces[trace_id]["deferred"]
+        ][-self.INCREMENTAL_MAX_DEFERRED_TRACES :]
+        deferred = {trace_id: buffer.traces[trace_id]["first"] for trace_id in open_trace_ids}
+        trace_ids = [trace_id for trace_id in buffer.traces if trace_id not in deferred]
+        trace_count += len(trace_ids)
+        span_count += self._flush_traces(buffer, trace_ids, pre_calculate_storage, duplicate_start_time)
+        self.set_watermark(cursor, deferred)
+
+        metrics.APM_TOPO_DISCOVER_SPAN_COUNT.labels(
+            bk_biz_id=self.bk_biz_id, app_name=self.app_name, mode="incremental"
+        ).inc(span_count)
         logger.info(
-            f"[TopoHandler] discover finished {self.bk_biz_id} {self.app_name} "
-            f"trace count: {trace_id_count} span count: {span_count} "
-            f"elapsed: {(datetime.datetime.now() - start).seconds}s"
+            f"[TopoHandler] incremental discover finished {self.bk_biz_id} {self.app_name} "
+            f"window: [{start_time}, {position}) trace count: {trace_count} span count: {span_count} "
+            f"deferred trace count: {len(deferred)} elapsed: {(datetime.datetime.now() - start).seconds}s"
         )
@@ -25,15 +25,20 @@ from apm.core.discover.precalculation.storage import PrecalculateStorage
 from apm.core.handlers.virtual_metric.metric_handler import BkBaseVirtualMetricHandler
 from apm.core.platform_config import PlatformConfig
 from apm.models import ApmApplication, EbpfApplicationConfig, MetricDataSource
+from apm.utils.base import divide_biscuit
 from core.errors.alarm_backends import LockError
+from core.prometheus import metrics
 from django.conf import settings
 from django.db.models import Q
 
 logger = logging.getLogger("apm")
 
 
-@app.task(ignore_result=True, queue="celery_cron")
-def handler(bk_biz_id, app_name):
+# 每个拓扑发现任务处理的应用数量
+TOPO_DISCOVER_APP_BATCH_SIZE = 5
+
+
+def discover_application(bk_biz_id, app_name):
     start = time.time()
     topo_handler = TopoHandler(bk_biz_id, app_name)
     if topo_handler.is_valid():
@@ -41,6 +46,17 @@ def handler(bk_biz_id, app_name):
     logger.info(f"[topo_discover_cron] end. app_name: {app_name} cost: {time.time() - start}")
 
 
+@app.task(ignore_result=True, queue="celery_cron")
+def handler(applications):
+    """批量发现应用拓扑，全部应用处理完成后上报一次指标"""
+    for bk_biz_id, app_name in applications:
+        try:
+            discover_application(bk_biz_id, app_name)
+        except Exception as e:  # noqa
+            logger.exception(f"[topo_discover_cron] failed. app_name: {app_name}, error: {e}")
+    metrics.report_all()
+
+
 def topo_discover_cron():
     # 10分钟刷新一次
     interval = 10
@@ -51,17 +67,21 @@ def topo_discover_cron():
             "bk_biz_id", "app_name", "id"
         )
     )
+    applications = []
     for index, application in enumerate(to_be_refreshed):
         bk_biz_id, app_name, app_id = application
         try:
             with service_lock(key.APM_TOPO_DISCOVER_LOCK, app_id=app_id):
                 if index % interval == slug:
                     logger.info(f"[topo_discover_cron] start. app_name: {app_name}, app_id: {app_id}")
-                    handler.delay(bk_biz_id, app_name)
+                    applications.append((bk_biz_id, app_name))
         except LockError:
             logger.info(f"skipped: [topo_discover_cron] already running. app_name: {app_name}, app_id: {app_id}")
             continue
 
+    for batch in divide_biscuit(applications, TOPO_DISCOVER_APP_BATCH_SIZE):
+        handler.delay(batch)
+
 
 def refresh_apm_config():
     # 30分钟刷新一次
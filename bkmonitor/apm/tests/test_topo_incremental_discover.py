@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import mock
+import pytest
+
+from apm.core.discover.base import TopoHandler
+
+
+def sort_key(span):
+    return span["time"], span["trace_id"], span["span_id"]
+
+
+class FakeES(object):
+    """
+    按 (time, trace_id, span_id) 排序，支持 search_after 分页的 span 存储
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def add(self, trace_id, span_id, span_time):
+        self.spans.append({"trace_id": trace_id, "span_id": span_id, "time": span_time, "kind": 2})
+
+    def filter(self, body):
+        spans = self.spans
+        for condition in body["query"]["bool"]["filter"]:
+            if "terms" in condition:
+                spans = [i for i in spans if i["trace_id"] in condition["terms"]["trace_id"]]
+            else:
+                time_range = condition["range"]["time"]
+                spans = [
+                    i
+                    for i in spans
+                    if i["time"] >= time_range.get("gte", float("-inf"))
+                    and i["time"] < time_range.get("lt", float("inf"))
+                    and i["time"] <= time_range.get("lte", float("inf"))
+                ]
+        return sorted(spans, key=sort_key)
+
+    def search(self, index, body, **kwargs):
+        spans = self.filter(body)
+        if body.get("search_after"):
+            spans = [i for i in spans if sort_key(i) > tuple(body["search_after"])]
+        return {"hits": {"hits": [{"_source": i, "sort": list(sort_key(i))} for i in spans[: body["size"]]]}}
+
+    def count(self, index, body):
+        return {"count": len(self.filter(body))}
+
+
+@pytest.fixture
+def es():
+    return FakeES()
+
+
+@pytest.fixture
+def topo_handler(es):
+    handler = TopoHandler.__new__(TopoHandler)
+    handler.bk_biz_id = 2
+    handler.app_name = "test_app"
+    handler.datasource = mock.MagicMock()
+    handler.datasource.es_client = es
+    handler.watermark = {}
+    handler.batches = []
+    handler.get_watermark = lambda: handler.watermark
+    handler.set_watermark = lambda cursor, deferred: handler.watermark.update(cursor=cursor, deferred=deferred)
+    handler._get_trace_task_splits = lambda: (10000, 1)
+    handler._discover_spans = lambda spans, storage: handler.batches.append(
+        sorted((i["trace_id"], i["span_id"]) for i in spans)
+    )
+    return handler
+
+
+@pytest.fixture
+def discover(topo_handler, settings):
+    settings.APM_TOPO_DISCOVER_DELAY = 0
+    with mock.patch("apm.core.discover.base.PrecalculateStorage"), mock.patch(
+        "apm.core.discover.base.metrics"
+    ) as metrics:
+
+        def _discover(now):
+            topo_handler.batches = []
+            with mock.patch("time.time", return_value=now / 1000):
+                topo_handler.incremental_discover()
+            return topo_handler.batches
+
+        _discover.metrics = metrics
+        yield _discover
+
+
+def test_get_discover_window(topo_handler, settings):
+    settings.APM_TOPO_DISCOVER_DELAY = 60
+    with mock.patch("time.time", return_value=10000):
+        # 首次发现
+        assert topo_handler.get_discover_window() == (9940000 - 600000, 9940000, None, {})
+
+        # 从上次的游标处继续
+        topo_handler.watermark = {"cursor": [9500000, "t1", "s1"], "deferred": {"t1": 9400000}}
+        assert topo_handler.get_discover_window() == (9500000, 9940000, [9500000, "t1", "s1"], {"t1": 9400000})
+
+        # 水位落后过多
+        topo_handler.watermark = {"cursor": [1000, "t1", "s1"], "deferred": {"t1": 900}}
+        assert topo_handler.get_discover_window() == (9940000 - TopoHandler.INCREMENTAL_MAX_WINDOW, 9940000, None, {})
+
+
+def test_list_span_by_window(topo_handler, es):
+    for span_id, span_time in enumerate([1000, 1000, 1000, 1500, 2000]):
+        es.add("t1", f"s{span_id}", span_time)
+
+    # 同一时间的 span 跨页时不会遗漏
+    pages = list(topo_handler.list_span_by_window(1000, 2000, size=2))
+    assert [[i["span_id"] for i, __ in page] for page in pages] == [["s0", "s1"], ["s2", "s3"]]
+
+    # 从游标处继续
+    pages = list(topo_handler.list_span_by_window(1000, 2000, after=[1000, "t1", "s1"], size=2))
+    assert [[i["span_id"] for i, __ in page] for page in pages] == [["s2", "s3"]]
+
+
+def test_incremental_discover(topo_handler, es, discover):
+    grace = TopoHandler.INCREMENTAL_TRACE_OPEN_GRACE
+    # t1 在窗口内结束，t2 跨越窗口边界
+    es.add("t1", "a", 1000)
+    es.add("t1", "b", 2000)
+    es.add("t2", "a", 600000 - grace // 2)
+    es.add("t2", "b", 600000 + 1000)
+    es.add("t3", "a", 600000 + 2000)
+
+    # 首次发现，窗口边界上的 t2 延后到下一次处理
+    assert discover(600000) == [[("t1", "a"), ("t1", "b")]]
+    assert topo_handler.watermark == {"cursor": [600000, "", ""], "deferred": {"t2": 600000 - grace // 2}}
+
+    # 补齐 t2 在窗口开始前的 span 后一起处理，窗口内已结束的 trace 不会重复处理
+    assert discover(600000 + 2 * grace) == [[("t2", "a"), ("t2", "b"), ("t3", "a")]]
+    assert topo_handler.watermark == {"cursor": [600000 + 2 * grace, "", ""], "deferred": {}}
+    discover.metrics.APM_TOPO_DISCOVER_DUPLICATE_SPAN_AVOIDED_COUNT.labels().inc.assert_called_once_with(0)
+
+    # 没有新的 span
+    assert discover(600000 + 3 * grace) == []
+
+
+def test_incremental_discover__duplicate_span_avoided(topo_handler, es, discover):
+    # 间隔较长的 trace 在上次窗口中已处理过的 span，不会重复处理
+    es.add("t1", "a", 1000)
+    assert discover(600000) == [[("t1", "a")]]
+
+    es.add("t1", "b", 700000)
+    assert discover(800000) == [[("t1", "b")]]
+    discover.metrics.APM_TOPO_DISCOVER_DUPLICATE_SPAN_AVOIDED_COUNT.labels().inc.assert_called_once_with(1)
+
+
+def test_incremental_discover__timeout(topo_handler, es, discover):
+    topo_handler.watermark = {"cursor": [0, "", ""], "deferred": {}}
+    topo_handler.TRACE_ID_CHUNK_MAX_DURATION = 0
+    for trace_id in ["t1", "t2", "t3"]:
+        es.add(trace_id, "a", 1000)
+        es.add(trace_id, "b", 2000)
+
+    # 超时中断时记录游标，未结束的 trace 延后到下一次处理
+    with mock.patch("apm.core.discover.base.constants.DISCOVER_BATCH_SIZE", 3):
+        assert discover(600000) == []
+        assert topo_handler.watermark == {"cursor": [1000, "t3", "a"], "deferred": {"t1": 1000, "t2": 1000, "t3": 1000}}
+
+        topo_handler.TRACE_ID_CHUNK_MAX_DURATION = 10 * 60
+        assert discover(600000) == [[("t1", "a"), ("t1", "b"), ("t2", "a"), ("t2", "b"), ("t3", "a"), ("t3", "b")]]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from bkmonitor.data_source.unify_query.executor import DataSourceQueryExecutor
+from core.errors.bkmonitor.data_source import DataSourceQueryTimeoutError
+
+
+def make_data_source(table, data_source_label="bk_monitor"):
+    return SimpleNamespace(data_source_label=data_source_label, data_type_label="log", table=table)
+
+
+@pytest.fixture(autouse=True)
+def reset_semaphores():
+    DataSourceQueryExecutor._semaphores = {}
+    yield
+    DataSourceQueryExecutor._semaphores = {}
+
+
+class TestDataSourceQueryExecutor:
+    def test_run__keep_order(self):
+        data_sources = [make_data_source(f"table_{i}") for i in range(4)]
+
+        def query(data_source):
+            # 先提交的查询更晚返回
+            time.sleep(0.01 * (4 - int(data_source.table[-1])))
+            return data_source.table
+
+        assert DataSourceQueryExecutor().run(query, data_sources) == [f"table_{i}" for i in range(4)]
+
+    def test_run__backend_concurrency(self, settings):
+        settings.DATASOURCE_QUERY_BACKEND_CONCURRENCY = 2
+        data_sources = [make_data_source(f"table_{i}") for i in range(6)]
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def query(data_source):
+            with lock:
+                running.append(data_source)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(data_source)
+
+        DataSourceQueryExecutor().run(query, data_sources)
+        assert max(max_running) == 2
+
+    def test_run__timeout(self):
+        data_sources = [make_data_source(f"table_{i}") for i in range(2)]
+
+        def query(data_source):
+            time.sleep(0.2)
+
+        with pytest.raises(DataSourceQueryTimeoutError):
+            DataSourceQueryExecutor(timeout=0.05).run(query, data_sources)
+
+    def test_run__exception(self):
+        data_sources = [make_data_source(f"table_{i}") for i in range(3)]
+
+        def query(data_source):
+            if data_source.table == "table_1":
+                raise ValueError(data_source.table)
+            return data_source.table
+
+        with pytest.raises(ValueError):
+            DataSourceQueryExecutor().run(query, data_sources)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from bkmonitor.data_source.unify_query.query import UnifyQuery
+
+PARAMS = {"query_list": [{"reference_name": "a"}]}
+
+UNIFY_QUERY_DATA = {
+    "series": [
+        {
+            "name": "_result0",
+            "columns": ["_time", "a"],
+            "types": ["time", "float"],
+            "group_keys": ["bk_target_ip_table0", "bk_target_cloud_id"],
+            "group_values": ["127.0.0.1", "0"],
+            "values": [["2022-05-18T11:38:00Z", 1.0], ["2022-05-18T11:39:00Z", None], ["2022-05-18T11:40:00Z", 3.0]],
+        },
+        {
+            "name": "_result1",
+            "columns": ["_time", "_value"],
+            "types": ["time", "float"],
+            "group_keys": None,
+            "group_values": [],
+            "values": [["2022-05-18T11:38:00Z", 4.0], ["2022-05-18T11:40:00Z", 5.0]],
+        },
+        {
+            "name": "_result2",
+            "columns": ["_time", "_value"],
+            "types": ["time", "float"],
+            "group_keys": [],
+            "group_values": [],
+            "values": [],
+        },
+    ]
+}
+
+
+class TestUnifyQuery:
+    def test_process_unify_query_data(self):
+        records = UnifyQuery.process_unify_query_data(PARAMS, UNIFY_QUERY_DATA)
+        assert records == [
+            {
+                "bk_target_ip": "127.0.0.1",
+                "bk_target_cloud_id": "0",
+                "_time_": 1652873880000,
+                "a": 1.0,
+                "_result_": 1.0,
+            },
+            {
+                "bk_target_ip": "127.0.0.1",
+                "bk_target_cloud_id": "0",
+                "_time_": 1652873940000,
+                "a": None,
+                "_result_": None,
+            },
+            {
+                "bk_target_ip": "127.0.0.1",
+                "bk_target_cloud_id": "0",
+                "_time_": 1652874000000,
+                "a": 3.0,
+                "_result_": 3.0,
+            },
+            {"_time_": 1652873880000, "_result_": 4.0},
+            {"_time_": 1652874000000, "_result_": 5.0},
+        ]
+
+    def test_parse_unify_query_series(self):
+        series_list = UnifyQuery.parse_unify_query_series(PARAMS, UNIFY_QUERY_DATA, end_time=1652874000000)
+        assert series_list == [
+            {
+                "dimensions": {"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": "0"},
+                "columns": {
+                    "_time_": [1652873880000, 1652873940000],
+                    "a": [1.0, None],
+                    "_result_": [1.0, None],
+                },
+            },
+            {"dimensions": {}, "columns": {"_time_": [1652873880000], "_result_": [4.0]}},
+        ]
+        assert UnifyQuery.series_to_records(series_list) == UnifyQuery.process_unify_query_data(
+            PARAMS, UNIFY_QUERY_DATA, end_time=1652874000000
+        )
+
+    def test_records_to_series(self):
+        records = UnifyQuery.process_unify_query_data(PARAMS, UNIFY_QUERY_DATA)
+        series_list = UnifyQuery.records_to_series(records, ["bk_target_ip", "bk_target_cloud_id"], set())
+        assert UnifyQuery.series_to_records(series_list) == records
+
+        series_list = UnifyQuery.records_to_series(records, None, {"_time_", "_result_", "a"})
+        assert UnifyQuery.series_to_records(series_list) == records
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from bkmonitor.data_source.data_source import DataSource
+from bkmonitor.utils.thread_backend import ThreadPool
+from core.errors.bkmonitor.data_source import DataSourceQueryTimeoutError
+from core.prometheus import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DataSourceQueryExecutor:
+    """
+    多数据源并发查询
+    1. 线程池在进程内共享，总并发数由 DATASOURCE_QUERY_MAX_WORKERS 控制
+    2. 同一数据源后端(数据来源 + 数据类型)的并发数由 DATASOURCE_QUERY_BACKEND_CONCURRENCY 控制
+    3. 超过截止时间或任一查询失败时，取消尚未开始的查询
+    """
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _semaphores: Dict[Tuple[str, str], threading.BoundedSemaphore] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, timeout: Optional[float] = None):
+        if timeout is None:
+            timeout = getattr(settings, "DATASOURCE_QUERY_TIMEOUT", 0)
+        self.timeout = timeout
+        self.deadline = time.time() + timeout if timeout else None
+        self.cancelled = threading.Event()
+
+    @classmethod
+    def get_pool(cls) -> ThreadPoolExecutor:
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=getattr(settings, "DATASOURCE_QUERY_MAX_WORKERS", 8),
+                        thread_name_prefix="datasource_query",
+                    )
+        return cls._pool
+
+    @classmethod
+    def get_semaphore(cls, data_source: DataSource) -> threading.BoundedSemaphore:
+        backend = (data_source.data_source_label, data_source.data_type_label)
+        if backend not in cls._semaphores:
+            with cls._lock:
+                if backend not in cls._semaphores:
+                    cls._semaphores[backend] = threading.BoundedSemaphore(
+                        getattr(settings, "DATASOURCE_QUERY_BACKEND_CONCURRENCY", 4)
+                    )
+        return cls._semaphores[backend]
+
+    def remaining(self) -> Optional[float]:
+        """
+        距离截止时间的剩余秒数，没有截止时间时返回 None
+        """
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0)
+
+    def call(self, func: Callable, data_source: DataSource):
+        """
+        在后端并发限制下执行单个数据源的查询，并上报查询耗时
+        """
+        semaphore = self.get_semaphore(data_source)
+        remaining = self.remaining()
+        if self.cancelled.is_set() or remaining == 0 or not semaphore.acquire(timeout=remaining):
+            raise DataSourceQueryTimeoutError(timeout=self.timeout)
+
+        try:
+            # 等待期间查询可能已被取消
+            if self.cancelled.is_set():
+                raise DataSourceQueryTimeoutError(timeout=self.timeout)
+
+            labels = {
+                "data_source_label": data_source.data_source_label,
+                "data_type_label": data_source.data_type_label,
+                "role": settings.ROLE,
+                "result_table": str(getattr(data_source, "table", "") or getattr(data_source, "index_set_id", "")),
+                "api": "data_source",
+            }
+            with metrics.DATASOURCE_QUERY_TIME.labels(**labels).time():
+                return func(data_source)
+        finally:
+            semaphore.release()
+
+    def run(self, func: Callable[[DataSource], object], data_sources: List[DataSource]) -> List:
+        """
+        并发执行各数据源的查询，结果与 data_sources 顺序一致
+        任一查询失败或超时时，取消其余查询并抛出异常
+        """
+        if len(data_sources) <= 1:
+            return [self.call(func, data_source) for data_source in data_sources]
+
+        pool = self.get_pool()
+        call = ThreadPool.get_func_with_local(self.call)
+        futures = [pool.submit(call, func, data_source) for data_source in data_sources]
+
+        try:
+            return [future.result(timeout=self.remaining()) for future in futures]
+        except (FutureTimeoutError, CancelledError):
+            raise DataSourceQueryTimeoutError(timeout=self.timeout)
+        finally:
+            # 正常结束时所有查询均已完成，此处只会取消异常时尚未开始的查询
+            self.cancelled.set()
+            for future in futures:
+                future.cancel()
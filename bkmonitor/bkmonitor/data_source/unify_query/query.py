@@ -14,7 +14,7 @@ import logging
 import re
 import time
 from itertools import chain
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Set, Union
 
 import arrow
 from django.conf import settings
@@ -24,6 +24,7 @@ from opentelemetry import trace
 
 from bkm_space.utils import bk_biz_id_to_space_uid
 from bkmonitor.data_source.data_source import DataSource, TimeSeriesDataSource
+from bkmonitor.data_source.unify_query.executor import DataSourceQueryExecutor
 from bkmonitor.data_source.unify_query.functions import (
     AggMethods,
     CpAggMethods,
@@ -92,51 +93,121 @@ class UnifyQuery:
         return list(dimensions)
 
     @classmethod
-    def process_unify_query_data(cls, params: Dict, data: Dict, end_time: int = None):
+    def parse_unify_query_series(cls, params: Dict, data: Dict, end_time: int = None) -> List[Dict]:
         """
-        处理统一查询模块返回值
+        按列解析统一查询模块返回值
+        :return: [{
+            "dimensions": {"bk_target_ip": "127.0.0.1"},
+            "columns": {"_time_": [1581350400000, ...], "_result_": [1.0, ...]}
+        }]
         """
         re_dimension = re.compile(r"_table\d+$")
 
-        records = []
+        # 同一个返回值中，各 series 的维度名及时间点基本相同，解析结果在本次处理中复用
+        group_key_cache = {}
+        time_cache = {}
+
+        series_list = []
+        for row in data["series"] or []:
+            if not row["values"]:
+                continue
 
-        rows = data["series"] or []
-        for row in rows:
             dimensions = {}
-            if not row["group_keys"]:
-                row["group_keys"] = []
-            for index, group_key in enumerate(row["group_keys"]):
-                end_string = re_dimension.findall(group_key)
-                if end_string:
-                    end_string = end_string[0]
-                    group_key = group_key[: -len(end_string)]
+            for group_key, group_value in zip(row["group_keys"] or [], row["group_values"]):
+                if group_key not in group_key_cache:
+                    group_key_cache[group_key] = re_dimension.sub("", group_key)
+                dimensions[group_key_cache[group_key]] = group_value
+
+            columns = {}
+            for column, column_type, values in zip(row["columns"], row["types"], zip(*row["values"])):
+                if column_type == "time":
+                    for v in values:
+                        if v not in time_cache:
+                            time_cache[v] = arrow.get(v).timestamp * 1000
+                    values = [time_cache[v] for v in values]
+                else:
+                    values = list(values)
+
+                if column == "_time":
+                    column = "_time_"
+                elif column in ["_result", "_value"]:
+                    column = "_result_"
+
+                columns[column] = values
+
+            # 单指标情况下避免缺少_result_字段
+            if "_result_" not in columns:
+                columns["_result_"] = list(columns[params["query_list"][0]["reference_name"]])
+
+            # 时间戳等于结束时间的数据，不返回
+            if end_time and end_time in columns.get("_time_", []):
+                retained = [index for index, t in enumerate(columns["_time_"]) if t != end_time]
+                columns = {column: [values[index] for index in retained] for column, values in columns.items()}
+                if not retained:
+                    continue
 
-                dimensions[group_key] = row["group_values"][index]
+            series_list.append({"dimensions": dimensions, "columns": columns})
+        return series_list
 
-            for value in row["values"]:
+    @classmethod
+    def series_to_records(cls, series_list: List[Dict]) -> List[Dict]:
+        """
+        将按列组织的数据转换为记录列表
+        """
+        records = []
+        for series in series_list:
+            dimensions = series["dimensions"]
+            columns = list(series["columns"].keys())
+            for values in zip(*series["columns"].values()):
                 record = {**dimensions}
-                for column, column_type, v in zip(row["columns"], row["types"], value):
-                    if column_type == "time":
-                        v = arrow.get(v).timestamp * 1000
-
-                    if column == "_time":
-                        column = "_time_"
-                    elif column in ["_result", "_value"]:
-                        column = "_result_"
-
-                    record[column] = v
-
-                # 单指标情况下避免缺少_result_字段
-                if "_result_" not in record:
-                    record["_result_"] = record[params["query_list"][0]["reference_name"]]
-
-                # 如果是最后一条数据，且时间戳等于结束时间，不返回
-                if end_time and record.get("_time_") == end_time:
-                    continue
-
+                record.update(zip(columns, values))
                 records.append(record)
         return records
 
+    @classmethod
+    def records_to_series(
+        cls, records: List[Dict], dimension_fields: Optional[List[str]], value_fields: Set[str]
+    ) -> List[Dict]:
+        """
+        将记录列表按维度转换为按列组织的数据
+        :param dimension_fields: 维度字段，为 None 时除 value_fields 外的字段均视为维度
+        :param value_fields: 数值字段
+        """
+        if dimension_fields is not None:
+            dimension_fields = set(dimension_fields)
+
+        def is_dimension(key):
+            if dimension_fields is not None:
+                return key in dimension_fields
+            return key not in value_fields
+
+        groups = {}
+        for record in records:
+            dimensions = {key: value for key, value in record.items() if is_dimension(key)}
+            groups.setdefault(tuple(dimensions.items()), (dimensions, []))[1].append(record)
+
+        series_list = []
+        for dimensions, group_records in groups.values():
+            columns = {}
+            for record in group_records:
+                for key in record:
+                    if key not in dimensions:
+                        columns.setdefault(key, None)
+            series_list.append(
+                {
+                    "dimensions": dimensions,
+                    "columns": {column: [record.get(column) for record in group_records] for column in columns},
+                }
+            )
+        return series_list
+
+    @classmethod
+    def process_unify_query_data(cls, params: Dict, data: Dict, end_time: int = None):
+        """
+        处理统一查询模块返回值
+        """
+        return cls.series_to_records(cls.parse_unify_query_series(params, data, end_time=end_time))
+
     def use_unify_query(self) -> bool:
         """
         判断使用使用统一查询模块进行查询
@@ -229,9 +300,11 @@ class UnifyQuery:
         slimit: Optional[int] = None,
         down_sample_range: Optional[int] = "",
         time_alignment: bool = True,
+        columnar: bool = False,
     ) -> List[Dict]:
         """
         使用统一查询模块进行查询
+        :param columnar: 是否返回按列组织的数据
         """
         params = self.get_unify_query_params(start_time, end_time, time_alignment)
         params.update(dict(down_sample_range=down_sample_range, timezone=timezone.get_current_timezone_name()))
@@ -242,7 +315,10 @@ class UnifyQuery:
             span.set_attribute("bk.system", "unify_query")
             span.set_attribute("bk.unify_query.statement", json.dumps(params))
             data = api.unify_query.query_data(**params)
-            data = self.process_unify_query_data(params, data, end_time=end_time)
+            if columnar:
+                data = self.parse_unify_query_series(params, data, end_time=end_time)
+            else:
+                data = self.process_unify_query_data(params, data, end_time=end_time)
         return data
 
     def _query_data_source(
@@ -251,14 +327,14 @@ class UnifyQuery:
         end_time: int,
         limit: Optional[int] = None,
         slimit: Optional[int] = None,
+        timeout: Optional[float] = None,
     ) -> List[Dict]:
         """
-        使用原始数据源进行查询
+        使用原始数据源进行查询，多个数据源并发查询
+        :param timeout: 查询超时时间(秒)，默认使用 DATASOURCE_QUERY_TIMEOUT
         """
 
-        all_data = []
-
-        for datasource in self.data_sources:
+        def query(datasource: DataSource) -> List[Dict]:
             data = datasource.query_data(
                 start_time=start_time,
                 end_time=end_time,
@@ -272,6 +348,10 @@ class UnifyQuery:
                         continue
                     metric_field = datasource.metrics[0].get("alias") or datasource.metrics[0]["field"]
                     record["_result_"] = record[metric_field]
+            return data
+
+        all_data = []
+        for data in DataSourceQueryExecutor(timeout=timeout).run(query, self.data_sources):
             all_data.extend(data)
 
         return all_data
@@ -286,9 +366,16 @@ class UnifyQuery:
         *args,
         **kwargs,
     ) -> List[Dict]:
+        """
+        查询数据
+        :param kwargs: columnar 为 True 时，返回按列组织的数据，参考 parse_unify_query_series
+                       timeout 为多数据源查询的超时时间(秒)
+        """
         if not self.data_sources:
             return []
 
+        columnar = kwargs.get("columnar", False)
+
         if not start_time or not end_time:
             end_time = int(time.time()) * 1000
             start_time = end_time - 60 * 60 * 1000
@@ -337,6 +424,7 @@ class UnifyQuery:
                         slimit=slimit,
                         down_sample_range=down_sample_range,
                         time_alignment=kwargs.get("time_alignment", True),
+                        columnar=columnar,
                     )
             except Exception as e:
                 exc = e
@@ -349,7 +437,10 @@ class UnifyQuery:
                         end_time=end_time,
                         limit=limit,
                         slimit=slimit,
+                        timeout=kwargs.get("timeout"),
                     )
+                if columnar:
+                    data = self.records_to_series(data, self.dimensions, self.get_value_fields())
             except Exception as e:
                 exc = e
 
@@ -361,6 +452,22 @@ class UnifyQuery:
 
         return data
 
+    def query_series(self, *args, **kwargs) -> List[Dict]:
+        """
+        查询数据，返回按列组织的数据，避免逐条构造记录
+        """
+        kwargs["columnar"] = True
+        return self.query_data(*args, **kwargs)
+
+    def get_value_fields(self) -> Set[str]:
+        """
+        获取记录中的非维度字段
+        """
+        value_fields = {"_time_", "_result_"}
+        for data_source in self.data_sources:
+            value_fields.update(metric.get("alias") or metric["field"] for metric in data_source.metrics)
+        return value_fields
+
     def query_dimensions(self, dimension_field: Union[List, str], limit, start_time, end_time, *args, **kwargs):
         """
         查询维度
@@ -372,7 +479,8 @@ class UnifyQuery:
         else:
             if isinstance(dimension_field, list):
                 dimension_field = dimension_field[0]
-            points = self.query_data(start_time, end_time)
+            # 多数据源时通过 query_data 并发查询各数据源
+            points = self.query_data(start_time, end_time, timeout=kwargs.get("timeout"))
             dimensions = set()
             for point in points:
                 dimension = point.get(dimension_field)
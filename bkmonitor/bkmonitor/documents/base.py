@@ -194,6 +194,18 @@ class BaseDocument(Document):
             return cls().parallel_bulk(**params)
         return cls().bulk(max_retries=cls.ES_BULK_MAX_RETRIES, **params)
 
+    @classmethod
+    def bulk_write(cls, operations, **kwargs):
+        """
+        将不同类型文档的写入操作合并为一次 bulk 请求
+        :param operations: [(document, action)]，各文档需使用同一个 ES 连接
+        """
+        actions = [doc.prepare_action(action) for doc, action in operations]
+        if not actions:
+            return 0, []
+        params = dict(actions=actions, request_timeout=cls.ES_REQUEST_TIMEOUT, **kwargs)
+        return cls().bulk(max_retries=cls.ES_BULK_MAX_RETRIES, **params)
+
     @classmethod
     def get_lifecycle_manager(cls):
         return ILM(
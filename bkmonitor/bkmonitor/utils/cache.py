@@ -13,6 +13,7 @@ specific language governing permissions and limitations under the License.
 import functools
 import json
 import logging
+import threading
 import time
 import zlib
 
@@ -24,6 +25,7 @@ from django.utils.encoding import force_bytes
 from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.local import local
 from bkmonitor.utils.request import get_request
+from core.prometheus import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -34,11 +36,32 @@ except Exception:
     mem_cache = cache
 
 
+class InflightCall(object):
+    """
+    进程内正在执行的缓存刷新，供相同缓存key的其他线程等待结果
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.success = False
+
+
 class UsingCache(object):
     min_length = 15
     preset = 6
     key_prefix = "web_cache"
 
+    # 跨进程刷新租约的超时时间(秒)，持有租约的进程异常退出后，租约自动释放
+    lease_timeout = 30
+    # 等待其他线程或进程刷新缓存的最长时间(秒)，超时后自行执行函数
+    lease_wait_timeout = 5
+    # 等待其他进程刷新缓存时的轮询间隔(秒)
+    lease_poll_interval = 0.1
+
+    _inflight_calls = {}
+    _inflight_lock = threading.Lock()
+
     def __init__(
         self,
         cache_type,
@@ -47,6 +70,7 @@ class UsingCache(object):
         compress=True,
         is_cache_func=lambda res: True,
         func_key_generator=lambda func: "{}.{}".format(func.__module__, func.__name__),
+        stale_ttl=None,
     ):
         """
         :param cache_type: 缓存类型
@@ -54,6 +78,7 @@ class UsingCache(object):
         :param compress: 是否进行压缩
         :param is_cache_func: 缓存函数，当函数返回true时，则进行缓存
         :param func_key_generator: 函数标识key的生成逻辑
+        :param stale_ttl: 缓存过期后仍可返回旧数据的时长(秒)，期间由一个请求负责刷新，默认使用缓存类型的配置
         """
         self.cache_type = cache_type
         self.backend_cache_type = backend_cache_type
@@ -73,6 +98,10 @@ class UsingCache(object):
         self.using_cache_type = self._get_using_cache_type()
         self.local_cache_enable = settings.ROLE == "web"
 
+        if stale_ttl is None:
+            stale_ttl = getattr(self.using_cache_type, "stale_ttl", 0)
+        self.stale_ttl = stale_ttl or 0
+
     def _get_username(self):
         username = "backend"
         if self.user_related:
@@ -105,10 +134,20 @@ class UsingCache(object):
             )
         return None
 
+    def _get_key_prefix(self, task_definition):
+        """
+        缓存key前缀，用于统计各缓存的命中情况
+        """
+        return "{}:{}:{}".format(self.key_prefix, self.using_cache_type.key, self.func_key_generator(task_definition))
+
+    @staticmethod
+    def _count(key_prefix, status):
+        metrics.USING_CACHE_REQUEST_COUNT.labels(key_prefix=key_prefix, status=status).inc()
+
     def get_value(self, cache_key, default=None):
         """
         新增一级内存缓存（local）。在同一个请求(线程)中，优先使用内存缓存。
-        一级缓存： local（web服务单次请求中生效）
+        一级缓存： local（web服务单次请求中生效，保存反序列化后的对象，同一请求中共享，调用方不能修改返回值）
         二级缓存： cache（60s生效）
         机制：
         local (miss), cache(miss): cache <- result
@@ -116,8 +155,8 @@ class UsingCache(object):
         """
         if self.local_cache_enable:
             value = getattr(local, cache_key, None)
-            if value:
-                return json.loads(value)
+            if value is not None:
+                return value
 
         value = mem_cache.get(cache_key, default=None) or cache.get(cache_key, default=None)
         if value is None:
@@ -132,7 +171,7 @@ class UsingCache(object):
             except Exception:
                 value = default
         if value and self.local_cache_enable:
-            setattr(local, cache_key, json.dumps(value))
+            setattr(local, cache_key, value)
         return value
 
     def set_value(self, key, value, timeout=60):
@@ -169,15 +208,115 @@ class UsingCache(object):
             cache_key = None
         else:
             cache_key = self._cache_key(task_definition, args, kwargs)
-        if cache_key:
-            return_value = self.get_value(cache_key, default=None)
-
-            if return_value is None:
-                return_value = self._refresh(task_definition, args, kwargs)
+        if not cache_key:
+            return self._cacheless(task_definition, args, kwargs)
+
+        key_prefix = self._get_key_prefix(task_definition)
+        return_value = self.get_value(cache_key, default=None)
+
+        if return_value is None:
+            self._count(key_prefix, "miss")
+            return self._coalesced_refresh(task_definition, args, kwargs, cache_key, key_prefix)
+
+        # 缓存数据已过期，由获取到租约的请求负责刷新，其余请求直接返回过期数据
+        if self.stale_ttl and not self._is_fresh(cache_key):
+            if self._acquire_lease(cache_key):
+                self._count(key_prefix, "miss")
+                try:
+                    return self._refresh(task_definition, args, kwargs)
+                except Exception as e:
+                    # 刷新失败时继续使用过期数据
+                    logger.exception("[Cache]刷新过期缓存[key:%s]失败：%s", cache_key, e)
+                    return return_value
+                finally:
+                    self._release_lease(cache_key)
+            self._count(key_prefix, "stale")
         else:
-            return_value = self._cacheless(task_definition, args, kwargs)
+            self._count(key_prefix, "hit")
         return return_value
 
+    def _coalesced_refresh(self, task_definition, args, kwargs, cache_key, key_prefix):
+        """
+        合并并发的缓存刷新
+        1. 同一进程内，相同缓存key只有一个线程执行函数，其余线程等待其结果
+        2. 跨进程通过租约key保证只有一个进程执行函数，其余进程轮询等待缓存写入
+        等待超时或执行方失败时，自行执行函数
+        """
+        with self._inflight_lock:
+            call = self._inflight_calls.get(cache_key)
+            is_leader = call is None
+            if is_leader:
+                call = self._inflight_calls[cache_key] = InflightCall()
+
+        if not is_leader:
+            if call.event.wait(self.lease_wait_timeout) and call.success:
+                self._count(key_prefix, "coalesced")
+                # 等待方与执行方共享结果，调用方不能修改返回值
+                return call.result
+            return self._refresh(task_definition, args, kwargs)
+
+        try:
+            call.result = self._refresh_with_lease(task_definition, args, kwargs, cache_key, key_prefix)
+            call.success = True
+            return call.result
+        finally:
+            with self._inflight_lock:
+                self._inflight_calls.pop(cache_key, None)
+            call.event.set()
+
+    def _refresh_with_lease(self, task_definition, args, kwargs, cache_key, key_prefix):
+        if self._acquire_lease(cache_key):
+            try:
+                return self._refresh(task_definition, args, kwargs)
+            finally:
+                self._release_lease(cache_key)
+
+        # 其他进程正在刷新，等待其写入缓存；租约释放后仍无缓存(如结果不需要缓存)，则自行执行
+        deadline = time.time() + self.lease_wait_timeout
+        while time.time() < deadline:
+            time.sleep(self.lease_poll_interval)
+            return_value = self.get_value(cache_key, default=None)
+            if return_value is not None:
+                self._count(key_prefix, "coalesced")
+                return return_value
+            if not self._lease_exists(cache_key):
+                break
+        return self._refresh(task_definition, args, kwargs)
+
+    @staticmethod
+    def _lease_key(cache_key):
+        return "{}:lease".format(cache_key)
+
+    @staticmethod
+    def _fresh_key(cache_key):
+        return "{}:fresh".format(cache_key)
+
+    def _acquire_lease(self, cache_key):
+        try:
+            return cache.add(self._lease_key(cache_key), 1, self.lease_timeout)
+        except Exception as e:
+            # 缓存出错不影响主流程
+            logger.warning("[Cache]获取刷新租约[key:%s]失败：%s", cache_key, e)
+            return True
+
+    def _release_lease(self, cache_key):
+        try:
+            cache.delete(self._lease_key(cache_key))
+        except Exception as e:
+            logger.warning("[Cache]释放刷新租约[key:%s]失败：%s", cache_key, e)
+
+    def _lease_exists(self, cache_key):
+        try:
+            return cache.get(self._lease_key(cache_key)) is not None
+        except Exception:
+            return False
+
+    def _is_fresh(self, cache_key):
+        try:
+            return cache.get(self._fresh_key(cache_key)) is not None
+        except Exception:
+            return True
+
     def _refresh(self, task_definition, args, kwargs):
         """
         【强制刷新模式】
@@ -191,7 +330,16 @@ class UsingCache(object):
         # 或者不缓存空数据且数据为空时
         # 需要进行缓存
         if self.is_cache_func(return_value):
-            self.set_value(cache_key, return_value, self.using_cache_type.timeout)
+            timeout = self.using_cache_type.timeout
+            if self.stale_ttl:
+                # 数据多保留 stale_ttl 秒，是否过期由 fresh key 判断
+                self.set_value(cache_key, return_value, timeout + self.stale_ttl)
+                try:
+                    cache.set(self._fresh_key(cache_key), 1, timeout)
+                except Exception as e:
+                    logger.warning("[Cache]写入缓存过期标记[key:%s]失败：%s", cache_key, e)
+            else:
+                self.set_value(cache_key, return_value, timeout)
 
         return return_value
 
@@ -236,20 +384,22 @@ class CacheTypeItem(object):
     缓存类型定义
     """
 
-    def __init__(self, key, timeout, user_related=None, label=""):
+    def __init__(self, key, timeout, user_related=None, label="", stale_ttl=0):
         """
         :param key: 缓存名称
         :param timeout: 缓存超时，单位：s
         :param user_related: 是否用户相关
         :param label: 详细说明
+        :param stale_ttl: 缓存过期后仍可返回旧数据的时长，单位：s，期间由一个请求负责刷新
         """
         self.key = key
         self.timeout = timeout
         self.label = label
         self.user_related = user_related
+        self.stale_ttl = stale_ttl
 
     def __call__(self, timeout):
-        return CacheTypeItem(self.key, timeout, self.user_related, self.label)
+        return CacheTypeItem(self.key, timeout, self.user_related, self.label, self.stale_ttl)
 
 
 class CacheType(object):
@@ -271,7 +421,7 @@ class CacheType(object):
     )
     USER = CacheTypeItem(key="user", timeout=settings.CACHE_USER_TIMEOUT, user_related=False)
     GSE = CacheTypeItem(key="gse", timeout=60 * 5, user_related=False)
-    BCS = CacheTypeItem(key="bcs", timeout=60 * 5, user_related=False)
+    BCS = CacheTypeItem(key="bcs", timeout=60 * 5, user_related=False, stale_ttl=60 * 5)
     METADATA = CacheTypeItem(key="metadata", timeout=60 * 10, user_related=False)
     APM = CacheTypeItem(key="apm", timeout=60 * 10, user_related=False)
     APM_EBPF = CacheTypeItem(key="apm_ebpf", timeout=60 * 10, user_related=False)
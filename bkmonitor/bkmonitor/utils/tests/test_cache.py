@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from bkmonitor.utils import cache as cache_module
+from bkmonitor.utils.cache import CacheTypeItem, UsingCache
+
+
+@pytest.fixture(autouse=True)
+def local_caches(mocker, settings):
+    settings.ENVIRONMENT = "testing"
+    settings.ROLE = "worker"
+    cache = LocMemCache("using_cache_test", {})
+    mocker.patch.object(cache_module, "cache", cache)
+    mocker.patch.object(cache_module, "mem_cache", cache)
+    return cache
+
+
+class Counter(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"value": value, "calls": self.calls}
+
+
+def make_using_cache(**kwargs):
+    return UsingCache(
+        CacheTypeItem(key="test", timeout=60, user_related=False, **kwargs), func_key_generator=lambda func: "test"
+    )
+
+
+def run_concurrently(func, count):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(func(1))) for _ in range(count)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    return results
+
+
+class TestUsingCache:
+    def test_single_flight(self):
+        counter = Counter(delay=0.1)
+        func = make_using_cache()(counter)
+
+        results = run_concurrently(func, 5)
+        assert counter.calls == 1
+        assert results == [{"value": 1, "calls": 1}] * 5
+
+        # 缓存命中
+        assert func(1) == {"value": 1, "calls": 1}
+        assert counter.calls == 1
+
+    def test_wait_for_other_process(self, local_caches):
+        counter = Counter()
+        using_cache = make_using_cache()
+        func = using_cache(counter)
+        cache_key = using_cache._cache_key(counter, (1,), {})
+
+        # 模拟其他进程持有租约并写入缓存
+        local_caches.add(using_cache._lease_key(cache_key), 1, 30)
+        timer = threading.Timer(0.2, using_cache.set_value, args=(cache_key, {"value": 1, "calls": 0}))
+        timer.start()
+
+        assert func(1) == {"value": 1, "calls": 0}
+        assert counter.calls == 0
+        timer.join()
+
+    def test_lease_released_without_value(self, local_caches):
+        counter = Counter()
+        using_cache = make_using_cache()
+        func = using_cache(counter)
+        cache_key = using_cache._cache_key(counter, (1,), {})
+
+        # 其他进程释放租约但没有写入缓存时，不需要等待到超时
+        local_caches.add(using_cache._lease_key(cache_key), 1, 30)
+        timer = threading.Timer(0.2, local_caches.delete, args=(using_cache._lease_key(cache_key),))
+        timer.start()
+
+        start = time.time()
+        assert func(1) == {"value": 1, "calls": 1}
+        assert time.time() - start < using_cache.lease_wait_timeout
+        timer.join()
+
+    def test_stale_while_revalidate(self, local_caches):
+        counter = Counter()
+        using_cache = make_using_cache(stale_ttl=60)
+        func = using_cache(counter)
+        cache_key = using_cache._cache_key(counter, (1,), {})
+
+        assert func(1) == {"value": 1, "calls": 1}
+
+        # 数据过期且其他请求正在刷新时，返回过期数据
+        local_caches.delete(using_cache._fresh_key(cache_key))
+        local_caches.add(using_cache._lease_key(cache_key), 1, 30)
+        assert func(1) == {"value": 1, "calls": 1}
+        assert counter.calls == 1
+
+        # 获取到租约的请求负责刷新
+        local_caches.delete(using_cache._lease_key(cache_key))
+        assert func(1) == {"value": 1, "calls": 2}
+        assert func(1) == {"value": 1, "calls": 2}
+        assert counter.calls == 2
+
+    def test_local_cache_shared(self, settings):
+        settings.ROLE = "web"
+        using_cache = make_using_cache()
+        cache_key = "test_local_cache_shared"
+        using_cache.set_value(cache_key, {"items": [1]})
+        try:
+            # 同一请求中只反序列化一次，后续读取返回同一对象
+            value = using_cache.get_value(cache_key)
+            assert value == {"items": [1]}
+            assert using_cache.get_value(cache_key) is value
+        finally:
+            delattr(cache_module.local, cache_key)
@@ -285,6 +285,29 @@ DISK_FILTER_CONDITION_LIST_V1 = [
 # SQL最大查询条数
 SQL_MAX_LIMIT = 200000
 
+# Resource 批量请求共享线程池大小
+RESOURCE_EXECUTOR_MAX_WORKERS = 50
+# Resource 批量请求默认并发上限(按 Resource 或 API 模块限制)
+RESOURCE_EXECUTOR_DEFAULT_CONCURRENCY = 10
+# Resource 批量请求并发上限，key 为 Resource 路径或 api.{module_name}
+RESOURCE_EXECUTOR_CONCURRENCY = {"api.cmdb": 10, "api.bcs-storage": 5, "api.bcs-cluster-manager": 5}
+
+# 多数据源查询的线程池大小
+DATASOURCE_QUERY_MAX_WORKERS = 8
+# 同一数据源后端(数据来源 + 数据类型)的最大并发查询数
+DATASOURCE_QUERY_BACKEND_CONCURRENCY = 4
+# 多数据源查询超时时间(秒)，0 表示不限制
+DATASOURCE_QUERY_TIMEOUT = 0
+
+# 指标选择器是否使用内存倒排索引进行模糊搜索
+METRIC_SEARCH_INDEX_ENABLED = True
+# 倒排索引命中的候选指标超过该数量时，回退为数据库模糊查询
+METRIC_SEARCH_INDEX_MAX_CANDIDATES = 10000
+# 倒排索引全量重建周期(秒)，用于回收已删除指标占用的内存
+METRIC_SEARCH_INDEX_REBUILD_INTERVAL = 60 * 60
+# 单个进程内倒排索引的最大指标数，超出时按最久未使用淘汰业务索引
+METRIC_SEARCH_INDEX_MAX_METRICS = 2000000
+
 FILE_SYSTEM_TYPE_RT_ID = "system.disk"
 FILE_SYSTEM_TYPE_FIELD_NAME = "device_type"
 FILE_SYSTEM_TYPE_IGNORE = ["iso9660", "tmpfs", "udf"]
@@ -624,6 +624,11 @@ PYINSTRUMENT_URL_ARGUMENT = "bk-monitor-profile"
 
 # 指标缓存任务执行周期数
 METRIC_CACHE_TASK_PERIOD = 10
+# 单业务指标缓存刷新时，各数据源并发刷新数
+METRIC_CACHE_REFRESH_CONCURRENCY = 4
+# 指标缓存写入批量大小范围，按写入耗时自适应调整
+METRIC_CACHE_BATCH_SIZE_MIN = 50
+METRIC_CACHE_BATCH_SIZE_MAX = 2000
 
 # 外部监控域名前缀
 EXTERNAL_PREFIX = ""
@@ -103,6 +103,52 @@ GRAPH_RENDER_SERVICE_ENABLED = True
 # 告警检测范围动态关联开关
 DETECT_RANGE_DYNAMIC_ASSOCIATE = True
 
+# 阈值、简易同环比算法是否启用批量检测
+DETECT_BATCH_ENABLED = True
+
+# trigger 是否批量拉取检测窗口
+TRIGGER_BATCH_ENABLED = True
+
+# 待检测数据队列编码版本，1: json，2: 紧凑编码。滚动升级时需先升级所有 detect/nodata 进程再切换为 2
+ACCESS_DATA_CODEC_VERSION = 1
+
+# CMDB 缓存是否启用进程内缓存，数据按刷新版本失效
+CMDB_LOCAL_CACHE_ENABLED = True
+# CMDB 进程内缓存每类对象的最大数量及过期时间(秒)
+CMDB_LOCAL_CACHE_MAXSIZE = 50000
+CMDB_LOCAL_CACHE_TTL = 600
+# CMDB 刷新版本检查间隔(秒)
+CMDB_LOCAL_CACHE_VERSION_CHECK_INTERVAL = 10
+
+# CMDB 缓存是否增量刷新，只写入发生变化的对象
+CMDB_INCREMENTAL_REFRESH_ENABLED = True
+# CMDB 缓存刷新时按业务并发拉取的线程数
+CMDB_REFRESH_CONCURRENCY = 8
+# 告警生成是否使用合并处理模式，一次性读取告警缓存，并合并缓存写入及ES写入请求
+ALERT_BUILDER_FUSED_ENABLED = True
+# 后台任务按主机分配时使用的一致性哈希算法: ring(md5虚拟节点环)/jump/rendezvous，切换算法会导致任务重新分配
+DISPATCH_HASH_ALGORITHM = "ring"
+# 实时监控是否使用批量模式：大批量拉取 kafka 数据，批量解码并合并推送
+REAL_TIME_ACCESS_BATCH_ENABLED = False
+# 实时监控批量模式下单次拉取的最大消息数
+REAL_TIME_ACCESS_POLL_MAX_RECORDS = 20000
+# 实时监控批量模式下待处理批次队列长度，队列满时阻塞拉取
+REAL_TIME_ACCESS_QUEUE_SIZE = 20
+# 实时监控批量模式下单次处理的最大消息数
+REAL_TIME_ACCESS_HANDLE_BATCH_SIZE = 50000
+# 数据拉取去重实现: set(redis集合保存完整record_id)/fingerprint(64位指纹整数数组)，切换后首个周期可能有少量重复数据
+ACCESS_DUPLICATE_BACKEND = "set"
+# 无数据检测是否批量读写维度检测点，每个监控项的检测点读取、恢复及回写各合并为一次 pipeline 请求
+NODATA_BULK_CHECK_ENABLED = True
+# 延时队列分片数量，第0个分片沿用原来的key；调小后仍会调度使用过的全部分片，不会遗留任务
+DELAY_QUEUE_SHARDS = 1
+# 延时队列单批次调度的最大任务数
+DELAY_QUEUE_BATCH_SIZE = 1000
+# 延时队列最大轮询间隔(秒)，有更早到期的任务时会提前唤醒
+DELAY_QUEUE_POLL_INTERVAL = 0.2
+# 延时队列是否通过 lua 脚本原子领取到期任务
+DELAY_QUEUE_SCRIPT_ENABLED = True
+
 # 告警开关
 ENABLE_PING_ALARM = True
 ENABLE_AGENT_ALARM = True
@@ -519,6 +565,34 @@ TIME_SERIES_METRIC_EXPIRED_DAYS = 30
 MAX_METRICS_FETCH_STEP = os.environ.get("MAX_METRICS_FETCH_STEP", 500)
 METRICS_KEY_PREFIX = "bkmonitor:metrics_"
 METRIC_DIMENSIONS_KEY_PREFIX = "bkmonitor:metric_dimensions_"
+# 自定义指标是否增量同步，仅拉取上次同步水位之后上报的指标，维度及上报时间均未变化的指标不再写入DB
+TIME_SERIES_METRIC_INCREMENTAL_SYNC_ENABLED = True
+# 自定义指标全量同步间隔(秒)，全量同步时清理过期指标
+TIME_SERIES_METRIC_FULL_SYNC_INTERVAL = 6 * 60 * 60
+# 自定义指标维度未变化时，上报时间推进超过该值(秒)才更新DB中的最后更新时间
+TIME_SERIES_METRIC_TOUCH_INTERVAL = 60 * 60
+# 自定义指标同步时，每个进程内并发同步的分组数
+TIME_SERIES_METRIC_SYNC_CONCURRENCY = 4
+# 数据源配置是否批量组装，仅推送配置摘要有变化的数据源
+DATASOURCE_REFRESH_BULK_ENABLED = True
+# 数据源配置摘要未变化时，超过该间隔(秒)仍重新校验 gse 及 consul 上的配置
+DATASOURCE_CONFIG_VERIFY_INTERVAL = 60 * 60
+# 数据源配置推送的并发数
+DATASOURCE_REFRESH_CONCURRENCY = 10
+# ES 生命周期任务是否按集群加载索引目录，各存储共享索引、别名及快照信息
+ES_STORAGE_INDEX_CATALOG_ENABLED = True
+# ES 生命周期任务单次提交的别名变更数量上限
+ES_STORAGE_ALIAS_BATCH_SIZE = 500
+# 空间路由是否按字段内容摘要增量写入 redis，仅通知有变化的字段
+SPACE_ROUTER_INCREMENTAL_PUSH_ENABLED = True
+# 空间路由字段摘要的过期时间(秒)，过期后全部字段重新写入一次
+SPACE_ROUTER_DIGEST_EXPIRE = 24 * 60 * 60
+# 空间路由变更通知的合并窗口(秒)，窗口内的通知去重后批量发送，不大于 0 时立即发送
+SPACE_ROUTER_PUBLISH_WINDOW = 1
+# APM 拓扑是否按水位增量发现，仅扫描上次游标之后写入的 span
+APM_TOPO_DISCOVER_INCREMENTAL_ENABLED = True
+# APM 拓扑增量发现的延迟(秒)，仅扫描该时间之前的 span，等待数据写入完整
+APM_TOPO_DISCOVER_DELAY = 60
 
 # 默认 Kafka 存储集群 ID
 DEFAULT_KAFKA_STORAGE_CLUSTER_ID = None
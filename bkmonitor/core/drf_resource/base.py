@@ -12,6 +12,8 @@ specific language governing permissions and limitations under the License.
 
 import abc
 import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import as_completed, wait
 
 import six
 from django.db import models
@@ -19,8 +21,8 @@ from django.utils.translation import ugettext as _
 from opentelemetry import trace
 
 from bkmonitor.utils.request import get_request_username
-from bkmonitor.utils.thread_backend import ThreadPool
 from core.drf_resource.exceptions import CustomException
+from core.drf_resource.executor import ExecutorRegistry, in_executor_thread
 from core.drf_resource.tasks import run_perform_request
 from core.drf_resource.tools import (
     format_serializer_errors,
@@ -82,6 +84,9 @@ class Resource(six.with_metaclass(abc.ABCMeta, object)):
     # 记录所有`support_data_collect`为True的resource请求)
     support_data_collect = True
 
+    # 批量请求的并发上限，为 None 时按 get_executor_key 从 RESOURCE_EXECUTOR_CONCURRENCY 中获取
+    bulk_concurrency = None
+
     def __init__(self, context=None):
         self.RequestSerializer, self.ResponseSerializer = self._search_serializer_class()
 
@@ -223,26 +228,59 @@ class Resource(six.with_metaclass(abc.ABCMeta, object)):
             validated_response_data = self.validate_response_data(response_data)
             return validated_response_data
 
-    def bulk_request(self, request_data_iterable=None, ignore_exceptions=False):
+    def get_executor_key(self) -> str:
         """
-        基于多线程的批量并发请求
+        批量请求并发限制的维度，默认按 Resource 限制
+        """
+        return "{}.{}".format(self.__class__.__module__, self.__class__.__name__)
+
+    def submit_bulk_request(self, request_data_iterable):
+        """
+        提交批量请求到共享执行器，返回与请求参数顺序一致的 future 列表
         """
         if not isinstance(request_data_iterable, (list, tuple)):
             raise TypeError("'request_data_iterable' object is not iterable")
 
-        pool = ThreadPool()
-        futures = []
-        for request_data in request_data_iterable:
-            futures.append(pool.apply_async(self.request, args=(request_data,)))
+        executor = ExecutorRegistry.get_executor(self.get_executor_key(), self.bulk_concurrency)
+        # 已在共享线程池中执行时，当前线程与线程池一起执行请求，避免等待嵌套请求导致线程池耗尽
+        if in_executor_thread():
+            args_list = [(request_data,) for request_data in request_data_iterable]
+            return executor.submit_caller_runs(self.request, args_list)
+        return [executor.submit(self.request, request_data) for request_data in request_data_iterable]
 
-        pool.close()
-        pool.join()
+    def bulk_request_as_completed(self, request_data_iterable=None, timeout=None):
+        """
+        批量并发请求，按完成顺序返回 (请求序号, future)
+        :param timeout: 超时时间(秒)，超时后取消未开始的请求，并抛出 concurrent.futures.TimeoutError
+        """
+        futures = self.submit_bulk_request(request_data_iterable)
+        future_to_index = {future: index for index, future in enumerate(futures)}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                yield future_to_index[future], future
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def bulk_request(self, request_data_iterable=None, ignore_exceptions=False, timeout=None):
+        """
+        基于多线程的批量并发请求
+        :param timeout: 超时时间(秒)，超时未完成的请求视为失败
+        """
+        futures = self.submit_bulk_request(request_data_iterable)
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
 
         results = []
         exceptions = []
         for future in futures:
             try:
-                results.append(future.get())
+                if future in not_done:
+                    raise FutureTimeoutError(
+                        "bulk request of {} timeout after {}s".format(self.get_resource_name(), timeout)
+                    )
+                results.append(future.result())
             except Exception as e:
                 # 判断是否忽略错误
                 if not ignore_exceptions:
@@ -130,6 +130,12 @@ class APIResource(six.with_metaclass(abc.ABCMeta, CacheResource)):
         self.method = self.method.upper()
         self.session = requests.session()
 
+    def get_executor_key(self) -> str:
+        """
+        同一 API 模块的接口共享批量请求的并发限制
+        """
+        return "api.{}".format(self.module_name)
+
     def request(self, request_data=None, **kwargs):
         request_data = request_data or kwargs
         # 如果参数中传递了用户信息，则记录下来，以便接口请求时使用
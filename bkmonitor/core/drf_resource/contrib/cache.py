@@ -31,6 +31,8 @@ class CacheResource(six.with_metaclass(abc.ABCMeta, Resource)):
     cache_user_related = None
     # 是否使用压缩
     cache_compress = True
+    # 缓存过期后仍可返回旧数据的时长(秒)，为 None 时使用缓存类型的配置
+    cache_stale_ttl = None
 
     def __init__(self, *args, **kwargs):
         # 若cache_type为None则视为关闭缓存功能
@@ -66,6 +68,7 @@ class CacheResource(six.with_metaclass(abc.ABCMeta, Resource)):
             compress=self.cache_compress,
             is_cache_func=self.cache_write_trigger,
             func_key_generator=func_key_generator,
+            stale_ttl=self.cache_stale_ttl,
         )(self.request)
 
     def cache_write_trigger(self, res):
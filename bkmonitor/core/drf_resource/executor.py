@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from bkmonitor.utils.thread_backend import ThreadPool
+from core.prometheus import metrics
+
+logger = logging.getLogger(__name__)
+
+# 标记当前线程是否为共享线程池的工作线程
+_worker_local = threading.local()
+
+
+def in_executor_thread() -> bool:
+    """
+    当前线程是否为共享线程池的工作线程
+    在工作线程中再次提交任务并等待结果可能导致线程池耗尽，此时调用方需要参与执行(见 LimitedExecutor.submit_caller_runs)
+    """
+    return getattr(_worker_local, "in_executor", False)
+
+
+class _Task:
+    """
+    执行器任务，由线程池或提交任务的调用方线程认领后执行，保证只执行一次
+    """
+
+    __slots__ = ("future", "func", "func_with_local", "args", "kwargs", "submit_time", "claimed")
+
+    def __init__(self, func: Callable, args, kwargs):
+        self.future = Future()
+        self.func = func
+        # 线程池中执行时需要同步调用方的 local 数据
+        self.func_with_local = ThreadPool.get_func_with_local(func)
+        self.args = args
+        self.kwargs = kwargs
+        self.submit_time = time.time()
+        self.claimed = False
+
+
+class LimitedExecutor:
+    """
+    限制并发数的执行器
+    超出并发上限的任务在执行器内排队，不占用共享线程池的线程
+    """
+
+    def __init__(self, key: str, pool: ThreadPoolExecutor, concurrency: int):
+        self.key = key
+        self.pool = pool
+        self.concurrency = max(concurrency, 1)
+        self.running = 0
+        self.pending = deque()
+        self.lock = threading.Lock()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        task = _Task(func, args, kwargs)
+        self._dispatch(task)
+        return task.future
+
+    def submit_caller_runs(self, func: Callable, args_list: Iterable) -> List[Future]:
+        """
+        提交一组任务，调用方线程同时执行尚未被线程池认领的任务
+        用于线程池工作线程中的嵌套提交: 线程池空闲时与线程池并行执行，线程池耗尽时由调用方执行全部任务，不会因等待而死锁
+        NOTE: 调用方线程执行的任务不计入并发数，并发数最多超出1
+        """
+        tasks = [_Task(func, args, {}) for args in args_list]
+        for task in tasks:
+            self._dispatch(task)
+        for task in tasks:
+            # 调用方线程中直接执行，不能清理调用方的 local 数据
+            if self._claim(task):
+                self._execute(task, task.func)
+        return [task.future for task in tasks]
+
+    def _dispatch(self, task: _Task):
+        with self.lock:
+            if self.running < self.concurrency:
+                self.running += 1
+            else:
+                self.pending.append(task)
+                return
+        self.pool.submit(self._run, task)
+
+    def _claim(self, task: _Task) -> bool:
+        with self.lock:
+            if task.claimed:
+                return False
+            task.claimed = True
+            return True
+
+    def _execute(self, task: _Task, func: Callable):
+        # 排队期间被取消的任务不再执行
+        if not task.future.set_running_or_notify_cancel():
+            return
+        start_time = time.time()
+        metrics.RESOURCE_EXECUTOR_QUEUE_TIME.labels(key=self.key).observe(start_time - task.submit_time)
+        # 调用方线程可能已是工作线程，执行后恢复原标记
+        in_executor = in_executor_thread()
+        _worker_local.in_executor = True
+        try:
+            task.future.set_result(func(*task.args, **task.kwargs))
+        except BaseException as e:
+            task.future.set_exception(e)
+        finally:
+            _worker_local.in_executor = in_executor
+            metrics.RESOURCE_EXECUTOR_RUN_TIME.labels(key=self.key).observe(time.time() - start_time)
+
+    def _run(self, task: _Task):
+        try:
+            if self._claim(task):
+                self._execute(task, task.func_with_local)
+        finally:
+            with self.lock:
+                next_task = self.pending.popleft() if self.pending else None
+                if next_task is None:
+                    self.running -= 1
+            if next_task is not None:
+                self.pool.submit(self._run, next_task)
+
+
+class ExecutorRegistry:
+    """
+    进程内共享的执行器注册表
+    所有执行器共用一个线程池，按 key (如 API 模块或 Resource) 分别限制并发数
+    """
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _executors: Dict[str, LimitedExecutor] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_pool(cls) -> ThreadPoolExecutor:
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    cls._pool = ThreadPoolExecutor(
+                        max_workers=getattr(settings, "RESOURCE_EXECUTOR_MAX_WORKERS", 50),
+                        thread_name_prefix="resource_executor",
+                    )
+        return cls._pool
+
+    @classmethod
+    def get_concurrency(cls, key: str) -> int:
+        """
+        获取并发上限，RESOURCE_EXECUTOR_CONCURRENCY 中未配置的使用默认值
+        """
+        concurrency_config = getattr(settings, "RESOURCE_EXECUTOR_CONCURRENCY", {})
+        return concurrency_config.get(key, getattr(settings, "RESOURCE_EXECUTOR_DEFAULT_CONCURRENCY", 10))
+
+    @classmethod
+    def get_executor(cls, key: str, concurrency: int = None) -> LimitedExecutor:
+        executor = cls._executors.get(key)
+        if executor is None:
+            pool = cls.get_pool()
+            with cls._lock:
+                executor = cls._executors.get(key)
+                if executor is None:
+                    executor = cls._executors[key] = LimitedExecutor(key, pool, concurrency or cls.get_concurrency(key))
+        return executor
@@ -48,3 +48,9 @@ class FunctionNotSupportedError(DataSourceError):
     code = 3325005
     name = _lazy("计算函数不支持")
     message_tpl = _lazy("函数{func_name}不支持在多指标计算中使用")
+
+
+class DataSourceQueryTimeoutError(DataSourceError):
+    code = 3325006
+    name = _lazy("数据源查询超时")
+    message_tpl = _lazy("数据源查询超时({timeout}s)，未完成的查询已取消")
@@ -16,7 +16,7 @@ from django.conf import settings
 from prometheus_client.exposition import push_to_gateway
 from prometheus_client.utils import INF
 
-from core.prometheus.base import REGISTRY, BkCollectorRegistry, Counter, Histogram
+from core.prometheus.base import REGISTRY, BkCollectorRegistry, Counter, Gauge, Histogram
 from core.prometheus.tools import get_metric_agg_gateway_url, udp_handler
 
 logger = logging.getLogger(__name__)
@@ -139,6 +139,30 @@ ACCESS_EVENT_PROCESS_PULL_DATA_COUNT = Counter(
     labelnames=("data_id",),
 )
 
+ACCESS_REAL_TIME_CONSUMER_LAG = Gauge(
+    name="bkmonitor_access_real_time_consumer_lag",
+    documentation="access 实时监控 kafka 消费延迟条数",
+    labelnames=("topic",),
+)
+
+ACCESS_REAL_TIME_QUEUE_SIZE = Gauge(
+    name="bkmonitor_access_real_time_queue_size",
+    documentation="access 实时监控待处理批次队列长度",
+)
+
+DELAY_QUEUE_BACKLOG = Gauge(
+    name="bkmonitor_delay_queue_backlog",
+    documentation="延时队列积压任务数",
+    labelnames=("backend", "shard"),
+)
+
+DELAY_QUEUE_DISPATCH_LAG = Histogram(
+    name="bkmonitor_delay_queue_dispatch_lag",
+    documentation="延时队列任务实际调度时间与预期调度时间的差值",
+    labelnames=("backend",),
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60, INF),
+)
+
 ACCESS_PROCESS_PUSH_DATA_COUNT = Counter(
     name="bkmonitor_access_process_push_data_count",
     documentation="access 模块数据推送条数",
@@ -302,6 +326,13 @@ ACCESS_TO_ALERT_PROCESS_LATENCY = Histogram(
     buckets=(1, 2, 3, 5, 10, 15, 20, 30, 60, 180, 300, INF),
 )
 
+ALERT_BUILD_STAGE_TIME = Histogram(
+    name="bkmonitor_alert_build_stage_time",
+    documentation="告警(builder)合并处理模式下各阶段耗时",
+    labelnames=("stage",),
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.5, 1, 3, 5, 10, 30, INF),
+)
+
 ALERT_MANAGE_PUSH_DATA_COUNT = Counter(
     name="bkmonitor_alert_manage_push_data_count",
     documentation="alert(manager) 模块数据推送条数",
@@ -439,6 +470,46 @@ ALARM_CACHE_TASK_TIME = Histogram(
     buckets=(10, 30, 60, INF),
 )
 
+ALARM_CACHE_LOCAL_COUNT = Counter(
+    name="bkmonitor_alarm_cache_local_count",
+    documentation="进程内缓存命中、未命中及淘汰次数",
+    labelnames=("type", "status"),
+)
+
+USING_CACHE_REQUEST_COUNT = Counter(
+    name="bkmonitor_using_cache_request_count",
+    documentation="接口缓存命中、未命中、合并请求及返回过期数据次数",
+    labelnames=("key_prefix", "status"),
+)
+
+RESOURCE_EXECUTOR_QUEUE_TIME = Histogram(
+    name="bkmonitor_resource_executor_queue_time",
+    documentation="Resource 批量请求任务排队耗时",
+    labelnames=("key",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, INF),
+)
+
+RESOURCE_EXECUTOR_RUN_TIME = Histogram(
+    name="bkmonitor_resource_executor_run_time",
+    documentation="Resource 批量请求任务执行耗时",
+    labelnames=("key",),
+    buckets=(0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, INF),
+)
+
+# metric list cache
+METRIC_CACHE_REFRESH_TIME = Histogram(
+    name="bkmonitor_metric_cache_refresh_time",
+    documentation="指标缓存刷新耗时",
+    labelnames=("manager", "exception"),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, INF),
+)
+
+METRIC_CACHE_REFRESH_ROWS = Counter(
+    name="bkmonitor_metric_cache_refresh_rows",
+    documentation="指标缓存刷新变更行数",
+    labelnames=("manager", "action"),
+)
+
 # mail report
 MAIL_REPORT_SEND_LATENCY = Histogram(
     name="bkmonitor_mail_report_send_latency",
@@ -453,4 +524,17 @@ MAIL_REPORT_SEND_COUNT = Counter(
     labelnames=("item_id", "status", "exception"),
 )
 
+# apm topo discover
+APM_TOPO_DISCOVER_SPAN_COUNT = Counter(
+    name="bkmonitor_apm_topo_discover_span_count",
+    documentation="APM拓扑发现扫描的span数量",
+    labelnames=("bk_biz_id", "app_name", "mode"),
+)
+
+APM_TOPO_DISCOVER_DUPLICATE_SPAN_AVOIDED_COUNT = Counter(
+    name="bkmonitor_apm_topo_discover_duplicate_span_avoided_count",
+    documentation="APM拓扑增量发现避免重复扫描的span数量",
+    labelnames=("bk_biz_id", "app_name"),
+)
+
 TOTAL_TAG = "__total__"
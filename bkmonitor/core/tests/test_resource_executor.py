@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+from core.drf_resource import Resource
+from core.drf_resource.executor import ExecutorRegistry
+
+
+class SleepResource(Resource):
+    """
+    记录最大并发数的 Resource
+    """
+
+    bulk_concurrency = 2
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def perform_request(self, validated_request_data):
+        cls = self.__class__
+        with cls.lock:
+            cls.running += 1
+            cls.max_running = max(cls.max_running, cls.running)
+        time.sleep(validated_request_data["sleep"])
+        with cls.lock:
+            cls.running -= 1
+        if validated_request_data.get("error"):
+            raise ValueError(validated_request_data["value"])
+        return validated_request_data["value"]
+
+
+class NestedResource(Resource):
+    """
+    在执行器线程中再次发起批量请求的 Resource
+    """
+
+    def perform_request(self, validated_request_data):
+        return SleepResource().bulk_request(validated_request_data["params"], timeout=2)
+
+
+@pytest.fixture(autouse=True)
+def reset_executors():
+    ExecutorRegistry._executors = {}
+    SleepResource.max_running = 0
+    yield
+    ExecutorRegistry._executors = {}
+
+
+class TestBulkRequest:
+    def test_bulk_request(self):
+        params = [{"value": i, "sleep": 0.02} for i in range(6)]
+        assert SleepResource().bulk_request(params) == list(range(6))
+        assert SleepResource.max_running == 2
+
+    def test_bulk_request__ignore_exceptions(self):
+        params = [{"value": 0, "sleep": 0}, {"value": 1, "sleep": 0, "error": True}]
+        assert SleepResource().bulk_request(params, ignore_exceptions=True) == [0, None]
+        with pytest.raises(ValueError):
+            SleepResource().bulk_request(params)
+
+    def test_bulk_request__timeout(self):
+        params = [{"value": i, "sleep": 0.2} for i in range(4)]
+        with pytest.raises(FutureTimeoutError):
+            SleepResource().bulk_request(params, timeout=0.05)
+
+    def test_bulk_request__partial_timeout(self):
+        # 超时的请求视为失败
+        params = [{"value": 0, "sleep": 0}, {"value": 1, "sleep": 0.5}]
+        assert SleepResource().bulk_request(params, ignore_exceptions=True, timeout=0.2) == [0, None]
+
+    def test_bulk_request_as_completed(self):
+        params = [{"value": 0, "sleep": 0.1}, {"value": 1, "sleep": 0}]
+        results = [(index, future.result()) for index, future in SleepResource().bulk_request_as_completed(params)]
+        assert results == [(1, 1), (0, 0)]
+
+    def test_nested_bulk_request(self):
+        # 嵌套的批量请求仍然并发执行
+        params = [{"value": i, "sleep": 0.1} for i in range(2)]
+        assert NestedResource().bulk_request([{"params": params}]) == [[0, 1]]
+        assert SleepResource.max_running == 2
+
+    def test_nested_bulk_request__pool_exhausted(self):
+        # 线程池耗尽时，由调用方线程执行嵌套请求，不会死锁
+        pool, ExecutorRegistry._pool = ExecutorRegistry._pool, ThreadPoolExecutor(max_workers=1)
+        try:
+            params = [{"value": i, "sleep": 0} for i in range(3)]
+            assert NestedResource().bulk_request([{"params": params}], timeout=5) == [[0, 1, 2]]
+        finally:
+            ExecutorRegistry._pool.shutdown(wait=False)
+            ExecutorRegistry._pool = pool
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from metadata import config, models
+from metadata.service.data_source import DataSourceConfigBuilder
+from metadata.utils.hash_util import object_md5
+
+
+class Command(BaseCommand):
+    help = "数据源配置组装压测：对比逐个 to_json 与批量组装的查询次数及耗时，仅组装配置，不推送 gse 及 consul"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=1000, help="参与压测的数据源数量")
+
+    def handle(self, *args, **options):
+        data_id_list = list(
+            models.DataSource.objects.filter(is_enable=True)
+            .order_by("bk_data_id")
+            .values_list("bk_data_id", flat=True)[: options["limit"]]
+        )
+        if not data_id_list:
+            self.stdout.write("no enabled datasource found")
+            return
+        self.stdout.write("datasource: {}".format(len(data_id_list)))
+
+        legacy_configs, legacy_queries, legacy_cost = self.run_legacy(data_id_list)
+        bulk_configs, bulk_queries, bulk_cost = self.run_bulk(data_id_list)
+
+        per_1k = 1000.0 / len(data_id_list)
+        for name, configs, queries, cost in [
+            ("to_json", legacy_configs, legacy_queries, legacy_cost),
+            ("bulk", bulk_configs, bulk_queries, bulk_cost),
+        ]:
+            self.stdout.write(
+                "{}: built {}, queries {} ({:.0f} per 1k), wall time {:.3f}s ({:.3f}s per 1k)".format(
+                    name, len(configs), queries, queries * per_1k, cost, cost * per_1k
+                )
+            )
+
+        mismatch = [
+            data_id
+            for data_id, consul_config in legacy_configs.items()
+            if object_md5(consul_config) != object_md5(bulk_configs.get(data_id))
+        ]
+        self.stdout.write("mismatch: {} {}".format(len(mismatch), mismatch[:10]))
+
+    @staticmethod
+    def run_legacy(data_id_list):
+        configs = {}
+        start = time.time()
+        with CaptureQueriesContext(connections[config.DATABASE_CONNECTION_NAME]) as context:
+            for data_source in models.DataSource.objects.filter(bk_data_id__in=data_id_list):
+                try:
+                    configs[data_source.bk_data_id] = data_source.to_json(is_consul_config=True)
+                except Exception:
+                    continue
+        return configs, len(context.captured_queries), time.time() - start
+
+    @staticmethod
+    def run_bulk(data_id_list):
+        configs = {}
+        start = time.time()
+        with CaptureQueriesContext(connections[config.DATABASE_CONNECTION_NAME]) as context:
+            data_sources = list(models.DataSource.objects.filter(bk_data_id__in=data_id_list))
+            builder = DataSourceConfigBuilder(data_sources, is_consul_config=True)
+            for data_source in data_sources:
+                try:
+                    configs[data_source.bk_data_id] = builder.build(data_source)
+                except Exception:
+                    continue
+        return configs, len(context.captured_queries), time.time() - start
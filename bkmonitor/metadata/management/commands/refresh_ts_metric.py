@@ -27,7 +27,7 @@ class Command(BaseCommand):
         except models.TimeSeriesGroup.DoesNotExist:
             raise CommandError("data id not found from TimeSeriesGroup")
         # 从redis中同步数据到metadata
-        ts_group.update_time_series_metrics()
+        ts_group.update_time_series_metrics(is_incremental=False)
         # TODO: 更新上游缓存或上游DB
 
         print("update time series metric successfully")
@@ -421,6 +421,13 @@ INFLUXDB_ADDITIONAL_INFO_FOR_UNIFY_QUERY = "query_router_info"
 # 查询 vm 存储的路由信息
 QUERY_VM_STORAGE_ROUTER_KEY = "query_vm_router"
 
+# 自定义时序指标增量同步状态，记录各分组已同步的上报时间水位及最近一次全量同步时间
+TIME_SERIES_METRIC_SYNC_STATE_KEY = "bkmonitorv3:ts_metric_sync:state"
+# 自定义时序指标摘要，记录各指标的维度摘要及最近一次写入DB时的上报时间
+TIME_SERIES_METRIC_DIGEST_KEY_PREFIX = "bkmonitorv3:ts_metric_sync:digest_"
+# 数据源配置摘要，记录各数据源最近一次推送成功的 consul 及 gse 路由配置摘要
+DATASOURCE_CONFIG_DIGEST_KEY = "bkmonitorv3:datasource:config_digest"
+
 # 批量写入数量限制
 BULK_CREATE_BATCH_SIZE = 2000
 
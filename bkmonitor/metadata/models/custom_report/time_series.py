@@ -11,7 +11,6 @@ specific language governing permissions and limitations under the License.
 import datetime
 import json
 import logging
-import math
 import time
 from typing import Dict, List, Optional, Set, Tuple
 
@@ -24,15 +23,21 @@ from django.utils.timezone import make_aware
 from django.utils.timezone import now as tz_now
 from django.utils.translation import ugettext as _
 
+from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.db.fields import JsonField
 from metadata import config
-from metadata.models.constants import DB_DUPLICATE_ID
+from metadata.models.constants import (
+    DB_DUPLICATE_ID,
+    TIME_SERIES_METRIC_DIGEST_KEY_PREFIX,
+    TIME_SERIES_METRIC_SYNC_STATE_KEY,
+)
 from metadata.models.result_table import (
     ResultTable,
     ResultTableField,
     ResultTableOption,
 )
 from metadata.models.storage import ClusterInfo
+from metadata.utils.redis_tools import RedisTools
 from packages.utils.redis_client import RedisClient
 
 from .base import CustomGroupBase
@@ -56,6 +61,9 @@ class TimeSeriesGroup(CustomGroupBase):
     # 默认INFLUXDB存储配置
     DEFAULT_STORAGE_CONFIG = {"use_default_rp": True}
 
+    # 增量同步指标时，上报时间水位回退的秒数
+    METRIC_SYNC_WATERMARK_OVERLAP = 5 * 60
+
     # Event字段配置
     STORAGE_EVENT_OPTION = {}
 
@@ -198,9 +206,9 @@ class TimeSeriesGroup(CustomGroupBase):
         ).exists()
 
     @atomic(config.DATABASE_CONNECTION_NAME)
-    def update_metrics(self, metric_info):
+    def update_metrics(self, metric_info, is_incremental=False):
         # 记录是否有指标更新
-        is_updated = TimeSeriesMetric.update_metrics(self.time_series_group_id, metric_info)
+        is_updated = TimeSeriesMetric.update_metrics(self.time_series_group_id, metric_info, is_incremental)
         tag_set = set()
         field_list = []
         tag_total_list = []
@@ -267,34 +275,68 @@ class TimeSeriesGroup(CustomGroupBase):
     def metric_consul_path(self):
         return "{}/influxdb_metrics/{}/time_series_metric".format(config.CONSUL_PATH, self.bk_data_id)
 
-    def get_metrics_from_redis(self):
+    @staticmethod
+    def iter_metrics_with_scores(client, custom_metrics_key: str, min_score: float, max_score: float):
+        """按分值游标分页拉取指标
+
+        按偏移量分页时，redis 每一页都需要从头遍历跳过之前的成员，因此使用上一页最后的分值作为下一页的起点，
+        仅对分值相同的成员使用偏移量
+        """
+        fetch_step = int(settings.MAX_METRICS_FETCH_STEP)
+        cursor, offset = min_score, 0
+        while True:
+            try:
+                metrics_with_scores: List[Tuple[bytes, float]] = client.zrangebyscore(
+                    custom_metrics_key, min=cursor, max=max_score, start=offset, num=fetch_step, withscores=True
+                )
+            except Exception:
+                # 游标分页无法跳过出错的一页，返回部分指标会导致后续指标被当作过期清理，因此中止本次同步
+                logger.exception(
+                    "failed to get metrics from storage, key: %s, min: %s, max: %s",
+                    custom_metrics_key,
+                    cursor,
+                    max_score,
+                )
+                raise
+            if not metrics_with_scores:
+                return
+
+            yield metrics_with_scores
+            if len(metrics_with_scores) < fetch_step:
+                return
+
+            last_score = metrics_with_scores[-1][1]
+            same_score_count = 0
+            for __, score in reversed(metrics_with_scores):
+                if score != last_score:
+                    break
+                same_score_count += 1
+            if last_score == cursor:
+                offset += same_score_count
+            else:
+                cursor, offset = last_score, same_score_count
+
+    def get_metrics_from_redis(self, min_score: Optional[float] = None):
         """从 redis 中获取数据
 
         其中，redis 中数据有 transfer 上报
+        :param min_score: 拉取的最小上报时间，默认为有效期的开始时间
         """
         client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
         custom_metrics_key = f"{settings.METRICS_KEY_PREFIX}{self.bk_data_id}"
         metric_dimensions_key = f"{settings.METRIC_DIMENSIONS_KEY_PREFIX}{self.bk_data_id}"
 
         now_time = tz_now()
-        fetch_step = settings.MAX_METRICS_FETCH_STEP
         expired_days = settings.TIME_SERIES_METRIC_EXPIRED_DAYS
         valid_begin_ts = (now_time - datetime.timedelta(expired_days)).timestamp()
-        metrics_filter_params = {"name": custom_metrics_key, "min": valid_begin_ts, "max": now_time.timestamp()}
+        if min_score is None or min_score < valid_begin_ts:
+            min_score = valid_begin_ts
 
         metrics_info = []
         # 分批拉取 redis 数据，防止大批量数据拖垮
-        for i in range(math.ceil(client.zcount(**metrics_filter_params) / fetch_step)):
-            try:
-                # 0. 首先获取有效期内的所有 metrics
-                metrics_with_scores: List[Tuple[bytes, float]] = client.zrangebyscore(
-                    **metrics_filter_params, start=fetch_step * i, num=fetch_step, withscores=True
-                )
-            except Exception:
-                logger.exception("failed to get metrics from storage, filter params: %s", metrics_filter_params)
-                # metrics 可能存在大批量内容，可容忍某一步出错
-                continue
-
+        for metrics_with_scores in self.iter_metrics_with_scores(
+            client, custom_metrics_key, min_score, now_time.timestamp()
+        ):
             # 1. 获取当前这批 metrics 的 dimensions 信息
             try:
                 dimensions_list: List[bytes] = client.hmget(metric_dimensions_key, [x[0] for x in metrics_with_scores])
@@ -328,17 +370,121 @@ class TimeSeriesGroup(CustomGroupBase):
                 )
         return metrics_info
 
-    def update_time_series_metrics(self) -> bool:
+    @property
+    def metric_digest_key(self) -> str:
+        return f"{TIME_SERIES_METRIC_DIGEST_KEY_PREFIX}{self.time_series_group_id}"
+
+    @staticmethod
+    def get_metric_digest(metric_info: Dict) -> str:
+        """指标的维度摘要，仅维度名变化时需要更新DB"""
+        return count_md5(sorted(metric_info["tag_value_list"].keys()))
+
+    def get_metric_sync_state(self) -> Optional[Dict]:
+        """获取增量同步状态，包含上报时间水位及最近一次全量同步时间，获取失败时返回 None 进行全量同步"""
+        try:
+            state = RedisTools.hget(TIME_SERIES_METRIC_SYNC_STATE_KEY, str(self.time_series_group_id))
+            return json.loads(state) if state else None
+        except Exception:
+            logger.exception("failed to get metric sync state of group->[%s]", self.time_series_group_id)
+            return None
+
+    def save_metric_sync_state(self, metrics_info: List[Dict], state: Dict, is_full: bool = False):
+        """记录已写入DB的指标摘要及同步状态"""
+        digests = {
+            metric_info["field_name"]: f"{self.get_metric_digest(metric_info)}:{metric_info['last_modify_time']}"
+            for metric_info in metrics_info
+        }
+
+        try:
+            if is_full:
+                RedisTools.delete(self.metric_digest_key)
+            if digests:
+                RedisTools.hmset_to_redis(self.metric_digest_key, digests)
+                RedisTools.expire(self.metric_digest_key, settings.TIME_SERIES_METRIC_EXPIRED_DAYS * 24 * 60 * 60)
+            RedisTools.hset_to_redis(
+                TIME_SERIES_METRIC_SYNC_STATE_KEY, str(self.time_series_group_id), json.dumps(state)
+            )
+        except Exception:
+            # 状态未更新时，下次同步会重复拉取，不影响正确性
+            logger.exception("failed to save metric sync state of group->[%s]", self.time_series_group_id)
+
+    def filter_changed_metrics(self, metrics_info: List[Dict]) -> List[Dict]:
+        """过滤出维度变化或上报时间推进超过间隔的指标，其余指标不再写入DB"""
+        try:
+            digests = RedisTools.hmget(
+                self.metric_digest_key, [metric_info["field_name"] for metric_info in metrics_info]
+            )
+        except Exception:
+            logger.exception("failed to get metric digests of group->[%s]", self.time_series_group_id)
+            return metrics_info
+        touch_interval = getattr(settings, "TIME_SERIES_METRIC_TOUCH_INTERVAL", 60 * 60)
+
+        changed_metrics_info = []
+        for metric_info, digest in zip(metrics_info, digests):
+            if not digest:
+                changed_metrics_info.append(metric_info)
+                continue
+            if isinstance(digest, bytes):
+                digest = digest.decode("utf-8")
+            tags_md5, __, last_modify_time = digest.partition(":")
+            try:
+                last_modify_time = float(last_modify_time)
+            except ValueError:
+                last_modify_time = 0
+            if (
+                tags_md5 != self.get_metric_digest(metric_info)
+                or metric_info["last_modify_time"] - last_modify_time >= touch_interval
+            ):
+                changed_metrics_info.append(metric_info)
+        return changed_metrics_info
+
+    def update_time_series_metrics(self, is_incremental: Optional[bool] = None) -> bool:
         """从远端存储中同步TS的指标和维度对应关系
 
+        增量同步时，仅拉取水位之后上报的指标，且跳过维度未变化的指标；
+        超过全量同步间隔或没有同步状态时，进行全量同步，并清理过期指标
+        :param is_incremental: 是否增量同步，默认按配置及同步状态判断
         :return: 返回是否有更新指标
         """
-        metrics_info = self.get_metrics_from_redis()
-
-        # 记录是否有更新，然后推送redis并发布通知
-        is_updated = self.update_metrics(metrics_info)
-        logger.debug("TimeSeriesGroup<%s> already updated all metrics", self.pk)
+        if is_incremental is None:
+            is_incremental = getattr(settings, "TIME_SERIES_METRIC_INCREMENTAL_SYNC_ENABLED", False)
+        if not is_incremental:
+            metrics_info = self.get_metrics_from_redis()
+            # 记录是否有更新，然后推送redis并发布通知
+            is_updated = self.update_metrics(metrics_info)
+            logger.debug("TimeSeriesGroup<%s> already updated all metrics", self.pk)
+            return is_updated
+
+        now_ts = time.time()
+        state = self.get_metric_sync_state()
+        full_sync_interval = getattr(settings, "TIME_SERIES_METRIC_FULL_SYNC_INTERVAL", 6 * 60 * 60)
+        if not state or now_ts - state.get("full_sync_time", 0) >= full_sync_interval:
+            metrics_info = self.get_metrics_from_redis()
+            is_updated = self.update_metrics(metrics_info)
+            state = {
+                "watermark": max([metric_info["last_modify_time"] for metric_info in metrics_info], default=0),
+                "full_sync_time": now_ts,
+            }
+            self.save_metric_sync_state(metrics_info, state, is_full=True)
+            logger.debug("TimeSeriesGroup<%s> already updated all metrics", self.pk)
+            return is_updated
 
+        # 水位回退一段时间，避免 transfer 写入延迟导致遗漏，重复拉取的指标会按摘要过滤
+        metrics_info = self.get_metrics_from_redis(state["watermark"] - self.METRIC_SYNC_WATERMARK_OVERLAP)
+        changed_metrics_info = self.filter_changed_metrics(metrics_info)
+        is_updated = False
+        if changed_metrics_info:
+            is_updated = self.update_metrics(changed_metrics_info, is_incremental=True)
+        state["watermark"] = max(
+            [state["watermark"]] + [metric_info["last_modify_time"] for metric_info in metrics_info]
+        )
+        self.save_metric_sync_state(changed_metrics_info, state)
+        logger.debug(
+            "TimeSeriesGroup<%s> incrementally updated metrics, fetched: %s, changed: %s",
+            self.pk,
+            len(metrics_info),
+            len(changed_metrics_info),
+        )
         return is_updated
 
     def remove_metrics(self):
@@ -770,7 +916,7 @@ class TimeSeriesMetric(models.Model):
         return result
 
     @classmethod
-    def update_metrics(cls, group_id, metric_info_list):
+    def update_metrics(cls, group_id, metric_info_list, is_incremental=False):
         """
         批量的修改/创建某个自定义时序分组下的metric信息
         :param group_id: 自定义分组ID
@@ -783,6 +929,7 @@ class TimeSeriesMetric(models.Model):
             "tag_list": {"module": {"values": ["foo",]}, "set": {"values": ["foo",]}, "partition": {}}
             "last_modify_time": 1464567890123,
         }]
+        :param is_incremental: 是否仅传入了部分指标，此时不清理未传入的指标
         :return: True or raise
         """
         # 0. 判断是否真的存在某个group_id
@@ -800,6 +947,8 @@ class TimeSeriesMetric(models.Model):
         field_name_list = []
         # 需要删除的指标（白名单模式下禁用的指标）
         white_list_disabled_metric = []
+        # 一次性获取分组下已有的指标，避免逐个查询
+        metric_objs = {metric_obj.field_name: metric_obj for metric_obj in cls.objects.filter(group_id=group_id)}
         for metric_info in metric_info_list:
             # 判断传入数据是否包含 values (tag_value_list/tag_list)
             if "tag_value_list" in metric_info:
@@ -824,12 +973,11 @@ class TimeSeriesMetric(models.Model):
                 tag_list.append(cls.TARGET_DIMENSION_NAME)
 
             created = False
-            try:
-                # 判断是否已经存在这个指标
-                metric_obj = cls.objects.get(field_name=field_name, group_id=group_id)
-            except cls.DoesNotExist:
+            # 判断是否已经存在这个指标
+            metric_obj = metric_objs.get(field_name)
+            if metric_obj is None:
                 # 如果不存在指标，创建一个新的
-                metric_obj = cls.objects.create(field_name=field_name, group_id=group_id)
+                metric_obj = metric_objs[field_name] = cls.objects.create(field_name=field_name, group_id=group_id)
                 created = True
                 logger.info("new metric_obj->[{}] is create for group_id->[{}].".format(metric_obj, group_id))
                 # NOTE: 如果有新增, 则标识要更新，删除时，可以不立即更新
@@ -867,7 +1015,7 @@ class TimeSeriesMetric(models.Model):
             cls.objects.filter(group_id=group_id, field_id__in=white_list_disabled_metric).delete()
 
         # 判断是否存在需要删除的字段，仅在自动发现模式下需要
-        if is_auto_discovery:
+        if is_auto_discovery and not is_incremental:
             need_delete_query = cls.objects.filter(group_id=group_id).exclude(field_name__in=field_name_list)
             if need_delete_query.exists():
                 deleted_field_list = list(need_delete_query.values_list("field_name", flat=True))
@@ -176,7 +176,36 @@ class DataSource(models.Model):
 
     def to_json(self, is_consul_config=False, with_rt_info=True):
         """返回当前data_id的配置字符串"""
+        result_config = self.compose_config(DataSourceOption.get_option(self.bk_data_id))
 
+        if with_rt_info:
+            # 获取ResultTable的配置
+            result_table_id_list = [
+                info.table_id for info in DataSourceResultTable.objects.filter(bk_data_id=self.bk_data_id)
+            ]
+
+            # 获取存在的结果表
+            real_table_id_list = ResultTable.objects.filter(
+                table_id__in=result_table_id_list, is_deleted=False, is_enable=True
+            ).values_list("table_id", flat=True)
+            # 批量获取结果表级别选项
+            table_id_option_dict = ResultTableOption.batch_result_table_option(real_table_id_list)
+            # 获取字段信息
+            table_field_dict = ResultTableField.batch_get_fields(real_table_id_list, is_consul_config)
+            # 判断需要未删除，而且在启用状态的结果表
+            result_config["result_table_list"] = self.compose_result_table_list(
+                ResultTable.objects.filter(table_id__in=result_table_id_list, is_deleted=False, is_enable=True),
+                table_id_option_dict,
+                table_field_dict,
+            )
+
+        return result_config
+
+    def compose_config(self, option):
+        """
+        组装数据源级别的配置，不包含结果表信息
+        :param option: 数据源选项
+        """
         mq_config = {
             "storage_config": {"topic": self.mq_config.topic, "partition": self.mq_config.partition},
             "batch_size": self.mq_config.batch_size,
@@ -187,12 +216,12 @@ class DataSource(models.Model):
         mq_config.update(self.mq_cluster.consul_config)
         mq_config["cluster_config"].pop("last_modify_time")
 
-        result_config = {
+        return {
             "bk_data_id": self.bk_data_id,
             "data_id": self.bk_data_id,
             "mq_config": mq_config,
             "etl_config": self.etl_config,
-            "option": DataSourceOption.get_option(self.bk_data_id),
+            "option": option,
             "type_label": self.type_label,
             "source_label": self.source_label,
             "token": self.token,
@@ -203,50 +232,45 @@ class DataSource(models.Model):
             "space_uid": self.space_uid,
         }
 
-        if with_rt_info:
-            # 获取ResultTable的配置
-            result_table_id_list = [
-                info.table_id for info in DataSourceResultTable.objects.filter(bk_data_id=self.bk_data_id)
-            ]
-
-            result_table_info_list = []
-            # 获取存在的结果表
-            real_table_id_list = ResultTable.objects.filter(
-                table_id__in=result_table_id_list, is_deleted=False, is_enable=True
-            ).values_list("table_id", flat=True)
-            # 批量获取结果表级别选项
-            table_id_option_dict = ResultTableOption.batch_result_table_option(real_table_id_list)
-            # 获取字段信息
-            table_field_dict = ResultTableField.batch_get_fields(real_table_id_list, is_consul_config)
-            # 判断需要未删除，而且在启用状态的结果表
-            for result_table in ResultTable.objects.filter(
-                table_id__in=result_table_id_list, is_deleted=False, is_enable=True
-            ):
-                shipper_list = []
-                # NOTE: 现阶段 transfer 识别不了 `victoria_metrics`，针对 `victoria_metrics` 类型的存储，跳过写入 consul
-                for real_table in result_table.real_storage_list:
-                    consul_config = real_table.consul_config
-                    if consul_config:
-                        if consul_config.get("cluster_type") in IGNORED_STORAGE_CLUSTER_TYPES:
-                            continue
-                        shipper_list.append(consul_config)
-
-                result_table_info_list.append(
-                    {
-                        "bk_biz_id": result_table.bk_biz_id,
-                        "result_table": result_table.table_id,
-                        "shipper_list": shipper_list,
-                        # 如果是自定义上报的情况，不需要将字段信息写入到consul上
-                        "field_list": table_field_dict.get(result_table.table_id, [])
-                        if not self.is_custom_timeseries_report
-                        else [],
-                        "schema_type": result_table.schema_type,
-                        "option": table_id_option_dict.get(result_table.table_id, {}),
-                    }
-                )
-            result_config["result_table_list"] = result_table_info_list
+    def compose_result_table_list(self, result_tables, table_id_option_dict, table_field_dict, real_storage_dict=None):
+        """
+        组装结果表级别的配置
+        :param result_tables: 未删除且启用的结果表
+        :param table_id_option_dict: 结果表选项 {table_id: {option_name: option_value}}
+        :param table_field_dict: 结果表字段 {table_id: [field_info]}
+        :param real_storage_dict: 预取的结果表存储 {table_id: [real_storage]}，为 None 时逐个结果表查询
+        """
+        result_table_info_list = []
+        for result_table in result_tables:
+            if real_storage_dict is None:
+                real_storage_list = result_table.real_storage_list
+            else:
+                real_storage_list = real_storage_dict.get(result_table.table_id, [])
+
+            shipper_list = []
+            # NOTE: 现阶段 transfer 识别不了 `victoria_metrics`，针对 `victoria_metrics` 类型的存储，跳过写入 consul
+            for real_table in real_storage_list:
+                consul_config = real_table.consul_config
+                if consul_config:
+                    if consul_config.get("cluster_type") in IGNORED_STORAGE_CLUSTER_TYPES:
+                        continue
+                    shipper_list.append(consul_config)
+
+            result_table_info_list.append(
+                {
+                    "bk_biz_id": result_table.bk_biz_id,
+                    "result_table": result_table.table_id,
+                    "shipper_list": shipper_list,
+                    # 如果是自定义上报的情况，不需要将字段信息写入到consul上
+                    "field_list": table_field_dict.get(result_table.table_id, [])
+                    if not self.is_custom_timeseries_report
+                    else [],
+                    "schema_type": result_table.schema_type,
+                    "option": table_id_option_dict.get(result_table.table_id, {}),
+                }
+            )
 
-        return result_config
+        return result_table_info_list
 
     @property
     def gse_route_config(self):
@@ -824,9 +848,10 @@ class DataSource(models.Model):
             new_transfer_cluster_id,
         )
 
-    def refresh_consul_config(self):
+    def refresh_consul_config(self, consul_config=None):
         """
         更新consul配置，告知ETL等其他依赖模块配置有所更新
+        :param consul_config: 已组装好的consul配置，为 None 时通过 to_json 获取
         :return: True | raise Exception
         """
         # 如果数据源没有启用，则不用刷新 consul 配置
@@ -842,7 +867,9 @@ class DataSource(models.Model):
         hash_consul = consul_tools.HashConsul()
 
         # 2. 刷新当前data_id的配置
-        hash_consul.put(key=self.consul_config_path, value=self.to_json(is_consul_config=True))
+        if consul_config is None:
+            consul_config = self.to_json(is_consul_config=True)
+        hash_consul.put(key=self.consul_config_path, value=consul_config)
         logger.info(
             "data_id->[{}] has update config to ->[{}] success".format(self.bk_data_id, self.consul_config_path)
         )
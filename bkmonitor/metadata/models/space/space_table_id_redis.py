@@ -43,31 +43,64 @@ from metadata.models.space.ds_rt import (
     get_table_id_cluster_id,
     get_table_info_for_influxdb_and_vm,
 )
-from metadata.utils.redis_tools import RedisTools
+from metadata.utils.redis_tools import RedisHashSyncer, RedisPublisher
 
 logger = logging.getLogger("metadata")
 
+# 空间路由变更通知在时间窗口内合并去重后批量发送
+space_router_publisher = RedisPublisher(window=getattr(settings, "SPACE_ROUTER_PUBLISH_WINDOW", 1))
+
 
 class SpaceTableIDRedis:
     """空间路由结果表数据推送 redis 相关功能"""
 
+    ROUTER_KEY_CHANNELS = {
+        SPACE_TO_RESULT_TABLE_KEY: SPACE_TO_RESULT_TABLE_CHANNEL,
+        FIELD_TO_RESULT_TABLE_KEY: FIELD_TO_RESULT_TABLE_CHANNEL,
+        DATA_LABEL_TO_RESULT_TABLE_KEY: DATA_LABEL_TO_RESULT_TABLE_CHANNEL,
+        RESULT_TABLE_DETAIL_KEY: RESULT_TABLE_DETAIL_CHANNEL,
+    }
+
+    def __init__(self):
+        # 按字段内容摘要增量写入，仅通知内容有变化的字段
+        enabled = getattr(settings, "SPACE_ROUTER_INCREMENTAL_PUSH_ENABLED", True)
+        expire = getattr(settings, "SPACE_ROUTER_DIGEST_EXPIRE", 24 * 60 * 60)
+        self.syncers = {
+            key: RedisHashSyncer(key, channel, publisher=space_router_publisher, expire=expire, enabled=enabled)
+            for key, channel in self.ROUTER_KEY_CHANNELS.items()
+        }
+        # 记录当前实例累计写入、跳过及通知的字段数量
+        self.sync_stats = {key: {"written": 0, "skipped": 0, "published": 0} for key in self.ROUTER_KEY_CHANNELS}
+
+    def _sync_to_redis(self, key: str, field_value: Dict[str, str], is_publish: Optional[bool] = False) -> Dict:
+        """写入有变化的字段，并按需通知"""
+        stats = self.syncers[key].sync(field_value, is_publish=is_publish)
+        for name, count in stats.items():
+            self.sync_stats[key][name] += count
+        logger.info(
+            "sync redis key: %s, written: %s, skipped: %s, published: %s",
+            key,
+            stats["written"],
+            stats["skipped"],
+            stats["published"],
+        )
+        return stats
+
     def push_space_table_ids(self, space_type: str, space_id: str, is_publish: Optional[bool] = False):
         """推送空间及对应的结果表和过滤条件"""
         logger.info("start to push space table_id data, space_type: %s, space_id: %s", space_type, space_id)
         # NOTE: 为防止 space_id 传递非字符串，转换一次
         space_id = str(space_id)
         # 过滤空间关联的数据源信息
+        # 如果指定要更新，则在数据有变化时通知
         if space_type == SpaceTypes.BKCC.value:
-            self._push_bkcc_space_table_ids(space_type, space_id)
+            self._push_bkcc_space_table_ids(space_type, space_id, is_publish=is_publish)
         elif space_type == SpaceTypes.BKCI.value:
             # 开启容器服务，则需要处理集群+业务+构建机+其它(在当前空间下创建的插件、自定义上报等)
-            self._push_bkci_space_table_ids(space_type, space_id)
+            self._push_bkci_space_table_ids(space_type, space_id, is_publish=is_publish)
         elif space_type == SpaceTypes.BKSAAS.value:
-            self._push_bksaas_space_table_ids(space_type, space_id)
+            self._push_bksaas_space_table_ids(space_type, space_id, is_publish=is_publish)
 
-        # 如果指定要更新，则通知
-        if is_publish:
-            RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, [f"{space_type}__{space_id}"])
         logger.info("push space table_id data successfully, space_type: %s, space_id: %s", space_type, space_id)
 
     def push_field_table_ids(
@@ -143,11 +176,9 @@ class SpaceTableIDRedis:
 
         # 推送数据到 redis，需要 json 序列化处理
         if field_table_ids:
-            redis_values = {field: json.dumps(table_ids) for field, table_ids in field_table_ids.items()}
-            RedisTools.hmset_to_redis(FIELD_TO_RESULT_TABLE_KEY, redis_values)
-
-            if is_publish:
-                RedisTools.publish(FIELD_TO_RESULT_TABLE_CHANNEL, list(field_table_ids.keys()))
+            # NOTE: 结果表排序后序列化，避免查询顺序不同导致内容摘要变化
+            redis_values = {field: json.dumps(sorted(table_ids)) for field, table_ids in field_table_ids.items()}
+            self._sync_to_redis(FIELD_TO_RESULT_TABLE_KEY, redis_values, is_publish=is_publish)
 
         # TODO: 推送的数据详情先添加上，待稳定后删除
         logger.info("push redis field_to_result_table, data: %s", json.dumps(field_table_ids))
@@ -181,11 +212,8 @@ class SpaceTableIDRedis:
             rt_dl_map.setdefault(data["data_label"], []).append(data["table_id"])
 
         if rt_dl_map:
-            redis_values = {data_label: json.dumps(table_ids) for data_label, table_ids in rt_dl_map.items()}
-            RedisTools.hmset_to_redis(DATA_LABEL_TO_RESULT_TABLE_KEY, redis_values)
-
-            if is_publish:
-                RedisTools.publish(DATA_LABEL_TO_RESULT_TABLE_CHANNEL, list(rt_dl_map.keys()))
+            redis_values = {data_label: json.dumps(sorted(table_ids)) for data_label, table_ids in rt_dl_map.items()}
+            self._sync_to_redis(DATA_LABEL_TO_RESULT_TABLE_KEY, redis_values, is_publish=is_publish)
         logger.info("push redis data_label_to_result_table")
 
     def push_table_id_detail(self, table_id_list: Optional[List] = None, is_publish: Optional[bool] = False):
@@ -216,13 +244,11 @@ class SpaceTableIDRedis:
             detail["measurement_type"] = measurement_type_dict.get(table_id) or ""
             detail["bcs_cluster_id"] = table_id_cluster_id.get(table_id) or ""
             detail["data_label"] = _table_id_dict.get(table_id, {}).get("data_label") or ""
-            _table_id_detail[table_id] = json.dumps(detail)
+            _table_id_detail[table_id] = json.dumps(detail, sort_keys=True)
 
         # 推送数据
         if _table_id_detail:
-            RedisTools.hmset_to_redis(RESULT_TABLE_DETAIL_KEY, _table_id_detail)
-            if is_publish:
-                RedisTools.publish(RESULT_TABLE_DETAIL_CHANNEL, list(_table_id_detail.keys()))
+            self._sync_to_redis(RESULT_TABLE_DETAIL_KEY, _table_id_detail, is_publish=is_publish)
         logger.info("push redis result_table_detail")
 
     def _push_bkcc_space_table_ids(
@@ -230,14 +256,15 @@ class SpaceTableIDRedis:
         space_type: str,
         space_id: str,
         from_authorization: Optional[bool] = None,
+        is_publish: Optional[bool] = False,
     ):
         """推送 bkcc 类型空间数据"""
         logger.info("start to push bkcc space table_id, space_type: %s, space_id: %s", space_type, space_id)
         _values = self._compose_data(space_type, space_id, from_authorization=from_authorization)
         # 推送数据
         if _values:
-            redis_values = {f"{space_type}__{space_id}": json.dumps(_values)}
-            RedisTools.hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values)
+            redis_values = {f"{space_type}__{space_id}": json.dumps(_values, sort_keys=True)}
+            self._sync_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values, is_publish=is_publish)
         logger.info(
             "push redis space_to_result_table, space_type: %s, space_id: %s",
             space_type,
@@ -248,6 +275,7 @@ class SpaceTableIDRedis:
         self,
         space_type: str,
         space_id: str,
+        is_publish: Optional[bool] = False,
     ):
         """推送 bcs 类型空间下的关联业务的数据"""
         logger.info("start to push biz of bcs space table_id, space_type: %s, space_id: %s", space_type, space_id)
@@ -258,8 +286,8 @@ class SpaceTableIDRedis:
         _values.update(self._compose_bkci_cross_table_ids(space_type, space_id))
         # 推送数据
         if _values:
-            redis_values = {f"{space_type}__{space_id}": json.dumps(_values)}
-            RedisTools.hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values)
+            redis_values = {f"{space_type}__{space_id}": json.dumps(_values, sort_keys=True)}
+            self._sync_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values, is_publish=is_publish)
         logger.info(
             "push redis space_to_result_table, space_type: %s, space_id:%s",
             space_type,
@@ -271,6 +299,7 @@ class SpaceTableIDRedis:
         space_type: str,
         space_id: str,
         table_id_list: Optional[List] = None,
+        is_publish: Optional[bool] = False,
     ):
         """推送 bksaas 类型空间下的数据"""
         logger.info("start to push bksaas space table_id, space_type: %s, space_id: %s", space_type, space_id)
@@ -278,8 +307,8 @@ class SpaceTableIDRedis:
         # 获取蓝鲸应用使用的集群数据
         _values.update(self._compose_bksaas_other_table_ids(space_type, space_id, table_id_list))
         if _values:
-            redis_values = {f"{space_type}__{space_id}": json.dumps(_values)}
-            RedisTools.hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values)
+            redis_values = {f"{space_type}__{space_id}": json.dumps(_values, sort_keys=True)}
+            self._sync_to_redis(SPACE_TO_RESULT_TABLE_KEY, redis_values, is_publish=is_publish)
         logger.info(
             "push redis space_to_result_table, space_type: %s, space_id: %s",
             space_type,
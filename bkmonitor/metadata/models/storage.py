@@ -1758,6 +1758,9 @@ class ESStorage(models.Model, StorageResultTable):
     mapping_settings = models.TextField("别名配置信息")
     storage_cluster_id = models.IntegerField("存储集群")
 
+    # 生命周期任务中注入的集群索引目录，为 None 时直接请求 ES
+    index_catalog = None
+
     @classmethod
     def refresh_consul_table_config(cls):
         """
@@ -2072,14 +2075,13 @@ class ESStorage(models.Model, StorageResultTable):
         判断该index是否已经存在,优先v2，随后v1
         :return: True | False
         """
-        es_client = self.get_client()
-        stat_info_list = es_client.indices.stats(self.search_format_v2())
+        stat_info_list = self.get_index_stats("v2")
         for stat_index_name in list(stat_info_list["indices"].keys()):
             re_result = self.index_re_v2.match(stat_index_name)
             if re_result:
                 logger.debug("table_id->[%s] found v2 index list->[%s]", self.table_id, str(stat_info_list))
                 return True
-        stat_info_list = es_client.indices.stats(self.search_format_v1())
+        stat_info_list = self.get_index_stats("v1")
         for stat_index_name in list(stat_info_list["indices"].keys()):
             re_result = self.index_re_v1.match(stat_index_name)
             if re_result:
@@ -2097,7 +2099,6 @@ class ESStorage(models.Model, StorageResultTable):
             "size": 123123,  # index大小，单位byte
         }
         """
-        es_client = self.get_client()
         # stats格式为：{
         #   "indices": {
         #       "${index_name}": {
@@ -2112,12 +2113,12 @@ class ESStorage(models.Model, StorageResultTable):
         index_re = None
         index_version = ""
         # 查找index,找不到v2的就找v1的
-        stat_info_list = es_client.indices.stats(self.search_format_v2())
+        stat_info_list = self.get_index_stats("v2")
         if len(stat_info_list["indices"]) != 0:
             index_version = "v2"
             index_re = self.index_re_v2
         else:
-            stat_info_list = es_client.indices.stats(self.search_format_v1())
+            stat_info_list = self.get_index_stats("v1")
             if len(stat_info_list["indices"]) != 0:
                 index_version = "v1"
                 index_re = self.index_re_v1
@@ -2198,10 +2199,70 @@ class ESStorage(models.Model, StorageResultTable):
 
     def get_client(self):
         """获取该结果表的客户端句柄"""
+        if self.index_catalog is not None:
+            return self.index_catalog.es_client
         return es_tools.get_client(self.storage_cluster_id)
 
     es_client = cached_property(get_client, name="es_client")
 
+    def get_index_stats(self, index_version):
+        """
+        获取指定版本索引的大小信息
+        :param index_version: v1 | v2
+        :return: 格式同 indices.stats
+        """
+        if self.index_catalog is not None:
+            return self.index_catalog.get_index_stats(self.index_name, index_version)
+
+        search_format = self.search_format_v2() if index_version == "v2" else self.search_format_v1()
+        return self.get_client().indices.stats(search_format)
+
+    def get_index_aliases(self):
+        """获取全部索引及其别名，格式同 indices.get_alias"""
+        if self.index_catalog is not None:
+            return self.index_catalog.get_index_aliases(self.index_name)
+        return self.get_client().indices.get_alias(index=f"*{self.index_name}_*_*")
+
+    def get_alias_indices(self, alias_name):
+        """获取别名指向的索引列表，别名不存在时抛出 NotFoundError"""
+        if self.index_catalog is not None:
+            index_list = self.index_catalog.get_alias_indices(alias_name)
+            if not index_list:
+                raise elasticsearch5.NotFoundError(alias_name)
+            return index_list
+        return list(self.get_client().indices.get_alias(name=alias_name).keys())
+
+    def update_index_aliases(self, actions):
+        """更新别名，存在索引目录时合并到集群级别批量提交"""
+        if self.index_catalog is not None:
+            self.index_catalog.update_aliases(self.table_id, actions)
+            return
+        self.get_client().indices.update_aliases(body={"actions": actions})
+
+    def create_index_by_name(self, index_name):
+        """按索引名创建索引"""
+        # 创建索引需要增加一个请求超时的防御
+        self.get_client().indices.create(index=index_name, body=self.index_body, params={"request_timeout": 30})
+        if self.index_catalog is not None:
+            self.index_catalog.add_index(index_name)
+
+    def delete_index(self, index_name):
+        """按索引名删除索引"""
+        self.get_client().indices.delete(index=index_name)
+        if self.index_catalog is not None:
+            self.index_catalog.remove_index(index_name)
+
+    def get_snapshots(self):
+        """获取该结果表的全部快照"""
+        repository_name = self.snapshot_obj.target_snapshot_repository_name
+        if self.index_catalog is not None:
+            return self.index_catalog.get_snapshots(repository_name, self.index_name)
+
+        try:
+            return self.es_client.snapshot.get(repository_name, self.search_snapshot).get("snapshots", [])
+        except (elasticsearch5.NotFoundError, elasticsearch.NotFoundError, elasticsearch6.NotFoundError):
+            return []
+
     def add_field(self, field):
         """需要修改ES的mapping"""
         pass
@@ -2380,7 +2441,6 @@ class ESStorage(models.Model, StorageResultTable):
         """
         更新alias，如果有已存在的alias，则将其指向最新的index，并根据ahead_time前向预留一定的alias
         """
-        es_client = self.get_client()
         current_index_info = self.current_index_info()
         last_index_name = self.make_index_name(
             current_index_info["datetime_object"], current_index_info["index"], current_index_info["index_version"]
@@ -2403,7 +2463,7 @@ class ESStorage(models.Model, StorageResultTable):
                 # 3.1 判断这个别名是否有指向旧的index，如果存在则需要解除
                 try:
                     # 此处是非通配的别名，所以会有NotFound的异常
-                    index_list = es_client.indices.get_alias(name=round_alias_name).keys()
+                    index_list = self.get_alias_indices(round_alias_name)
 
                     # 排除已经指向最新index的alias
                     delete_list = []
@@ -2426,35 +2486,23 @@ class ESStorage(models.Model, StorageResultTable):
                     )
                     delete_list = []
 
-                # 3.2 需要将循环中的别名都指向了最新的index
-                es_client.indices.update_aliases(
-                    body={
-                        "actions": [
-                            {"add": {"index": last_index_name, "alias": round_alias_name}},
-                            {"add": {"index": last_index_name, "alias": round_read_alias_name}},
-                        ]
-                    }
-                )
+                # 3.2 需要将循环中的别名都指向了最新的index，同时解除写入别名与旧index的关联
+                actions = [
+                    {"add": {"index": last_index_name, "alias": round_alias_name}},
+                    {"add": {"index": last_index_name, "alias": round_read_alias_name}},
+                ]
+                actions.extend({"remove": {"index": index, "alias": round_alias_name}} for index in delete_list)
+                self.update_index_aliases(actions)
 
                 logger.info(
-                    "table_id->[%s] now has index->[%s] and alias->[%s | %s]",
+                    "table_id->[%s] now has index->[%s] and alias->[%s | %s], relations with index->[%s] had delete",
                     self.table_id,
                     last_index_name,
                     round_alias_name,
                     round_read_alias_name,
+                    delete_list,
                 )
 
-                # 只有当index相关列表不为空的时候，才会进行别名关联清理
-                if len(delete_list) != 0:
-                    index_list_str = ",".join(delete_list)
-                    es_client.indices.delete_alias(index=index_list_str, name=round_alias_name)
-                    logger.info(
-                        "table_id->[%s] index->[%s] alias->[%s] relations now had delete.",
-                        self.table_id,
-                        delete_list,
-                        round_alias_name,
-                    )
-
             finally:
                 logger.info("all operations for index->[{}] gap->[{}] now is done.".format(self.table_id, now_gap))
                 # slice_gap maybe zero, will cause dead loop
@@ -2478,10 +2526,9 @@ class ESStorage(models.Model, StorageResultTable):
             return False
 
         now_datetime_object = self.now
-        es_client = self.get_client()
         new_index_name = self.make_index_name(now_datetime_object, 0, "v2")
         # 创建index
-        es_client.indices.create(index=new_index_name, body=self.index_body, params={"request_timeout": 30})
+        self.create_index_by_name(new_index_name)
         logger.info("table_id->[%s] has created new index->[%s]", self.table_id, new_index_name)
         return True
 
@@ -2518,7 +2565,7 @@ class ESStorage(models.Model, StorageResultTable):
         # 循环处理，以应对预留时间被手动加长,导致超前index有多个的场景
         while now_datetime_object < current_index_info["datetime_object"]:
             logger.warn("table_id->[%s] delete index->[%s] because it has ahead time", self.table_id, last_index_name)
-            es_client.indices.delete(index=last_index_name)
+            self.delete_index(last_index_name)
             # 重新获取最新的index，这里没做防护，默认存在超前的index，就一定存在不超前的可用index
             current_index_info = self.current_index_info()
             last_index_name = self.make_index_name(
@@ -2587,7 +2634,7 @@ class ESStorage(models.Model, StorageResultTable):
             # 如果当前index并没有写入过数据(count==0),则对其进行删除重建操作即可
             if es_client.count(index=last_index_name).get("count", 0) == 0:
                 new_index = current_index_info["index"]
-                es_client.indices.delete(index=last_index_name)
+                self.delete_index(last_index_name)
                 logger.info(
                     "table_id->[%s] has index->[%s] which has not data, will be deleted for new index create.",
                     self.table_id,
@@ -2603,7 +2650,7 @@ class ESStorage(models.Model, StorageResultTable):
         logger.info("table_id->[%s] will create new index->[%s]", self.table_id, new_index_name)
 
         # 2.1 创建新的index
-        es_client.indices.create(index=new_index_name, body=self.index_body, params={"request_timeout": 30})
+        self.create_index_by_name(new_index_name)
         logger.info("table_id->[%s] new index_name->[%s] is created now", self.table_id, new_index_name)
 
         return True
@@ -2703,9 +2750,7 @@ class ESStorage(models.Model, StorageResultTable):
         if not self.can_delete():
             return
         # 获取所有的写入别名
-        es_client = self.get_client()
-
-        alias_list = es_client.indices.get_alias(index=f"*{self.index_name}_*_*")
+        alias_list = self.get_index_aliases()
 
         filter_result = self.group_expired_alias(alias_list, self.retention)
 
@@ -2721,7 +2766,12 @@ class ESStorage(models.Model, StorageResultTable):
                         self.table_id,
                         alias_info["expired_alias"],
                     )
-                    es_client.indices.delete_alias(index=index_name, name=",".join(alias_info["expired_alias"]))
+                    self.update_index_aliases(
+                        [
+                            {"remove": {"index": index_name, "alias": alias_name}}
+                            for alias_name in alias_info["expired_alias"]
+                        ]
+                    )
                     logger.warning(
                         "table_id->[%s] delete_alias_list->[%s] is deleted.",
                         self.table_id,
@@ -2736,7 +2786,7 @@ class ESStorage(models.Model, StorageResultTable):
                 index_name,
             )
             try:
-                es_client.indices.delete(index=index_name)
+                self.delete_index(index_name)
             except (
                 elasticsearch5.ElasticsearchException,
                 elasticsearch.ElasticsearchException,
@@ -3018,7 +3068,7 @@ class ESStorage(models.Model, StorageResultTable):
         es_client = self.get_client()
 
         # 获取索引对应的别名
-        alias_list = es_client.indices.get_alias(index=f"*{self.index_name}_*_*")
+        alias_list = self.get_index_aliases()
 
         filter_result = self.group_expired_alias(alias_list, self.warm_phase_days)
 
@@ -3148,7 +3198,7 @@ class ESStorage(models.Model, StorageResultTable):
 
     def expired_index(self):
         es_client = self.es_client
-        alias_list = es_client.indices.get_alias(index=f"*{self.index_name}_*_*")
+        alias_list = self.get_index_aliases()
         expired_index_info = self.group_expired_alias(alias_list, self.retention)
         ret = []
 
@@ -3160,13 +3210,7 @@ class ESStorage(models.Model, StorageResultTable):
         return ret
 
     def current_snapshot_info(self):
-        es_client = self.es_client
-        try:
-            snapshots = es_client.snapshot.get(
-                self.snapshot_obj.target_snapshot_repository_name, self.search_snapshot
-            ).get("snapshots", [])
-        except (elasticsearch5.NotFoundError, elasticsearch.NotFoundError, elasticsearch6.NotFoundError):
-            snapshots = []
+        snapshots = self.get_snapshots()
         snapshot_re = self.snapshot_re
         max_datetime = None
         max_snapshot = {}
@@ -3233,6 +3277,8 @@ class ESStorage(models.Model, StorageResultTable):
                     new_snapshot_name,
                     {"indices": ",".join(expired_index), "include_global_state": False},
                 )
+            if self.index_catalog is not None:
+                self.index_catalog.add_snapshot(self.snapshot_obj.target_snapshot_repository_name, new_snapshot_name)
         except Exception as e:
             logger.exception(
                 "table_id->[%s] create new snapshot ->[%s] failed e -> [%s]", self.table_id, new_snapshot_name, e
@@ -3285,13 +3331,7 @@ class ESStorage(models.Model, StorageResultTable):
         logger.info("table_id -> [%s] filter expired snapshot before %s days", self.table_id, expired_days)
         expired_datetime_point = self.now - datetime.timedelta(days=expired_days)
 
-        es_client = self.es_client
-        try:
-            snapshots = es_client.snapshot.get(
-                self.snapshot_obj.target_snapshot_repository_name, self.search_snapshot
-            ).get("snapshots", [])
-        except (elasticsearch5.NotFoundError, elasticsearch.NotFoundError, elasticsearch6.NotFoundError):
-            snapshots = []
+        snapshots = self.get_snapshots()
         snapshot_re = self.snapshot_re
         expired_snapshots = []
 
@@ -10,15 +10,22 @@ specific language governing permissions and limitations under the License.
 """
 import json
 import logging
+import time
 import traceback
 
 import kafka
+from django.conf import settings
 from django.db.models import F
 from django.utils.translation import ugettext as _
 
 from alarm_backends.core.lock.service_lock import share_lock
+from bkmonitor.utils.thread_backend import ThreadPool
 from metadata import models
+from metadata.models.constants import DATASOURCE_CONFIG_DIGEST_KEY
+from metadata.service.data_source import DataSourceConfigBuilder
 from metadata.utils import consul_tools
+from metadata.utils.hash_util import object_md5
+from metadata.utils.redis_tools import RedisTools
 
 from .tasks import manage_es_storage
 
@@ -157,9 +164,14 @@ def refresh_datasource():
     ).values_list("table_id", flat=True)
     # 过滤到对应的数据源 ID
     ds_with_rt = {data_id for rt, data_id in ds_rt_map.items() if rt in enabled_rts}
-    for datasource in models.DataSource.objects.filter(is_enable=True, bk_data_id__in=ds_with_rt).order_by(
+    datasource_qs = models.DataSource.objects.filter(is_enable=True, bk_data_id__in=ds_with_rt).order_by(
         "-last_modify_time"
-    ):
+    )
+    if getattr(settings, "DATASOURCE_REFRESH_BULK_ENABLED", True):
+        refresh_datasource_in_bulk(list(datasource_qs))
+        return
+
+    for datasource in datasource_qs:
         try:
             # 更新前，需要从DB读取一次最新的数据，避免脏数据读写
             datasource.clean_cache()
@@ -174,6 +186,94 @@ def refresh_datasource():
             )
 
 
+def refresh_datasource_in_bulk(data_sources):
+    """
+    批量刷新数据源的外部配置
+    1. 预取依赖数据，在内存中组装全部数据源的 consul 配置
+    2. 与最近一次推送成功的配置摘要比对，仅推送有变化或超过校验间隔的数据源
+    3. 并发推送 gse 路由及 consul 配置，推送成功后记录摘要
+    """
+    start_time = time.time()
+    builder = DataSourceConfigBuilder(data_sources, is_consul_config=True)
+
+    try:
+        old_digests = {
+            int(data_id): json.loads(digest)
+            for data_id, digest in RedisTools.hgetall(DATASOURCE_CONFIG_DIGEST_KEY).items()
+        }
+    except Exception:
+        logger.exception("failed to get datasource config digests, all datasource will be refreshed")
+        old_digests = {}
+
+    now_ts = int(time.time())
+    verify_interval = getattr(settings, "DATASOURCE_CONFIG_VERIFY_INTERVAL", 60 * 60)
+    pending_list = []
+    for datasource in data_sources:
+        try:
+            consul_config = builder.build(datasource)
+            digest = {"consul": object_md5(consul_config), "gse": object_md5(datasource.gse_route_config)}
+        except Exception:
+            logger.error(
+                "data_id->[{}] failed to build outer config for->[{}]".format(
+                    datasource.bk_data_id, traceback.format_exc()
+                )
+            )
+            continue
+
+        old_digest = old_digests.get(datasource.bk_data_id) or {}
+        if (
+            old_digest.get("consul") == digest["consul"]
+            and old_digest.get("gse") == digest["gse"]
+            and now_ts - old_digest.get("verify_time", 0) < verify_interval
+        ):
+            continue
+        pending_list.append((datasource, consul_config, digest))
+
+    def refresh_outer_config(datasource, consul_config):
+        try:
+            datasource.refresh_gse_config()
+            datasource.refresh_consul_config(consul_config)
+        except Exception:
+            logger.error(
+                "data_id->[{}] failed to refresh outer config for->[{}]".format(
+                    datasource.bk_data_id, traceback.format_exc()
+                )
+            )
+            return False
+
+        logger.debug("data_id->[%s] refresh all outer success" % datasource.bk_data_id)
+        return True
+
+    pool = ThreadPool(getattr(settings, "DATASOURCE_REFRESH_CONCURRENCY", 10))
+    results = pool.map_ignore_exception(refresh_outer_config, [pending[:2] for pending in pending_list])
+    pool.close()
+    pool.join()
+
+    new_digests = {}
+    for (datasource, consul_config, digest), is_success in zip(pending_list, results):
+        # 推送失败的数据源不记录摘要，下个周期重试
+        if is_success:
+            new_digests[str(datasource.bk_data_id)] = json.dumps(dict(digest, verify_time=now_ts))
+
+    stale_data_ids = set(old_digests.keys()) - {datasource.bk_data_id for datasource in data_sources}
+    try:
+        if new_digests:
+            RedisTools.hmset_to_redis(DATASOURCE_CONFIG_DIGEST_KEY, new_digests)
+        if stale_data_ids:
+            RedisTools.hdel(DATASOURCE_CONFIG_DIGEST_KEY, [str(data_id) for data_id in stale_data_ids])
+    except Exception:
+        # 摘要未更新时，下个周期会重新推送，不影响正确性
+        logger.exception("failed to save datasource config digests")
+
+    logger.info(
+        "refresh datasource in bulk, total->[%s], changed->[%s], success->[%s], cost->[%.3fs]",
+        len(data_sources),
+        len(pending_list),
+        len(new_digests),
+        time.time() - start_time,
+    )
+
+
 @share_lock(identify="metadata_refreshKafkaStorage")
 def refresh_kafka_storage():
     # 确认所有kafka存储都有对应的topic
@@ -227,7 +327,8 @@ def refresh_es_storage():
     table_id_list = models.ResultTable.objects.filter(
         table_id__in=es_storages.values_list("table_id", flat=True), is_enable=True, is_deleted=False
     ).values_list("table_id", flat=True)
-    es_storages = es_storages.filter(table_id__in=table_id_list)
+    # 按集群排序，使同一任务内的存储尽量归属同一集群，共享索引目录
+    es_storages = es_storages.filter(table_id__in=table_id_list).order_by("storage_cluster_id", "table_id")
 
     count = es_storages.count()
     for s in range(start, count, step):
@@ -605,7 +605,6 @@ def push_and_publish_space_router(
     space_type: Optional[str] = None, space_id: Optional[str] = None, is_publish: Optional[bool] = True
 ):
     """推送数据和通知"""
-    from metadata.models.space.constants import SPACE_TO_RESULT_TABLE_CHANNEL
     from metadata.models.space.ds_rt import get_space_table_id_data_id
     from metadata.task.tasks import multi_push_space_table_ids
 
@@ -628,8 +627,9 @@ def push_and_publish_space_router(
     chunks = [space_list[i : i + chunk_size] for i in range(0, count, chunk_size)]
     threads = []
 
+    # 需要通知时，仅通知路由数据有变化的空间
     for chunk in chunks:
-        t = threading.Thread(target=multi_push_space_table_ids, args=(chunk,))
+        t = threading.Thread(target=multi_push_space_table_ids, args=(chunk, is_publish))
         t.start()
         threads.append(t)
 
@@ -637,13 +637,11 @@ def push_and_publish_space_router(
     for t in threads:
         t.join()
 
-    # 通知到使用方
-    if is_publish:
-        space_uid_list = [f"{space['space_type_id']}__{space['space_id']}" for space in spaces]
-        RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, space_uid_list)
-
     # 更新数据
-    from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
+    from metadata.models.space.space_table_id_redis import (
+        SpaceTableIDRedis,
+        space_router_publisher,
+    )
 
     # 仅存在空间 id 时，可以直接按照结果表进行处理
     table_id_list = []
@@ -656,6 +654,9 @@ def push_and_publish_space_router(
     space_client.push_field_table_ids(table_id_list=table_id_list, is_publish=is_publish)
     space_client.push_data_label_table_ids(table_id_list=table_id_list, is_publish=is_publish)
     space_client.push_table_id_detail(table_id_list=table_id_list, is_publish=is_publish)
+    # 发送窗口内缓存的通知
+    space_router_publisher.flush()
+    logger.info("push space router stats: %s", json.dumps(space_client.sync_stats))
 
 
 @share_lock(identify="metadata_push_and_publish_space_router")
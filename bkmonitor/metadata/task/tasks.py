@@ -15,11 +15,14 @@ import threading
 import traceback
 from typing import Dict, List, Optional
 
+from django.conf import settings
 from django.utils.translation import ugettext as _
 
 from alarm_backends.service.scheduler.app import app
+from bkmonitor.utils.thread_backend import ThreadPool
 from metadata import models
 from metadata.models.space.constants import SPACE_REDIS_KEY
+from metadata.utils import es_tools
 from metadata.utils.redis_tools import RedisTools
 
 logger = logging.getLogger("metadata")
@@ -121,14 +124,9 @@ def delete_restore_indices(restore_id):
 
 
 def update_time_series_metrics(time_series_metrics, task_result_queue):
-    data_id_list, table_id_list = [], []
-    for time_series_group in time_series_metrics:
+    def update_group_metrics(time_series_group):
         try:
             is_updated = time_series_group.update_time_series_metrics()
-            # 记录是否有更新，如果有更新则推送到redis
-            if is_updated:
-                data_id_list.append(time_series_group.bk_data_id)
-                table_id_list.append(time_series_group.table_id)
         except Exception as e:
             logger.error(
                 "data_id->[{data_id}], table_id->[{table_id}] try to update ts metrics from redis failed, error->[{err_msg}], traceback_detail->[{detail}]".format(  # noqa
@@ -138,10 +136,24 @@ def update_time_series_metrics(time_series_metrics, task_result_queue):
                     detail=traceback.format_exc(),
                 )
             )
-        else:
-            logger.info(
-                "time_series_group->[{}] metric update from redis success.".format(time_series_group.bk_data_id)
-            )
+            return False
+
+        logger.info("time_series_group->[{}] metric update from redis success.".format(time_series_group.bk_data_id))
+        return is_updated
+
+    # 分组之间并发同步，限制并发数，避免 DB 压力过大
+    time_series_metrics = list(time_series_metrics)
+    pool = ThreadPool(getattr(settings, "TIME_SERIES_METRIC_SYNC_CONCURRENCY", 4))
+    results = pool.map_ignore_exception(update_group_metrics, time_series_metrics)
+    pool.close()
+    pool.join()
+
+    data_id_list, table_id_list = [], []
+    for time_series_group, is_updated in zip(time_series_metrics, results):
+        # 记录是否有更新，如果有更新则推送到redis
+        if is_updated:
+            data_id_list.append(time_series_group.bk_data_id)
+            table_id_list.append(time_series_group.table_id)
 
     # 仅当指标有变动的结果表存在时，才进行路由配置更新
     if table_id_list:
@@ -165,8 +177,23 @@ def update_time_series_metrics(time_series_metrics, task_result_queue):
 
 @app.task(ignore_result=True, queue="celery_report_cron")
 def manage_es_storage(es_storages):
+    # 同一集群的存储共享一份索引目录，避免每个存储单独查询索引、别名及快照
+    es_storages = list(es_storages)
+    catalogs = {}
+    if getattr(settings, "ES_STORAGE_INDEX_CATALOG_ENABLED", True):
+        for cluster_id in {es_storage.storage_cluster_id for es_storage in es_storages}:
+            try:
+                catalogs[cluster_id] = es_tools.ESIndexCatalog(
+                    es_tools.get_client(cluster_id),
+                    alias_batch_size=getattr(settings, "ES_STORAGE_ALIAS_BATCH_SIZE", 500),
+                )
+            except Exception:
+                # 目录加载失败时，该集群的存储直接请求 ES
+                logger.exception("cluster_id->[%s] failed to load es index catalog", cluster_id)
+
     # 遍历所有的ES存储并创建index, 并执行完整的es生命周期操作
     for es_storage in es_storages:
+        es_storage.index_catalog = catalogs.get(es_storage.storage_cluster_id)
         try:
             # 先预创建各个时间段的index，
             # 1. 同时判断各个预创建好的index是否字段与数据库的一致
@@ -195,6 +222,13 @@ def manage_es_storage(es_storages):
                 "es_storage->[{}] failed to cron task for->[{}]".format(es_storage.table_id, traceback.format_exc())
             )
 
+    # 按集群批量提交剩余的别名变更
+    for cluster_id, catalog in catalogs.items():
+        try:
+            catalog.flush_aliases()
+        except Exception:
+            logger.exception("cluster_id->[%s] failed to flush es aliases", cluster_id)
+
 
 @app.task(ignore_result=True, queue="celery_metadata_task_worker")
 def publish_redis(space_type_id: Optional[str] = None, space_id: Optional[str] = None, table_id: Optional[str] = None):
@@ -226,11 +260,11 @@ def push_and_publish_space_router(
 ):
     """推送并发布空间路由功能"""
     logger.info("start to push and publish space_type: %s, space_id: %s router", space_type, space_id)
-    from metadata.models.space.constants import (
-        SPACE_TO_RESULT_TABLE_CHANNEL,
-        SpaceTypes,
+    from metadata.models.space.constants import SpaceTypes
+    from metadata.models.space.space_table_id_redis import (
+        SpaceTableIDRedis,
+        space_router_publisher,
     )
-    from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
 
     space_client = SpaceTableIDRedis()
     # 更新数据
@@ -256,8 +290,9 @@ def push_and_publish_space_router(
         # 分组
         chunks = [space_list[i : i + chunk_size] for i in range(0, count, chunk_size)]
         threads = []
+        # 仅通知路由数据有变化的空间
         for chunk in chunks:
-            t = threading.Thread(target=multi_push_space_table_ids, args=(chunk,))
+            t = threading.Thread(target=multi_push_space_table_ids, args=(chunk, True))
             t.start()
             threads.append(t)
 
@@ -265,26 +300,29 @@ def push_and_publish_space_router(
         for t in threads:
             t.join()
 
-        # 通知到使用方
-        push_redis_keys = [f"{space_type}__{space_id}" for space_id in space_ids]
-        RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, push_redis_keys)
-
+    # 发送窗口内缓存的通知
+    space_router_publisher.flush()
     logger.info("push and publish space_type: %s, space_id: %s router successfully", space_type, space_id)
 
 
-def multi_push_space_table_ids(space_list: List[Dict]):
+def multi_push_space_table_ids(space_list: List[Dict], is_publish: Optional[bool] = False):
     """批量推送数据"""
     logger.info("start to multi push space table ids")
+    from metadata.models.space.constants import SPACE_TO_RESULT_TABLE_KEY
     from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
 
     space_client = SpaceTableIDRedis()
     for space in space_list:
         try:
-            space_client.push_space_table_ids(space_type=space["space_type"], space_id=space["space_id"])
+            space_client.push_space_table_ids(
+                space_type=space["space_type"], space_id=space["space_id"], is_publish=is_publish
+            )
         except Exception as e:
             logger.error("push space to redis error, %s", e)
 
-    logger.info("multi push space table ids successfully")
+    logger.info(
+        "multi push space table ids successfully, stats: %s", space_client.sync_stats[SPACE_TO_RESULT_TABLE_KEY]
+    )
 
 
 @app.task(ignore_result=True, queue="celery_metadata_task_worker")
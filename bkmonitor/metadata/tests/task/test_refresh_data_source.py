@@ -76,3 +76,76 @@ def test_refresh_datasource(create_and_delete_record, mocker):
     data = list(mock_hash_consul.result_list.values())
     assert len(data) == 1
     assert data[0]["bk_data_id"] == DEFAULT_DATA_ID
+
+
+@pytest.fixture
+def create_result_table(create_and_delete_record, username, table_id):
+    from metadata import models
+
+    models.ResultTable.objects.create(
+        table_id=table_id,
+        table_name_zh="test",
+        is_custom_table=True,
+        schema_type="free",
+        default_storage="influxdb",
+        creator=username,
+        last_modify_user=username,
+        bk_biz_id=0,
+    )
+    models.ResultTableField.objects.create(
+        table_id=table_id,
+        field_name="usage",
+        field_type="float",
+        tag="metric",
+        default_value=None,
+        is_config_by_user=True,
+        description="usage",
+        unit="",
+        alias_name="",
+    )
+    yield
+    models.ResultTableField.objects.filter(table_id=table_id).delete()
+    models.ResultTable.objects.filter(table_id=table_id).delete()
+
+
+def test_datasource_config_builder(create_result_table, table_id):
+    from metadata import models
+    from metadata.service.data_source import DataSourceConfigBuilder
+
+    data_source = models.DataSource.objects.get(bk_data_id=DEFAULT_DATA_ID)
+    expected = data_source.to_json(is_consul_config=True)
+
+    data_sources = list(models.DataSource.objects.filter(bk_data_id=DEFAULT_DATA_ID))
+    builder = DataSourceConfigBuilder(data_sources, is_consul_config=True)
+    config = builder.build(data_sources[0])
+
+    assert config == expected
+    assert [rt["result_table"] for rt in config["result_table_list"]] == [table_id]
+
+
+def test_refresh_datasource_skip_unchanged(create_result_table, mocker, settings):
+    from metadata.tests.conftest import HashConsulMocker
+    from metadata.utils.redis_tools import RedisTools
+
+    settings.DATASOURCE_REFRESH_BULK_ENABLED = True
+    settings.DATASOURCE_CONFIG_VERIFY_INTERVAL = 60 * 60
+    mock_hash_consul = HashConsulMocker()
+    put = mocker.spy(mock_hash_consul, "put")
+    mocker.patch("metadata.utils.consul_tools.HashConsul", return_value=mock_hash_consul)
+    mocker.patch("metadata.models.data_source.DataSource.refresh_gse_config", return_value=True)
+    mocker.patch("alarm_backends.core.storage.redis.Cache.__new__", return_value=mock_redis_client())
+    mocker.patch.object(RedisTools, "metadata_redis_client", mock_redis_client())
+
+    from metadata.task.config_refresh import refresh_datasource
+
+    refresh_datasource()
+    assert put.call_count == 1
+
+    # 配置未变化，不再推送
+    refresh_datasource()
+    assert put.call_count == 1
+
+    # 超过校验间隔，重新推送校验
+    settings.DATASOURCE_CONFIG_VERIFY_INTERVAL = 0
+    refresh_datasource()
+    assert put.call_count == 2
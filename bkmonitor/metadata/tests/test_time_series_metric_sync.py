@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import json
+import time
+
+import pytest
+from mockredis import mock_redis_client
+
+from metadata.models import ResultTableField, TimeSeriesGroup, TimeSeriesMetric
+from metadata.utils.redis_tools import RedisTools
+
+pytestmark = pytest.mark.django_db
+
+BK_DATA_ID = 1500001
+METRICS_KEY = f"bkmonitor:metrics_{BK_DATA_ID}"
+DIMENSIONS_KEY = f"bkmonitor:metric_dimensions_{BK_DATA_ID}"
+
+
+def report_metric(client, field_name, score, dimensions):
+    client.zadd(METRICS_KEY, **{field_name: score})
+    client.hset(
+        DIMENSIONS_KEY,
+        field_name,
+        json.dumps({"dimensions": {name: {"last_update_time": int(score), "values": []} for name in dimensions}}),
+    )
+
+
+@pytest.fixture
+def transfer_client(mocker, settings):
+    settings.METRICS_KEY_PREFIX = "bkmonitor:metrics_"
+    settings.METRIC_DIMENSIONS_KEY_PREFIX = "bkmonitor:metric_dimensions_"
+    client = mock_redis_client()
+    mocker.patch("metadata.models.custom_report.time_series.RedisClient.from_envs", return_value=client)
+    mocker.patch.object(RedisTools, "metadata_redis_client", mock_redis_client())
+    return client
+
+
+@pytest.fixture
+def ts_group(mocker):
+    mocker.patch("metadata.models.custom_report.time_series.TimeSeriesGroup.update_tag_fields", return_value=True)
+    group = TimeSeriesGroup.objects.create(
+        bk_data_id=BK_DATA_ID,
+        bk_biz_id=1,
+        table_id="metric_sync_test.__default__",
+        time_series_group_name="metric_sync_test",
+        label="applications",
+        creator="admin",
+    )
+    yield group
+    TimeSeriesMetric.objects.filter(group_id=group.time_series_group_id).delete()
+    ResultTableField.objects.filter(table_id=group.table_id).delete()
+    group.delete()
+
+
+def test_iter_metrics_with_scores(transfer_client, settings, mocker):
+    settings.MAX_METRICS_FETCH_STEP = 3
+    # 分值相同的成员跨越多页
+    scores = [100, 100, 100, 100, 100, 101, 102, 102, 102, 103]
+    for index, score in enumerate(scores):
+        transfer_client.zadd(METRICS_KEY, **{f"metric_{index}": score})
+
+    pages = list(TimeSeriesGroup.iter_metrics_with_scores(transfer_client, METRICS_KEY, 100, 103))
+    members = [member.decode("utf-8") for page in pages for member, __ in page]
+    assert sorted(members) == sorted(f"metric_{index}" for index in range(len(scores)))
+    assert len(members) == len(scores)
+    assert all(len(page) <= 3 for page in pages)
+
+    pages = list(TimeSeriesGroup.iter_metrics_with_scores(transfer_client, METRICS_KEY, 102, 103))
+    assert sum(len(page) for page in pages) == 4
+
+    # 分页失败时中止，避免返回不完整的指标列表
+    zrangebyscore = transfer_client.zrangebyscore
+    mocker.patch.object(
+        transfer_client,
+        "zrangebyscore",
+        side_effect=[zrangebyscore(METRICS_KEY, min=100, max=103, start=0, num=3, withscores=True), Exception()],
+    )
+    with pytest.raises(Exception):
+        list(TimeSeriesGroup.iter_metrics_with_scores(transfer_client, METRICS_KEY, 100, 103))
+
+
+def test_incremental_sync(transfer_client, ts_group, settings, mocker):
+    settings.TIME_SERIES_METRIC_FULL_SYNC_INTERVAL = 3600
+    settings.TIME_SERIES_METRIC_TOUCH_INTERVAL = 600
+    now = time.time()
+    for index in range(5):
+        report_metric(transfer_client, f"metric_{index}", now - 3000, ["bk_target_ip"])
+
+    # 首次同步为全量同步
+    assert ts_group.update_time_series_metrics(is_incremental=True)
+    group_id = ts_group.time_series_group_id
+    assert TimeSeriesMetric.objects.filter(group_id=group_id).count() == 5
+    state = ts_group.get_metric_sync_state()
+    assert state["watermark"] == now - 3000
+
+    update_metrics = mocker.spy(TimeSeriesGroup, "update_metrics")
+
+    # 没有新上报的指标，不写入DB
+    assert not ts_group.update_time_series_metrics(is_incremental=True)
+    assert not update_metrics.called
+
+    # 维度未变化且上报时间推进不足间隔的指标，不写入DB
+    report_metric(transfer_client, "metric_0", now - 2900, ["bk_target_ip"])
+    ts_group.update_time_series_metrics(is_incremental=True)
+    assert not update_metrics.called
+    assert ts_group.get_metric_sync_state()["watermark"] == now - 2900
+
+    # 仅维度变化及新增的指标写入DB
+    now = time.time()
+    report_metric(transfer_client, "metric_1", now, ["bk_target_ip", "device_name"])
+    report_metric(transfer_client, "metric_5", now, ["bk_target_ip"])
+    assert ts_group.update_time_series_metrics(is_incremental=True)
+    assert update_metrics.call_count == 1
+    changed_metrics = update_metrics.call_args[0][1]
+    assert sorted(metric["field_name"] for metric in changed_metrics) == ["metric_1", "metric_5"]
+    assert set(TimeSeriesMetric.objects.get(group_id=group_id, field_name="metric_1").tag_list) == {
+        "bk_target_ip",
+        "device_name",
+        "target",
+    }
+    assert TimeSeriesMetric.objects.filter(group_id=group_id).count() == 6
+
+
+def test_full_sync_after_interval(transfer_client, ts_group, settings):
+    settings.TIME_SERIES_METRIC_FULL_SYNC_INTERVAL = 3600
+    now = time.time()
+    report_metric(transfer_client, "metric_0", now - 3000, ["bk_target_ip"])
+    ts_group.update_time_series_metrics(is_incremental=True)
+
+    state = ts_group.get_metric_sync_state()
+    state["full_sync_time"] -= 3600
+    RedisTools.hset_to_redis("bkmonitorv3:ts_metric_sync:state", str(ts_group.time_series_group_id), json.dumps(state))
+
+    ts_group.update_time_series_metrics(is_incremental=True)
+    assert ts_group.get_metric_sync_state()["full_sync_time"] > state["full_sync_time"]
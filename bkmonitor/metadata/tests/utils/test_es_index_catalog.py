@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+from unittest import mock
+
+import elasticsearch5
+import pytest
+
+from metadata.utils.es_tools import ESIndexCatalog
+
+
+@pytest.fixture
+def es_client():
+    client = mock.MagicMock()
+    client.cat.indices.return_value = [
+        {"index": "v2_2_bklog_test_2023010100_0", "status": "open", "pri.store.size": "100"},
+        {"index": "v2_2_bklog_test_2023010200_0", "status": "open", "pri.store.size": "200"},
+        {"index": "2_bklog_test_2022123100_0", "status": "open", "pri.store.size": "300"},
+        {"index": "v2_2_bklog_test_2022010100_0", "status": "close", "pri.store.size": None},
+        {"index": "v2_2_bklog_other_2023010100_0", "status": "open", "pri.store.size": "400"},
+        {"index": ".kibana", "status": "open", "pri.store.size": "10"},
+    ]
+    client.cat.aliases.return_value = [
+        {"alias": "write_2023010100_2_bklog_test", "index": "v2_2_bklog_test_2023010100_0"},
+        {"alias": "2_bklog_test_2023010100_read", "index": "v2_2_bklog_test_2023010100_0"},
+        {"alias": "write_2023010200_2_bklog_test", "index": "v2_2_bklog_test_2023010200_0"},
+    ]
+    client.cat.snapshots.return_value = [
+        {"id": "2_bklog_test_snapshot_20230101", "status": "SUCCESS"},
+        {"id": "2_bklog_other_snapshot_20230101", "status": "SUCCESS"},
+    ]
+    return client
+
+
+def test_load(es_client):
+    catalog = ESIndexCatalog(es_client)
+
+    assert catalog.get_index_stats("2_bklog_test", "v2") == {
+        "indices": {
+            "v2_2_bklog_test_2023010100_0": {"primaries": {"store": {"size_in_bytes": 100}}},
+            "v2_2_bklog_test_2023010200_0": {"primaries": {"store": {"size_in_bytes": 200}}},
+        }
+    }
+    assert list(catalog.get_index_stats("2_bklog_test", "v1")["indices"]) == ["2_bklog_test_2022123100_0"]
+    assert catalog.get_index_aliases("2_bklog_test") == {
+        "v2_2_bklog_test_2023010100_0": {
+            "aliases": {"write_2023010100_2_bklog_test": {}, "2_bklog_test_2023010100_read": {}}
+        },
+        "v2_2_bklog_test_2023010200_0": {"aliases": {"write_2023010200_2_bklog_test": {}}},
+        "2_bklog_test_2022123100_0": {"aliases": {}},
+    }
+    assert catalog.get_alias_indices("write_2023010200_2_bklog_test") == ["v2_2_bklog_test_2023010200_0"]
+    assert catalog.get_index_stats("2_bklog_missing", "v2") == {"indices": {}}
+
+
+def test_update_aliases(es_client):
+    catalog = ESIndexCatalog(es_client, alias_batch_size=10)
+    catalog.add_index("v2_2_bklog_test_2023010300_0")
+    catalog.update_aliases(
+        "2_bklog.test",
+        [
+            {"add": {"index": "v2_2_bklog_test_2023010300_0", "alias": "write_2023010200_2_bklog_test"}},
+            {"remove": {"index": "v2_2_bklog_test_2023010200_0", "alias": "write_2023010200_2_bklog_test"}},
+        ],
+    )
+    catalog.update_aliases(
+        "2_bklog.other", [{"add": {"index": "v2_2_bklog_other_2023010100_0", "alias": "2_bklog_other_read"}}]
+    )
+
+    # 变更先作用于本地目录，未达到批量数量前不提交
+    assert catalog.get_alias_indices("write_2023010200_2_bklog_test") == ["v2_2_bklog_test_2023010300_0"]
+    es_client.indices.update_aliases.assert_not_called()
+
+    catalog.flush_aliases()
+    es_client.indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {"add": {"index": "v2_2_bklog_test_2023010300_0", "alias": "write_2023010200_2_bklog_test"}},
+                {"remove": {"index": "v2_2_bklog_test_2023010200_0", "alias": "write_2023010200_2_bklog_test"}},
+                {"add": {"index": "v2_2_bklog_other_2023010100_0", "alias": "2_bklog_other_read"}},
+            ]
+        }
+    )
+    assert catalog.alias_actions == []
+
+
+def test_flush_aliases_retry_by_table(es_client):
+    catalog = ESIndexCatalog(es_client)
+    catalog.update_aliases("2_bklog.test", [{"add": {"index": "v2_2_bklog_test_2023010100_0", "alias": "a"}}])
+    catalog.update_aliases("2_bklog.other", [{"add": {"index": "v2_2_bklog_other_2023010100_0", "alias": "b"}}])
+
+    es_client.indices.update_aliases.side_effect = [elasticsearch5.NotFoundError(404), None, None]
+    catalog.flush_aliases()
+
+    assert es_client.indices.update_aliases.call_count == 3
+    es_client.indices.update_aliases.assert_any_call(
+        body={"actions": [{"add": {"index": "v2_2_bklog_other_2023010100_0", "alias": "b"}}]}
+    )
+
+
+def test_remove_index(es_client):
+    catalog = ESIndexCatalog(es_client)
+    catalog.update_aliases(
+        "2_bklog.test",
+        [{"remove": {"index": "v2_2_bklog_test_2023010100_0", "alias": "2_bklog_test_2023010100_read"}}],
+    )
+    catalog.remove_index("v2_2_bklog_test_2023010100_0")
+
+    # 索引删除后，相关的别名变更不再提交
+    assert catalog.alias_actions == []
+    assert catalog.get_alias_indices("write_2023010100_2_bklog_test") == []
+    assert "v2_2_bklog_test_2023010100_0" not in catalog.get_index_aliases("2_bklog_test")
+
+
+def test_get_snapshots(es_client):
+    catalog = ESIndexCatalog(es_client)
+
+    assert catalog.get_snapshots("repo", "2_bklog_test") == [
+        {"snapshot": "2_bklog_test_snapshot_20230101", "state": "SUCCESS"}
+    ]
+    catalog.add_snapshot("repo", "2_bklog_test_snapshot_20230102")
+    assert catalog.get_snapshots("repo", "2_bklog_test")[-1] == {
+        "snapshot": "2_bklog_test_snapshot_20230102",
+        "state": "IN_PROGRESS",
+    }
+    # 同一仓库只加载一次
+    es_client.cat.snapshots.assert_called_once()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import mock
+import pytest
+from mockredis import mock_redis_client
+
+from metadata.utils.redis_tools import RedisHashSyncer, RedisPublisher, RedisTools
+
+KEY = "bkmonitorv3:test:router"
+CHANNEL = "bkmonitorv3:test:router:channel"
+
+
+@pytest.fixture
+def redis_client(mocker):
+    client = mock_redis_client()
+    mocker.patch.object(RedisTools, "metadata_redis_client", client)
+    return client
+
+
+@pytest.fixture
+def published(redis_client):
+    return redis_client.pubsub[CHANNEL]
+
+
+def test_sync_only_changed_fields(redis_client, published):
+    syncer = RedisHashSyncer(KEY, CHANNEL)
+
+    stats = syncer.sync({"a": "1", "b": "2"}, is_publish=True)
+    assert stats == {"written": 2, "skipped": 0, "published": 2}
+    assert published == ["a", "b"]
+
+    published.clear()
+    stats = syncer.sync({"a": "1", "b": "3"}, is_publish=True)
+    assert stats == {"written": 1, "skipped": 1, "published": 1}
+    assert published == ["b"]
+    assert redis_client.hget(KEY, "b") == b"3"
+
+    # 数据被清理后，全部重新写入
+    published.clear()
+    redis_client.delete(KEY)
+    stats = syncer.sync({"a": "1", "b": "3"}, is_publish=True)
+    assert stats == {"written": 2, "skipped": 0, "published": 2}
+    assert redis_client.hgetall(KEY) == {b"a": b"1", b"b": b"3"}
+
+
+def test_sync_publish_unpublished_fields(redis_client, published):
+    syncer = RedisHashSyncer(KEY, CHANNEL)
+    syncer.sync({"a": "1", "b": "2"})
+
+    # 未通知的变更，在下次需要通知时一并通知
+    stats = syncer.sync({"a": "1", "b": "2"}, is_publish=True)
+    assert stats == {"written": 0, "skipped": 2, "published": 2}
+    assert sorted(published) == ["a", "b"]
+
+    published.clear()
+    stats = syncer.sync({"a": "1", "b": "2"}, is_publish=True)
+    assert stats == {"written": 0, "skipped": 2, "published": 0}
+    assert published == []
+
+
+def test_publisher_merge_in_window(redis_client, published):
+    publisher = RedisPublisher(window=60)
+    assert publisher.publish(CHANNEL, ["a", "b"]) == 2
+    assert publisher.publish(CHANNEL, ["b", "c"]) == 1
+    assert published == []
+
+    assert publisher.flush() == 3
+    assert published == ["a", "b", "c"]
+    assert publisher.flush() == 0
+
+
+def test_unpublished_kept_when_flush_failed(redis_client, published):
+    publisher = RedisPublisher(window=60)
+    syncer = RedisHashSyncer(KEY, CHANNEL, publisher=publisher)
+    stats = syncer.sync({"a": "1"}, is_publish=True)
+    assert stats == {"written": 1, "skipped": 0, "published": 1}
+
+    # 发送失败时保留未通知标记，下次需要通知时重新发送
+    with mock.patch.object(redis_client, "pipeline", side_effect=Exception("connection error")):
+        with pytest.raises(Exception):
+            publisher.flush()
+    assert published == []
+
+    stats = syncer.sync({"a": "1"}, is_publish=True)
+    assert stats == {"written": 0, "skipped": 1, "published": 1}
+    publisher.flush()
+    assert published == ["a"]
+    assert redis_client.smembers(syncer.unpublished_key) == set()
+
+
+def test_digest_expire_not_extended(redis_client, published):
+    syncer = RedisHashSyncer(KEY, CHANNEL, expire=60)
+    syncer.sync({"a": "1"})
+    assert 0 < redis_client.ttl(syncer.digest_key) <= 60
+
+    # 持续有字段变化时，摘要的过期时间不顺延
+    redis_client.expire(syncer.digest_key, 10)
+    syncer.sync({"a": "2"})
+    assert redis_client.ttl(syncer.digest_key) <= 10
+
+    # 摘要过期后，被其他途径修改的字段重新写入
+    redis_client.hset(KEY, "a", "3")
+    redis_client.delete(syncer.digest_key)
+    stats = syncer.sync({"a": "2"})
+    assert stats["written"] == 1
+    assert redis_client.hget(KEY, "a") == b"2"
+    assert 0 < redis_client.ttl(syncer.digest_key) <= 60
+
+
+def test_sync_check_unpublished_by_fields(redis_client, published):
+    syncer = RedisHashSyncer(KEY, CHANNEL)
+    syncer.sync({"a": "1", "b": "2"})
+    redis_client.sadd(syncer.unpublished_key, "other")
+
+    # 仅检查本次同步字段的未通知标记，不读取整个集合
+    with mock.patch.object(redis_client, "smembers", side_effect=AssertionError):
+        stats = syncer.sync({"a": "1"}, is_publish=True)
+    assert stats == {"written": 0, "skipped": 1, "published": 1}
+    assert published == ["a"]
+    assert redis_client.smembers(syncer.unpublished_key) == {b"b", b"other"}
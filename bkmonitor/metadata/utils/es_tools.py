@@ -8,12 +8,20 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
-from typing import List
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, List
 
+import elasticsearch
+import elasticsearch5
+import elasticsearch6
 from elasticsearch import Elasticsearch as Elasticsearch
 from elasticsearch5 import Elasticsearch as Elasticsearch5
 from elasticsearch6 import Elasticsearch as Elasticsearch6
 
+logger = logging.getLogger("metadata")
+
 
 def get_value_if_not_none(value, default):
     if value is None:
@@ -65,3 +73,168 @@ def get_client(cluster):
 def get_cluster_disk_size(es_client, kind="total", bytes="b"):
     allocations = es_client.cat.allocation(format="json", bytes=bytes, params={"request_timeout": 10})
     return sum([int(get_value_if_not_none(node.get(f"disk.{kind}"), 0)) for node in allocations])
+
+
+class ESIndexCatalog:
+    """
+    ES 集群的索引目录快照
+
+    一次生命周期任务内，同一集群的 ESStorage 共享一次加载的索引、别名及快照信息，
+    别名变更先作用于本地目录，再按集群合并为 update_aliases 请求批量提交
+    """
+
+    # 索引名格式: [v2_]{index_name}_{datetime}_{index}
+    INDEX_RE = re.compile(r"^(?P<version>v2_)?(?P<index_name>.+)_(?P<datetime>\d+)_(?P<index>\d+)$")
+    # 快照名格式: {index_name}_snapshot_{datetime}
+    SNAPSHOT_RE = re.compile(r"^(?P<index_name>.+)_snapshot_(?P<datetime>\d+)$")
+
+    def __init__(self, es_client, alias_batch_size: int = 500):
+        self.es_client = es_client
+        self.alias_batch_size = alias_batch_size
+
+        # {index: {"version": "v2", "size": 1024}}
+        self.index_info = {}
+        # {index_name: {index}}
+        self.table_indices = defaultdict(set)
+        # {index: {alias}}
+        self.index_aliases = defaultdict(set)
+        # {alias: {index}}
+        self.alias_indices = defaultdict(set)
+        # {repository: {index_name: [snapshot]}}
+        self.snapshots = {}
+        # 待提交的别名变更 [(table_id, action)]
+        self.alias_actions = []
+
+        self.load()
+
+    def load(self):
+        """加载集群的全部索引及别名"""
+        for item in self.es_client.cat.indices(
+            format="json", bytes="b", h="index,status,pri.store.size", params={"request_timeout": 60}
+        ):
+            # 与 indices.stats 及 get_alias 一致，不处理已关闭的索引
+            if item.get("status") == "close":
+                continue
+            self.add_index(item["index"], int(item.get("pri.store.size") or 0))
+
+        for item in self.es_client.cat.aliases(format="json", h="alias,index", params={"request_timeout": 60}):
+            if item["index"] in self.index_info:
+                self.index_aliases[item["index"]].add(item["alias"])
+                self.alias_indices[item["alias"]].add(item["index"])
+
+        logger.info(
+            "es index catalog loaded, index count->[%s], alias count->[%s]",
+            len(self.index_info),
+            len(self.alias_indices),
+        )
+
+    def add_index(self, index: str, size: int = 0):
+        """记录新增的索引"""
+        re_result = self.INDEX_RE.match(index)
+        if re_result is None:
+            return
+
+        self.index_info[index] = {"version": "v2" if re_result.group("version") else "v1", "size": size}
+        self.table_indices[re_result.group("index_name")].add(index)
+
+    def remove_index(self, index: str):
+        """记录删除的索引，索引删除后别名随之删除，待提交的相关别名变更不再需要"""
+        re_result = self.INDEX_RE.match(index)
+        if re_result is not None:
+            self.table_indices[re_result.group("index_name")].discard(index)
+        self.index_info.pop(index, None)
+
+        for alias in self.index_aliases.pop(index, set()):
+            self.alias_indices[alias].discard(index)
+        self.alias_actions = [
+            (table_id, action)
+            for table_id, action in self.alias_actions
+            if list(action.values())[0]["index"] != index
+        ]
+
+    def get_index_stats(self, index_name: str, version: str) -> Dict:
+        """返回结果表指定版本的索引大小，格式同 indices.stats"""
+        return {
+            "indices": {
+                index: {"primaries": {"store": {"size_in_bytes": self.index_info[index]["size"]}}}
+                for index in self.table_indices.get(index_name, [])
+                if self.index_info[index]["version"] == version
+            }
+        }
+
+    def get_index_aliases(self, index_name: str) -> Dict:
+        """返回结果表全部索引的别名，格式同 indices.get_alias"""
+        return {
+            index: {"aliases": {alias: {} for alias in self.index_aliases.get(index, [])}}
+            for index in self.table_indices.get(index_name, [])
+        }
+
+    def get_alias_indices(self, alias: str) -> List[str]:
+        """返回别名指向的索引"""
+        return list(self.alias_indices.get(alias, []))
+
+    def update_aliases(self, table_id: str, actions: List[Dict]):
+        """别名变更先作用于本地目录，累计到一定数量后提交"""
+        for action in actions:
+            operation, info = list(action.items())[0]
+            if operation == "add":
+                self.index_aliases[info["index"]].add(info["alias"])
+                self.alias_indices[info["alias"]].add(info["index"])
+            else:
+                self.index_aliases[info["index"]].discard(info["alias"])
+                self.alias_indices[info["alias"]].discard(info["index"])
+            self.alias_actions.append((table_id, action))
+
+        if len(self.alias_actions) >= self.alias_batch_size:
+            self.flush_aliases()
+
+    def flush_aliases(self):
+        """
+        合并提交别名变更
+        update_aliases 请求是原子的，提交失败时按结果表逐个重试，避免单个结果表的异常影响整个集群
+        """
+        alias_actions, self.alias_actions = self.alias_actions, []
+        if not alias_actions:
+            return
+
+        try:
+            self.es_client.indices.update_aliases(body={"actions": [action for _, action in alias_actions]})
+            logger.info("es index catalog update aliases success, action count->[%s]", len(alias_actions))
+            return
+        except (
+            elasticsearch5.ElasticsearchException,
+            elasticsearch.ElasticsearchException,
+            elasticsearch6.ElasticsearchException,
+        ):
+            logger.exception("es index catalog update aliases failed, will retry by table")
+
+        table_actions = defaultdict(list)
+        for table_id, action in alias_actions:
+            table_actions[table_id].append(action)
+        for table_id, actions in table_actions.items():
+            try:
+                self.es_client.indices.update_aliases(body={"actions": actions})
+            except Exception:
+                logger.exception("table_id->[%s] update aliases->[%s] failed", table_id, actions)
+
+    def get_snapshots(self, repository: str, index_name: str) -> List[Dict]:
+        """返回结果表在仓库中的快照，格式同 snapshot.get 中的 snapshots"""
+        if repository not in self.snapshots:
+            self.snapshots[repository] = defaultdict(list)
+            try:
+                snapshot_list = self.es_client.cat.snapshots(
+                    repository=repository, format="json", h="id,status", params={"request_timeout": 60}
+                )
+            except (elasticsearch5.NotFoundError, elasticsearch.NotFoundError, elasticsearch6.NotFoundError):
+                snapshot_list = []
+            for item in snapshot_list:
+                self.add_snapshot(repository, item["id"], item["status"])
+
+        return list(self.snapshots[repository].get(index_name, []))
+
+    def add_snapshot(self, repository: str, snapshot: str, state: str = "IN_PROGRESS"):
+        """记录新增的快照"""
+        re_result = self.SNAPSHOT_RE.match(snapshot)
+        if re_result is None or repository not in self.snapshots:
+            return
+        self.snapshots[repository][re_result.group("index_name")].append({"snapshot": snapshot, "state": state})
@@ -8,9 +8,11 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+import hashlib
 import logging
 import os
-from typing import Dict, List, Set
+import threading
+from typing import Dict, List, Optional, Set
 
 from packages.utils.redis_client import RedisClient
 
@@ -107,6 +109,203 @@ class RedisTools(object):
     def smembers(cls, key: str) -> Set:
         return cls().client.smembers(key)
 
+    @classmethod
+    def delete(cls, key: str) -> int:
+        return cls().client.delete(key)
+
+    @classmethod
+    def expire(cls, key: str, ttl: int) -> bool:
+        return cls().client.expire(key, ttl)
+
+
+def _to_str(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    return value
+
+
+class RedisPublisher(object):
+    """合并发布 redis 消息
+
+    时间窗口内的消息按通道去重后缓存，窗口结束时通过 pipeline 一次性发送
+    NOTE: 使用方按单条消息解析变更的 key，因此仍然是一条消息对应一个 key，仅合并网络往返
+    """
+
+    def __init__(self, window: Optional[float] = 0):
+        # 合并窗口(秒)，不大于 0 时立即发送
+        self.window = window or 0
+        # {channel: {msg: 发送成功后需要移除该消息的未通知集合 key}}
+        self._pending: Dict[str, Dict[str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def publish(self, channel: str, msg_list: List[str], unpublished_key: Optional[str] = None) -> int:
+        """缓存待发布的消息，返回新增的消息数量
+
+        :param unpublished_key: 记录未通知消息的集合，发送成功后才从中移除，发送失败时保留，由下次通知重新发送
+        """
+        if not msg_list:
+            return 0
+        count = 0
+        with self._lock:
+            pending = self._pending.setdefault(channel, {})
+            for msg in msg_list:
+                if msg not in pending:
+                    count += 1
+                if unpublished_key or msg not in pending:
+                    pending[msg] = unpublished_key
+            if self.window > 0 and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_by_timer)
+                self._timer.start()
+        if self.window <= 0:
+            self.flush()
+        return count
+
+    def flush(self) -> int:
+        """发送缓存的消息，返回发送的消息数量"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        count = sum(len(msgs) for msgs in pending.values())
+        if not count:
+            return 0
+        try:
+            pipeline = RedisTools().client.pipeline(transaction=False)
+            for channel, msgs in pending.items():
+                for msg in msgs:
+                    pipeline.publish(channel, msg)
+            pipeline.execute()
+        except Exception as e:
+            logger.error("publish msg error, %s", e)
+            raise Exception(f"publish msg error, {e}")
+
+        # 发送成功后，移除未通知标记
+        published = {}
+        for msgs in pending.values():
+            for msg, unpublished_key in msgs.items():
+                if unpublished_key:
+                    published.setdefault(unpublished_key, []).append(msg)
+        for unpublished_key, msgs in published.items():
+            try:
+                RedisTools.srem(unpublished_key, msgs)
+            except Exception:
+                # 标记未移除时，下次通知会重复发送，不影响正确性
+                logger.exception("failed to remove unpublished msg of key: %s", unpublished_key)
+        return count
+
+    def _flush_by_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("failed to flush buffered publish msg")
+
+
+class RedisHashSyncer(object):
+    """按字段内容摘要增量同步 redis hash
+
+    - 字段内容的摘要记录在 `{key}:digest` 中，仅写入摘要有变化的字段
+    - 摘要仅在新建时设置过期时间，过期后全部字段重新写入一次，修正被其他途径修改的字段
+    - 写入的字段记录在 `{key}:unpublished` 中，通知发送成功后才移除，未通知的字段在下次需要通知时一并通知
+    """
+
+    DIGEST_KEY_SUFFIX = "digest"
+    UNPUBLISHED_KEY_SUFFIX = "unpublished"
+    CHUNK_SIZE = 1000
+
+    def __init__(
+        self,
+        key: str,
+        channel: Optional[str] = None,
+        publisher: Optional[RedisPublisher] = None,
+        expire: Optional[int] = 24 * 60 * 60,
+        enabled: Optional[bool] = True,
+    ):
+        self.key = key
+        self.channel = channel
+        self.publisher = publisher or RedisPublisher()
+        # 摘要的过期时间，过期后全部字段重新写入一次，避免与实际数据长期不一致
+        self.expire = expire
+        self.enabled = enabled
+        self.digest_key = f"{key}:{self.DIGEST_KEY_SUFFIX}"
+        self.unpublished_key = f"{key}:{self.UNPUBLISHED_KEY_SUFFIX}"
+
+    @staticmethod
+    def digest(value: str) -> str:
+        return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+    def sync(self, field_value: Dict[str, str], is_publish: Optional[bool] = False) -> Dict[str, int]:
+        """写入有变化的字段，返回写入、跳过及通知的字段数量"""
+        stats = {"written": 0, "skipped": 0, "published": 0}
+        if not field_value:
+            return stats
+
+        if not self.enabled:
+            RedisTools.hmset_to_redis(self.key, field_value)
+            stats["written"] = len(field_value)
+            if is_publish and self.channel:
+                stats["published"] = len(field_value)
+                self.publisher.publish(self.channel, list(field_value.keys()))
+            return stats
+
+        client = RedisTools().client
+        digests = {field: self.digest(value) for field, value in field_value.items()}
+        fields = list(field_value.keys())
+        need_publish = bool(is_publish and self.channel)
+
+        # 一次往返读取摘要及未通知标记，仅检查本次同步的字段
+        pipeline = client.pipeline(transaction=False)
+        pipeline.exists(self.key)
+        pipeline.ttl(self.digest_key)
+        for start in range(0, len(fields), self.CHUNK_SIZE):
+            pipeline.hmget(self.digest_key, fields[start : start + self.CHUNK_SIZE])
+        if need_publish:
+            for field in fields:
+                pipeline.sismember(self.unpublished_key, field)
+        results = pipeline.execute()
+        key_exists, digest_ttl = results[0], results[1]
+        chunk_count = (len(fields) + self.CHUNK_SIZE - 1) // self.CHUNK_SIZE
+        old_digest_values = [value for chunk in results[2 : 2 + chunk_count] for value in chunk]
+        unpublished_flags = results[2 + chunk_count :]
+
+        # 数据被清理时，摘要不再可信，全部重新写入
+        old_digests = dict(zip(fields, old_digest_values)) if key_exists else {}
+        changed_fields = [field for field in fields if _to_str(old_digests.get(field)) != digests[field]]
+
+        if changed_fields:
+            pipeline = client.pipeline(transaction=False)
+            for start in range(0, len(changed_fields), self.CHUNK_SIZE):
+                chunk = changed_fields[start : start + self.CHUNK_SIZE]
+                pipeline.hmset(self.key, {field: field_value[field] for field in chunk})
+                pipeline.hmset(self.digest_key, {field: digests[field] for field in chunk})
+            if self.channel:
+                pipeline.sadd(self.unpublished_key, *changed_fields)
+            if self.expire:
+                # 仅在摘要新建时设置过期时间，避免持续写入导致摘要永不过期
+                if digest_ttl is None or digest_ttl < 0:
+                    pipeline.expire(self.digest_key, self.expire)
+                if self.channel:
+                    pipeline.expire(self.unpublished_key, self.expire)
+            pipeline.execute()
+
+        stats["written"] = len(changed_fields)
+        stats["skipped"] = len(fields) - len(changed_fields)
+        if not need_publish:
+            return stats
+
+        # 通知本次变更的字段，以及此前写入但未通知的字段，发送成功后由 publisher 移除未通知标记
+        changed_field_set = set(changed_fields)
+        publish_fields = changed_fields + [
+            field
+            for field, unpublished in zip(fields, unpublished_flags)
+            if unpublished and field not in changed_field_set
+        ]
+        if publish_fields:
+            stats["published"] = len(publish_fields)
+            self.publisher.publish(self.channel, publish_fields, unpublished_key=self.unpublished_key)
+        return stats
+
 
 def setup_client():
     RedisTools.metadata_redis_client = RedisClient.from_envs(
@@ -58,6 +58,7 @@ from monitor_web.models.custom_report import (
     CustomTSTable,
 )
 from monitor_web.plugin.constant import PluginType
+from monitor_web.strategies.metric_search_index import MetricSearchIndexManager
 from monitor_web.strategies.resources import GetMetricListV2Resource
 from monitor_web.tasks import append_custom_ts_metric_list_cache
 
@@ -1159,6 +1160,7 @@ class AddCustomMetricResource(Resource):
         create_params.update(extra_params)
         new_metric = MetricListCache(**create_params)
         new_metric.save()
+        MetricSearchIndexManager.notify([new_metric.bk_biz_id])
         return GetMetricListV2Resource.get_metric_list(
             validated_request_data["bk_biz_id"], MetricListCache.objects.filter(id=new_metric.id)
         )
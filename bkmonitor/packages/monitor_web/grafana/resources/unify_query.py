@@ -14,7 +14,7 @@ from collections import defaultdict
 from dataclasses import asdict
 from functools import reduce
 from itertools import chain
-from typing import Dict, List, Pattern, Tuple
+from typing import Dict, List, Optional, Pattern, Tuple
 
 import arrow
 from django.conf import settings
@@ -676,7 +676,11 @@ class UnifyQueryRawResource(ApiAuthResource):
             query_config["filter_dict"]["target"] = target_instances
         return True
 
-    def perform_request(self, params):
+    def get_query(self, params) -> Tuple[Optional[UnifyQuery], List[Dict]]:
+        """
+        构造统一查询对象，并返回指标信息
+        当目标实例为空时，查询对象为 None
+        """
         # cookies filter
         cookies_filter = get_cookies_filter()
         if cookies_filter:
@@ -691,7 +695,7 @@ class UnifyQueryRawResource(ApiAuthResource):
 
         # 查询目标实例
         if not self.get_target_instance(params):
-            return {"series": [], "metrics": metrics}
+            return None, metrics
 
         # 数据查询
         for query_config in params["query_configs"]:
@@ -749,8 +753,11 @@ class UnifyQueryRawResource(ApiAuthResource):
             functions=params["functions"],
         )
         safe_push_to_gateway(registry=OPERATION_REGISTRY)
+        return query, metrics
 
-        points = query.query_data(
+    @staticmethod
+    def get_query_kwargs(params) -> Dict:
+        return dict(
             start_time=params["start_time"] * 1000,
             end_time=params["end_time"] * 1000,
             limit=params["limit"],
@@ -758,6 +765,13 @@ class UnifyQueryRawResource(ApiAuthResource):
             down_sample_range=params["down_sample_range"],
         )
 
+    def perform_request(self, params):
+        query, metrics = self.get_query(params)
+        if query is None:
+            return {"series": [], "metrics": metrics}
+
+        points = query.query_data(**self.get_query_kwargs(params))
+
         # 数据预处理
         points = TimeCompareProcessor.process_origin_data(params, points)
         return {
@@ -785,30 +799,19 @@ class GraphUnifyQueryResource(UnifyQueryRawResource):
 
         return metrics[0].get("unit", "")
 
-    def data_format(self, params, data):
+    @staticmethod
+    def get_format_context(params) -> Dict:
         """
-        转换为Grafana TimeSeries的格式
-        :param params: 请求参数
-        :param data: [{
-            "metric_field": 32960991004.444443,
-            "bk_target_ip": "127.0.0.1",
-            "minute60": 1581350400000,
-            "time": 1581350400000
-        }]
-        :type data: list
-        :return:
-        :rtype: list
+        获取数据格式化所需的配置
         """
-
         dimension_fields = set(chain(*(query_config["group_by"] for query_config in params["query_configs"])))
 
-        formatted_data = defaultdict(dict)
-
         # 表达式翻译
         expression: str = params["expression"]
-        stack: str = params.get("stack")
         data_source_label = ""
         is_bar = False
+        # 需要展示的指标 (字段名, 展示名)
+        display_metrics = []
         for query_config in params["query_configs"]:
             data_source_label = query_config.get("data_source_label")
             for metric in query_config["metrics"]:
@@ -824,20 +827,50 @@ class GraphUnifyQueryResource(UnifyQueryRawResource):
                     (DataSourceLabel.BK_FTA, DataTypeLabel.EVENT),
                 )
 
-        for record in data:
-            dimensions = tuple(
-                sorted(
-                    (key, value)
-                    for key, value in record.items()
-                    if key in dimension_fields
-                    or key == "__time_compare"
-                    or (data_source_label == DataSourceLabel.PROMETHEUS and key not in ["_result_", "_time_"])
-                )
+        for query_config in params["query_configs"]:
+            for metric in query_config["metrics"]:
+                # 只展示需要展示的指标
+                if not metric.get("display"):
+                    continue
+
+                if metric.get("alias"):
+                    display_metrics.append((metric["alias"], f"{metric['field']}({metric['alias']})"))
+                else:
+                    display_metrics.append((metric["field"], metric["field"]))
+
+        def is_dimension(key: str) -> bool:
+            return (
+                key in dimension_fields
+                or key == "__time_compare"
+                or (data_source_label == DataSourceLabel.PROMETHEUS and key not in ["_result_", "_time_"])
             )
 
+        return {
+            "expression": expression,
+            "stack": params.get("stack"),
+            "is_bar": is_bar,
+            "display_metrics": display_metrics,
+            "is_dimension": is_dimension,
+        }
+
+    @staticmethod
+    def format_value(value):
+        if isinstance(value, (int, float)):
+            return round(value, settings.POINT_PRECISION)
+        return value
+
+    def format_records(self, context: Dict, formatted_data: Dict, data: List[Dict]):
+        """
+        按维度及指标归并记录
+        """
+        is_dimension = context["is_dimension"]
+        expression = context["expression"]
+
+        for record in data:
+            dimensions = tuple(sorted((key, value) for key, value in record.items() if is_dimension(key)))
+
             if record.get("_result_") is not None:
-                if isinstance(record["_result_"], (int, float)):
-                    record["_result_"] = round(record["_result_"], settings.POINT_PRECISION)
+                record["_result_"] = self.format_value(record["_result_"])
 
                 # 查询结果取值
                 formatted_data[dimensions].setdefault(("_result_", expression), []).append(
@@ -845,29 +878,57 @@ class GraphUnifyQueryResource(UnifyQueryRawResource):
                 )
 
             # 其他指标取值
-            for query_config in params["query_configs"]:
-                for metric in query_config["metrics"]:
-                    # 只展示需要展示的指标
-                    if not metric.get("display"):
+            for alias, display_dimension in context["display_metrics"]:
+                if record.get(alias) is not None:
+                    formatted_data[dimensions].setdefault((alias, display_dimension), []).append(
+                        [self.format_value(record[alias]), record["_time_"]]
+                    )
+
+    def format_series(self, context: Dict, formatted_data: Dict, series_list: List[Dict]):
+        """
+        按维度及指标归并按列组织的数据，结果与 format_records 一致
+        """
+        is_dimension = context["is_dimension"]
+
+        for series in series_list:
+            columns = series["columns"]
+
+            # 数据列也可能作为维度，此时只能逐条处理
+            if any(column in series["dimensions"] or is_dimension(column) for column in columns):
+                self.format_records(context, formatted_data, UnifyQuery.series_to_records([series]))
+                continue
+
+            dimensions = tuple(sorted((key, value) for key, value in series["dimensions"].items() if is_dimension(key)))
+            times = columns["_time_"]
+
+            metric_tuples = [("_result_", context["expression"])] + context["display_metrics"]
+            metric_datapoints = []
+            for order, metric_tuple in enumerate(metric_tuples):
+                values = columns.get(metric_tuple[0])
+                if values is None:
+                    continue
+
+                datapoints = []
+                first_index = None
+                for index, (value, timestamp) in enumerate(zip(values, times)):
+                    if value is None:
                         continue
+                    if first_index is None:
+                        first_index = index
+                    datapoints.append([self.format_value(value), timestamp])
 
-                    if metric.get("alias"):
-                        alias = metric["alias"]
-                        display_dimension = f"{metric['field']}({alias})"
-                    else:
-                        alias = metric["field"]
-                        display_dimension = alias
-
-                    alias = metric.get("alias") or metric["field"]
-                    if record.get(alias) is not None:
-                        value = record[alias]
-                        if isinstance(value, (int, float)):
-                            value = round(value, settings.POINT_PRECISION)
-                        formatted_data[dimensions].setdefault((alias, display_dimension), []).append(
-                            [value, record["_time_"]]
-                        )
-
-        # 构造图表数据结构
+                if datapoints:
+                    metric_datapoints.append((first_index, order, metric_tuple, datapoints))
+
+            # 与逐条处理时指标出现的先后顺序保持一致
+            metric_datapoints.sort(key=lambda x: x[:2])
+            for _, _, metric_tuple, datapoints in metric_datapoints:
+                formatted_data[dimensions].setdefault(metric_tuple, []).extend(datapoints)
+
+    def build_formatted_data(self, context: Dict, formatted_data: Dict) -> List[Dict]:
+        """
+        构造图表数据结构
+        """
         result = []
         for dimensions, metric_to_data_point in formatted_data.items():
             dimension_string = ", ".join("{}={}".format(dimension[0], dimension[1]) for dimension in dimensions)
@@ -884,14 +945,43 @@ class GraphUnifyQueryResource(UnifyQueryRawResource):
                     "metric_field": metric_tuple[0],
                     "datapoints": value,
                     "alias": metric_tuple[0],
-                    "type": "bar" if is_bar else "line",
+                    "type": "bar" if context["is_bar"] else "line",
                 }
-                if stack:
-                    item["stack"] = stack
+                if context["stack"]:
+                    item["stack"] = context["stack"]
                 result.append(item)
 
         return result
 
+    def data_format(self, params, data):
+        """
+        转换为Grafana TimeSeries的格式
+        :param params: 请求参数
+        :param data: [{
+            "metric_field": 32960991004.444443,
+            "bk_target_ip": "127.0.0.1",
+            "minute60": 1581350400000,
+            "time": 1581350400000
+        }]
+        :type data: list
+        :return:
+        :rtype: list
+        """
+        context = self.get_format_context(params)
+        formatted_data = defaultdict(dict)
+        self.format_records(context, formatted_data, data)
+        return self.build_formatted_data(context, formatted_data)
+
+    def series_data_format(self, params, series_list):
+        """
+        将按列组织的数据转换为Grafana TimeSeries的格式
+        :param series_list: UnifyQuery.query_series 的返回值
+        """
+        context = self.get_format_context(params)
+        formatted_data = defaultdict(dict)
+        self.format_series(context, formatted_data, series_list)
+        return self.build_formatted_data(context, formatted_data)
+
     def translate_dimensions(self, params: Dict, data: List):
         """
         维度翻译
@@ -945,12 +1035,20 @@ class GraphUnifyQueryResource(UnifyQueryRawResource):
         return data
 
     def perform_request(self, params):
-        raw_query_result = super(GraphUnifyQueryResource, self).perform_request(params)
-        points = raw_query_result["series"]
-        metrics = raw_query_result["metrics"]
+        if params["function"].get("time_compare"):
+            raw_query_result = super(GraphUnifyQueryResource, self).perform_request(params)
+            points = raw_query_result["series"]
+            metrics = raw_query_result["metrics"]
 
-        # 数据格式化
-        series = self.data_format(params, points)
+            # 数据格式化
+            series = self.data_format(params, points)
+        else:
+            # 无时间对比时，直接使用按列组织的数据进行格式化，无需构造逐条记录
+            query, metrics = self.get_query(params)
+            if query is None:
+                series = []
+            else:
+                series = self.series_data_format(params, query.query_series(**self.get_query_kwargs(params)))
 
         # 数据后处理
         series = TimeCompareProcessor.process_formatted_data(params, series)
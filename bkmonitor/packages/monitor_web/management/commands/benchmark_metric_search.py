@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import random
+import time
+
+from django.core.management import BaseCommand
+from monitor_web.strategies.metric_search_index import (
+    MetricSearchIndex,
+    MetricSearchIndexManager,
+)
+from monitor_web.strategies.resources.v2 import GetMetricListV2Resource
+
+PREFIXES = ["system", "container", "kube", "apm", "custom", "bkunifylogbeat", "mysql", "redis", "nginx", "jvm"]
+OBJECTS = ["cpu", "mem", "disk", "net", "io", "pod", "node", "process", "thread", "request", "gc", "conn", "cache"]
+ACTIONS = ["usage", "total", "free", "used", "rate", "count", "latency", "errors", "bytes", "seconds", "in", "out"]
+NAMES = ["使用率", "总量", "空闲", "延迟", "错误数", "请求数", "流量", "耗时"]
+DIMENSIONS = ["bk_target_ip", "bk_target_cloud_id", "pod_name", "namespace", "service_name", "device_name", "instance"]
+
+
+def generate_metric(index: int, rng: random.Random):
+    prefix = rng.choice(PREFIXES)
+    obj = rng.choice(OBJECTS)
+    action = rng.choice(ACTIONS)
+    table = f"{prefix}_{index // 50}.{obj}"
+    metric_field = f"{obj}_{action}_{index}"
+    return {
+        "result_table_id": table,
+        "metric_field": metric_field,
+        "metric_field_name": f"{obj.upper()} {rng.choice(NAMES)}",
+        "data_label": f"{prefix}_{index // 50}",
+        "readable_name": f"{table}.{metric_field}",
+        "dimensions": [{"id": name, "name": name} for name in rng.sample(DIMENSIONS, 3)],
+        "use_frequency": rng.randint(0, 10),
+    }
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    """
+    指标搜索倒排索引性能测试
+    - 默认使用构造的指标数据，可对比索引检索与 Python 逐行匹配(匹配规则与 icontains 一致，非数据库查询)的耗时
+    - 指定 --bk-biz-id 时使用数据库中该业务的指标构建索引，并对比索引不可用时回退的数据库模糊查询耗时
+    """
+
+    help = "benchmark metric search with inverted index on a synthetic metric table or a business in the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=1000000, help="synthetic metric count")
+        parser.add_argument("--rounds", type=int, default=20, help="search rounds per query")
+        parser.add_argument("--limit", type=int, default=10000, help="max candidates")
+        parser.add_argument("--scan", action="store_true", help="compare with python full scan")
+        parser.add_argument("--bk-biz-id", type=int, default=None, help="benchmark with metrics of the business")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["bk_biz_id"] is not None:
+            self.handle_database(options)
+            return
+
+        rng = random.Random(options["seed"])
+        size = options["size"]
+
+        start_time = time.time()
+        metrics = [generate_metric(i, rng) for i in range(size)]
+        self.stdout.write(f"generate {size} metrics, cost {time.time() - start_time:.2f}s")
+
+        index = MetricSearchIndex()
+        start_time = time.time()
+        for metric_id, metric in enumerate(metrics):
+            index.add(metric_id, metric)
+        index.search(["warmup"], options["limit"])
+        self.stdout.write(f"build index, tokens: {len(index.postings)}, cost {time.time() - start_time:.2f}s")
+
+        samples = [metrics[size // 2], metrics[size // 3], metrics[size // 7]]
+        queries = [
+            samples[0]["metric_field"],
+            samples[1]["readable_name"],
+            samples[1]["result_table_id"],
+            "_".join(samples[2]["metric_field"].split("_")[:2]),
+            f"_{size // 3}",
+            NAMES[0],
+        ]
+        for query in queries:
+            latencies = []
+            result = None
+            for __ in range(options["rounds"]):
+                start_time = time.perf_counter()
+                result = index.search([query], options["limit"])
+                latencies.append((time.perf_counter() - start_time) * 1000)
+
+            hits = "fallback" if result is None else len(result)
+            message = (
+                f"query {query!r}: hits={hits}, p50={percentile(latencies, 50):.2f}ms, "
+                f"p99={percentile(latencies, 99):.2f}ms"
+            )
+
+            if options["scan"]:
+                # 逐行校验，与数据库模糊查询的匹配规则一致
+                lower_query = query.lower()
+                exact_queries = index.parse_query(lower_query)
+                start_time = time.perf_counter()
+                scan_hits = sum(1 for doc in index.docs.values() if index.score(doc, lower_query, exact_queries))
+                message += f", python_scan={(time.perf_counter() - start_time) * 1000:.2f}ms(hits={scan_hits})"
+            self.stdout.write(message)
+
+    def handle_database(self, options):
+        """
+        对比索引检索与数据库模糊查询
+        """
+        bk_biz_id = options["bk_biz_id"]
+        index = MetricSearchIndex(bk_biz_id)
+        start_time = time.time()
+        count = MetricSearchIndexManager.load(index)
+        self.stdout.write(
+            f"build index of business({bk_biz_id}), metrics: {count}, cost {time.time() - start_time:.2f}s"
+        )
+        if not count:
+            return
+
+        rng = random.Random(options["seed"])
+        docs = rng.sample(list(index.docs.values()), min(3, count))
+        queries = [docs[0][index.METRIC_FIELD], docs[-1][index.READABLE_NAME], docs[-1][index.RESULT_TABLE_ID]]
+        queryset = MetricSearchIndexManager.get_queryset(bk_biz_id)
+        for query in queries:
+            index_latencies = []
+            db_latencies = []
+            result = None
+            db_hits = 0
+            for __ in range(options["rounds"]):
+                start_time = time.perf_counter()
+                result = index.search([query], options["limit"])
+                index_latencies.append((time.perf_counter() - start_time) * 1000)
+
+                # 不传业务ID时不使用索引，即为索引不可用时的数据库模糊查询
+                start_time = time.perf_counter()
+                db_hits = len(GetMetricListV2Resource.query_filter(queryset, {}, [query]).values_list("id", flat=True))
+                db_latencies.append((time.perf_counter() - start_time) * 1000)
+
+            hits = "fallback" if result is None else len(result)
+            self.stdout.write(
+                f"query {query!r}: hits={hits}, p50={percentile(index_latencies, 50):.2f}ms, "
+                f"p99={percentile(index_latencies, 99):.2f}ms, db_hits={db_hits}, "
+                f"db_p50={percentile(db_latencies, 50):.2f}ms, db_p99={percentile(db_latencies, 99):.2f}ms"
+            )
@@ -16,7 +16,7 @@ import time
 from collections import defaultdict
 from datetime import datetime
 from functools import reduce
-from typing import Dict, Generator, List
+from typing import Dict, Generator, List, Set, Tuple
 
 from django.conf import settings
 from django.db.models import Count, Max, Q
@@ -36,6 +36,7 @@ from monitor_web.plugin.manager.process import (
     BuildInProcessDimension,
     BuildInProcessMetric,
 )
+from monitor_web.strategies.metric_search_index import MetricSearchIndexManager
 from monitor_web.tasks import run_metric_manager_async
 
 from bkmonitor.commons.tools import is_ipv6_biz
@@ -69,6 +70,7 @@ from constants.strategy import (
 )
 from core.drf_resource import api
 from core.errors.api import BKAPIError
+from core.prometheus import metrics
 
 FILTER_DIMENSION_LIST = ["time", "bk_supplier_id", "bk_cmdb_level", "timestamp"]
 # 时序指标filed_type
@@ -173,7 +175,88 @@ UPTIMECHECK_MAP = {
     "ICMP": [],
 }
 
-METRIC_POOL_KEYS = ["id", "metric_md5", "bk_biz_id", "result_table_id", "metric_field", "related_id", "readable_name"]
+METRIC_POOL_KEYS = ["id", "bk_biz_id", "result_table_id", "metric_field", "related_id", "metric_md5"]
+METRIC_POOL_CHUNK_SIZE = 5000
+
+
+class MetricCacheWriter:
+    """
+    指标缓存批量写入
+    根据单批写入耗时自适应调整批量大小，并统计各类变更数量
+    """
+
+    # 单批写入的目标耗时(秒)
+    TARGET_WRITE_TIME = 1
+
+    def __init__(self, manager_name: str):
+        self.manager_name = manager_name
+        self.min_batch_size = getattr(settings, "METRIC_CACHE_BATCH_SIZE_MIN", 50)
+        self.max_batch_size = max(getattr(settings, "METRIC_CACHE_BATCH_SIZE_MAX", 2000), self.min_batch_size)
+        self.batch_size = self.min_batch_size
+        self.update_fields = [
+            field.name for field in MetricListCache._meta.get_fields(include_parents=False) if not field.auto_created
+        ]
+
+        self.to_be_create: List[MetricListCache] = []
+        self.to_be_update: List[MetricListCache] = []
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+
+    def create(self, metric: MetricListCache):
+        self.to_be_create.append(metric)
+        if len(self.to_be_create) >= self.batch_size:
+            self.flush_create()
+
+    def update(self, metric: MetricListCache):
+        self.to_be_update.append(metric)
+        if len(self.to_be_update) >= self.batch_size:
+            self.flush_update()
+
+    def adjust_batch_size(self, cost: float):
+        # 写入较快时扩大批量，较慢时缩小批量
+        if cost < self.TARGET_WRITE_TIME / 2:
+            self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+        elif cost > self.TARGET_WRITE_TIME:
+            self.batch_size = max(self.batch_size // 2, self.min_batch_size)
+
+    def flush_create(self):
+        if not self.to_be_create:
+            return
+
+        to_be_create, self.to_be_create = self.to_be_create, []
+        start_time = time.time()
+        MetricListCache.objects.bulk_create(to_be_create, batch_size=len(to_be_create))
+        self.adjust_batch_size(time.time() - start_time)
+
+        self.created += len(to_be_create)
+        metrics.METRIC_CACHE_REFRESH_ROWS.labels(self.manager_name, "create").inc(len(to_be_create))
+
+    def flush_update(self):
+        if not self.to_be_update:
+            return
+
+        to_be_update, self.to_be_update = self.to_be_update, []
+        start_time = time.time()
+        MetricListCache.objects.bulk_update(to_be_update, self.update_fields, batch_size=len(to_be_update))
+        self.adjust_batch_size(time.time() - start_time)
+
+        self.updated += len(to_be_update)
+        metrics.METRIC_CACHE_REFRESH_ROWS.labels(self.manager_name, "update").inc(len(to_be_update))
+
+    def flush(self):
+        self.flush_create()
+        self.flush_update()
+        if self.unchanged:
+            metrics.METRIC_CACHE_REFRESH_ROWS.labels(self.manager_name, "unchanged").inc(self.unchanged)
+
+    def delete(self, metric_ids: List[int]):
+        for ids in chunks(metric_ids, self.max_batch_size):
+            MetricListCache.objects.filter(id__in=ids).delete()
+
+        self.deleted += len(metric_ids)
+        metrics.METRIC_CACHE_REFRESH_ROWS.labels(self.manager_name, "delete").inc(len(metric_ids))
 
 
 class BaseMetricCacheManager:
@@ -229,30 +312,33 @@ class BaseMetricCacheManager:
             .annotate(use_frequency=Count("metric_id"))
         }
 
-    def _run(self):
-        start_time = time.time()
-        logger.info(f"update metric {self.__class__.__name__}({self.bk_biz_id}) start，timestamp: {int(start_time)}")
-
-        # 集中整理后进行差量更新
-        to_be_create = []
-        to_be_update = []
-        to_be_delete = []
-        self.refresh_metric_use_frequency()
-
+    def get_metric_pool_digest(self) -> Tuple[Dict[str, Tuple[int, str]], List[int], Set[int]]:
+        """
+        读取已有指标的摘要，仅保留指标ID及md5，避免加载完整的指标数据
+        :return: 指标摘要 {metric_key: (id, metric_md5)}，重复指标ID，重复指标所属业务
+        """
         metric_pool = self.get_metric_pool()
         if self.bk_biz_id is not None:
             metric_pool = metric_pool.filter(bk_biz_id=self.bk_biz_id)
-        metric_pool_values = metric_pool.only(*METRIC_POOL_KEYS)
-
-        # metric_hash_dict
-        metric_hash_dict = {}
-        for m in list(metric_pool_values):
-            metric_id = "{}.{}.{}.{}".format(m.bk_biz_id, m.result_table_id, m.metric_field, m.related_id)
-            if metric_id in metric_hash_dict:
-                to_be_delete.append(m.id)
+
+        digest = {}
+        duplicate_ids = []
+        duplicate_biz_ids = set()
+        for metric_id, bk_biz_id, result_table_id, metric_field, related_id, metric_md5 in metric_pool.values_list(
+            *METRIC_POOL_KEYS
+        ).iterator(chunk_size=METRIC_POOL_CHUNK_SIZE):
+            metric_key = "{}.{}.{}.{}".format(bk_biz_id, result_table_id, metric_field, related_id)
+            if metric_key in digest:
+                duplicate_ids.append(metric_id)
+                duplicate_biz_ids.add(bk_biz_id)
             else:
-                metric_hash_dict[metric_id] = m
+                digest[metric_key] = (metric_id, metric_md5)
+        return digest, duplicate_ids, duplicate_biz_ids
 
+    def iter_metrics(self) -> Generator[Dict, None, None]:
+        """
+        逐表流式获取指标，并补全指标字段
+        """
         for table in self.get_tables():
             for metric in self.get_metrics_by_table(table):
                 # 处理result_table_id长度
@@ -279,66 +365,90 @@ class BaseMetricCacheManager:
                         )
                     )
                 )
-                metric_id = "{}.{}.{}.{}".format(
-                    metric["bk_biz_id"],
-                    metric.get("result_table_id", ""),
-                    metric["metric_field"],
-                    metric.get("related_id", ""),
-                )
-                metric_instance = metric_hash_dict.pop(metric_id, None)
-                if metric_instance is None:
-                    _metric = MetricListCache(**metric)
-                    metric["readable_name"] = _metric.get_human_readable_name()
-                    _metric.readable_name = metric["readable_name"]
-                    _metric.metric_md5 = count_md5(metric)
-
-                    logger.info("Going to add %s to cache creating list", metric_id)
-                    to_be_create.append(_metric)
-                    continue
+                yield metric
 
-                # readable_name 可能会因用户修改data_label而变更，因此跟随周期任务自动更新
-                metric["readable_name"] = metric_instance.get_human_readable_name()
-
-                metric["metric_md5"] = count_md5(metric)
-                if not metric_instance.metric_md5 or metric_instance.metric_md5 != metric["metric_md5"]:
-                    metric["last_update"] = datetime.now()
-                    logger.info(f"Going to adding {metric_id} to cache updating list")
-                    metric["id"] = metric_instance.id
-                    to_be_update.append(metric)
-                    metric_instance.metric_md5 = metric["metric_md5"]
-
-        # create
-        if to_be_create:
-            logger.info("Going to bulk create %s metric caches", len(to_be_create))
-            MetricListCache.objects.bulk_create(to_be_create, batch_size=50)
-
-        # update
-        if to_be_update:
-            logger.info("Going to bulk update %s metric caches", len(to_be_update))
-            for metrics in chunks(to_be_update, 500):
-                init_md5_metrics = []
-                for metric in metrics:
-                    _metric = MetricListCache(**metric)
-                    init_md5_metrics.append(_metric)
-                fields = [
-                    field.name
-                    for field in MetricListCache._meta.get_fields(include_parents=False)
-                    if not field.auto_created
-                ]
-                MetricListCache.objects.bulk_update(init_md5_metrics, fields, batch_size=500)
+    def _run(self):
+        start_time = time.time()
+        manager_name = self.__class__.__name__
+        logger.info(f"update metric {manager_name}({self.bk_biz_id}) start，timestamp: {int(start_time)}")
 
-        # clean (手动添加的自定义指标标记md5为0，不做删除处理）
-        to_be_delete.extend([m.id for m in list(metric_hash_dict.values()) if m.metric_md5 != "0"])
-        if to_be_delete:
-            logger.info("Going to delete metric caches %s", list(metric_hash_dict.keys()))
-            MetricListCache.objects.filter(id__in=to_be_delete).delete()
+        exc = None
+        try:
+            writer = self.refresh()
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            metrics.METRIC_CACHE_REFRESH_TIME.labels(manager_name, str(exc)).observe(time.time() - start_time)
+            metrics.report_all()
 
         logger.info(
-            f"update metric {self.__class__.__name__}({self.bk_biz_id}) end, "
-            f"create {len(to_be_create)} metric,update {len(to_be_update)} metric, delete {len(to_be_delete)} metric."
-            f"timestamp: {int(start_time)}, cost {time.time() - start_time}s"
+            f"update metric {manager_name}({self.bk_biz_id}) end, "
+            f"create {writer.created} metric,update {writer.updated} metric, delete {writer.deleted} metric, "
+            f"unchanged {writer.unchanged} metric. timestamp: {int(start_time)}, cost {time.time() - start_time}s"
         )
 
+    def refresh(self) -> "MetricCacheWriter":
+        """
+        差量刷新指标缓存
+        逐个指标与已有指标的md5比对，变更的指标按批写入，内存占用不随表数量增长
+        """
+        writer = MetricCacheWriter(self.__class__.__name__)
+        self.refresh_metric_use_frequency()
+
+        metric_digest, to_be_delete, changed_biz_ids = self.get_metric_pool_digest()
+
+        for metric in self.iter_metrics():
+            metric_key = "{}.{}.{}.{}".format(
+                metric["bk_biz_id"],
+                metric.get("result_table_id", ""),
+                metric["metric_field"],
+                metric.get("related_id", ""),
+            )
+            # readable_name 可能会因用户修改data_label而变更，因此跟随周期任务自动更新
+            _metric = MetricListCache(**metric)
+            metric["readable_name"] = _metric.get_human_readable_name()
+            _metric.readable_name = metric["readable_name"]
+
+            exists = metric_digest.pop(metric_key, None)
+            if exists is None:
+                _metric.metric_md5 = count_md5(metric)
+                logger.debug("Going to add %s to cache creating list", metric_key)
+                writer.create(_metric)
+                changed_biz_ids.add(_metric.bk_biz_id)
+                continue
+
+            metric_id, metric_md5 = exists
+            metric["metric_md5"] = count_md5(metric)
+            if not metric_md5 or metric_md5 != metric["metric_md5"]:
+                logger.debug(f"Going to adding {metric_key} to cache updating list")
+                _metric.id = metric_id
+                _metric.metric_md5 = metric["metric_md5"]
+                _metric.last_update = datetime.now()
+                writer.update(_metric)
+                changed_biz_ids.add(_metric.bk_biz_id)
+            else:
+                writer.unchanged += 1
+
+        writer.flush()
+
+        # clean (手动添加的自定义指标标记md5为0，不做删除处理）
+        for metric_key, (metric_id, metric_md5) in metric_digest.items():
+            if metric_md5 != "0":
+                to_be_delete.append(metric_id)
+                changed_biz_ids.add(int(metric_key.split(".", 1)[0]))
+        if to_be_delete:
+            logger.info("Going to delete %s metric caches", len(to_be_delete))
+            writer.delete(to_be_delete)
+
+        # 通知指标搜索索引增量同步
+        try:
+            MetricSearchIndexManager.notify(changed_biz_ids, to_be_delete)
+        except Exception as e:
+            logger.exception(f"notify metric search index failed: {e}")
+
+        return writer
+
     def run(self, delay=False):
         if delay:
             run_metric_manager_async.delay(self)
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from bkmonitor.models.metric_list_cache import MetricListCache
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+class MetricSearchIndex:
+    """
+    指标选择器倒排索引(单个业务)
+
+    以字段中的词(按非字母数字字符切分)建立倒排表，查询时先在词表中做子串匹配得到候选指标，
+    再对候选指标做与 icontains 等价的精确校验，保证结果与数据库模糊查询一致
+    """
+
+    # 文档字段顺序
+    FIELDS = ("result_table_id", "metric_field", "metric_field_name", "data_label", "readable_name", "dimensions")
+    RESULT_TABLE_ID, METRIC_FIELD, METRIC_FIELD_NAME, DATA_LABEL, READABLE_NAME, DIMENSIONS = range(len(FIELDS))
+    # 首个查询词命中超过 limit 的倍数时不再求交集，直接放弃使用索引
+    CANDIDATE_SCAN_FACTOR = 10
+
+    def __init__(self, bk_biz_id: int = None):
+        self.bk_biz_id = bk_biz_id
+        self.docs: Dict[int, Tuple[str, ...]] = {}
+        self.use_frequency: Dict[int, int] = {}
+        self.postings: Dict[str, Set[int]] = {}
+
+        # 同步状态
+        self.loaded = False
+        self.version = None
+        self.synced_at = None
+        self.built_at = 0
+
+        # 词表子串查找缓存，词表变化时重建
+        self._vocab_dirty = True
+        self._vocab_text = ""
+        self._vocab_starts: List[int] = []
+        self._vocab_tokens: List[str] = []
+
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return TOKEN_PATTERN.findall(text.lower())
+
+    @classmethod
+    def build_document(cls, metric: Dict) -> Tuple[str, ...]:
+        """
+        将指标转换为小写的字段元组
+        """
+        dimensions = []
+        for dimension in metric.get("dimensions") or []:
+            if isinstance(dimension, dict):
+                dimensions.append(f"{dimension.get('id', '')} {dimension.get('name', '')}")
+            else:
+                dimensions.append(str(dimension))
+
+        return tuple(
+            (" ".join(dimensions) if field == "dimensions" else str(metric.get(field) or "")).lower()
+            for field in cls.FIELDS
+        )
+
+    def add(self, metric_id: int, metric: Dict):
+        """
+        新增或更新指标
+        """
+        doc = self.build_document(metric)
+        with self._lock:
+            old_doc = self.docs.get(metric_id)
+            if old_doc == doc:
+                self.use_frequency[metric_id] = metric.get("use_frequency") or 0
+                return
+            if old_doc is not None:
+                self._remove_postings(metric_id, old_doc)
+
+            self.docs[metric_id] = doc
+            self.use_frequency[metric_id] = metric.get("use_frequency") or 0
+            for token in {token for value in doc for token in TOKEN_PATTERN.findall(value)}:
+                ids = self.postings.get(token)
+                if ids is None:
+                    self.postings[token] = {metric_id}
+                    self._vocab_dirty = True
+                else:
+                    ids.add(metric_id)
+
+    def remove(self, metric_id: int):
+        with self._lock:
+            doc = self.docs.pop(metric_id, None)
+            self.use_frequency.pop(metric_id, None)
+            if doc is not None:
+                self._remove_postings(metric_id, doc)
+
+    def _remove_postings(self, metric_id: int, doc: Tuple[str, ...]):
+        for token in {token for value in doc for token in TOKEN_PATTERN.findall(value)}:
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(metric_id)
+            if not ids:
+                del self.postings[token]
+                self._vocab_dirty = True
+
+    def _refresh_vocab(self):
+        if not self._vocab_dirty:
+            return
+
+        # 词表拼接为一个字符串，子串查找交给 str.find，再通过起始位置反查对应的词
+        tokens = list(self.postings)
+        starts = []
+        position = 0
+        for token in tokens:
+            starts.append(position)
+            position += len(token) + 1
+        self._vocab_tokens = tokens
+        self._vocab_starts = starts
+        self._vocab_text = "\n".join(tokens)
+        self._vocab_dirty = False
+
+    def _match_tokens(self, term: str) -> Set[str]:
+        """
+        查找词表中包含 term 的词
+        """
+        tokens = set()
+        text = self._vocab_text
+        position = text.find(term)
+        while position != -1:
+            index = bisect.bisect_right(self._vocab_starts, position) - 1
+            token = self._vocab_tokens[index]
+            tokens.add(token)
+            # 跳到下一个词继续查找
+            position = text.find(term, self._vocab_starts[index] + len(token) + 1)
+        return tokens
+
+    def _candidates(self, terms: Iterable[str], limit: int) -> Optional[Set[int]]:
+        """
+        根据查询词获取候选指标，候选数量超过 limit 时返回 None
+        """
+        term_postings = []
+        for term in set(terms):
+            postings = [self.postings[token] for token in self._match_tokens(term)]
+            term_postings.append((sum(len(ids) for ids in postings), postings))
+        if not term_postings:
+            return None
+
+        # 从区分度最高的查询词开始求交集
+        term_postings.sort(key=lambda item: item[0])
+        estimate, postings = term_postings[0]
+        if estimate > limit * self.CANDIDATE_SCAN_FACTOR:
+            return None
+        candidates = set().union(*postings)
+
+        for estimate, postings in term_postings[1:]:
+            if not candidates:
+                break
+            if len(postings) <= self.CANDIDATE_SCAN_FACTOR:
+                # 命中的词较少时逐个判断，避免合并大的倒排表
+                candidates = {metric_id for metric_id in candidates if any(metric_id in ids for ids in postings)}
+            else:
+                candidates &= set().union(*postings)
+
+        if len(candidates) > limit:
+            return None
+        return candidates
+
+    @staticmethod
+    def parse_query(query: str) -> List[Tuple[str, str, str]]:
+        """
+        解析指标ID格式的查询，与 GetMetricListV2Resource.filter_by_conditions 保持一致
+        :return: [(结果表字段, 结果表部分, 指标部分)]
+        """
+        fields = query.split(".")
+        if len(fields) == 2:
+            return [("result_table_id", fields[0], fields[1]), ("data_label", fields[0], fields[1])]
+        if len(fields) >= 3:
+            return [("result_table_id", ".".join(fields[:2]), ".".join(fields[2:]))]
+        return []
+
+    def score(self, doc: Tuple[str, ...], query: str, exact_queries: List[Tuple[str, str, str]]) -> int:
+        """
+        计算指标与查询的相关度，0 表示不匹配
+        """
+        metric_field = doc[self.METRIC_FIELD]
+        if metric_field == query:
+            return 100
+        for field, table_part, metric_part in exact_queries:
+            table_value = doc[self.RESULT_TABLE_ID if field == "result_table_id" else self.DATA_LABEL]
+            if table_part in table_value and metric_part in metric_field:
+                # 完整的指标ID匹配优先展示
+                return 100 if doc[self.READABLE_NAME] == query else 80
+        if metric_field.startswith(query):
+            return 60
+        if query in metric_field:
+            return 40
+        if query in doc[self.RESULT_TABLE_ID]:
+            return 20
+        if query in doc[self.METRIC_FIELD_NAME]:
+            return 10
+        return 0
+
+    def search(self, queries: Iterable[str], limit: int) -> Optional[List[Tuple[int, Tuple[int, int]]]]:
+        """
+        模糊搜索指标
+        匹配规则与数据库查询一致: 结果表ID/指标名/指标别名包含查询词，或按指标ID格式拆分后分别匹配
+        :return: [(指标ID, (相关度, 使用频率))]，无法使用索引(如查询词过短、命中过多)时返回 None
+        """
+        scores = {}
+        with self._lock:
+            self._refresh_vocab()
+            for query in queries:
+                query = query.lower()
+                terms = TOKEN_PATTERN.findall(query)
+                if not terms:
+                    return None
+
+                candidates = self._candidates(terms, limit)
+                if candidates is None:
+                    return None
+
+                exact_queries = self.parse_query(query)
+                for metric_id in candidates:
+                    score = self.score(self.docs[metric_id], query, exact_queries)
+                    if score > scores.get(metric_id, 0):
+                        scores[metric_id] = score
+                if len(scores) > limit:
+                    return None
+
+            return [(metric_id, (score, self.use_frequency.get(metric_id, 0))) for metric_id, score in scores.items()]
+
+
+class MetricSearchIndexManager:
+    """
+    进程内的指标倒排索引管理
+    - 指标缓存刷新后更新共享版本号，各进程查询时发现版本变化，按 last_update 增量同步
+    - 索引的构建及同步在后台线程中执行，索引未就绪或版本落后时，由调用方回退为数据库查询
+    - 按 LRU 淘汰业务索引，进程内索引的指标总数不超过 METRIC_SEARCH_INDEX_MAX_METRICS
+    """
+
+    VERSION_KEY = "metric_search_index_version:{bk_biz_id}"
+    VERSION_TIMEOUT = 60 * 60 * 24
+    # 增量同步时往前多取一段时间，避免并发写入时遗漏
+    SYNC_OVERLAP = timedelta(minutes=1)
+    BUILD_CHUNK_SIZE = 5000
+    VALUE_FIELDS = ("id", "use_frequency", "last_update") + MetricSearchIndex.FIELDS
+
+    _indexes: "OrderedDict[int, MetricSearchIndex]" = OrderedDict()
+    # 正在构建或同步的业务
+    _pending: Set[int] = set()
+    _lock = threading.Lock()
+    # 单线程执行，避免同时构建多个索引占用过多数据库及CPU资源
+    _builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metric_search_index")
+
+    @classmethod
+    def get_queryset(cls, bk_biz_id: int):
+        # 不使用带请求上下文过滤的默认 manager，索引中保留全部指标，由调用方的查询条件进行过滤
+        return MetricListCache._base_manager.filter(bk_biz_id=bk_biz_id)
+
+    @classmethod
+    def load(cls, index: MetricSearchIndex, since=None) -> int:
+        queryset = cls.get_queryset(index.bk_biz_id)
+        if since is not None:
+            queryset = queryset.filter(last_update__gte=since - cls.SYNC_OVERLAP)
+
+        count = 0
+        for metric in queryset.values(*cls.VALUE_FIELDS).iterator(chunk_size=cls.BUILD_CHUNK_SIZE):
+            index.add(metric["id"], metric)
+            if metric["last_update"] and (index.synced_at is None or metric["last_update"] > index.synced_at):
+                index.synced_at = metric["last_update"]
+            count += 1
+        return count
+
+    @classmethod
+    def build(cls, bk_biz_id: int, version=None):
+        """
+        全量构建或增量同步业务索引，在后台线程中执行
+        """
+        try:
+            index = cls._indexes.get(bk_biz_id)
+            rebuild_interval = getattr(settings, "METRIC_SEARCH_INDEX_REBUILD_INTERVAL", 60 * 60)
+            start_time = time.time()
+            if index is None or start_time - index.built_at > rebuild_interval:
+                # 全量构建完成前，继续使用旧的索引
+                index = MetricSearchIndex(bk_biz_id)
+                index.built_at = start_time
+                count = cls.load(index)
+                index.loaded = True
+                index.version = version
+                logger.info(
+                    "[metric_search_index] build index(%s) with %s metrics, cost %.3fs",
+                    bk_biz_id,
+                    count,
+                    time.time() - start_time,
+                )
+            else:
+                cls.load(index, since=index.synced_at)
+                index.version = version
+
+            with cls._lock:
+                cls._indexes[bk_biz_id] = index
+                cls._indexes.move_to_end(bk_biz_id)
+                cls._evict()
+        except Exception as e:
+            logger.exception(f"[metric_search_index] build index({bk_biz_id}) failed: {e}")
+        finally:
+            with cls._lock:
+                cls._pending.discard(bk_biz_id)
+
+    @classmethod
+    def build_in_background(cls, bk_biz_id: int, version=None):
+        try:
+            cls.build(bk_biz_id, version)
+        finally:
+            # 后台线程不会自动回收数据库连接
+            connections.close_all()
+
+    @classmethod
+    def _evict(cls):
+        """
+        淘汰最久未使用的索引，至少保留最近使用的一个
+        """
+        max_metrics = getattr(settings, "METRIC_SEARCH_INDEX_MAX_METRICS", 2000000)
+        total = sum(len(index) for index in cls._indexes.values())
+        while len(cls._indexes) > 1 and total > max_metrics:
+            __, index = cls._indexes.popitem(last=False)
+            total -= len(index)
+
+    @classmethod
+    def submit_build(cls, bk_biz_id: int, version=None):
+        with cls._lock:
+            if bk_biz_id in cls._pending:
+                return
+            cls._pending.add(bk_biz_id)
+        cls._builder.submit(cls.build_in_background, bk_biz_id, version)
+
+    @classmethod
+    def get_index(cls, bk_biz_id: int, version=None) -> Optional[MetricSearchIndex]:
+        """
+        获取可用的业务索引，不阻塞请求
+        索引不存在或版本落后时提交后台构建，并返回 None；索引到期重建期间继续使用旧的索引
+        """
+        with cls._lock:
+            index = cls._indexes.get(bk_biz_id)
+            if index is not None:
+                cls._indexes.move_to_end(bk_biz_id)
+
+        rebuild_interval = getattr(settings, "METRIC_SEARCH_INDEX_REBUILD_INTERVAL", 60 * 60)
+        if index is None or index.version != version or time.time() - index.built_at > rebuild_interval:
+            cls.submit_build(bk_biz_id, version)
+        if index is None or index.version != version:
+            return None
+        return index
+
+    @classmethod
+    def search(cls, bk_biz_ids: List[int], queries: List[str]) -> Optional[List[int]]:
+        """
+        在多个业务的索引中搜索，返回按相关度、使用频率排序的候选指标ID，任一业务索引不可用时返回 None
+        """
+        limit = getattr(settings, "METRIC_SEARCH_INDEX_MAX_CANDIDATES", 10000)
+        versions = cache.get_many([cls.VERSION_KEY.format(bk_biz_id=bk_biz_id) for bk_biz_id in bk_biz_ids])
+
+        indexes = [
+            cls.get_index(bk_biz_id, versions.get(cls.VERSION_KEY.format(bk_biz_id=bk_biz_id)))
+            for bk_biz_id in bk_biz_ids
+        ]
+        if None in indexes:
+            return None
+
+        results = []
+        for index in indexes:
+            result = index.search(queries, limit)
+            if result is None:
+                return None
+            results.extend(result)
+
+        if len(results) > limit:
+            return None
+        results.sort(key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        return [metric_id for metric_id, __ in results]
+
+    @classmethod
+    def notify(cls, bk_biz_ids: Iterable[int], deleted_ids: Iterable[int] = ()):
+        """
+        指标缓存变更通知
+        :param bk_biz_ids: 发生变更的业务
+        :param deleted_ids: 删除的指标，当前进程中已加载的索引直接移除，其他进程在全量重建时回收
+        """
+        bk_biz_ids = set(bk_biz_ids)
+        if not bk_biz_ids:
+            return
+
+        version = time.time()
+        try:
+            cache.set_many(
+                {cls.VERSION_KEY.format(bk_biz_id=bk_biz_id): version for bk_biz_id in bk_biz_ids},
+                cls.VERSION_TIMEOUT,
+            )
+        except Exception as e:
+            # 通知失败不影响指标写入，索引在全量重建时恢复
+            logger.exception(f"notify metric search index failed: {e}")
+
+        deleted_ids = list(deleted_ids)
+        if deleted_ids:
+            for bk_biz_id in bk_biz_ids:
+                index = cls._indexes.get(bk_biz_id)
+                if index is None:
+                    continue
+                for metric_id in deleted_ids:
+                    index.remove(metric_id)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._indexes = OrderedDict()
+            cls._pending = set()
@@ -28,6 +28,7 @@ from monitor_web.strategies.constant import (
     DEFAULT_TRIGGER_CONFIG_MAP,
     GLOBAL_TRIGGER_CONFIG,
 )
+from monitor_web.strategies.metric_search_index import MetricSearchIndexManager
 from monitor_web.strategies.serializers import handle_target
 from monitor_web.tasks import update_metric_list_by_biz
 from rest_framework import serializers
@@ -1275,37 +1276,62 @@ class GetMetricListV2Resource(Resource):
 
         # 模糊搜索
         if filter_dict["query"]:
-            # 尝试解析指标ID格式的query字符串
-            exact_query = []
-            for query in filter_dict["query"]:
-                query_params_list = []
-                fields = query.split(".")
-                if len(fields) == 2:
-                    query_params_list.extend(
-                        [
-                            {"result_table_id": fields[0], "metric_field": fields[1]},
-                            {"data_label": fields[0], "metric_field": fields[1]},
-                        ]
-                    )
-                elif len(fields) >= 3:
-                    query_params_list.append(
-                        {"result_table_id": ".".join(fields[:2]), "metric_field": ".".join(fields[2:])}
-                    )
+            metrics = cls.query_filter(metrics, params, filter_dict["query"])
 
-                for query_params in query_params_list:
-                    filter_params = {
-                        f"{query_key}__icontains": query_value for query_key, query_value in query_params.items()
-                    }
-                    exact_query.append(Q(**filter_params))
+        return metrics
 
-            queries = []
-            for query, field in product(filter_dict["query"], ["result_table_id", "metric_field", "metric_field_name"]):
-                queries.append(Q(**{f"{field}__icontains": query}))
+    @classmethod
+    def search_metric_ids(cls, params: Dict, queries: List[str]) -> Optional[List[int]]:
+        """
+        通过倒排索引搜索指标，返回按相关度排序的候选指标ID，索引不可用时返回 None
+        """
+        if not getattr(settings, "METRIC_SEARCH_INDEX_ENABLED", False) or not params.get("bk_biz_id"):
+            return None
+
+        try:
+            return MetricSearchIndexManager.search([0, params["bk_biz_id"]], queries)
+        except Exception as e:
+            logger.exception(f"search metric by index failed: {e}")
+            return None
 
-            queries.extend(exact_query)
-            metrics = metrics.filter(reduce(lambda x, y: x | y, queries))
+    @classmethod
+    def query_filter(cls, metrics: QuerySet, params: Dict, queries: List[str]) -> QuerySet:
+        """
+        模糊搜索过滤，优先使用倒排索引，索引不可用时回退为数据库模糊查询
+        """
+        metric_ids = cls.search_metric_ids(params, queries)
+        if metric_ids is not None:
+            return metrics.filter(id__in=metric_ids)
 
-        return metrics
+        # 尝试解析指标ID格式的query字符串
+        exact_query = []
+        for query in queries:
+            query_params_list = []
+            fields = query.split(".")
+            if len(fields) == 2:
+                query_params_list.extend(
+                    [
+                        {"result_table_id": fields[0], "metric_field": fields[1]},
+                        {"data_label": fields[0], "metric_field": fields[1]},
+                    ]
+                )
+            elif len(fields) >= 3:
+                query_params_list.append(
+                    {"result_table_id": ".".join(fields[:2]), "metric_field": ".".join(fields[2:])}
+                )
+
+            for query_params in query_params_list:
+                filter_params = {
+                    f"{query_key}__icontains": query_value for query_key, query_value in query_params.items()
+                }
+                exact_query.append(Q(**filter_params))
+
+        conditions = []
+        for query, field in product(queries, ["result_table_id", "metric_field", "metric_field_name"]):
+            conditions.append(Q(**{f"{field}__icontains": query}))
+
+        conditions.extend(exact_query)
+        return metrics.filter(reduce(lambda x, y: x | y, conditions))
 
     @classmethod
     def page_filter(cls, metrics: QuerySet, params) -> Tuple[QuerySet, int]:
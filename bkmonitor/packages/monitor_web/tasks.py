@@ -42,6 +42,7 @@ from bkmonitor.strategy.serializers import MultivariateAnomalyDetectionSerialize
 from bkmonitor.utils.common_utils import to_bk_data_rt_id
 from bkmonitor.utils.local import local
 from bkmonitor.utils.sql import sql_format_params
+from bkmonitor.utils.thread_backend import ThreadPool
 from bkmonitor.utils.user import set_local_username
 from constants.data_source import DataSourceLabel, DataTypeLabel
 from constants.dataflow import ConsumingMode
@@ -225,6 +226,16 @@ def update_metric_list_by_biz(bk_biz_id):
     ]
     source_type_gt_0 = ["BKDATA"]
 
+    def update_metric(_source_type, source):
+        try:
+            start = time.time()
+            logger.info("update metric list({}) by biz({})".format(_source_type, bk_biz_id))
+            source(bk_biz_id).run(delay=False)
+            logger.info("update metric list({}) succeed in {}".format(_source_type, time.time() - start))
+        except BaseException as e:
+            logger.exception("Failed to update metric list(%s) for (%s)", _source_type, e)
+
+    sources = []
     for source_type, source in list(SOURCE_TYPE.items()):
         # 部分环境可用禁用数据平台指标缓存
         if not settings.ENABLE_BKDATA_METRIC_CACHE and source_type == "BKDATA":
@@ -234,17 +245,19 @@ def update_metric_list_by_biz(bk_biz_id):
         if source_type in source_type_to_app_code and source_type_to_app_code[source_type] not in apps:
             continue
 
-        try:
-            if source_type in source_type_use_biz:
-                if source_type in source_type_gt_0 and bk_biz_id <= 0:
-                    continue
-                start = time.time()
-                logger.info("update metric list({}) by biz({})".format(source_type, bk_biz_id))
-                source(bk_biz_id).run(delay=False)
-                logger.info("update metric list({}) succeed in {}".format(source_type, time.time() - start))
+        if source_type not in source_type_use_biz:
+            continue
+        if source_type in source_type_gt_0 and bk_biz_id <= 0:
+            continue
+        sources.append((source_type, source))
 
-        except BaseException as e:
-            logger.exception("Failed to update metric list(%s) for (%s)", source_type, e)
+    # 各数据源的指标缓存互不影响，使用有限的线程并发刷新
+    pool = ThreadPool(min(len(sources), settings.METRIC_CACHE_REFRESH_CONCURRENCY) or 1)
+    try:
+        pool.map_ignore_exception(update_metric, sources)
+    finally:
+        pool.close()
+        pool.join()
 
     ApplicationConfig.objects.filter(cc_biz_id=bk_biz_id, key=f"{bk_biz_id}_update_metric_cache").delete()
 
@@ -273,6 +286,7 @@ def append_metric_list_cache(result_table_id_list):
     """
     from bkmonitor.models.metric_list_cache import MetricListCache
     from monitor_web.strategies.metric_list_cache import BkmonitorMetricCacheManager
+    from monitor_web.strategies.metric_search_index import MetricSearchIndexManager
 
     def update_or_create_metric_list_cache(metric_list):
         for metric in metric_list:
@@ -284,6 +298,8 @@ def append_metric_list_cache(result_table_id_list):
                 data_source_label=metric.get("data_source_label"),
                 defaults=metric,
             )
+        # 通知指标搜索索引增量同步
+        MetricSearchIndexManager.notify({metric["bk_biz_id"] for metric in metric_list if "bk_biz_id" in metric})
 
     set_local_username(settings.COMMON_USERNAME)
     if not result_table_id_list:
@@ -381,6 +397,7 @@ def append_event_metric_list_cache(bk_event_group_id):
         BkMonitorLogCacheManager,
         CustomEventCacheManager,
     )
+    from monitor_web.strategies.metric_search_index import MetricSearchIndexManager
 
     set_local_username(settings.COMMON_USERNAME)
     event_group_id = int(bk_event_group_id)
@@ -397,6 +414,7 @@ def append_event_metric_list_cache(bk_event_group_id):
                 data_source_label=metric_msg.get("data_source_label"),
                 defaults=metric_msg,
             )
+        MetricSearchIndexManager.notify({metric["bk_biz_id"] for metric in create_msg if "bk_biz_id" in metric})
     else:
         BkMonitorLogCacheManager().run()
 
@@ -414,6 +432,7 @@ def update_task_running_status(task_id):
 def append_custom_ts_metric_list_cache(time_series_group_id):
     from bkmonitor.models.metric_list_cache import MetricListCache
     from monitor_web.strategies.metric_list_cache import CustomMetricCacheManager
+    from monitor_web.strategies.metric_search_index import MetricSearchIndexManager
 
     try:
         params = {
@@ -432,6 +451,7 @@ def append_custom_ts_metric_list_cache(time_series_group_id):
                     data_source_label=metric_msg.get("data_source_label"),
                     defaults=metric_msg,
                 )
+            MetricSearchIndexManager.notify({metric["bk_biz_id"] for metric in create_msg if "bk_biz_id" in metric})
     except BaseException as err:
         logger.error("[update_custom_ts_metric] failed, msg is {}".format(err))
 
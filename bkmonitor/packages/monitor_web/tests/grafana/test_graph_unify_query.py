@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import copy
+
+import pytest
+
+from bkmonitor.data_source.unify_query.query import UnifyQuery
+from constants.data_source import DataSourceLabel, DataTypeLabel
+from packages.monitor_web.grafana.resources.unify_query import GraphUnifyQueryResource
+
+SERIES_LIST = [
+    {
+        "dimensions": {"bk_target_ip": "127.0.0.1", "bk_target_cloud_id": "0"},
+        "columns": {"_time_": [1000, 2000, 3000], "a": [1.234, None, 3], "_result_": [None, 2.345, 3]},
+    },
+    {
+        "dimensions": {"bk_target_ip": "127.0.0.2", "bk_target_cloud_id": "0"},
+        "columns": {"_time_": [1000, 2000], "a": [4, 5], "_result_": [4, 5]},
+    },
+]
+
+
+@pytest.mark.parametrize("data_source_label", [DataSourceLabel.BK_MONITOR_COLLECTOR, DataSourceLabel.PROMETHEUS])
+def test_series_data_format(data_source_label):
+    """
+    按列组织的数据格式化结果需要与逐条记录格式化的结果一致
+    """
+    params = {
+        "expression": "a",
+        "query_configs": [
+            {
+                "data_source_label": data_source_label,
+                "data_type_label": DataTypeLabel.TIME_SERIES,
+                "group_by": ["bk_target_ip"],
+                "metrics": [{"field": "usage", "method": "AVG", "alias": "a", "display": True}],
+            }
+        ],
+    }
+    resource = GraphUnifyQueryResource()
+    records = UnifyQuery.series_to_records(copy.deepcopy(SERIES_LIST))
+    assert resource.series_data_format(params, copy.deepcopy(SERIES_LIST)) == resource.data_format(params, records)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import pytest
+from monitor_web.strategies.metric_list_cache import BaseMetricCacheManager
+
+from bkmonitor.models.metric_list_cache import MetricListCache
+from constants.data_source import DataSourceLabel, DataTypeLabel
+
+pytestmark = pytest.mark.django_db
+
+
+def build_metric(metric_field, description=""):
+    return {
+        "bk_biz_id": 2,
+        "result_table_id": "system.cpu",
+        "metric_field": metric_field,
+        "metric_field_name": metric_field,
+        "description": description,
+        "dimensions": [{"id": "bk_target_ip", "name": "ip"}],
+        "collect_config_ids": [],
+        "result_table_label": "os",
+        "data_source_label": DataSourceLabel.BK_MONITOR_COLLECTOR,
+        "data_type_label": DataTypeLabel.TIME_SERIES,
+        "data_target": "host_target",
+        "default_dimensions": [],
+        "default_condition": [],
+    }
+
+
+class FakeMetricCacheManager(BaseMetricCacheManager):
+    data_sources = ((DataSourceLabel.BK_MONITOR_COLLECTOR, DataTypeLabel.TIME_SERIES),)
+
+    def __init__(self, bk_biz_id, metrics):
+        super(FakeMetricCacheManager, self).__init__(bk_biz_id)
+        self.metrics = metrics
+
+    def get_tables(self):
+        yield {}
+
+    def get_metrics_by_table(self, table):
+        for metric in self.metrics:
+            yield dict(metric)
+
+
+class TestMetricCacheRefresh(object):
+    def setup_method(self):
+        MetricListCache.objects.all().delete()
+
+    def test_refresh(self, settings):
+        settings.METRIC_CACHE_BATCH_SIZE_MIN = 2
+        settings.METRIC_CACHE_BATCH_SIZE_MAX = 4
+
+        writer = FakeMetricCacheManager(2, [build_metric(f"metric_{i}") for i in range(5)]).refresh()
+        assert (writer.created, writer.updated, writer.deleted, writer.unchanged) == (5, 0, 0, 0)
+        assert MetricListCache.objects.filter(bk_biz_id=2).count() == 5
+        assert MetricListCache.objects.get(metric_field="metric_0").readable_name == "system.cpu.metric_0"
+
+        metrics = [build_metric(f"metric_{i}") for i in range(1, 5)]
+        metrics[0]["description"] = "changed"
+        writer = FakeMetricCacheManager(2, metrics).refresh()
+        assert (writer.created, writer.updated, writer.deleted, writer.unchanged) == (0, 1, 1, 3)
+        assert MetricListCache.objects.get(metric_field="metric_1").description == "changed"
+        assert not MetricListCache.objects.filter(metric_field="metric_0").exists()
+
+    def test_refresh_duplicate_and_manual_metric(self):
+        manager = FakeMetricCacheManager(2, [build_metric("metric_0")])
+        manager.refresh()
+        MetricListCache.objects.create(**build_metric("metric_0"))
+        MetricListCache.objects.create(metric_md5="0", **build_metric("manual"))
+
+        writer = manager.refresh()
+        assert (writer.created, writer.updated, writer.deleted, writer.unchanged) == (0, 0, 1, 1)
+        assert MetricListCache.objects.filter(metric_field="metric_0").count() == 1
+        assert MetricListCache.objects.filter(metric_field="manual").exists()
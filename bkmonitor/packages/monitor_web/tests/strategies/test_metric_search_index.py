@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2021 THL A29 Limited, a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+import random
+
+import pytest
+
+from monitor_web.management.commands.benchmark_metric_search import generate_metric
+from monitor_web.strategies.metric_search_index import MetricSearchIndex, MetricSearchIndexManager
+
+
+def icontains_match(metric, query):
+    """
+    与 GetMetricListV2Resource 中数据库模糊查询一致的匹配规则
+    """
+    query = query.lower()
+    result_table_id = metric["result_table_id"].lower()
+    metric_field = metric["metric_field"].lower()
+    if query in result_table_id or query in metric_field or query in metric["metric_field_name"].lower():
+        return True
+
+    fields = query.split(".")
+    if len(fields) == 2:
+        table_part, metric_part = fields
+        return (table_part in result_table_id or table_part in metric["data_label"].lower()) and (
+            metric_part in metric_field
+        )
+    if len(fields) >= 3:
+        return ".".join(fields[:2]) in result_table_id and ".".join(fields[2:]) in metric_field
+    return False
+
+
+class TestMetricSearchIndex(object):
+    def test_search(self):
+        index = MetricSearchIndex()
+        index.add(1, {"result_table_id": "system.cpu_summary", "metric_field": "usage", "metric_field_name": "CPU使用率"})
+        index.add(2, {"result_table_id": "system.mem", "metric_field": "pct_used", "metric_field_name": "内存使用率"})
+        index.add(3, {"result_table_id": "system.cpu_detail", "metric_field": "usage", "use_frequency": 10})
+
+        assert sorted(index.search(["使用率"], 100)) == [(1, (10, 0)), (2, (10, 0))]
+        assert sorted(index.search(["CPU_S"], 100)) == [(1, (20, 0))]
+        assert sorted(index.search(["system.cpu.usage"], 100)) == [(1, (80, 0)), (3, (80, 10))]
+        assert sorted(index.search(["mem.pct"], 100)) == [(2, (80, 0))]
+        assert sorted(index.search(["usage"], 100)) == [(1, (100, 0)), (3, (100, 10))]
+
+        # 无法切分出查询词或命中过多时不使用索引
+        assert index.search(["."], 100) is None
+        assert index.search(["system"], 2) is None
+
+    def test_update_and_remove(self):
+        index = MetricSearchIndex()
+        index.add(1, {"result_table_id": "system.cpu", "metric_field": "usage"})
+        assert index.search(["usage"], 100) == [(1, (100, 0))]
+
+        index.add(1, {"result_table_id": "system.cpu", "metric_field": "idle"})
+        assert not index.search(["usage"], 100)
+        assert index.search(["idle"], 100) == [(1, (100, 0))]
+
+        index.remove(1)
+        assert not index.search(["idle"], 100)
+        assert not index.postings
+
+    def test_search_consistent_with_icontains(self):
+        rng = random.Random(1)
+        metrics = [generate_metric(i, rng) for i in range(2000)]
+        index = MetricSearchIndex()
+        for metric_id, metric in enumerate(metrics):
+            index.add(metric_id, metric)
+
+        queries = ["cpu", "USAGE_1", "_12", "使用", "mem_free", "kube_3.pod", "system_1.net.net_in", "apm.", "y.c"]
+        queries.extend(rng.choice(metrics)["readable_name"] for __ in range(20))
+        for query in queries:
+            result = index.search([query], len(metrics))
+            expected = {metric_id for metric_id, metric in enumerate(metrics) if icontains_match(metric, query)}
+            assert result is not None
+            assert {metric_id for metric_id, __ in result} == expected, query
+
+
+class SyncBuilder(object):
+    """
+    在调用方线程中同步执行构建任务
+    """
+
+    def submit(self, func, *args):
+        func(*args)
+
+
+class TestMetricSearchIndexManager(object):
+    @pytest.fixture(autouse=True)
+    def builder(self, mocker):
+        def load(index, since=None):
+            for metric_id in range(2):
+                index.add(index.bk_biz_id * 10 + metric_id, {"result_table_id": "system.cpu", "metric_field": "usage"})
+            return 2
+
+        MetricSearchIndexManager.clear()
+        mocker.patch.object(MetricSearchIndexManager, "_builder", SyncBuilder())
+        mocker.patch.object(MetricSearchIndexManager, "load", side_effect=load)
+        mocker.patch.object(MetricSearchIndexManager, "build_in_background", MetricSearchIndexManager.build)
+        yield
+        MetricSearchIndexManager.clear()
+
+    def test_get_index(self):
+        # 索引未就绪时不阻塞请求，由调用方回退为数据库查询
+        assert MetricSearchIndexManager.get_index(1, "v1") is None
+        index = MetricSearchIndexManager.get_index(1, "v1")
+        assert index is not None and index.version == "v1"
+
+        # 版本落后时回退为数据库查询，同步完成后继续使用索引
+        assert MetricSearchIndexManager.get_index(1, "v2") is None
+        assert MetricSearchIndexManager.get_index(1, "v2") is index
+
+    def test_evict(self, settings):
+        settings.METRIC_SEARCH_INDEX_MAX_METRICS = 4
+        for bk_biz_id in (1, 2):
+            MetricSearchIndexManager.get_index(bk_biz_id)
+        assert list(MetricSearchIndexManager._indexes) == [1, 2]
+
+        # 最近使用的索引移到末尾，超出上限时淘汰最久未使用的索引
+        MetricSearchIndexManager.get_index(1)
+        MetricSearchIndexManager.get_index(3)
+        assert list(MetricSearchIndexManager._indexes) == [1, 3]